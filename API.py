@@ -23,9 +23,12 @@ import time
 import json
 import base64
 import logging
+import asyncio
+import itertools
+import collections
 import threading
-import tempfile
 from typing import Dict, List, Optional, Union, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from enum import Enum
@@ -35,11 +38,10 @@ from uuid import uuid4
 import glob
 import numpy as np
 import torch
-from PIL import Image
-import cv2
+from PIL import Image, ImageEnhance
 import uvicorn
 from fastapi import FastAPI, File, UploadFile, Form, Query, HTTPException, BackgroundTasks, Depends, status
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field, validator
@@ -49,7 +51,9 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 # Импорты из модулей проекта
 from inference.predictor import ColorizationPredictor
-from inference.postprocessor import ColorizationPostProcessor
+from inference.postprocessor import ColorizationPostprocessor as ColorizationPostProcessor
+from inference.micro_batching import create_micro_batch_scheduler
+from inference.job_store import create_job_store, FINAL_STATUSES
 from utils.config_parser import load_config
 from utils.visualization import ColorizationVisualizer
 from utils.user_interaction import UserInteractionModule
@@ -59,6 +63,7 @@ from modules.memory_bank import MemoryBankModule
 
 
 # Настройка логирования
+os.makedirs("monitoring/error_logs", exist_ok=True)
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -78,6 +83,21 @@ class ColorSpace(str, Enum):
     YUV = "yuv"
 
 
+class ImageFormat(str, Enum):
+    """Поддерживаемые форматы изображения в ответе."""
+    PNG = "png"
+    JPEG = "jpeg"
+    WEBP = "webp"
+
+
+# Формат PIL и MIME-тип для каждого формата ответа
+IMAGE_FORMAT_INFO = {
+    ImageFormat.PNG: ("PNG", "image/png"),
+    ImageFormat.JPEG: ("JPEG", "image/jpeg"),
+    ImageFormat.WEBP: ("WEBP", "image/webp"),
+}
+
+
 class StylePreset(str, Enum):
     """Предустановленные стили колоризации."""
     DEFAULT = "default"
@@ -167,7 +187,7 @@ class BatchProgressResponse(BaseModel):
     processed_images: int = Field(..., description="Количество обработанных изображений")
     progress_percent: float = Field(..., description="Процент завершения")
     estimated_time_left: Optional[float] = Field(None, description="Оценка оставшегося времени в секундах")
-    errors: List[Dict[str, str]] = Field([], description="Список ошибок")
+    errors: List[Dict[str, Any]] = Field([], description="Список ошибок")
 
 
 class TintoraAIModel:
@@ -420,7 +440,7 @@ class TintoraAIModel:
         Колоризация изображения.
         
         Args:
-            image_data (np.ndarray): Изображение в виде numpy массива
+            image_data (np.ndarray): Изображение RGB или ЧБ в виде numpy массива
             color_space (str): Цветовое пространство ("lab", "rgb", "yuv")
             style (str): Имя стиля
             saturation (float, optional): Насыщенность (переопределение)
@@ -439,83 +459,240 @@ class TintoraAIModel:
             if not self.wait_for_model():
                 raise RuntimeError(f"Модель не загружена: {self.load_error}")
         
-        # Создаем временный файл для изображения
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as temp_file:
-            temp_path = temp_file.name
-            # Сохраняем изображение во временный файл
-            cv2.imwrite(temp_path, image_data)
+        # Изображение обрабатывается целиком в памяти, без записи на диск
+        prediction = self.predictor.predict_arrays([image_data])[0]
         
-        try:
-            # Получаем настройки стиля
-            style_settings = self._process_style_settings(style, saturation, contrast, enhance)
+        return self._finalize_prediction(
+            prediction,
+            image_data=image_data,
+            color_space=color_space,
+            style=style,
+            saturation=saturation,
+            contrast=contrast,
+            enhance=enhance,
+            style_strength=style_strength,
+            custom_style_image=custom_style_image,
+            guidance=guidance,
+            show_uncertainty=show_uncertainty
+        )
+    
+    def colorize_batch(self, requests: List[Dict[str, Any]]) -> List[Union[dict, Exception]]:
+        """
+        Колоризация нескольких изображений одним пакетным проходом модели.
+        
+        Используется планировщиком микропакетов: одновременные запросы /colorize
+        объединяются и проходят через модель одним батчем, а настройки стиля и
+        оценка неопределенности применяются к каждому результату отдельно.
+        
+        Args:
+            requests (List[Dict[str, Any]]): Параметры запросов в формате аргументов colorize_image
             
-            # Обновляем настройки постпроцессора
-            self.postprocessor.color_space = color_space
-            self.postprocessor.saturation = style_settings.get('saturation', 1.0)
-            self.postprocessor.contrast = style_settings.get('contrast', 1.0)
-            self.postprocessor.apply_enhancement = style_settings.get('enhance', False)
+        Returns:
+            List[Union[dict, Exception]]: Результат или исключение для каждого запроса
+        """
+        # Проверяем, что модель загружена
+        if not self.is_loaded:
+            if not self.wait_for_model():
+                raise RuntimeError(f"Модель не загружена: {self.load_error}")
+        
+        # Один проход модели для всех изображений пакета
+        predictions = self.predictor.predict_arrays([request['image_data'] for request in requests])
+        
+        results = []
+        for request, prediction in zip(requests, predictions):
+            try:
+                results.append(self._finalize_prediction(prediction, **request))
+            except Exception as e:
+                logger.error(f"Ошибка при обработке результата колоризации: {str(e)}")
+                results.append(e)
+                
+        return results
+    
+    def _finalize_prediction(self, prediction: Dict[str, Any], image_data: np.ndarray = None,
+                             color_space: str = "lab", style: str = "default",
+                             saturation: float = None, contrast: float = None,
+                             enhance: bool = None, style_strength: float = 1.0,
+                             custom_style_image: np.ndarray = None,
+                             guidance: str = None, show_uncertainty: bool = False) -> dict:
+        """
+        Применение настроек стиля и оценки неопределенности к предсказанию модели.
+        
+        Args:
+            prediction (Dict[str, Any]): Результат ColorizationPredictor.predict_arrays
+            image_data (np.ndarray, optional): Исходное изображение (не используется)
+            color_space (str): Цветовое пространство
+            style (str): Имя стиля
+            saturation (float, optional): Насыщенность (переопределение)
+            contrast (float, optional): Контраст (переопределение)
+            enhance (bool, optional): Улучшение (переопределение)
+            style_strength (float): Интенсивность применения стиля (0.0-1.0)
+            custom_style_image (np.ndarray, optional): Пользовательское изображение стиля
+            guidance (str, optional): Подсказки для GuideNet в формате "Команда:Текст"
+            show_uncertainty (bool): Включить карту неопределенности
             
-            # Обрабатываем команды и советы, если указаны
-            if guidance:
-                parsed_guidance = self.user_interaction.parse_command(guidance)
-                if parsed_guidance['is_command']:
-                    # TODO: Реализовать обработку команд
-                    logger.info(f"Применена команда: {parsed_guidance['command_type']}")
+        Returns:
+            dict: Результаты колоризации ('colorized' в формате uint8 [H, W, 3])
+        """
+        # Получаем настройки стиля
+        style_settings = self._process_style_settings(style, saturation, contrast, enhance)
+        
+        # Обрабатываем команды и советы, если указаны
+        if guidance:
+            parsed_guidance = self.user_interaction.parse_command(guidance)
+            if parsed_guidance['is_command']:
+                logger.info(f"Применена команда: {parsed_guidance['command_type']}")
+        
+        # Применяем насыщенность и контраст стиля в памяти
+        colorized_pil = Image.fromarray(prediction['colorized'])
+        if style_settings.get('saturation', 1.0) != 1.0:
+            colorized_pil = ImageEnhance.Color(colorized_pil).enhance(style_settings['saturation'])
+        if style_settings.get('contrast', 1.0) != 1.0:
+            colorized_pil = ImageEnhance.Contrast(colorized_pil).enhance(style_settings['contrast'])
+        if style_settings.get('enhance', False):
+            colorized_pil = ImageEnhance.Sharpness(colorized_pil).enhance(1.5)
+        
+        result = {
+            'colorized': np.array(colorized_pil),
+            'color_space': color_space,
+            'style': style
+        }
+        
+        # Применяем пользовательский стиль, если указан
+        if custom_style_image is not None and self.style_transfer:
+            colorized_tensor = torch.from_numpy(result['colorized'].astype(np.float32) / 255.0).permute(2, 0, 1).unsqueeze(0).to(self.device)
+            style_tensor = torch.from_numpy(custom_style_image).permute(2, 0, 1).unsqueeze(0).to(self.device)
             
-            # Колоризируем изображение
-            result = self.predictor.colorize_image(
-                image_path=temp_path,
-                postprocessor=self.postprocessor,
-                batch_size=1
+            styled_result = self.style_transfer.transfer_style(
+                content_image=colorized_tensor,
+                style_image=style_tensor,
+                style_weight=style_strength * 100.0,  # Масштабируем вес стиля
+                num_steps=20  # Ограниченное число шагов для API
             )
             
-            if not result:
-                raise ValueError("Не удалось колоризировать изображение")
-            
-            # Применяем пользовательский стиль, если указан
-            if custom_style_image is not None and self.style_transfer:
-                # Преобразуем результат в тензор для переноса стиля
-                colorized_tensor = torch.from_numpy(result['colorized']).permute(2, 0, 1).unsqueeze(0).to(self.device)
-                style_tensor = torch.from_numpy(custom_style_image).permute(2, 0, 1).unsqueeze(0).to(self.device)
-                
-                # Выполняем перенос стиля
-                styled_result = self.style_transfer.transfer_style(
-                    content_image=colorized_tensor,
-                    style_image=style_tensor,
-                    style_weight=style_strength * 100.0,  # Масштабируем вес стиля
-                    num_steps=20  # Ограниченное число шагов для API
-                )
-                
-                # Преобразуем обратно в numpy
-                styled_result_np = styled_result[0].cpu().permute(1, 2, 0).numpy()
-                result['colorized'] = styled_result_np
-            
-            # Оцениваем неопределенность, если требуется
-            if show_uncertainty and self.uncertainty_module:
-                # Преобразуем результат в тензор для оценки неопределенности
-                colorized_tensor = torch.from_numpy(result['colorized']).permute(2, 0, 1).unsqueeze(0).to(self.device)
-                
-                # Оцениваем неопределенность
+            styled_result_np = styled_result[0].clamp(0, 1).cpu().permute(1, 2, 0).numpy()
+            result['colorized'] = (styled_result_np * 255).round().astype(np.uint8)
+        
+        # Карта неопределенности: из предсказания модели или от модуля оценки
+        if show_uncertainty:
+            if prediction.get('uncertainty') is not None:
+                result['uncertainty_map'] = prediction['uncertainty']
+            elif self.uncertainty_module:
+                colorized_tensor = torch.from_numpy(result['colorized'].astype(np.float32) / 255.0).permute(2, 0, 1).unsqueeze(0).to(self.device)
                 uncertainty_result = self.uncertainty_module(colorized_tensor)
-                uncertainty_map = uncertainty_result['uncertainty'][0, 0].cpu().numpy()
-                
-                # Добавляем карту неопределенности к результату
-                result['uncertainty_map'] = uncertainty_map
+                result['uncertainty_map'] = uncertainty_result['uncertainty'][0, 0].cpu().numpy()
+        
+        return result
+
+
+def decode_image(data: Union[str, bytes]) -> np.ndarray:
+    """
+    Декодирование изображения в памяти.
+    
+    Строки всегда интерпретируются как base64: данные запросов клиентов не должны
+    приводить к чтению файлов сервера (файлы загружаются через load_image_file).
+    
+    Args:
+        data (Union[str, bytes]): Байты файла изображения или строка base64 (в том числе data URI)
             
-            return result
+    Returns:
+        np.ndarray: Изображение RGB [H, W, 3] или ЧБ [H, W] в формате uint8
+    """
+    if isinstance(data, str):
+        if data.startswith('data:image'):
+            data = data.split(',', 1)[1]
+        data = base64.b64decode(data)
+    
+    image = Image.open(BytesIO(data))
+    
+    # Приводим палитровые, 16-битные и RGBA изображения к RGB
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+        
+    return np.asarray(image)
+
+
+def load_image_file(path: str) -> np.ndarray:
+    """
+    Загрузка изображения из локального файла (для SDK, не для данных запросов API).
+    
+    Args:
+        path (str): Путь к файлу изображения
             
-        finally:
-            # Удаляем временный файл
-            try:
-                os.unlink(temp_path)
-            except Exception as e:
-                logger.error(f"Ошибка при удалении временного файла: {str(e)}")
+    Returns:
+        np.ndarray: Изображение RGB [H, W, 3] или ЧБ [H, W] в формате uint8
+    """
+    with open(path, 'rb') as f:
+        return decode_image(f.read())
+
+
+def encode_image(image: np.ndarray, format: str = "PNG", quality: int = None,
+                 compress_level: int = None) -> bytes:
+    """
+    Кодирование изображения в байты.
+    
+    Args:
+        image (np.ndarray): Изображение uint8 или float в диапазоне [0, 1]
+        format (str): Формат изображения (PNG, JPEG, WEBP)
+        quality (int, optional): Качество для JPEG и WebP (1-100)
+        compress_level (int, optional): Уровень сжатия PNG (0-9)
+        
+    Returns:
+        bytes: Закодированное изображение
+    """
+    format = format.upper()
+    save_kwargs = {}
+    
+    if format == "PNG" and compress_level is not None:
+        save_kwargs['compress_level'] = int(compress_level)
+    elif format in ("JPEG", "WEBP") and quality is not None:
+        save_kwargs['quality'] = int(quality)
+    
+    buffer = BytesIO()
+    Image.fromarray(_to_uint8(image)).save(buffer, format=format, **save_kwargs)
+    return buffer.getvalue()
+
+
+def _iter_chunks(data: bytes, chunk_size: int = 64 * 1024):
+    """
+    Разбиение закодированного изображения на части для потоковой передачи.
+    
+    Args:
+        data (bytes): Закодированное изображение
+        chunk_size (int): Размер части в байтах
+        
+    Yields:
+        bytes: Очередная часть данных
+    """
+    view = memoryview(data)
+    for offset in range(0, len(view), chunk_size):
+        yield bytes(view[offset:offset + chunk_size])
+
+
+def _to_uint8(image: np.ndarray) -> np.ndarray:
+    """
+    Приведение изображения к uint8.
+    
+    Args:
+        image (np.ndarray): Изображение uint8 или float в диапазоне [0, 1]
+        
+    Returns:
+        np.ndarray: Изображение uint8
+    """
+    if image.dtype == np.uint8:
+        return image
+    return (np.clip(image, 0.0, 1.0) * 255).round().astype(np.uint8)
 
 
 class BatchProcessor:
     """
     Класс для обработки пакетных запросов на колоризацию.
     Управляет очередью, приоритетами и прогрессом обработки.
+    
+    Состояние пакетов, входные изображения и результаты хранятся в BatchJobStore
+    (SQLite и файлы на диске), в памяти остается только очередь индексов изображений.
+    Пакеты обрабатываются пулом рабочих потоков мини-пакетами: планировщик на каждом
+    шаге выбирает пакет с наименьшим виртуальным временем (start-time fair queuing, по кругу
+    или с учетом приоритета), а декодирование и кодирование изображений выполняются в отдельном пуле потоков.
     """
     
     def __init__(self, tintora_model: TintoraAIModel):
@@ -526,16 +703,77 @@ class BatchProcessor:
             tintora_model (TintoraAIModel): Модель колоризации
         """
         self.model = tintora_model
-        self.batch_queue = []  # Очередь заданий
-        self.active_batches = {}  # Активные пакеты: batch_id -> информация
-        self.completed_batches = {}  # Завершенные пакеты
+        
+        # Хранилище заданий с ограниченным сроком хранения результатов
+        api_config = self.model.config.get('api', {}) if isinstance(self.model.config, dict) else {}
+        job_store_config = api_config.get('job_store', {})
+        self.job_store = create_job_store(job_store_config)
+        self.cleanup_interval = job_store_config.get('cleanup_interval', 60)
+        
+        # Параметры пула рабочих потоков
+        workers_config = api_config.get('batch_workers', {})
+        self.num_workers = max(1, workers_config.get('num_workers', 2))
+        self.mini_batch_size = max(1, workers_config.get('mini_batch_size', 8))
+        self.scheduling = workers_config.get('scheduling', 'priority')
+        if self.scheduling not in ('round_robin', 'priority'):
+            raise ValueError(f"Неизвестная стратегия планирования: {self.scheduling}")
+        
+        self.batch_queue = {}  # Незавершенные пакеты: batch_id -> состояние планировщика
+        self.active_batches = {}  # Незавершенные пакеты: batch_id -> статус
         self.lock = threading.Lock()  # Блокировка для многопоточного доступа
+        self.condition = threading.Condition(self.lock)  # Сигнал о появлении заданий
+        self._sequence = itertools.count()
+        self._next_cleanup = time.time()
         
-        # Запуск фонового потока для обработки очереди
+        # Пул для декодирования и кодирования, чтобы потоки модели не простаивали
+        self.io_pool = ThreadPoolExecutor(
+            max_workers=max(1, workers_config.get('io_workers', 4)),
+            thread_name_prefix="BatchIO"
+        )
+        
+        # Возвращаем в очередь пакеты, не завершенные до перезапуска
+        for batch_id, priority in self.job_store.get_unfinished_jobs():
+            self.job_store.set_status(batch_id, 'pending')
+            self._register_batch(batch_id, priority)
+        
+        # Запуск пула рабочих потоков для обработки очереди
         self.running = True
-        self.worker_thread = threading.Thread(target=self._process_queue)
-        self.worker_thread.daemon = True
-        self.worker_thread.start()
+        self.worker_threads = []
+        for i in range(self.num_workers):
+            worker_thread = threading.Thread(target=self._process_queue, name=f"BatchWorker-{i}")
+            worker_thread.daemon = True
+            worker_thread.start()
+            self.worker_threads.append(worker_thread)
+    
+    def _register_batch(self, batch_id: str, priority: int):
+        """
+        Постановка пакета в очередь планировщика.
+        
+        Args:
+            batch_id (str): ID пакета
+            priority (int): Приоритет обработки
+        """
+        batch_info = self.job_store.get_job(batch_id)
+        params = self.job_store.get_params(batch_id)
+        
+        # Изображения, обработанные до перезапуска, пропускаем
+        done_indices = {item['index'] for item in self.job_store.get_results(batch_id)}
+        done_indices.update(error['index'] for error in batch_info['errors'])
+        
+        with self.condition:
+            self.batch_queue[batch_id] = {
+                'params': params,
+                'pending': collections.deque(i for i in range(batch_info['total_images']) if i not in done_indices),
+                'in_flight': 0,
+                'served': 0,
+                # Новый пакет начинает с текущего виртуального времени (start-time fair queuing)
+                'start_tag': self._virtual_time(),
+                'weight': max(1, priority) if self.scheduling == 'priority' else 1,
+                'sequence': next(self._sequence),
+                'started': False
+            }
+            self.active_batches[batch_id] = 'pending'
+            self.condition.notify_all()
     
     def add_batch(self, images: List[Union[np.ndarray, str]], is_urls: bool = False,
                   style: str = "default", color_space: str = "lab",
@@ -562,47 +800,63 @@ class BatchProcessor:
         """
         batch_id = str(uuid4())
         
-        # Создаем запись пакета
-        batch_info = {
-            'id': batch_id,
-            'images': images,
-            'is_urls': is_urls,
-            'style': style,
-            'color_space': color_space,
-            'saturation': saturation,
-            'contrast': contrast,
-            'enhance': enhance,
-            'notify_url': notify_url,
-            'callback_id': callback_id,
-            'priority': priority,
-            'status': 'pending',
-            'created_at': datetime.now().isoformat(),
-            'total_images': len(images),
-            'processed_images': 0,
-            'results': [],
-            'errors': [],
-            'start_time': None,
-            'end_time': None
-        }
+        # Сохраняем пакет в хранилище; входные изображения выносятся на диск
+        self.job_store.create_job(
+            batch_id,
+            images,
+            params={
+                'is_urls': is_urls,
+                'style': style,
+                'color_space': color_space,
+                'saturation': saturation,
+                'contrast': contrast,
+                'enhance': enhance,
+                'notify_url': notify_url,
+                'callback_id': callback_id
+            },
+            priority=priority
+        )
         
-        # Добавляем пакет в очередь с учетом приоритета
-        with self.lock:
-            # Находим позицию для вставки на основе приоритета
-            insert_pos = 0
-            for i, item in enumerate(self.batch_queue):
-                if item['priority'] < priority:
-                    insert_pos = i
-                    break
-                else:
-                    insert_pos = i + 1
+        self._register_batch(batch_id, priority)
+        logger.info(f"Добавлен пакет {batch_id} с {len(images)} изображениями, приоритет: {priority}")
+        
+        return batch_id
+    
+    def cancel_batch(self, batch_id: str) -> bool:
+        """
+        Отмена пакета. Вступает в силу между мини-пакетами: уже переданные
+        модели изображения будут обработаны, оставшиеся - нет.
+        
+        Args:
+            batch_id (str): ID пакета
             
-            # Вставляем пакет в нужную позицию
-            self.batch_queue.insert(insert_pos, batch_info)
-            self.active_batches[batch_id] = batch_info
+        Returns:
+            bool: True, если пакет найден и еще не завершен
+        """
+        with self.condition:
+            state = self.batch_queue.get(batch_id)
+            if state is None:
+                return False
             
-            logger.info(f"Добавлен пакет {batch_id} с {len(images)} изображениями, приоритет: {priority}")
+            state['pending'].clear()
+            self.active_batches[batch_id] = 'cancelled'
+            finished = state['in_flight'] == 0
         
-        return batch_id
+        logger.info(f"Пакет {batch_id} отменен")
+        
+        if finished:
+            self._finalize_batch(batch_id)
+        return True
+    
+    def get_queue_length(self) -> int:
+        """
+        Количество пакетов, ожидающих обработки.
+        
+        Returns:
+            int: Количество пакетов с необработанными изображениями
+        """
+        with self.lock:
+            return sum(1 for state in self.batch_queue.values() if state['pending'])
     
     def get_batch_progress(self, batch_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -614,47 +868,36 @@ class BatchProcessor:
         Returns:
             Optional[Dict[str, Any]]: Информация о пакете или None, если пакет не найден
         """
-        # Проверяем активные пакеты
-        if batch_id in self.active_batches:
-            batch = self.active_batches[batch_id]
-            
-            # Вычисляем прогресс
+        batch = self.job_store.get_job(batch_id)
+        if batch is None:
+            return None
+        
+        finished = batch['status'] in FINAL_STATUSES
+        
+        # Вычисляем прогресс
+        if finished:
+            progress = 100.0
+        else:
             progress = (batch['processed_images'] / batch['total_images'] * 100) if batch['total_images'] > 0 else 0
-            
-            # Оцениваем оставшееся время
-            estimated_time_left = None
-            if batch['start_time'] and batch['processed_images'] > 0:
-                elapsed_time = (datetime.now() - datetime.fromisoformat(batch['start_time'])).total_seconds()
-                images_per_second = batch['processed_images'] / elapsed_time if elapsed_time > 0 else 0
-                if images_per_second > 0:
-                    remaining_images = batch['total_images'] - batch['processed_images']
-                    estimated_time_left = remaining_images / images_per_second
-            
-            return {
-                'batch_id': batch_id,
-                'status': batch['status'],
-                'total_images': batch['total_images'],
-                'processed_images': batch['processed_images'],
-                'progress_percent': progress,
-                'estimated_time_left': estimated_time_left,
-                'errors': batch['errors']
-            }
-            
-        # Проверяем завершенные пакеты
-        if batch_id in self.completed_batches:
-            batch = self.completed_batches[batch_id]
-            
-            return {
-                'batch_id': batch_id,
-                'status': batch['status'],
-                'total_images': batch['total_images'],
-                'processed_images': batch['processed_images'],
-                'progress_percent': 100.0,
-                'estimated_time_left': 0,
-                'errors': batch['errors']
-            }
-            
-        return None
+        
+        # Оцениваем оставшееся время
+        estimated_time_left = 0 if finished else None
+        if not finished and batch['start_time'] and batch['processed_images'] > 0:
+            elapsed_time = time.time() - batch['start_time']
+            images_per_second = batch['processed_images'] / elapsed_time if elapsed_time > 0 else 0
+            if images_per_second > 0:
+                remaining_images = batch['total_images'] - batch['processed_images']
+                estimated_time_left = remaining_images / images_per_second
+        
+        return {
+            'batch_id': batch_id,
+            'status': batch['status'],
+            'total_images': batch['total_images'],
+            'processed_images': batch['processed_images'],
+            'progress_percent': progress,
+            'estimated_time_left': estimated_time_left,
+            'errors': batch['errors']
+        }
     
     def get_batch_results(self, batch_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -666,142 +909,276 @@ class BatchProcessor:
         Returns:
             Optional[Dict[str, Any]]: Результаты обработки или None, если пакет не найден или не завершен
         """
-        # Проверяем завершенные пакеты
-        if batch_id in self.completed_batches:
-            batch = self.completed_batches[batch_id]
-            
-            if batch['status'] == 'completed':
-                return {
-                    'batch_id': batch_id,
-                    'status': 'completed',
-                    'total_images': batch['total_images'],
-                    'processed_images': batch['processed_images'],
-                    'results': batch['results'],
-                    'errors': batch['errors'],
-                    'processing_time': (datetime.fromisoformat(batch['end_time']) - 
-                                      datetime.fromisoformat(batch['start_time'])).total_seconds()
-                }
+        batch = self.job_store.get_job(batch_id)
         
-        return None
+        if batch is None or batch['status'] != 'completed':
+            return None
+        
+        # Результаты читаются из файлов только по запросу
+        results = []
+        for item in self.job_store.get_results(batch_id):
+            with open(item['path'], 'rb') as f:
+                colorized_base64 = base64.b64encode(f.read()).decode()
+            results.append({
+                'index': item['index'],
+                'colorized_image': f"data:image/png;base64,{colorized_base64}",
+            })
+        
+        return {
+            'batch_id': batch_id,
+            'status': 'completed',
+            'total_images': batch['total_images'],
+            'processed_images': batch['processed_images'],
+            'results': results,
+            'errors': batch['errors'],
+            'processing_time': batch['end_time'] - batch['start_time']
+        }
     
     def _process_queue(self):
-        """Фоновая обработка очереди пакетов."""
+        """Цикл рабочего потока: выбор и обработка мини-пакетов."""
         while self.running:
-            # Берем пакет из очереди
-            batch_info = None
+            self._maybe_evict()
             
-            with self.lock:
-                if self.batch_queue:
-                    batch_info = self.batch_queue.pop(0)
+            # Ждем появления работы без опроса очереди
+            with self.condition:
+                selection = self._select_mini_batch()
+                if selection is None:
+                    self.condition.wait(timeout=max(0.1, self._next_cleanup - time.time()))
+                    continue
             
-            # Если есть пакет для обработки
-            if batch_info:
-                batch_id = batch_info['id']
+            batch_id, indices, params, first = selection
+            if first:
+                self.job_store.set_status(batch_id, 'processing')
                 logger.info(f"Начинается обработка пакета {batch_id}")
-                
-                # Обновляем статус и время начала
-                with self.lock:
-                    batch_info['status'] = 'processing'
-                    batch_info['start_time'] = datetime.now().isoformat()
-                    self.active_batches[batch_id] = batch_info
-                
-                try:
-                    # Обрабатываем каждое изображение в пакете
-                    for i, image_data in enumerate(batch_info['images']):
-                        try:
-                            # Проверяем, не отменена ли задача
-                            with self.lock:
-                                if self.active_batches[batch_id]['status'] == 'cancelled':
-                                    logger.info(f"Пакет {batch_id} был отменен")
-                                    break
-                            
-                            # Загружаем изображение
-                            if batch_info['is_urls']:
-                                # Загружаем по URL (не реализовано)
-                                image = None  # TODO: Реализовать загрузку по URL
-                            else:
-                                # Декодируем изображение из строки или base64
-                                if isinstance(image_data, str):
-                                    if image_data.startswith('data:image'):
-                                        # Декодируем base64
-                                        image_data = image_data.split(',')[1]
-                                        image = np.array(Image.open(BytesIO(base64.b64decode(image_data))))
-                                    else:
-                                        # Обычный путь к файлу
-                                        image = cv2.imread(image_data)
-                                else:
-                                    # Уже готовое изображение
-                                    image = image_data
-                            
-                            if image is None:
-                                raise ValueError("Не удалось загрузить изображение")
-                            
-                            # Колоризируем изображение
-                            result = self.model.colorize_image(
-                                image_data=image,
-                                color_space=batch_info['color_space'],
-                                style=batch_info['style'],
-                                saturation=batch_info['saturation'],
-                                contrast=batch_info['contrast'],
-                                enhance=batch_info['enhance']
-                            )
-                            
-                            # Кодируем результат в base64
-                            colorized_pil = Image.fromarray((result['colorized'] * 255).astype(np.uint8))
-                            buffer = BytesIO()
-                            colorized_pil.save(buffer, format="PNG")
-                            colorized_base64 = base64.b64encode(buffer.getvalue()).decode()
-                            
-                            # Добавляем результат
-                            batch_info['results'].append({
-                                'index': i,
-                                'colorized_image': f"data:image/png;base64,{colorized_base64}",
-                            })
-                            
-                            # Обновляем прогресс
-                            with self.lock:
-                                batch_info['processed_images'] += 1
-                                self.active_batches[batch_id] = batch_info
-                                
-                        except Exception as e:
-                            logger.error(f"Ошибка при обработке изображения {i} в пакете {batch_id}: {str(e)}")
-                            batch_info['errors'].append({
-                                'index': i,
-                                'error': str(e)
-                            })
-                    
-                    # Завершение обработки пакета
-                    with self.lock:
-                        batch_info['status'] = 'completed'
-                        batch_info['end_time'] = datetime.now().isoformat()
-                        self.completed_batches[batch_id] = batch_info
-                        
-                        if batch_id in self.active_batches:
-                            del self.active_batches[batch_id]
-                    
-                    logger.info(f"Завершена обработка пакета {batch_id}: "
-                               f"{batch_info['processed_images']}/{batch_info['total_images']} изображений, "
-                               f"{len(batch_info['errors'])} ошибок")
-                    
-                    # Отправляем уведомление, если указан URL
-                    if batch_info['notify_url']:
-                        self._send_notification(batch_info)
-                    
-                except Exception as e:
-                    logger.error(f"Ошибка при обработке пакета {batch_id}: {str(e)}")
-                    
-                    # Обновляем статус в случае ошибки
-                    with self.lock:
-                        batch_info['status'] = 'failed'
-                        batch_info['end_time'] = datetime.now().isoformat()
-                        self.completed_batches[batch_id] = batch_info
-                        
-                        if batch_id in self.active_batches:
-                            del self.active_batches[batch_id]
             
+            handled = set()
+            try:
+                self._process_mini_batch(batch_id, indices, params, handled)
+            except Exception as e:
+                logger.error(f"Ошибка при обработке мини-пакета пакета {batch_id}: {str(e)}")
+                # Завершаем только изображения, еще не завершенные и не переданные на кодирование
+                for index in indices:
+                    if index not in handled:
+                        self._complete_item(batch_id, index, error=str(e))
+    
+    @staticmethod
+    def _batch_tag(state: Dict[str, Any]) -> float:
+        """Виртуальное время пакета: время начала плюс обслуженные изображения на единицу веса."""
+        return state['start_tag'] + state['served'] / state['weight']
+    
+    def _virtual_time(self) -> float:
+        """
+        Текущее виртуальное время планировщика (вызывается под блокировкой).
+        
+        Returns:
+            float: Минимальное виртуальное время пакетов с необработанными изображениями
+        """
+        tags = [self._batch_tag(state) for state in self.batch_queue.values() if state['pending']]
+        return min(tags) if tags else 0.0
+    
+    def _select_mini_batch(self) -> Optional[Tuple[str, List[int], Dict[str, Any], bool]]:
+        """
+        Выбор следующего мини-пакета (вызывается под блокировкой).
+        
+        Выбирается пакет с наименьшим виртуальным временем: время начала пакета плюс
+        число обслуженных изображений на единицу веса. При стратегии 'round_robin' все
+        пакеты получают равную долю, при 'priority' доля пропорциональна приоритету.
+        Новый пакет начинает с текущего минимального виртуального времени, поэтому
+        чередуется с ранее начатыми пакетами, а не обслуживается монопольно.
+        
+        Returns:
+            Optional[Tuple[str, List[int], Dict[str, Any], bool]]: ID пакета, индексы изображений,
+                параметры пакета и признак первого мини-пакета; None, если работы нет
+        """
+        runnable = [(batch_id, state) for batch_id, state in self.batch_queue.items() if state['pending']]
+        if not runnable:
+            return None
+        
+        batch_id, state = min(runnable, key=lambda item: (self._batch_tag(item[1]), item[1]['sequence']))
+        
+        count = min(self.mini_batch_size, len(state['pending']))
+        indices = [state['pending'].popleft() for _ in range(count)]
+        state['in_flight'] += count
+        state['served'] += count
+        
+        first = not state['started']
+        state['started'] = True
+        self.active_batches[batch_id] = 'processing'
+        
+        return batch_id, indices, state['params'], first
+    
+    def _process_mini_batch(self, batch_id: str, indices: List[int], params: Dict[str, Any],
+                            handled: set = None):
+        """
+        Обработка мини-пакета: параллельное декодирование, один пакетный проход модели
+        и асинхронное кодирование результатов.
+        
+        Каждое изображение завершается ровно один раз: ошибки декодирования и прохода
+        модели завершают только соответствующие изображения.
+        
+        Args:
+            batch_id (str): ID пакета
+            indices (List[int]): Индексы изображений пакета
+            params (Dict[str, Any]): Параметры пакета
+            handled (set, optional): Пополняется индексами завершенных изображений и
+                изображений, переданных на кодирование
+        """
+        if handled is None:
+            handled = set()
+        
+        decode_futures = [self.io_pool.submit(self._load_image, batch_id, index, params) for index in indices]
+        
+        requests = []
+        request_indices = []
+        for index, future in zip(indices, decode_futures):
+            try:
+                image = future.result()
+            except Exception as e:
+                logger.error(f"Ошибка при загрузке изображения {index} в пакете {batch_id}: {str(e)}")
+                handled.add(index)
+                self._complete_item(batch_id, index, error=str(e))
+                continue
+            
+            requests.append({
+                'image_data': image,
+                'color_space': params['color_space'],
+                'style': params['style'],
+                'saturation': params['saturation'],
+                'contrast': params['contrast'],
+                'enhance': params['enhance']
+            })
+            request_indices.append(index)
+        
+        if not requests:
+            return
+        
+        # Один проход модели на весь мини-пакет; при ошибке всего прохода (например,
+        # нехватке памяти на одном большом изображении) изображения повторяются по одному
+        try:
+            results = self.model.colorize_batch(requests)
+        except Exception as e:
+            logger.warning(f"Ошибка при колоризации мини-пакета пакета {batch_id}, изображения обрабатываются по одному: {str(e)}")
+            results = []
+            for request in requests:
+                try:
+                    results.extend(self.model.colorize_batch([request]))
+                except Exception as item_error:
+                    results.append(item_error)
+        
+        # Кодирование и запись результатов выполняются в пуле ввода-вывода
+        for index, result in zip(request_indices, results):
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка при обработке изображения {index} в пакете {batch_id}: {str(result)}")
+                handled.add(index)
+                self._complete_item(batch_id, index, error=str(result))
             else:
-                # Если очередь пуста, ждем немного перед следующей проверкой
-                time.sleep(1)
+                self.io_pool.submit(self._encode_result, batch_id, index, result['colorized'])
+                handled.add(index)
+    
+    def _load_image(self, batch_id: str, index: int, params: Dict[str, Any]) -> np.ndarray:
+        """
+        Загрузка и декодирование одного изображения пакета.
+        
+        Args:
+            batch_id (str): ID пакета
+            index (int): Индекс изображения
+            params (Dict[str, Any]): Параметры пакета
+            
+        Returns:
+            np.ndarray: Декодированное изображение
+        """
+        image_data = self.job_store.load_input(batch_id, index)
+        
+        if params['is_urls']:
+            # Загружаем по URL (не реализовано)
+            image = None  # TODO: Реализовать загрузку по URL
+        elif isinstance(image_data, (str, bytes)):
+            # Декодируем изображение из base64
+            image = decode_image(image_data)
+        else:
+            # Уже готовое изображение
+            image = image_data
+        
+        if image is None:
+            raise ValueError("Не удалось загрузить изображение")
+        
+        return image
+    
+    def _encode_result(self, batch_id: str, index: int, colorized: np.ndarray):
+        """
+        Кодирование результата и сохранение его в хранилище.
+        
+        Args:
+            batch_id (str): ID пакета
+            index (int): Индекс изображения
+            colorized (np.ndarray): Колоризованное изображение
+        """
+        try:
+            self._complete_item(batch_id, index, data=encode_image(colorized))
+        except Exception as e:
+            logger.error(f"Ошибка при кодировании изображения {index} в пакете {batch_id}: {str(e)}")
+            self._complete_item(batch_id, index, error=str(e))
+    
+    def _complete_item(self, batch_id: str, index: int, data: bytes = None, error: str = None):
+        """
+        Сохранение результата изображения и завершение пакета после последнего изображения.
+        
+        Args:
+            batch_id (str): ID пакета
+            index (int): Индекс изображения
+            data (bytes, optional): Закодированный результат
+            error (str, optional): Текст ошибки
+        """
+        self.job_store.add_result(batch_id, index, data=data, extension="png", error=error)
+        
+        with self.condition:
+            state = self.batch_queue.get(batch_id)
+            if state is None:
+                return
+            state['in_flight'] -= 1
+            finished = state['in_flight'] == 0 and not state['pending']
+        
+        if finished:
+            self._finalize_batch(batch_id)
+    
+    def _finalize_batch(self, batch_id: str):
+        """
+        Завершение пакета: фиксация статуса и отправка уведомления.
+        
+        Args:
+            batch_id (str): ID пакета
+        """
+        with self.condition:
+            state = self.batch_queue.pop(batch_id, None)
+            status = 'cancelled' if self.active_batches.pop(batch_id, None) == 'cancelled' else 'completed'
+        
+        if state is None:
+            return
+        
+        self.job_store.set_status(batch_id, status)
+        
+        batch_info = self.job_store.get_job(batch_id)
+        logger.info(f"Завершена обработка пакета {batch_id}: "
+                   f"{batch_info['processed_images']}/{batch_info['total_images']} изображений, "
+                   f"{len(batch_info['errors'])} ошибок")
+        
+        # Отправляем уведомление, если указан URL
+        if state['params']['notify_url']:
+            self.io_pool.submit(self._send_notification, dict(batch_info, **state['params']))
+    
+    def _maybe_evict(self):
+        """Периодическая очистка устаревших пакетов в хранилище."""
+        with self.lock:
+            if time.time() < self._next_cleanup:
+                return
+            self._next_cleanup = time.time() + self.cleanup_interval
+        
+        try:
+            evicted = self.job_store.evict()
+            if evicted:
+                logger.info(f"Удалено устаревших пакетов: {evicted}")
+        except Exception as e:
+            logger.error(f"Ошибка при очистке хранилища пакетов: {str(e)}")
     
     def _send_notification(self, batch_info: Dict[str, Any]):
         """
@@ -823,8 +1200,7 @@ class BatchProcessor:
                 'total_images': batch_info['total_images'],
                 'processed_images': batch_info['processed_images'],
                 'errors_count': len(batch_info['errors']),
-                'processing_time': (datetime.fromisoformat(batch_info['end_time']) - 
-                                  datetime.fromisoformat(batch_info['start_time'])).total_seconds()
+                'processing_time': batch_info['end_time'] - batch_info['start_time']
             }
             
             # Добавляем callback_id, если указан
@@ -845,9 +1221,13 @@ class BatchProcessor:
     
     def shutdown(self):
         """Завершение работы обработчика пакетов."""
-        self.running = False
-        if self.worker_thread.is_alive():
-            self.worker_thread.join(timeout=5)
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        for worker_thread in self.worker_threads:
+            if worker_thread.is_alive():
+                worker_thread.join(timeout=5)
+        self.io_pool.shutdown(wait=True)
 
 
 class TintoraAIAPI:
@@ -876,6 +1256,16 @@ class TintoraAIAPI:
         # Инициализируем обработчик пакетов
         self.batch_processor = BatchProcessor(self.model)
         
+        # Планировщик, объединяющий одновременные запросы /colorize в микропакеты
+        api_config = self.model.config.get('api', {}) if isinstance(self.model.config, dict) else {}
+        self.micro_batch_scheduler = create_micro_batch_scheduler(
+            self.model.colorize_batch,
+            api_config.get('micro_batching', {})
+        )
+        
+        # Параметры кодирования бинарных ответов по умолчанию
+        self.encoding_config = api_config.get('encoding', {})
+        
         # Настраиваем CORS
         self.app.add_middleware(
             CORSMiddleware,
@@ -888,6 +1278,25 @@ class TintoraAIAPI:
         # Определяем маршруты
         self._setup_routes()
     
+    async def _run_colorization(self, colorize_kwargs: Dict[str, Any]) -> dict:
+        """
+        Колоризация вне цикла событий.
+        
+        Запрос передается планировщику микропакетов или, если он отключен,
+        выполняется в пуле потоков.
+        
+        Args:
+            colorize_kwargs (Dict[str, Any]): Аргументы TintoraAIModel.colorize_image
+            
+        Returns:
+            dict: Результаты колоризации
+        """
+        if self.micro_batch_scheduler is not None:
+            return await asyncio.wrap_future(self.micro_batch_scheduler.submit(colorize_kwargs))
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self.model.colorize_image(**colorize_kwargs))
+    
     def _setup_routes(self):
         """Настройка маршрутов API."""
         
@@ -913,10 +1322,18 @@ class TintoraAIAPI:
                 "model_status": model_status,
                 "load_error": self.model.load_error,
                 "active_batches": len(self.batch_processor.active_batches),
-                "queue_length": len(self.batch_processor.batch_queue),
+                "queue_length": self.batch_processor.get_queue_length(),
+                "micro_batching": self.micro_batch_scheduler.get_stats() if self.micro_batch_scheduler else None,
                 "timestamp": datetime.now().isoformat()
             }
         
+        @self.app.on_event("shutdown")
+        async def shutdown():
+            """Остановка фоновых обработчиков при завершении работы."""
+            if self.micro_batch_scheduler is not None:
+                self.micro_batch_scheduler.shutdown()
+            self.batch_processor.shutdown()
+        
         @self.app.post("/colorize", response_model=ColorizationResponse)
         async def colorize(request: ColorizationRequest):
             """
@@ -943,11 +1360,7 @@ class TintoraAIAPI:
                 if request.image_data:
                     # Из base64
                     try:
-                        image_data = request.image_data
-                        if image_data.startswith('data:image'):
-                            image_data = image_data.split(',')[1]
-                        
-                        image = np.array(Image.open(BytesIO(base64.b64decode(image_data))))
+                        image = decode_image(request.image_data)
                     except Exception as e:
                         raise HTTPException(
                             status_code=400,
@@ -960,8 +1373,7 @@ class TintoraAIAPI:
                         detail="Загрузка изображений по URL пока не реализована"
                     )
                 
-                # Колоризируем изображение
-                result = self.model.colorize_image(
+                colorize_kwargs = dict(
                     image_data=image,
                     color_space=request.color_space.value,
                     style=request.style.value if request.style else "default",
@@ -974,14 +1386,14 @@ class TintoraAIAPI:
                     show_uncertainty=request.show_uncertainty
                 )
                 
+                # Колоризируем изображение вне цикла событий
+                result = await self._run_colorization(colorize_kwargs)
+                
                 # Формируем результат
                 processing_time = time.time() - start_time
                 
                 # Кодируем колоризованное изображение в base64
-                colorized_pil = Image.fromarray((result['colorized'] * 255).astype(np.uint8))
-                buffer = BytesIO()
-                colorized_pil.save(buffer, format="PNG")
-                colorized_base64 = base64.b64encode(buffer.getvalue()).decode()
+                colorized_base64 = base64.b64encode(encode_image(result['colorized'])).decode()
                 
                 # Формируем ответ
                 response = ColorizationResponse(
@@ -1004,12 +1416,7 @@ class TintoraAIAPI:
                 if request.show_uncertainty and 'uncertainty_map' in result:
                     uncertainty_map = result['uncertainty_map']
                     # Преобразуем карту неопределенности в изображение
-                    uncertainty_vis = (uncertainty_map * 255).astype(np.uint8)
-                    uncertainty_pil = Image.fromarray(uncertainty_vis)
-                    
-                    buffer = BytesIO()
-                    uncertainty_pil.save(buffer, format="PNG")
-                    uncertainty_base64 = base64.b64encode(buffer.getvalue()).decode()
+                    uncertainty_base64 = base64.b64encode(encode_image(uncertainty_map)).decode()
                     
                     response.uncertainty_map = f"data:image/png;base64,{uncertainty_base64}"
                 
@@ -1024,6 +1431,94 @@ class TintoraAIAPI:
                     detail=f"Ошибка при колоризации: {str(e)}"
                 )
         
+        @self.app.post("/colorize/binary")
+        async def colorize_binary(
+            file: UploadFile = File(..., description="Изображение для колоризации"),
+            style: StylePreset = Form(StylePreset.DEFAULT),
+            color_space: ColorSpace = Form(ColorSpace.LAB),
+            saturation: Optional[float] = Form(None, ge=0.0, le=2.0),
+            contrast: Optional[float] = Form(None, ge=0.0, le=2.0),
+            enhance: Optional[bool] = Form(None),
+            output: str = Form("colorized", description="colorized или uncertainty"),
+            image_format: ImageFormat = Form(ImageFormat(self.encoding_config.get('format', 'png'))),
+            quality: int = Form(self.encoding_config.get('quality', 90), ge=1, le=100),
+            compress_level: int = Form(self.encoding_config.get('png_compress_level', 6), ge=0, le=9)
+        ):
+            """
+            Колоризация одиночного изображения с бинарным вводом и выводом.
+            
+            Изображение принимается как multipart-файл, результат возвращается потоком
+            байтов выбранного формата без base64 и JSON.
+            
+            Returns:
+                StreamingResponse: Закодированное изображение
+            """
+            start_time = time.time()
+            request_id = str(uuid4())
+            
+            if output not in ("colorized", "uncertainty"):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Неизвестный тип результата: {output}"
+                )
+            
+            loop = asyncio.get_running_loop()
+            
+            # Декодируем изображение вне цикла событий
+            try:
+                data = await file.read()
+                image = await loop.run_in_executor(None, decode_image, data)
+            except Exception as e:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Не удалось декодировать изображение: {str(e)}"
+                )
+            
+            try:
+                result = await self._run_colorization(dict(
+                    image_data=image,
+                    color_space=color_space.value,
+                    style=style.value,
+                    saturation=saturation,
+                    contrast=contrast,
+                    enhance=enhance,
+                    show_uncertainty=(output == "uncertainty")
+                ))
+            except Exception as e:
+                logger.error(f"Ошибка при колоризации: {str(e)}")
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Ошибка при колоризации: {str(e)}"
+                )
+            
+            if output == "uncertainty" and 'uncertainty_map' not in result:
+                raise HTTPException(
+                    status_code=422,
+                    detail="Карта неопределенности недоступна для данной модели"
+                )
+            
+            # Кодируем результат вне цикла событий
+            pil_format, media_type = IMAGE_FORMAT_INFO[image_format]
+            payload = await loop.run_in_executor(
+                None,
+                lambda: encode_image(
+                    result['colorized'] if output == "colorized" else result['uncertainty_map'],
+                    format=pil_format,
+                    quality=quality,
+                    compress_level=compress_level
+                )
+            )
+            
+            return StreamingResponse(
+                _iter_chunks(payload),
+                media_type=media_type,
+                headers={
+                    "Content-Length": str(len(payload)),
+                    "X-Request-ID": request_id,
+                    "X-Processing-Time": f"{time.time() - start_time:.4f}"
+                }
+            )
+        
         @self.app.post("/batch/colorize")
         async def batch_colorize(request: BatchColorizationRequest):
             """
@@ -1113,6 +1608,34 @@ class TintoraAIAPI:
                 
             return results
         
+        @self.app.post("/batch/cancel/{batch_id}")
+        async def batch_cancel(batch_id: str):
+            """
+            Отмена пакетной обработки.
+            
+            Args:
+                batch_id (str): ID пакета
+                
+            Returns:
+                dict: Результат отмены
+            """
+            if not self.batch_processor.cancel_batch(batch_id):
+                if self.batch_processor.get_batch_progress(batch_id):
+                    raise HTTPException(
+                        status_code=409,
+                        detail=f"Пакет с ID {batch_id} уже завершен"
+                    )
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Пакет с ID {batch_id} не найден"
+                )
+            
+            return {
+                "status": "cancelled",
+                "batch_id": batch_id,
+                "message": "Пакет отменен; изображения, уже переданные модели, будут обработаны"
+            }
+        
         @self.app.get("/styles")
         async def get_styles():
             """
@@ -1202,10 +1725,10 @@ class TintoraAISDK:
             dict: Результаты колоризации
         """
         # Загружаем изображение
-        image = cv2.imread(image_path)
-        
-        if image is None:
-            raise ValueError(f"Не удалось загрузить изображение: {image_path}")
+        try:
+            image = load_image_file(image_path)
+        except Exception as e:
+            raise ValueError(f"Не удалось загрузить изображение: {image_path}") from e
         
         # Колоризируем изображение
         result = self.model.colorize_image(
@@ -1218,7 +1741,7 @@ class TintoraAISDK:
         
         # Сохраняем результат, если указан путь
         if output_path:
-            colorized_img = Image.fromarray((result['colorized'] * 255).astype(np.uint8))
+            colorized_img = Image.fromarray(_to_uint8(result['colorized']))
             colorized_img.save(output_path)
         
         return result
@@ -7,14 +7,18 @@ TintoraAI Core: Основные компоненты архитектуры к
 - FPN Pyramid: Feature Pyramid Network с Pyramid Pooling для мультимасштабного восприятия
 - Cross-Attention Bridge: Модуль взаимодействия между Swin-UNet и ViT
 - Feature Fusion: Интеллектуальное слияние признаков с весами внимания
+- Checkpointing: Политика checkpointing активаций по этапам колоризатора
 
 Модули спроектированы для максимальной гибкости и производительности,
 позволяя колоризатору эффективно обрабатывать изображения разных типов и стилей.
 """
 
+import math
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+import torch.utils.checkpoint as checkpoint
 
 # Импортируем все основные компоненты
 from .swin_unet import SwinUNet, create_colorizer_swin_unet
@@ -22,6 +26,10 @@ from .vit_semantic import ViTSemantic, create_vit_semantic
 from .fpn_pyramid import FPNPyramid, DynamicFPNPyramid, create_fpn_pyramid, create_dynamic_fpn_pyramid
 from .cross_attention_bridge import CrossAttentionBridge, create_cross_attention_bridge
 from .feature_fusion import MultiHeadFeatureFusion, MultiModalFeatureFusion, create_feature_fusion
+from .checkpointing import (
+    CHECKPOINT_POLICIES, apply_activation_checkpointing, estimate_activation_memory,
+    select_checkpoint_stages, set_checkpoint_stages
+)
 
 
 class ColorizerBackbone(nn.Module):
@@ -120,10 +128,26 @@ class ColorizerBackbone(nn.Module):
         # Финальная проекция для выходного изображения
         self.output_conv = nn.Conv2d(fusion_dim, out_channels, kernel_size=1)
         
+        # Кратность размера входа: общая для Swin-UNet и патчей ViT
+        self.size_stride = math.lcm(self.swin_unet.size_stride, 16)
+        
+        # Модули верхнего уровня, выполняемые с checkpointing (см. core.checkpointing)
+        self.checkpoint_stages = set()
+        
+    def _run_stage(self, name, *args, **kwargs):
+        """Выполняет модуль верхнего уровня, при необходимости без сохранения активаций."""
+        module = getattr(self, name)
+        if name in self.checkpoint_stages and torch.is_grad_enabled():
+            return checkpoint.checkpoint(module, *args, use_reentrant=False, **kwargs)
+        return module(*args, **kwargs)
+        
     def forward(self, x):
         """
         Прямое распространение через backbone колоризатора.
         
+        Вход произвольного размера дополняется (replicate) до размера, кратного size_stride,
+        выход обрезается до исходного размера.
+        
         Args:
             x (torch.Tensor): Входное ЧБ изображение [B, 1, H, W]
             
@@ -136,6 +160,11 @@ class ColorizerBackbone(nn.Module):
                 'fused_features': torch.Tensor  # Слитые признаки
             }
         """
+        input_height, input_width = x.shape[-2:]
+        pad_b = (self.size_stride - input_height % self.size_stride) % self.size_stride
+        pad_r = (self.size_stride - input_width % self.size_stride) % self.size_stride
+        if pad_b > 0 or pad_r > 0:
+            x = F.pad(x, (0, pad_r, 0, pad_b), mode='replicate')
         batch_size, _, height, width = x.shape
         
         # Проход через Swin-UNet с извлечением промежуточных признаков и финального выхода
@@ -149,7 +178,7 @@ class ColorizerBackbone(nn.Module):
         vit_features = vit_output['enriched_features']  # [B, N_vit, C_vit]
         
         # Проход через FPN с промежуточными признаками из Swin-UNet
-        fpn_output = self.fpn_pyramid(swin_features_2d)
+        fpn_output = self._run_stage('fpn_pyramid', swin_features_2d)
         
         # Cross-Attention Bridge между Swin-UNet и ViT
         # Подготовим списки последовательностей для моста: [B, H_i*W_i, C_i]
@@ -161,7 +190,8 @@ class ColorizerBackbone(nn.Module):
             swin_features_seq.append(feat.permute(0, 2, 3, 1).contiguous().view(B, H_i * W_i, C))
 
         vit_patch_res = (height // 16, width // 16)
-        enhanced_swin_seq, enhanced_vit_seq = self.cross_bridge(
+        enhanced_swin_seq, enhanced_vit_seq = self._run_stage(
+            'cross_bridge',
             swin_features_list=swin_features_seq,
             vit_features=vit_features,
             swin_resolution=(swin_base_h, swin_base_w),
@@ -178,7 +208,7 @@ class ColorizerBackbone(nn.Module):
             "fpn": fpn_output['output'],
             "vit": enhanced_vit_seq
         }
-        fusion_output = self.feature_fusion(fusion_input)
+        fusion_output = self._run_stage('feature_fusion', fusion_input)
         # Используем пространственные слитые признаки как вход к финальной проекции
         spatial_features = fusion_output["spatial_features"]
         
@@ -187,6 +217,7 @@ class ColorizerBackbone(nn.Module):
         
         # Апсемплинг до исходного разрешения
         output = F.interpolate(output, size=(height, width), mode='bilinear', align_corners=True)
+        output = output[:, :, :input_height, :input_width]
         
         return {
             'output': output,
@@ -202,6 +233,9 @@ def create_colorizer(config=None):
     """
     Создает полную модель колоризатора на основе конфигурации.
     
+    Раздел activation_checkpointing (policy, stages, memory_budget_mb, batch_size)
+    задает политику checkpointing активаций (см. core.checkpointing).
+    
     Args:
         config (dict, optional): Словарь с параметрами конфигурации
         
@@ -234,9 +268,42 @@ def create_colorizer(config=None):
     # Создаем модель с указанными параметрами
     model = ColorizerBackbone(**default_config)
     
+    # Политика checkpointing активаций
+    checkpointing_config = (config or {}).get('activation_checkpointing') or {}
+    apply_activation_checkpointing(
+        model,
+        policy=checkpointing_config.get('policy', 'none'),
+        stages=checkpointing_config.get('stages'),
+        memory_budget_mb=checkpointing_config.get('memory_budget_mb'),
+        img_size=checkpointing_config.get('img_size', default_config['img_size']),
+        batch_size=checkpointing_config.get('batch_size', 1)
+    )
+    
     return model
 
 
+def set_fused_attention(model, enabled=True):
+    """
+    Переключает блоки внимания модели между F.scaled_dot_product_attention и эталонным путем.
+    
+    Эталонный путь с явной матрицей весов используется для численного сравнения.
+    
+    Args:
+        model (nn.Module): Модель колоризатора или ее часть
+        enabled (bool): Использовать ли scaled_dot_product_attention
+        
+    Returns:
+        int: Количество переключенных блоков внимания
+    """
+    enabled = enabled and hasattr(F, 'scaled_dot_product_attention')
+    count = 0
+    for module in model.modules():
+        if hasattr(module, 'fused_attention'):
+            module.fused_attention = enabled
+            count += 1
+    return count
+
+
 # Экспортируем все основные компоненты
 __all__ = [
     'SwinUNet',
@@ -252,6 +319,12 @@ __all__ = [
     'MultiHeadFeatureFusion',
     'MultiModalFeatureFusion',
     'create_feature_fusion',
+    'CHECKPOINT_POLICIES',
+    'apply_activation_checkpointing',
+    'estimate_activation_memory',
+    'select_checkpoint_stages',
+    'set_checkpoint_stages',
     'ColorizerBackbone',
-    'create_colorizer'
+    'create_colorizer',
+    'set_fused_attention'
 ]
@@ -0,0 +1,286 @@
+"""
+Checkpointing: Политика checkpointing активаций для ColorizerBackbone.
+
+Данный модуль разбивает колоризатор на этапы (уровни Swin-UNet, блоки ViT,
+Cross-Attention Bridge, FPN, Feature Fusion) и включает для выбранных этапов
+checkpointing: активации внутри этапа не сохраняются при прямом проходе и
+вычисляются повторно при обратном.
+
+Политики:
+- none: активации сохраняются полностью
+- transformer: checkpointing блоков Swin Transformer и ViT
+- all: checkpointing всех этапов
+- budget: этапы выбираются автоматически по бюджету памяти активаций
+
+Оценка памяти выполняется прямым проходом на устройстве 'meta': формы
+сохраняемых для обратного прохода тензоров известны без вычислений и выделения памяти.
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import torch
+import torch.nn as nn
+from torch.func import functional_call
+
+
+# Допустимые политики checkpointing
+CHECKPOINT_POLICIES = ('none', 'transformer', 'all', 'budget')
+
+# Этапы верхнего уровня ColorizerBackbone (выполняются через _run_stage)
+BACKBONE_STAGES = ('cross_bridge', 'fpn_pyramid', 'feature_fusion')
+
+
+def checkpoint_stage_units(model: nn.Module) -> Dict[str, List[nn.Module]]:
+    """
+    Возвращает этапы модели и модули, вычисляемые повторно при checkpointing этапа.
+
+    Для уровней Swin-UNet и ViT повторно вычисляется каждый Transformer блок отдельно,
+    для этапов верхнего уровня - модуль целиком.
+
+    Args:
+        model (nn.Module): Модель ColorizerBackbone
+
+    Returns:
+        Dict[str, List[nn.Module]]: Имя этапа -> модули, вычисляемые повторно
+    """
+    stages = OrderedDict()
+    for i, layer in enumerate(model.swin_unet.layers_down):
+        stages[f'swin_unet.layers_down.{i}'] = list(layer.blocks)
+    for i, layer in enumerate(model.swin_unet.layers_up):
+        stages[f'swin_unet.layers_up.{i}'] = list(layer.blocks)
+    stages['vit_semantic'] = list(model.vit_semantic.blocks)
+    for name in BACKBONE_STAGES:
+        stages[name] = [getattr(model, name)]
+    return stages
+
+
+def set_checkpoint_stages(model: nn.Module, stages: Sequence[str]) -> List[str]:
+    """
+    Включает checkpointing для указанных этапов и отключает для остальных.
+
+    Args:
+        model (nn.Module): Модель ColorizerBackbone
+        stages (Sequence[str]): Имена этапов (см. checkpoint_stage_units)
+
+    Returns:
+        List[str]: Этапы с включенным checkpointing в порядке следования
+    """
+    known = list(checkpoint_stage_units(model).keys())
+    unknown = [name for name in stages if name not in known]
+    if unknown:
+        raise ValueError(f"Неизвестные этапы checkpointing: {unknown}. Доступные: {known}")
+
+    stages = set(stages)
+    for i, layer in enumerate(model.swin_unet.layers_down):
+        layer.use_checkpoint = f'swin_unet.layers_down.{i}' in stages
+    for i, layer in enumerate(model.swin_unet.layers_up):
+        layer.use_checkpoint = f'swin_unet.layers_up.{i}' in stages
+    model.vit_semantic.use_checkpoint = 'vit_semantic' in stages
+    model.checkpoint_stages = {name for name in BACKBONE_STAGES if name in stages}
+
+    return [name for name in known if name in stages]
+
+
+def _tensor_bytes(value) -> int:
+    """Суммарный размер тензоров во вложенных списках, кортежах и словарях."""
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, dict):
+        return sum(_tensor_bytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_tensor_bytes(item) for item in value)
+    return 0
+
+
+def estimate_activation_memory(model: nn.Module, img_size: int, batch_size: int = 1) -> Dict:
+    """
+    Оценивает память активаций, сохраняемых для обратного прохода, по этапам модели.
+
+    Прямой проход выполняется на устройстве 'meta' с весами-заглушками, поэтому
+    оценка не требует памяти под активации и не зависит от устройства модели.
+    Оценка сверху: тензор, сохраненный несколькими операциями, учитывается каждый раз,
+    а scaled_dot_product_attention на 'meta' сохраняет матрицу весов внимания, как
+    эталонный путь (ядра flash/memory-efficient на GPU ее не сохраняют).
+
+    Args:
+        model (nn.Module): Модель ColorizerBackbone
+        img_size (int): Размер входа при обучении
+        batch_size (int): Размер пакета при обучении
+
+    Returns:
+        Dict: {
+            'total': int,  # Все сохраняемые активации, байт
+            'stages': {name: {'saved': int, 'inputs': int, 'peak_unit': int}}
+        }
+        где saved - активации этапа, inputs - входы модулей этапа (сохраняются
+        и при checkpointing), peak_unit - наибольшие активации одного модуля этапа
+        (выделяются повторно при обратном проходе)
+    """
+    stage_units = checkpoint_stage_units(model)
+    stats = {name: {'saved': 0, 'inputs': 0, 'peak_unit': 0} for name in stage_units}
+    total = [0]
+    active = []
+
+    state = {
+        name: torch.empty_like(tensor, device='meta').requires_grad_(tensor.requires_grad)
+        for name, tensor in list(model.named_parameters()) + list(model.named_buffers())
+    }
+    weight_ids = {id(tensor) for tensor in state.values()}
+
+    def pack(tensor):
+        # Веса сохраняются для обратного прохода, но не являются активациями
+        if id(tensor) in weight_ids or (tensor._base is not None and id(tensor._base) in weight_ids):
+            return tensor
+        size = tensor.numel() * tensor.element_size()
+        total[0] += size
+        if active:
+            active[-1][1][0] += size
+        return tensor
+
+    def make_hooks(name):
+        def pre_hook(module, args, kwargs):
+            stats[name]['inputs'] += _tensor_bytes(args) + _tensor_bytes(kwargs)
+            active.append((name, [0]))
+
+        def post_hook(module, args, kwargs, output):
+            _, unit_bytes = active.pop()
+            stats[name]['saved'] += unit_bytes[0]
+            stats[name]['peak_unit'] = max(stats[name]['peak_unit'], unit_bytes[0])
+
+        return pre_hook, post_hook
+
+    handles = []
+    for name, units in stage_units.items():
+        pre_hook, post_hook = make_hooks(name)
+        for unit in units:
+            handles.append(unit.register_forward_pre_hook(pre_hook, with_kwargs=True))
+            handles.append(unit.register_forward_hook(post_hook, with_kwargs=True))
+
+    # Checkpointing и кэши масок не должны влиять на оценку
+    enabled_stages = [name for name in stage_units if _stage_enabled(model, name)]
+    set_checkpoint_stages(model, [])
+    was_training = model.training
+    model.train()
+
+    try:
+        x = torch.empty(batch_size, model.swin_unet.in_chans, img_size, img_size, device='meta')
+        with torch.enable_grad(), torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+            functional_call(model, state, (x,))
+    finally:
+        for handle in handles:
+            handle.remove()
+        model.train(was_training)
+        set_checkpoint_stages(model, enabled_stages)
+        _drop_meta_masks(model)
+
+    return {'total': total[0], 'stages': stats}
+
+
+def _stage_enabled(model: nn.Module, name: str) -> bool:
+    """Проверяет, включен ли checkpointing этапа."""
+    if name in BACKBONE_STAGES:
+        return name in model.checkpoint_stages
+    return model.get_submodule(name).use_checkpoint
+
+
+def _drop_meta_masks(model: nn.Module):
+    """Удаляет маски внимания, построенные на устройстве 'meta' при оценке памяти."""
+    for module in model.modules():
+        cache = getattr(module, '_mask_cache', None)
+        if cache:
+            for key in [key for key in cache if key[-1].type == 'meta']:
+                del cache[key]
+
+
+def select_checkpoint_stages(estimate: Dict, memory_budget_mb: float) -> List[str]:
+    """
+    Выбирает этапы для checkpointing, чтобы активации уложились в бюджет памяти.
+
+    На каждом шаге добавляется этап, после которого оценка памяти активаций
+    (с учетом повторного вычисления одного модуля при обратном проходе) минимальна,
+    пока оценка превышает бюджет и добавление этапа ее уменьшает.
+
+    Args:
+        estimate (Dict): Результат estimate_activation_memory
+        memory_budget_mb (float): Бюджет памяти активаций в МБ
+
+    Returns:
+        List[str]: Выбранные этапы
+    """
+    budget = memory_budget_mb * 2 ** 20
+    stages = estimate['stages']
+
+    def memory_with(name, memory, peak):
+        saving = stages[name]['saved'] - stages[name]['inputs']
+        return memory - saving, max(peak, stages[name]['peak_unit'])
+
+    memory = estimate['total']
+    peak = 0
+    selected = []
+    while memory + peak > budget:
+        candidates = [name for name in stages if name not in selected]
+        if not candidates:
+            break
+        best = min(candidates, key=lambda name: sum(memory_with(name, memory, peak)))
+        best_memory, best_peak = memory_with(best, memory, peak)
+        if best_memory + best_peak >= memory + peak:
+            break
+        selected.append(best)
+        memory, peak = best_memory, best_peak
+
+    if memory + peak > budget:
+        logging.warning(
+            f"Активации не укладываются в бюджет {memory_budget_mb} МБ даже с checkpointing: "
+            f"оценка {(memory + peak) / 2 ** 20:.0f} МБ"
+        )
+
+    order = list(stages.keys())
+    return sorted(selected, key=order.index)
+
+
+def apply_activation_checkpointing(
+    model: nn.Module,
+    policy: str = 'none',
+    stages: Optional[Sequence[str]] = None,
+    memory_budget_mb: Optional[float] = None,
+    img_size: Optional[int] = None,
+    batch_size: int = 1
+) -> List[str]:
+    """
+    Применяет политику checkpointing активаций к модели.
+
+    Args:
+        model (nn.Module): Модель ColorizerBackbone
+        policy (str): Политика (none, transformer, all, budget)
+        stages (Sequence[str], optional): Явный список этапов (имеет приоритет над policy)
+        memory_budget_mb (float, optional): Бюджет памяти активаций в МБ для политики budget
+        img_size (int, optional): Размер входа при обучении для политики budget
+            (по умолчанию размер, заданный при создании модели)
+        batch_size (int): Размер пакета при обучении для политики budget
+
+    Returns:
+        List[str]: Этапы с включенным checkpointing
+    """
+    all_stages = list(checkpoint_stage_units(model).keys())
+    policy = str(policy or 'none').lower()
+
+    if stages is not None:
+        selected = list(stages)
+    elif policy == 'none':
+        selected = []
+    elif policy == 'transformer':
+        selected = [name for name in all_stages if name.startswith('swin_unet.') or name == 'vit_semantic']
+    elif policy == 'all':
+        selected = all_stages
+    elif policy == 'budget':
+        if memory_budget_mb is None:
+            raise ValueError("Для политики budget требуется memory_budget_mb")
+        img_size = img_size or model.swin_unet.img_size
+        estimate = estimate_activation_memory(model, img_size, batch_size)
+        selected = select_checkpoint_stages(estimate, memory_budget_mb)
+    else:
+        raise ValueError(f"Неизвестная политика checkpointing: {policy}. Доступные: {list(CHECKPOINT_POLICIES)}")
+
+    return set_checkpoint_stages(model, selected)
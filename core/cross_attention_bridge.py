@@ -103,13 +103,16 @@ class CrossAttentionLayer(nn.Module):
         qk_scale (float): Масштабирование для QK произведения (если None, используется по умолчанию)
         attn_drop (float): Dropout для весов внимания
         proj_drop (float): Dropout для выходных проекций
+        fused_attention (bool): Использовать F.scaled_dot_product_attention вместо явного softmax
     """
-    def __init__(self, dim, num_heads=8, qkv_bias=False, qk_scale=None, attn_drop=0., proj_drop=0.):
+    def __init__(self, dim, num_heads=8, qkv_bias=False, qk_scale=None, attn_drop=0., proj_drop=0.,
+                 fused_attention=True):
         super().__init__()
         self.dim = dim
         self.num_heads = num_heads
         head_dim = dim // num_heads
         self.scale = qk_scale or head_dim ** -0.5
+        self.fused_attention = fused_attention and hasattr(F, 'scaled_dot_product_attention')
         
         # Проекции для Q, K, V
         self.q_proj = nn.Linear(dim, dim, bias=qkv_bias)
@@ -144,13 +147,20 @@ class CrossAttentionLayer(nn.Module):
         k = self.k_proj(key_features).reshape(B, N_k, self.num_heads, C // self.num_heads).permute(0, 2, 1, 3)    # B, h, N_k, d
         v = self.v_proj(value_features).reshape(B, N_k, self.num_heads, C // self.num_heads).permute(0, 2, 1, 3)  # B, h, N_k, d
         
-        # Вычисление attention scores
-        attn = (q @ k.transpose(-2, -1)) * self.scale  # B, h, N_q, N_k
-        attn = attn.softmax(dim=-1)
-        attn = self.attn_drop(attn)
-        
-        # Взвешенная сумма значений
-        x = (attn @ v).transpose(1, 2).reshape(B, N_q, C)  # B, N_q, C
+        if self.fused_attention:
+            # Матрица весов [B, h, N_q, N_k] не материализуется
+            x = F.scaled_dot_product_attention(
+                q, k, v, dropout_p=self.attn_drop.p if self.training else 0.0, scale=self.scale
+            )
+        else:
+            # Эталонный путь с явной матрицей весов (для численного сравнения)
+            attn = (q @ k.transpose(-2, -1)) * self.scale  # B, h, N_q, N_k
+            attn = attn.softmax(dim=-1)
+            attn = self.attn_drop(attn)
+            x = attn @ v
+        
+        # Объединение голов
+        x = x.transpose(1, 2).reshape(B, N_q, C)  # B, N_q, C
         x = self.proj(x)
         x = self.proj_drop(x)
         
@@ -193,12 +203,14 @@ class MultiLevelFeatureFusion(nn.Module):
             nn.GELU()
         )
         
-    def forward(self, features_list):
+    def forward(self, features_list, base_resolution_hw=None):
         """
         Слияние признаков с разных уровней.
         
         Args:
             features_list (list): Список тензоров признаков [B, N_i, C_i]
+            base_resolution_hw (tuple, optional): Разрешение (H, W) первого уровня; нужно для
+                неквадратных карт, разрешение остальных уровней получается делением на 2^k
             
         Returns:
             tensor: Слитые признаки [B, N_0, fusion_dim]
@@ -227,7 +239,15 @@ class MultiLevelFeatureFusion(nn.Module):
             if N != base_resolution:
                 # Предполагаем, что N = H*W и можно определить H, W
                 side_len = int(math.sqrt(N))
-                if side_len * side_len == N:  # Проверка на квадратное разрешение
+                if base_resolution_hw is not None:
+                    # Каждый следующий уровень Swin уменьшает обе стороны в 2 раза
+                    scale = int(round(math.sqrt(base_resolution / N)))
+                    base_h, base_w = base_resolution_hw
+                    proj_features = rearrange(proj_features, 'b (h w) c -> b c h w', h=base_h // scale, w=base_w // scale)
+                    proj_features = F.interpolate(proj_features, size=(base_h, base_w),
+                                                mode='bilinear', align_corners=False)
+                    proj_features = rearrange(proj_features, 'b c h w -> b (h w) c')
+                elif side_len * side_len == N:  # Проверка на квадратное разрешение
                     proj_features = rearrange(proj_features, 'b (h w) c -> b c h w', h=side_len, w=side_len)
                     base_side_len = int(math.sqrt(base_resolution))
                     proj_features = F.interpolate(proj_features, size=(base_side_len, base_side_len), 
@@ -285,7 +305,8 @@ class CrossAttentionBridge(nn.Module):
         
         # Модуль выравнивания признаков для основного уровня
         self.feature_alignment = FeatureAlignment(
-            swin_dim=swin_dims[0],  # Используем размерность самого высокого уровня Swin
+            # После слияния уровней признаки Swin уже имеют размерность fusion_dim
+            swin_dim=fusion_dim if use_multi_level and len(swin_dims) > 1 else swin_dims[0],
             vit_dim=vit_dim,
             fusion_dim=fusion_dim,
             use_conv=True
@@ -380,7 +401,7 @@ class CrossAttentionBridge(nn.Module):
         # Подготовка признаков Swin (слияние нескольких уровней или использование верхнего уровня)
         if self.use_multi_level and len(swin_features_list) > 1:
             # Слияние признаков с разных уровней
-            fused_swin_features = self.multi_level_fusion(swin_features_list)
+            fused_swin_features = self.multi_level_fusion(swin_features_list, swin_resolution)
         else:
             # Используем только верхний уровень
             fused_swin_features = swin_features_list[0]
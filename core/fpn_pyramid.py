@@ -19,6 +19,40 @@ import torch.nn.functional as F
 import math
 
 
+def adaptive_avg_pool2d(x, output_size):
+    """
+    Адаптивный average pooling, экспортируемый в ONNX при любом размере входа.
+    
+    Совпадает с F.adaptive_avg_pool2d: размер 1 вычисляется средним, кратные размеры -
+    avg_pool2d с вычисленными ядром и шагом, остальные - умножением на матрицы
+    усреднения по высоте и ширине (границы окон как в adaptive_avg_pool2d).
+    
+    Args:
+        x (torch.Tensor): Входной тензор [B, C, H, W]
+        output_size (int): Размер выхода по каждой пространственной оси
+        
+    Returns:
+        torch.Tensor: Тензор [B, C, output_size, output_size]
+    """
+    # Размеры окон - константы графа (при экспорте размер входа фиксирован)
+    height, width = (int(size) for size in x.shape[-2:])
+    if output_size == 1:
+        return x.mean(dim=(2, 3), keepdim=True)
+    if height % output_size == 0 and width % output_size == 0:
+        kernel = (height // output_size, width // output_size)
+        return F.avg_pool2d(x, kernel_size=kernel, stride=kernel)
+    
+    def pooling_matrix(size):
+        matrix = torch.zeros(output_size, size, dtype=x.dtype, device=x.device)
+        for i in range(output_size):
+            start = (i * size) // output_size
+            end = -((-(i + 1) * size) // output_size)
+            matrix[i, start:end] = 1.0 / (end - start)
+        return matrix
+    
+    return pooling_matrix(height) @ x @ pooling_matrix(width).t()
+
+
 class ConvBNReLU(nn.Module):
     """
     Блок Conv-BatchNorm-ReLU для FPN.
@@ -179,7 +213,7 @@ class PyramidPoolingModule(nn.Module):
         # Применяем пулинг разных масштабов
         for path in self.paths:
             # Ветвь обработки
-            feat = path[0](x)  # AdaptiveAvgPool2d
+            feat = adaptive_avg_pool2d(x, path[0].output_size)  # AdaptiveAvgPool2d (экспортируемый в ONNX)
             feat = path[1](feat)  # ConvBNReLU
             # Билинейная интерполяция до исходного размера
             feat = F.interpolate(feat, size=size[2:], mode='bilinear', align_corners=True)
@@ -17,6 +17,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 import torch.utils.checkpoint as checkpoint
 import numpy as np
+from collections import OrderedDict
 from einops import rearrange
 from timm.layers import trunc_normal_
 from timm.layers.drop import DropPath
@@ -84,6 +85,90 @@ def window_reverse(windows, window_size, H, W):
     return x
 
 
+def compute_attention_mask(H, W, window_size, shift_size, device=None):
+    """
+    Строит маску внимания для карты признаков H x W, дополненной до кратного окну размера.
+    
+    Маска запрещает внимание между областями, соединенными циклическим сдвигом (SW-MSA),
+    и внимание к токенам дополнения.
+    
+    Args:
+        H (int): Высота карты признаков в токенах
+        W (int): Ширина карты признаков в токенах
+        window_size (int): Размер окна
+        shift_size (int): Размер сдвига окна
+        device (torch.device, optional): Устройство маски
+        
+    Returns:
+        tensor: Маска формы [nW, window_size*window_size, window_size*window_size] или None,
+            если маска не нужна (нет сдвига и дополнения)
+    """
+    Hp = int(np.ceil(H / window_size)) * window_size
+    Wp = int(np.ceil(W / window_size)) * window_size
+    
+    if shift_size == 0 and Hp == H and Wp == W:
+        return None
+        
+    img_mask = torch.zeros((1, Hp, Wp, 1), device=device)
+    if shift_size > 0:
+        h_slices = (slice(0, -window_size),
+                    slice(-window_size, -shift_size),
+                    slice(-shift_size, None))
+        w_slices = (slice(0, -window_size),
+                    slice(-window_size, -shift_size),
+                    slice(-shift_size, None))
+        cnt = 0
+        for h in h_slices:
+            for w in w_slices:
+                img_mask[:, h, w, :] = cnt
+                cnt += 1
+                
+    # Токены дополнения образуют отдельные области (в координатах после сдвига)
+    if Hp != H or Wp != W:
+        padding = torch.zeros((1, Hp, Wp, 1), device=device)
+        padding[:, H:, :, :] = 1
+        padding[:, :, W:, :] = 1
+        if shift_size > 0:
+            padding = torch.roll(padding, shifts=(-shift_size, -shift_size), dims=(1, 2))
+        img_mask = img_mask + padding * 100
+        
+    mask_windows = window_partition(img_mask, window_size)
+    mask_windows = mask_windows.view(-1, window_size * window_size)
+    attn_mask = mask_windows.unsqueeze(1) - mask_windows.unsqueeze(2)
+    attn_mask = attn_mask.masked_fill(attn_mask != 0, float(-100.0)).masked_fill(attn_mask == 0, float(0.0))
+    return attn_mask
+
+
+def _is_compiling():
+    """Проверяет, выполняется ли код внутри torch.compile."""
+    compiler = getattr(torch, 'compiler', None)
+    return compiler is not None and hasattr(compiler, 'is_compiling') and compiler.is_compiling()
+
+
+# Количество разрешений, для которых хранятся маски внимания Swin и позиционные кодирования ViT (вытеснение по LRU)
+MASK_CACHE_SIZE = 8
+
+
+def _lru_lookup(cache, key, build, max_size=MASK_CACHE_SIZE):
+    """
+    Возвращает значение из LRU-кэша, вычисляя его при отсутствии.
+    
+    Args:
+        cache (OrderedDict): Кэш (порядок - от давно использованных к недавним)
+        key: Ключ
+        build (callable): Функция вычисления значения
+        max_size (int): Максимальное количество значений в кэше
+    """
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    value = build()
+    cache[key] = value
+    if len(cache) > max_size:
+        cache.popitem(last=False)
+    return value
+
+
 class WindowAttention(nn.Module):
     """
     Многоголовое внимание на основе окон с относительным позиционным кодированием.
@@ -96,14 +181,22 @@ class WindowAttention(nn.Module):
         qk_scale (float): Масштабирование для QK произведения
         attn_drop (float): Вероятность dropout для внимания
         proj_drop (float): Вероятность dropout для проекции
+        fused_attention (bool): Использовать F.scaled_dot_product_attention вместо явного softmax
     """
-    def __init__(self, dim, window_size, num_heads, qkv_bias=True, qk_scale=None, attn_drop=0., proj_drop=0.):
+    def __init__(self, dim, window_size, num_heads, qkv_bias=True, qk_scale=None, attn_drop=0., proj_drop=0.,
+                 fused_attention=True):
         super().__init__()
         self.dim = dim
         self.window_size = window_size  # Wh, Ww
         self.num_heads = num_heads
         head_dim = dim // num_heads
         self.scale = qk_scale or head_dim ** -0.5
+        self.fused_attention = fused_attention and hasattr(F, 'scaled_dot_product_attention')
+        
+        # Объединенные смещения (позиционное смещение + маска сдвига) для инференса:
+        # (разрешение, тип, устройство) -> смещение [nW, nH, N, N]
+        self._bias_cache = OrderedDict()
+        self._bias_version = None
 
         # Параметры для относительного позиционного кодирования
         self.relative_position_bias_table = nn.Parameter(
@@ -133,13 +226,73 @@ class WindowAttention(nn.Module):
         trunc_normal_(self.relative_position_bias_table, std=.02)
         self.softmax = nn.Softmax(dim=-1)
 
-    def forward(self, x, mask=None):
+    def relative_position_bias(self):
+        """Возвращает относительное позиционное смещение формы [nH, Wh*Ww, Wh*Ww]."""
+        relative_position_bias = self.relative_position_bias_table[self.relative_position_index.view(-1)].view(
+            self.window_size[0] * self.window_size[1], self.window_size[0] * self.window_size[1], -1)  
+        return relative_position_bias.permute(2, 0, 1).contiguous()  # nH, Wh*Ww, Wh*Ww
+        
+    def attention_bias(self, mask=None, dtype=None, batch_size=1, mask_key=None):
+        """
+        Объединяет позиционное смещение и маску сдвига в одну аддитивную маску внимания.
+        
+        Маска сдвига повторяется для каждого изображения пакета: ядра
+        scaled_dot_product_attention работают быстрее с маской полной формы [B*nW, ...],
+        чем с маской, транслируемой по дополнительному измерению.
+        
+        Без вычисления градиентов смещение формы [nW, nH, N, N] кэшируется для каждого
+        разрешения mask_key (LRU на MASK_CACHE_SIZE разрешений) и повторяется по пакету
+        при каждом вызове. Кэш сбрасывается после изменения таблицы смещений
+        (шаг оптимизатора, загрузка весов).
+        
+        Args:
+            mask (tensor): Маска сдвига формы [nW, N, N] или None
+            dtype (torch.dtype, optional): Тип данных маски (по умолчанию тип таблицы смещений)
+            batch_size (int): Количество изображений в пакете
+            mask_key (tuple, optional): Разрешение (H, W), которому соответствует маска сдвига
+                (без него маска со сдвигом не кэшируется)
+            
+        Returns:
+            tensor: Маска формы [B*nW, nH, N, N] или [1, nH, N, N] без маски сдвига
+        """
+        dtype = dtype or self.relative_position_bias_table.dtype
+        
+        # При обучении маска нужна в графе вычислений, при torch.compile вычисляется в графе
+        if torch.is_grad_enabled() or _is_compiling() or (mask is not None and mask_key is None):
+            return self._expand_bias(self._build_attention_bias(mask, dtype), batch_size)
+            
+        # Таблица смещений изменилась - прежние маски недействительны
+        version = self.relative_position_bias_table._version
+        if self._bias_version != version:
+            self._bias_cache.clear()
+            self._bias_version = version
+            
+        key = (None if mask is None else tuple(mask_key), dtype, self.relative_position_bias_table.device)
+        bias = _lru_lookup(self._bias_cache, key, lambda: self._build_attention_bias(mask, dtype))
+        return self._expand_bias(bias, batch_size)
+        
+    def _build_attention_bias(self, mask, dtype):
+        """Вычисляет объединенную аддитивную маску внимания формы [nW, nH, N, N] или [1, nH, N, N]."""
+        bias = self.relative_position_bias().unsqueeze(0)  # 1, nH, N, N
+        if mask is not None:
+            bias = bias + mask.unsqueeze(1).to(bias.dtype)  # nW, nH, N, N
+        return bias.to(dtype)
+        
+    @staticmethod
+    def _expand_bias(bias, batch_size):
+        """Повторяет маску окон для каждого изображения пакета: [B*nW, nH, N, N]."""
+        if bias.shape[0] == 1:
+            return bias
+        return bias.unsqueeze(0).expand(batch_size, -1, -1, -1, -1).reshape(-1, *bias.shape[1:])
+        
+    def forward(self, x, mask=None, mask_key=None):
         """
         Прямое распространение через блок внимания.
         
         Args:
             x (tensor): Входной тензор формы [num_windows*B, N, C]
             mask (tensor): Маска внимания формы [nW, Mh*Mw, Mh*Mw] или None
+            mask_key (tuple, optional): Разрешение (H, W) маски для кэширования смещений
         """
         B_, N, C = x.shape
         
@@ -147,15 +300,44 @@ class WindowAttention(nn.Module):
         qkv = self.qkv(x).reshape(B_, N, 3, self.num_heads, C // self.num_heads).permute(2, 0, 3, 1, 4)
         q, k, v = qkv[0], qkv[1], qkv[2]  # B_, nH, N, C/nH
         
+        if self.fused_attention:
+            # Окна одного изображения идут подряд, маска повторяется для каждого изображения
+            nW = mask.shape[0] if mask is not None else 1
+            bias = self.attention_bias(mask, dtype=q.dtype, batch_size=B_ // nW, mask_key=mask_key)
+            x = F.scaled_dot_product_attention(
+                q, k, v,
+                attn_mask=bias,
+                dropout_p=self.attn_drop.p if self.training else 0.0,
+                scale=self.scale
+            )
+            x = x.transpose(1, 2).reshape(B_, N, C)
+        else:
+            x = self._reference_attention(q, k, v, mask)
+            
+        x = self.proj(x)
+        x = self.proj_drop(x)
+        return x
+        
+    def _reference_attention(self, q, k, v, mask=None):
+        """
+        Эталонное внимание с явной матрицей весов (для численного сравнения).
+        
+        Args:
+            q, k, v (tensor): Запросы, ключи и значения формы [num_windows*B, nH, N, C/nH]
+            mask (tensor): Маска внимания формы [nW, N, N] или None
+            
+        Returns:
+            tensor: Результат внимания формы [num_windows*B, N, C]
+        """
+        B_, _, N, _ = q.shape
+        C = q.shape[1] * q.shape[3]
+        
         # Масштабирование dot-product внимания
         q = q * self.scale
         attn = (q @ k.transpose(-2, -1))  # B_, nH, N, N
         
         # Добавление относительного позиционного смещения
-        relative_position_bias = self.relative_position_bias_table[self.relative_position_index.view(-1)].view(
-            self.window_size[0] * self.window_size[1], self.window_size[0] * self.window_size[1], -1)  
-        relative_position_bias = relative_position_bias.permute(2, 0, 1).contiguous()  # nH, Wh*Ww, Wh*Ww
-        attn = attn + relative_position_bias.unsqueeze(0)
+        attn = attn + self.relative_position_bias().unsqueeze(0)
         
         # Применение маски внимания, если она предоставлена
         if mask is not None:
@@ -169,10 +351,7 @@ class WindowAttention(nn.Module):
         attn = self.attn_drop(attn)
         
         # Взвешенная сумма
-        x = (attn @ v).transpose(1, 2).reshape(B_, N, C)
-        x = self.proj(x)
-        x = self.proj_drop(x)
-        return x
+        return (attn @ v).transpose(1, 2).reshape(B_, N, C)
 
 
 class SwinTransformerBlock(nn.Module):
@@ -224,34 +403,50 @@ class SwinTransformerBlock(nn.Module):
         mlp_hidden_dim = int(dim * mlp_ratio)
         self.mlp = MLP(dim=dim, mlp_ratio=mlp_ratio, dropout=drop)
         
-        # Создание маски внимания для SW-MSA
-        if self.shift_size > 0:
-            H, W = self.input_resolution
-            img_mask = torch.zeros((1, H, W, 1))
-            h_slices = (slice(0, -self.window_size),
-                        slice(-self.window_size, -self.shift_size),
-                        slice(-self.shift_size, None))
-            w_slices = (slice(0, -self.window_size),
-                        slice(-self.window_size, -self.shift_size),
-                        slice(-self.shift_size, None))
-            cnt = 0
-            for h in h_slices:
-                for w in w_slices:
-                    img_mask[:, h, w, :] = cnt
-                    cnt += 1
-                    
-            mask_windows = window_partition(img_mask, self.window_size)
-            mask_windows = mask_windows.view(-1, self.window_size * self.window_size)
-            attn_mask = mask_windows.unsqueeze(1) - mask_windows.unsqueeze(2)
-            attn_mask = attn_mask.masked_fill(attn_mask != 0, float(-100.0)).masked_fill(attn_mask == 0, float(0.0))
-        else:
-            attn_mask = None
+        # Маска внимания для SW-MSA при разрешении input_resolution
+        attn_mask = compute_attention_mask(
+            self.input_resolution[0], self.input_resolution[1], self.window_size, self.shift_size
+        ) if self.shift_size > 0 else None
             
         self.register_buffer("attn_mask", attn_mask)
         
-    def forward(self, x):
-        """Прямое распространение через Swin Transformer блок."""
-        H, W = self.input_resolution
+        # Маски для других разрешений: (H, W, устройство) -> маска или None (LRU)
+        self._mask_cache = OrderedDict()
+        
+    def shift_for(self, H, W):
+        """Размер сдвига для разрешения H x W (без сдвига, если карта не больше окна)."""
+        return self.shift_size if min(H, W) > self.window_size else 0
+        
+    def get_attention_mask(self, H, W, device):
+        """
+        Возвращает маску внимания для разрешения H x W, создавая ее при первом обращении
+        (хранятся маски MASK_CACHE_SIZE последних разрешений).
+        
+        Args:
+            H (int): Высота карты признаков в токенах
+            W (int): Ширина карты признаков в токенах
+            device (torch.device): Устройство маски
+            
+        Returns:
+            tensor: Маска внимания или None
+        """
+        if (H, W) == tuple(self.input_resolution) and self.attn_mask is not None:
+            return self.attn_mask
+            
+        return _lru_lookup(
+            self._mask_cache, (H, W, device),
+            lambda: compute_attention_mask(H, W, self.window_size, self.shift_for(H, W), device=device)
+        )
+        
+    def forward(self, x, hw=None):
+        """
+        Прямое распространение через Swin Transformer блок.
+        
+        Args:
+            x (tensor): Токены формы [B, H*W, C]
+            hw (tuple[int], optional): Разрешение (H, W) в токенах (по умолчанию input_resolution)
+        """
+        H, W = hw if hw is not None else self.input_resolution
         B, L, C = x.shape
         assert L == H * W, f"Input feature size ({L}) doesn't match resolution ({H}*{W})"
         
@@ -259,9 +454,19 @@ class SwinTransformerBlock(nn.Module):
         x = self.norm1(x)
         x = x.view(B, H, W, C)
         
+        # Дополнение до размера, кратного окну
+        pad_b = (self.window_size - H % self.window_size) % self.window_size
+        pad_r = (self.window_size - W % self.window_size) % self.window_size
+        if pad_b > 0 or pad_r > 0:
+            x = F.pad(x, (0, 0, 0, pad_r, 0, pad_b))
+        Hp, Wp = H + pad_b, W + pad_r
+        
+        shift_size = self.shift_for(H, W)
+        attn_mask = self.get_attention_mask(H, W, x.device)
+        
         # Cyclic shift
-        if self.shift_size > 0:
-            shifted_x = torch.roll(x, shifts=(-self.shift_size, -self.shift_size), dims=(1, 2))
+        if shift_size > 0:
+            shifted_x = torch.roll(x, shifts=(-shift_size, -shift_size), dims=(1, 2))
         else:
             shifted_x = x
             
@@ -271,20 +476,23 @@ class SwinTransformerBlock(nn.Module):
         
         # W-MSA/SW-MSA
         if self.use_checkpoint:
-            attn_windows = checkpoint.checkpoint(self.attn, x_windows, self.attn_mask)
+            attn_windows = checkpoint.checkpoint(self.attn, x_windows, attn_mask, (H, W), use_reentrant=False)
         else:
-            attn_windows = self.attn(x_windows, mask=self.attn_mask)
+            attn_windows = self.attn(x_windows, mask=attn_mask, mask_key=(H, W))
             
         # Merge windows
         attn_windows = attn_windows.view(-1, self.window_size, self.window_size, C)
-        shifted_x = window_reverse(attn_windows, self.window_size, H, W)
+        shifted_x = window_reverse(attn_windows, self.window_size, Hp, Wp)
         
         # Reverse cyclic shift
-        if self.shift_size > 0:
-            x = torch.roll(shifted_x, shifts=(self.shift_size, self.shift_size), dims=(1, 2))
+        if shift_size > 0:
+            x = torch.roll(shifted_x, shifts=(shift_size, shift_size), dims=(1, 2))
         else:
             x = shifted_x
             
+        if pad_b > 0 or pad_r > 0:
+            x = x[:, :H, :W, :].contiguous()
+            
         x = x.view(B, H * W, C)
         
         # FFN (Feed-Forward Network)
@@ -322,10 +530,10 @@ class PatchEmbed(nn.Module):
         self.norm = norm_layer(embed_dim) if norm_layer else nn.Identity()
         
     def forward(self, x):
-        """Прямое распространение: преобразование изображения в embedding."""
+        """Прямое распространение: преобразование изображения (размер кратен патчу) в embedding."""
         B, C, H, W = x.shape
-        assert H == self.img_size[0] and W == self.img_size[1], \
-            f"Input image size ({H}*{W}) doesn't match model ({self.img_size[0]}*{self.img_size[1]})."
+        assert H % self.patch_size[0] == 0 and W % self.patch_size[1] == 0, \
+            f"Input image size ({H}*{W}) is not divisible by patch size ({self.patch_size[0]}*{self.patch_size[1]})."
             
         # Проекция патчей
         x = self.proj(x).flatten(2).transpose(1, 2)
@@ -349,9 +557,9 @@ class PatchMerging(nn.Module):
         self.reduction = nn.Linear(4 * dim, 2 * dim, bias=False)
         self.norm = norm_layer(4 * dim)
         
-    def forward(self, x):
-        """Прямое распространение через слой объединения патчей."""
-        H, W = self.input_resolution
+    def forward(self, x, hw=None):
+        """Прямое распространение через слой объединения патчей (hw - разрешение входа, если отличается)."""
+        H, W = hw if hw is not None else self.input_resolution
         B, L, C = x.shape
         assert L == H * W, f"Input feature size ({L}) doesn't match resolution ({H}*{W})"
         
@@ -388,9 +596,9 @@ class PatchExpanding(nn.Module):
         self.expand = nn.Linear(dim, 2 * dim, bias=False) if dim_scale == 2 else nn.Identity()
         self.norm = norm_layer(dim)
         
-    def forward(self, x):
-        """Прямое распространение через слой расширения патчей."""
-        H, W = self.input_resolution
+    def forward(self, x, hw=None):
+        """Прямое распространение через слой расширения патчей (hw - разрешение входа, если отличается)."""
+        H, W = hw if hw is not None else self.input_resolution
         x = self.norm(x)
         x = self.expand(x)
         B, L, C = x.shape
@@ -420,9 +628,9 @@ class FinalPatchExpand_X4(nn.Module):
         self.expand = nn.Linear(dim, dim_scale * dim_scale * dim, bias=False)
         self.norm = norm_layer(dim)
         
-    def forward(self, x):
-        """Прямое распространение через финальный слой расширения патчей."""
-        H, W = self.input_resolution
+    def forward(self, x, hw=None):
+        """Прямое распространение через финальный слой расширения патчей (hw - разрешение входа, если отличается)."""
+        H, W = hw if hw is not None else self.input_resolution
         x = self.norm(x)
         x = self.expand(x)
         B, L, C = x.shape
@@ -477,18 +685,27 @@ class BasicLayer(nn.Module):
         ])
         
         # Слой даунсемплинга (при наличии)
-        self.downsample = downsample
+        if downsample is not None:
+            self.downsample = downsample(input_resolution, dim=dim, norm_layer=norm_layer)
+        else:
+            self.downsample = None
         
-    def forward(self, x):
-        """Прямое распространение через базовый слой."""
+    def forward(self, x, hw=None):
+        """
+        Прямое распространение через базовый слой.
+        
+        Args:
+            x (tensor): Токены формы [B, H*W, C]
+            hw (tuple[int], optional): Разрешение (H, W) в токенах (по умолчанию input_resolution)
+        """
         for blk in self.blocks:
             if self.use_checkpoint:
-                x = checkpoint.checkpoint(blk, x)
+                x = checkpoint.checkpoint(blk, x, hw, use_reentrant=False)
             else:
-                x = blk(x)
+                x = blk(x, hw)
         
         if self.downsample is not None:
-            x = self.downsample(x)
+            x = self.downsample(x, hw)
             
         return x
 
@@ -535,18 +752,27 @@ class BasicLayer_up(nn.Module):
         ])
         
         # Слой апсемплинга (при наличии)
-        self.upsample = upsample
+        if upsample is not None:
+            self.upsample = upsample(input_resolution, dim=dim, dim_scale=2, norm_layer=norm_layer)
+        else:
+            self.upsample = None
         
-    def forward(self, x):
-        """Прямое распространение через слой апсемплинга."""
+    def forward(self, x, hw=None):
+        """
+        Прямое распространение через слой апсемплинга.
+        
+        Args:
+            x (tensor): Токены формы [B, H*W, C]
+            hw (tuple[int], optional): Разрешение (H, W) в токенах (по умолчанию input_resolution)
+        """
         for blk in self.blocks:
             if self.use_checkpoint:
-                x = checkpoint.checkpoint(blk, x)
+                x = checkpoint.checkpoint(blk, x, hw, use_reentrant=False)
             else:
-                x = blk(x)
+                x = blk(x, hw)
         
         if self.upsample is not None:
-            x = self.upsample(x)
+            x = self.upsample(x, hw)
             
         return x
 
@@ -603,6 +829,9 @@ class SwinUNet(nn.Module):
         patches_resolution = self.patch_embed.patches_resolution
         self.patches_resolution = patches_resolution
         
+        # Кратность размера входа: патч и (num_layers - 1) объединений патчей
+        self.size_stride = patch_size * 2 ** (self.num_layers - 1)
+        
         # Абсолютное позиционное кодирование
         self.pos_drop = nn.Dropout(p=drop_rate)
         
@@ -676,12 +905,29 @@ class SwinUNet(nn.Module):
         """
         Прямое распространение через Swin-UNet.
         
+        Вход произвольного размера дополняется (replicate) до размера, кратного
+        patch_size * 2^(num_layers-1), выход обрезается до исходного размера.
+        
         Args:
             x (tensor): Входное изображение в формате (B, C, H, W)
             
         Returns:
             tensor: Выходное изображение в формате (B, out_chans, H, W)
         """
+        H_in, W_in = x.shape[-2:]
+        stride = self.size_stride
+        pad_b = (stride - H_in % stride) % stride
+        pad_r = (stride - W_in % stride) % stride
+        if pad_b > 0 or pad_r > 0:
+            x = F.pad(x, (0, pad_r, 0, pad_b), mode='replicate')
+        patches_resolution = ((H_in + pad_b) // self.patch_size, (W_in + pad_r) // self.patch_size)
+        
+        # Разрешение в токенах на каждом уровне
+        resolutions = [
+            (patches_resolution[0] // (2 ** i_layer), patches_resolution[1] // (2 ** i_layer))
+            for i_layer in range(self.num_layers)
+        ]
+        
         # Embedding патчей
         x = self.patch_embed(x)
         x = self.pos_drop(x)
@@ -696,28 +942,29 @@ class SwinUNet(nn.Module):
             # Сохраняем токены текущего уровня до даунсемплинга
             features_tokens.append(x)
             # Конвертируем в 2D карту признаков и сохраняем
-            H_i = self.patches_resolution[0] // (2 ** i_layer)
-            W_i = self.patches_resolution[1] // (2 ** i_layer)
+            H_i, W_i = resolutions[i_layer]
             B, L, C = x.shape
             feat_2d = x.view(B, H_i, W_i, C).permute(0, 3, 1, 2).contiguous()
             features_2d.append(feat_2d)
             # Переход к следующему уровню
-            x = layer(x)
+            x = layer(x, resolutions[i_layer])
         
         # Декодер (upsample) с skip connections
         for i, layer in enumerate(self.layers_up):
             if i > 0:  # Skip connection начиная со второго слоя декодера
                 x = x + features_tokens[self.num_layers - 1 - i]
-            x = layer(x)
+            x = layer(x, resolutions[self.num_layers - 1 - i])
         
         # Финальный слой upsample
         if self.final_upsample == "expand":
-            x = self.up(x)
+            x = self.up(x, patches_resolution)
             x = self.output(x)
             # Преобразование формата (B, L, C) -> (B, C, H, W)
             B, L, C = x.shape
-            H = W = int(L ** 0.5)
-            x = x.view(B, H, W, C).permute(0, 3, 1, 2).contiguous()
+            H = patches_resolution[0] * self.patch_size
+            W = patches_resolution[1] * self.patch_size
+            x = x.view(B, H, W, C).permute(0, 3, 1, 2)
+            x = x[:, :, :H_in, :W_in].contiguous()
         
         if self.return_intermediate:
             # Возвращаем 4 уровня признаков (C2..C5) и финальный выход
@@ -17,9 +17,13 @@ ViT обрабатывает изображение как последоват
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+import torch.utils.checkpoint as checkpoint
+from collections import OrderedDict
 from einops import rearrange, repeat
 import math
 
+from .swin_unet import _is_compiling, _lru_lookup
+
 
 class PatchEmbedding(nn.Module):
     """
@@ -55,8 +59,8 @@ class PatchEmbedding(nn.Module):
             torch.Tensor: Последовательность embedded патчей формы [B, num_patches, embed_dim]
         """
         B, C, H, W = x.shape
-        assert H == self.img_size[0] and W == self.img_size[1], \
-            f"Размер входа {H}x{W} не соответствует ожидаемому размеру {self.img_size[0]}x{self.img_size[1]}"
+        assert H % self.patch_size[0] == 0 and W % self.patch_size[1] == 0, \
+            f"Размер входа {H}x{W} не кратен размеру патча {self.patch_size[0]}x{self.patch_size[1]}"
             
         # Проекция патчей и преобразование формы
         x = self.proj(x)  # [B, embed_dim, H/patch_size, W/patch_size]
@@ -79,12 +83,15 @@ class Attention(nn.Module):
         qk_scale (float): Масштабирование для QK произведения
         attn_drop (float): Вероятность dropout для весов внимания
         proj_drop (float): Вероятность dropout для выходной проекции
+        fused_attention (bool): Использовать F.scaled_dot_product_attention вместо явного softmax
     """
-    def __init__(self, dim, num_heads=8, qkv_bias=False, qk_scale=None, attn_drop=0., proj_drop=0.):
+    def __init__(self, dim, num_heads=8, qkv_bias=False, qk_scale=None, attn_drop=0., proj_drop=0.,
+                 fused_attention=True):
         super().__init__()
         self.num_heads = num_heads
         head_dim = dim // num_heads
         self.scale = qk_scale or head_dim ** -0.5
+        self.fused_attention = fused_attention and hasattr(F, 'scaled_dot_product_attention')
         
         # Проекция для Query, Key, Value
         self.qkv = nn.Linear(dim, dim * 3, bias=qkv_bias)
@@ -112,13 +119,20 @@ class Attention(nn.Module):
         qkv = self.qkv(x).reshape(B, N, 3, self.num_heads, C // self.num_heads).permute(2, 0, 3, 1, 4)
         q, k, v = qkv[0], qkv[1], qkv[2]  # [B, num_heads, N, head_dim]
         
-        # Вычисление весов внимания
-        attn = (q @ k.transpose(-2, -1)) * self.scale  # [B, num_heads, N, N]
-        attn = attn.softmax(dim=-1)
-        attn = self.attn_drop(attn)
+        if self.fused_attention:
+            # Матрица весов [B, num_heads, N, N] не материализуется
+            x = F.scaled_dot_product_attention(
+                q, k, v, dropout_p=self.attn_drop.p if self.training else 0.0, scale=self.scale
+            )
+        else:
+            # Эталонный путь с явной матрицей весов (для численного сравнения)
+            attn = (q @ k.transpose(-2, -1)) * self.scale  # [B, num_heads, N, N]
+            attn = attn.softmax(dim=-1)
+            attn = self.attn_drop(attn)
+            x = attn @ v
         
-        # Взвешенная сумма значений
-        x = (attn @ v).transpose(1, 2).reshape(B, N, C)  # [B, N, C]
+        # Объединение голов
+        x = x.transpose(1, 2).reshape(B, N, C)  # [B, N, C]
         
         # Выходная проекция и dropout
         x = self.proj(x)
@@ -374,14 +388,16 @@ class ViTSemantic(nn.Module):
         norm_layer (nn.Module): Тип слоя нормализации
         semantic_dim (int): Размерность семантических признаков
         use_cls_token (bool): Использовать ли CLS токен
+        use_checkpoint (bool): Использовать ли checkpointing для Transformer блоков
     """
     def __init__(self, img_size=224, patch_size=16, in_chans=1, embed_dim=768,
                  depth=12, num_heads=12, mlp_ratio=4., qkv_bias=True, qk_scale=None,
                  drop_rate=0., attn_drop_rate=0., drop_path_rate=0., norm_layer=nn.LayerNorm,
-                 semantic_dim=256, use_cls_token=True):
+                 semantic_dim=256, use_cls_token=True, use_checkpoint=False):
         super().__init__()
         self.num_features = self.embed_dim = embed_dim
         self.use_cls_token = use_cls_token
+        self.use_checkpoint = use_checkpoint
         
         # Patch embedding
         self.patch_embed = PatchEmbedding(
@@ -400,6 +416,11 @@ class ViTSemantic(nn.Module):
         self.pos_embed = nn.Parameter(torch.zeros(1, num_tokens, embed_dim))
         self.pos_drop = nn.Dropout(p=drop_rate)
         
+        # Интерполированные позиционные кодирования для других сеток патчей
+        # (LRU, как кэш масок Swin) и версия pos_embed, для которой они вычислены
+        self._pos_embed_cache = OrderedDict()
+        self._pos_embed_version = None
+        
         # Stochastic depth decay rule
         dpr = [x.item() for x in torch.linspace(0, drop_path_rate, depth)]
         
@@ -464,6 +485,10 @@ class ViTSemantic(nn.Module):
         """
         Интерполяция позиционного кодирования для изображений с произвольным разрешением.
         
+        Без вычисления градиентов результат кэшируется для каждой сетки патчей и
+        пересчитывается после изменения pos_embed (шаг оптимизатора, загрузка весов),
+        поэтому бикубическая интерполяция выполняется один раз на разрешение.
+        
         Args:
             x (torch.Tensor): Входной тензор
             h (int): Высота в патчах
@@ -472,17 +497,37 @@ class ViTSemantic(nn.Module):
         Returns:
             torch.Tensor: Интерполированное позиционное кодирование
         """
-        npatch = x.shape[1] - 1 if self.use_cls_token else x.shape[1]
         N = self.pos_embed.shape[1] - 1 if self.use_cls_token else self.pos_embed.shape[1]
+        grid = int(math.sqrt(N))
         
-        if npatch == N:
+        # Сравниваем сетку, а не число патчей: 64x256 и 128x128 дают одинаковое число патчей
+        if h == grid and w == grid:
             return self.pos_embed
             
+        # При обучении кодирование нужно в графе вычислений, при torch.compile вычисляется в графе
+        if torch.is_grad_enabled() or _is_compiling():
+            return self._interpolate_pos_embed(h, w)
+            
+        version = self.pos_embed._version
+        key = (h, w, self.pos_embed.dtype, self.pos_embed.device)
+        
+        # pos_embed изменился - прежние кодирования недействительны
+        if self._pos_embed_version != version:
+            self._pos_embed_cache.clear()
+            self._pos_embed_version = version
+            
+        return _lru_lookup(self._pos_embed_cache, key, lambda: self._interpolate_pos_embed(h, w))
+        
+    def _interpolate_pos_embed(self, h, w):
+        """Бикубическая интерполяция позиционного кодирования на сетку h x w."""
+        N = self.pos_embed.shape[1] - 1 if self.use_cls_token else self.pos_embed.shape[1]
+        grid = int(math.sqrt(N))
+        
         class_pos_embed = self.pos_embed[:, 0:1] if self.use_cls_token else None
         patch_pos_embed = self.pos_embed[:, 1:] if self.use_cls_token else self.pos_embed
         
-        dim = x.shape[-1]
-        patch_pos_embed = patch_pos_embed.reshape(1, int(math.sqrt(N)), int(math.sqrt(N)), dim).permute(0, 3, 1, 2)
+        dim = self.pos_embed.shape[-1]
+        patch_pos_embed = patch_pos_embed.reshape(1, grid, grid, dim).permute(0, 3, 1, 2)
         patch_pos_embed = F.interpolate(patch_pos_embed, size=(h, w), mode='bicubic', align_corners=False)
         patch_pos_embed = patch_pos_embed.permute(0, 2, 3, 1).flatten(1, 2)
         
@@ -490,6 +535,12 @@ class ViTSemantic(nn.Module):
             return torch.cat((class_pos_embed, patch_pos_embed), dim=1)
         else:
             return patch_pos_embed
+            
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        """Загрузка весов со сбросом кэша интерполированных позиционных кодирований."""
+        self._pos_embed_cache.clear()
+        self._pos_embed_version = None
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
     
     def forward_features(self, x):
         """
@@ -501,7 +552,7 @@ class ViTSemantic(nn.Module):
         Returns:
             tuple: (all_tokens, cls_token или mean_token)
         """
-        B = x.shape[0]
+        B, _, H, W = x.shape
         
         # Patch embedding
         x = self.patch_embed(x)  # [B, num_patches, embed_dim]
@@ -511,13 +562,18 @@ class ViTSemantic(nn.Module):
             cls_tokens = self.cls_token.expand(B, -1, -1)
             x = torch.cat((cls_tokens, x), dim=1)
         
-        # Добавление позиционного кодирования
-        x = x + self.pos_embed
+        # Добавление позиционного кодирования (интерполированного для другого разрешения)
+        x = x + self.interpolate_pos_encoding(
+            x, H // self.patch_embed.patch_size[0], W // self.patch_embed.patch_size[1]
+        )
         x = self.pos_drop(x)
         
         # Прохождение через Transformer блоки
         for blk in self.blocks:
-            x = blk(x)
+            if self.use_checkpoint and torch.is_grad_enabled():
+                x = checkpoint.checkpoint(blk, x, use_reentrant=False)
+            else:
+                x = blk(x)
             
         # Нормализация
         x = self.norm(x)
@@ -32,6 +32,8 @@ import torchvision.transforms.functional as TF
 from PIL import Image
 import cv2
 
+from utils.color_conversion import rgb_to_lab_tensor, lab_to_rgb_tensor
+
 # Поддерживаемые цветовые пространства
 COLOR_SPACES = ['rgb', 'lab', 'yuv']
 
@@ -448,29 +450,17 @@ def get_color_transforms(color_space: str) -> Dict[str, Callable]:
         Преобразует тензор изображения из RGB в LAB.
         
         Args:
-            img_tensor (torch.Tensor): RGB-тензор изображения [C, H, W]
+            img_tensor (torch.Tensor): RGB-тензор изображения [C, H, W] или [B, C, H, W]
             
         Returns:
-            torch.Tensor: LAB-тензор изображения [C, H, W]
+            torch.Tensor: LAB-тензор изображения той же формы
         """
-        # Преобразуем тензор в numpy-массив
-        img_np = img_tensor.permute(1, 2, 0).cpu().numpy()
-        
-        # Масштабируем значения из [0, 1] в [0, 255]
-        if img_np.max() <= 1.0:
-            img_np = img_np * 255.0
+        # Масштабируем значения из [0, 255] в [0, 1]
+        if img_tensor.dtype != torch.uint8 and img_tensor.max() > 1.0:
+            img_tensor = img_tensor / 255.0
             
-        # Преобразуем в LAB
-        lab_img = cv2.cvtColor(img_np.astype(np.uint8), cv2.COLOR_RGB2LAB).astype(np.float32)
-        
         # Нормализуем: L в [0, 1], a и b в [-1, 1]
-        lab_img[:, :, 0] /= 100.0  # L: [0, 100] -> [0, 1]
-        lab_img[:, :, 1:] /= 127.0  # a, b: [-127, 127] -> [-1, 1]
-        
-        # Преобразуем обратно в тензор
-        lab_tensor = torch.from_numpy(lab_img).permute(2, 0, 1).float()
-        
-        return lab_tensor
+        return rgb_to_lab_tensor(img_tensor, normalize=True)
         
     # Преобразование LAB -> RGB
     def lab_to_rgb(img_tensor: torch.Tensor) -> torch.Tensor:
@@ -478,28 +468,13 @@ def get_color_transforms(color_space: str) -> Dict[str, Callable]:
         Преобразует тензор изображения из LAB в RGB.
         
         Args:
-            img_tensor (torch.Tensor): LAB-тензор изображения [C, H, W]
+            img_tensor (torch.Tensor): LAB-тензор изображения [C, H, W] или [B, C, H, W]
             
         Returns:
-            torch.Tensor: RGB-тензор изображения [C, H, W]
+            torch.Tensor: RGB-тензор изображения той же формы
         """
-        # Преобразуем тензор в numpy-массив
-        img_np = img_tensor.permute(1, 2, 0).cpu().numpy()
-        
-        # Денормализуем: L из [0, 1] в [0, 100], a и b из [-1, 1] в [-127, 127]
-        img_np[:, :, 0] *= 100.0
-        img_np[:, :, 1:] *= 127.0
-        
-        # Преобразуем в RGB
-        rgb_img = cv2.cvtColor(img_np.astype(np.float32), cv2.COLOR_LAB2RGB)
-        
-        # Масштабируем значения в [0, 1]
-        rgb_img = np.clip(rgb_img, 0, 255) / 255.0
-        
-        # Преобразуем в тензор
-        rgb_tensor = torch.from_numpy(rgb_img).permute(2, 0, 1).float()
-        
-        return rgb_tensor
+        # Денормализация L и a, b выполняется внутри общего преобразования
+        return lab_to_rgb_tensor(img_tensor, normalized=True)
         
     # Преобразование RGB -> YUV
     def rgb_to_yuv(img_tensor: torch.Tensor) -> torch.Tensor:
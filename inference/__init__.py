@@ -10,6 +10,14 @@ TintoraAI Inference: Модули для колоризации изображе
 - Predictor: Основной класс для предсказания цветов изображений
 - Postprocessor: Модуль для улучшения результатов колоризации
 - BatchProcessor: Компонент для эффективной пакетной обработки изображений
+- TiledInferenceEngine: Тайловый инференс для изображений большого размера
+- PrecisionMode: Режимы точности вычислений (fp32, bf16, fp16) при инференсе
+- CompiledModelCache: Скомпилированные варианты модели по формам входа с прогревом
+- OnnxRuntimeModel: Экспорт модели в ONNX и выполнение через ONNX Runtime на CPU
+- quantize_dynamic_int8: Динамическое INT8-квантование линейных слоев для CPU
+- MicroBatchScheduler: Объединение одновременных запросов в микропакеты
+- BatchJobStore: Ограниченное персистентное хранилище пакетных заданий API
+- MemoryBankServer: Общий банк памяти для нескольких процессов инференса
 - FallbackStrategy: Стратегии восстановления при проблемах с колоризацией
 
 Ключевые возможности:
@@ -30,6 +38,40 @@ from .postprocessor import (
     create_postprocessor, process_directory
 )
 
+from .tiling import (
+    TiledInferenceEngine, BlendingMode, create_tiling_engine
+)
+
+from .precision import (
+    PrecisionMode, resolve_precision, autocast_context, apply_channels_last
+)
+
+from .compilation import (
+    CompiledModelCache, CompileBackend, create_compiled_model
+)
+
+from .onnx_export import (
+    AbOutputWrapper, OnnxRuntimeModel, export_onnx, check_onnx_parity, create_onnx_runtime_model
+)
+
+from .quantization import (
+    quantize_dynamic_int8, quantizable_modules, quantization_groups, quantization_sensitivity,
+    model_size_bytes, save_quantized_model, load_quantized_model
+)
+
+from .micro_batching import (
+    MicroBatchScheduler, create_micro_batch_scheduler
+)
+
+from .job_store import (
+    BatchJobStore, create_job_store
+)
+
+from .memory_bank_server import (
+    MemoryBankService, MemoryBankServer, MemoryBankClient, LocalMemoryBankClient,
+    create_memory_bank_server
+)
+
 from .batch_processor import (
     BatchProcessor, QueueProcessor, ProcessingMode,
     create_batch_processor, process_batch_from_config
@@ -51,6 +93,53 @@ __all__ = [
     'create_postprocessor',
     'process_directory',
     
+    # Из tiling.py
+    'TiledInferenceEngine',
+    'BlendingMode',
+    'create_tiling_engine',
+    
+    # Из precision.py
+    'PrecisionMode',
+    'resolve_precision',
+    'autocast_context',
+    'apply_channels_last',
+    
+    # Из compilation.py
+    'CompiledModelCache',
+    'CompileBackend',
+    'create_compiled_model',
+    
+    # Из onnx_export.py
+    'AbOutputWrapper',
+    'OnnxRuntimeModel',
+    'export_onnx',
+    'check_onnx_parity',
+    'create_onnx_runtime_model',
+    
+    # Из quantization.py
+    'quantize_dynamic_int8',
+    'quantizable_modules',
+    'quantization_groups',
+    'quantization_sensitivity',
+    'model_size_bytes',
+    'save_quantized_model',
+    'load_quantized_model',
+    
+    # Из micro_batching.py
+    'MicroBatchScheduler',
+    'create_micro_batch_scheduler',
+    
+    # Из job_store.py
+    'BatchJobStore',
+    'create_job_store',
+    
+    # Из memory_bank_server.py
+    'MemoryBankService',
+    'MemoryBankServer',
+    'MemoryBankClient',
+    'LocalMemoryBankClient',
+    'create_memory_bank_server',
+    
     # Из batch_processor.py
     'BatchProcessor',
     'QueueProcessor',
@@ -9,6 +9,8 @@ Batch Processor: Модуль для эффективной пакетной о
 Ключевые особенности:
 - Эффективная пакетная обработка с использованием батчей оптимального размера
 - Параллельная обработка для максимального использования доступных ресурсов
+- Конвейер декодирование -> модель -> кодирование с ограниченными очередями
+- Постоянный пул процессов с однократной загрузкой модели и передачей изображений через общую память
 - Мониторинг и отчетность о процессе обработки в реальном времени
 - Обработка очередей с автоматическим подхватом новых файлов
 - Возможность паузы и возобновления процесса обработки
@@ -32,7 +34,7 @@ from typing import Dict, List, Tuple, Union, Optional, Any, Callable
 from pathlib import Path
 import shutil
 import multiprocessing
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait
 
 import numpy as np
 import torch
@@ -43,6 +45,7 @@ from watchdog.events import FileSystemEventHandler, FileCreatedEvent
 
 from .predictor import ColorizationPredictor, load_predictor, FallbackStrategy
 from .postprocessor import ColorizationPostprocessor, create_postprocessor
+from . import shared_images
 from utils.config_parser import load_config, ConfigParser
 
 
@@ -53,6 +56,7 @@ class ProcessingMode(Enum):
     PARALLEL_PROCESS = "parallel_process"  # Параллельная обработка на уровне процессов
     BATCH_SEQUENTIAL = "batch_sequential"  # Последовательная обработка батчами
     BATCH_PARALLEL = "batch_parallel"  # Параллельная обработка батчами
+    PIPELINE = "pipeline"  # Конвейер: декодирование -> модель -> кодирование
     QUEUE = "queue"  # Обработка очереди
 
 
@@ -71,6 +75,11 @@ class BatchProcessingStats:
         self.start_time = None
         self.end_time = None
         
+        # Суммарное время работы стадий конвейера и количество потоков в каждой
+        self.stage_times = {}
+        self.stage_workers = {}
+        self._lock = threading.Lock()
+        
     def start(self):
         """Отмечает начало обработки."""
         self.start_time = time.time()
@@ -98,6 +107,17 @@ class BatchProcessingStats:
         elif status == 'skipped':
             self.skipped_images += 1
             
+    def add_stage_time(self, stage: str, seconds: float):
+        """
+        Добавляет время работы стадии конвейера.
+        
+        Args:
+            stage (str): Имя стадии ('decode', 'infer', 'encode')
+            seconds (float): Время работы в секундах
+        """
+        with self._lock:
+            self.stage_times[stage] = self.stage_times.get(stage, 0.0) + seconds
+            
     def get_stats(self) -> Dict:
         """
         Возвращает текущую статистику обработки.
@@ -127,6 +147,15 @@ class BatchProcessingStats:
             stats["total_time"] = self.total_time
             stats["images_per_second"] = self.processed_images / max(0.001, self.total_time)
             
+        # Загрузка стадий конвейера: доля времени, в течение которой потоки стадии были заняты
+        if self.stage_times:
+            elapsed = self.total_time if self.end_time is not None else stats.get("elapsed_time", 0.0)
+            stats["stage_times"] = dict(self.stage_times)
+            stats["stage_utilization"] = {
+                stage: seconds / max(0.001, elapsed * self.stage_workers.get(stage, 1))
+                for stage, seconds in self.stage_times.items()
+            }
+            
         return stats
 
 
@@ -195,6 +224,9 @@ class BatchProcessor:
         self.paused = False
         self.stop_requested = False
         
+        # Постоянный пул процессов для режима PARALLEL_PROCESS (создается по требованию)
+        self._process_pool = None
+        
     def process_directory(
         self,
         input_dir: str,
@@ -302,6 +334,10 @@ class BatchProcessor:
             results = self._process_batch_parallel(
                 image_paths, reference_paths, style_name, style_alpha, metadata
             )
+        elif self.mode == ProcessingMode.PIPELINE:
+            results = self._process_pipeline(
+                image_paths, reference_paths, style_name, style_alpha, metadata
+            )
         else:
             raise ValueError(f"Неподдерживаемый режим обработки: {self.mode}")
             
@@ -322,6 +358,11 @@ class BatchProcessor:
             "results": results
         }
         
+        stats = self.stats.get_stats()
+        if "stage_times" in stats:
+            report["stage_times"] = stats["stage_times"]
+            report["stage_utilization"] = stats["stage_utilization"]
+        
         # Сохраняем отчет в файл
         report_path = os.path.join(self.output_dir, "metadata", f"batch_report_{time.strftime('%Y%m%d-%H%M%S')}.json")
         with open(report_path, 'w') as f:
@@ -553,6 +594,11 @@ class BatchProcessor:
         """
         Параллельно обрабатывает изображения, используя процессы.
         
+        Рабочие процессы создаются один раз и загружают модель в инициализаторе.
+        Изображения декодируются в основном процессе порциями и передаются через
+        общую память: задача содержит только имя сегмента, смещение и форму массива.
+        Пока рабочие процессы обрабатывают текущую порцию, декодируется следующая.
+        
         Args:
             image_paths (List[str]): Пути к изображениям
             reference_paths (List[str], optional): Пути к референсным изображениям
@@ -563,10 +609,6 @@ class BatchProcessor:
         Returns:
             List[Dict]: Результаты обработки
         """
-        # Примечание: Для использования процессов мы не можем напрямую использовать self.predictor,
-        # так как он содержит модели PyTorch, которые не могут быть переданы между процессами.
-        # Вместо этого мы будем использовать внешнюю функцию, которая создаст новый экземпляр предиктора.
-        
         # Создаем аргументы для каждого процесса
         tasks = []
         for i, image_path in enumerate(image_paths):
@@ -588,67 +630,167 @@ class BatchProcessor:
                 image_metadata.update(metadata)
                 
             # Добавляем задачу
-            task = {
+            tasks.append({
                 'image_path': image_path,
                 'reference_path': reference_path,
                 'style_name': style_name,
                 'style_alpha': style_alpha,
                 'output_path': output_path,
-                'metadata': image_metadata,
-                'config': {
-                    'model_path': self.config.get('model_path'),
-                    'config_path': self.config.get('config_path'),
-                    'modules_path': self.config.get('modules_path'),
-                    'device': self.config.get('device', 'cuda'),
-                    'postprocess': self.postprocess_enabled,
-                    'save_comparison': self.save_comparison,
-                    'save_uncertainty': self.save_uncertainty
-                }
-            }
-            tasks.append(task)
+                'metadata': image_metadata
+            })
+            
+        if not tasks:
+            return []
             
-        # Определяем количество рабочих процессов
-        max_workers = min(self.max_workers, len(tasks), multiprocessing.cpu_count())
+        executor = self._get_process_pool()
+        chunk_size = max(1, self.max_workers * self.batch_size)
+        chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
         
-        # Создаем пул процессов
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            # Создаем прогресс-бар
+        results = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as decode_pool:
             with tqdm.tqdm(total=len(tasks), desc="Обработка изображений") as pbar:
-                # Запускаем задачи
-                futures = [executor.submit(process_image_in_process, task) for task in tasks]
+                # Декодируем первую порцию заранее
+                next_chunk = self._submit_shared_chunk(executor, decode_pool, chunks[0], results)
                 
-                # Обрабатываем результаты
-                results = []
-                for future in as_completed(futures):
-                    # Получаем результат
-                    try:
-                        result = future.result()
-                        if result.get('status') == 'success':
-                            self.stats.update('success', result.get('processing_time', 0.0))
-                        else:
-                            self.stats.update('error', result.get('processing_time', 0.0))
-                    except Exception as e:
-                        self.logger.error(f"Ошибка при получении результата: {str(e)}")
-                        self.stats.update('error', 0.0)
-                        result = {
-                            "status": "error",
-                            "error_message": str(e),
-                            "processing_time": 0.0
-                        }
+                for chunk_index in range(len(chunks)):
+                    # Проверяем флаг остановки
+                    if self.stop_requested:
+                        self.logger.info("Обработка остановлена пользователем")
+                        # Дожидаемся уже отправленной порции, чтобы освободить общую память
+                        for future in next_chunk[1]:
+                            future.cancel()
+                        wait(next_chunk[1])
+                        shared_images.release(next_chunk[0])
+                        break
                         
-                    # Добавляем результат
-                    results.append(result)
+                    # Проверяем флаг паузы
+                    while self.paused and not self.stop_requested:
+                        time.sleep(0.5)
+                        
+                    segment, futures = next_chunk
                     
-                    # Обновляем прогресс-бар
-                    pbar.update(1)
-                    pbar.set_postfix({
-                        'успешно': self.stats.successful_images,
-                        'ошибки': self.stats.failed_images,
-                        'скорость': f"{len(results)/max(0.001, time.time() - self.stats.start_time):.1f} изобр./сек"
-                    })
+                    # Декодируем следующую порцию, пока обрабатывается текущая
+                    if chunk_index + 1 < len(chunks):
+                        next_chunk = self._submit_shared_chunk(executor, decode_pool, chunks[chunk_index + 1], results)
                     
+                    try:
+                        for future in as_completed(futures):
+                            # Получаем результат
+                            try:
+                                result = future.result()
+                                if result.get('status') == 'success':
+                                    self.stats.update('success', result.get('processing_time', 0.0))
+                                else:
+                                    self.stats.update('error', result.get('processing_time', 0.0))
+                            except Exception as e:
+                                self.logger.error(f"Ошибка при получении результата: {str(e)}")
+                                self.stats.update('error', 0.0)
+                                result = {
+                                    "status": "error",
+                                    "error_message": str(e),
+                                    "processing_time": 0.0
+                                }
+                                
+                            # Добавляем результат
+                            results.append(result)
+                            
+                            # Обновляем прогресс-бар
+                            pbar.update(1)
+                            pbar.set_postfix({
+                                'успешно': self.stats.successful_images,
+                                'ошибки': self.stats.failed_images,
+                                'скорость': f"{len(results)/max(0.001, time.time() - self.stats.start_time):.1f} изобр./сек"
+                            })
+                    finally:
+                        shared_images.release(segment)
+                        
         return results
         
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """
+        Возвращает постоянный пул рабочих процессов, создавая его при первом обращении.
+        
+        Returns:
+            ProcessPoolExecutor: Пул процессов с загруженными моделями
+        """
+        if self._process_pool is None:
+            worker_config = {
+                'model_path': self.config.get('model_path'),
+                'config_path': self.config.get('config_path'),
+                'modules_path': self.config.get('modules_path'),
+                'device': self.config.get('device', 'cuda'),
+                'postprocess': self.postprocess_enabled,
+                'save_comparison': self.save_comparison,
+                'save_uncertainty': self.save_uncertainty
+            }
+            
+            max_workers = max(1, min(self.max_workers, multiprocessing.cpu_count()))
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=init_process_worker,
+                initargs=(worker_config,)
+            )
+            self.logger.info(f"Запущен пул из {max_workers} рабочих процессов")
+            
+        return self._process_pool
+        
+    def _submit_shared_chunk(
+        self,
+        executor: ProcessPoolExecutor,
+        decode_pool: ThreadPoolExecutor,
+        tasks: List[Dict],
+        results: List[Dict]
+    ) -> Tuple[Optional[shared_images.SharedMemory], List]:
+        """
+        Декодирует порцию изображений в общую память и отправляет задачи рабочим процессам.
+        
+        Args:
+            executor (ProcessPoolExecutor): Пул рабочих процессов
+            decode_pool (ThreadPoolExecutor): Пул потоков декодирования
+            tasks (List[Dict]): Задачи порции
+            results (List[Dict]): Список результатов, в который добавляются ошибки загрузки
+            
+        Returns:
+            Tuple[Optional[SharedMemory], List]: Сегмент общей памяти и future задач
+        """
+        def decode(path):
+            return np.asarray(Image.open(path).convert('RGB'))
+            
+        decoded_tasks = []
+        images = []
+        for task, future in zip(tasks, [decode_pool.submit(decode, task['image_path']) for task in tasks]):
+            try:
+                images.append(future.result())
+                decoded_tasks.append(task)
+            except Exception as e:
+                self.logger.error(f"Ошибка при загрузке изображения {task['image_path']}: {str(e)}")
+                self.stats.update('error', 0.0)
+                results.append({
+                    "status": "error",
+                    "error_message": str(e),
+                    "source_path": task['image_path'],
+                    "processing_time": 0.0
+                })
+                
+        if not images:
+            return None, []
+            
+        segment, refs = shared_images.pack(images)
+        del images
+        
+        futures = [
+            executor.submit(process_image_in_process, dict(task, image=ref))
+            for task, ref in zip(decoded_tasks, refs)
+        ]
+        
+        return segment, futures
+        
+    def close(self):
+        """Останавливает пул рабочих процессов."""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=True)
+            self._process_pool = None
+            
     def _process_batch_sequential(
         self,
         image_paths: List[str],
@@ -899,6 +1041,210 @@ class BatchProcessor:
                     
         return results
         
+    def _process_pipeline(
+        self,
+        image_paths: List[str],
+        reference_paths: Optional[List[str]],
+        style_name: Optional[str],
+        style_alpha: Optional[float],
+        metadata: Optional[Dict]
+    ) -> List[Dict]:
+        """
+        Обрабатывает изображения трехстадийным конвейером.
+        
+        Потоки декодирования читают изображения в ограниченную очередь, стадия модели
+        собирает из нее батчи и выполняет один пакетный проход, потоки кодирования
+        сохраняют результаты. Ограниченные очереди обеспечивают обратное давление:
+        при отставании модели декодирование приостанавливается, при отставании
+        кодирования приостанавливается модель. Сравнения до/после в этом режиме не
+        сохраняются.
+        
+        Args:
+            image_paths (List[str]): Пути к изображениям
+            reference_paths (List[str], optional): Пути к референсным изображениям
+            style_name (str, optional): Имя стиля
+            style_alpha (float, optional): Интенсивность стиля
+            metadata (Dict, optional): Дополнительные метаданные
+            
+        Returns:
+            List[Dict]: Результаты обработки
+        """
+        # Пакетный проход модели не поддерживает референсы и стили
+        if reference_paths is not None or style_name is not None:
+            self.logger.warning("Режим pipeline не поддерживает референсы и стили, используется batch_sequential")
+            return self._process_batch_sequential(
+                image_paths, reference_paths, style_name, style_alpha, metadata
+            )
+            
+        pipeline_config = self.config.get('batch_processing', {}).get('pipeline', {})
+        decode_workers = max(1, pipeline_config.get('decode_workers', self.max_workers))
+        encode_workers = max(1, pipeline_config.get('encode_workers', max(1, self.max_workers // 2)))
+        queue_size = max(1, pipeline_config.get('queue_size', 4 * self.batch_size))
+        
+        self.stats.stage_workers = {'decode': decode_workers, 'infer': 1, 'encode': encode_workers}
+        
+        # Создаем задачи, пропуская существующие результаты
+        tasks = []
+        for image_path in image_paths:
+            output_path = self._get_output_path(image_path)
+            if not self.overwrite_existing and os.path.exists(output_path):
+                self.logger.debug(f"Пропуск существующего файла: {output_path}")
+                self.stats.update('skipped', 0.0)
+                continue
+                
+            image_metadata = {"source_path": image_path}
+            if metadata:
+                image_metadata.update(metadata)
+                
+            tasks.append({'image_path': image_path, 'output_path': output_path, 'metadata': image_metadata})
+            
+        decode_queue = queue.Queue(maxsize=queue_size)
+        encode_queue = queue.Queue(maxsize=queue_size)
+        task_iterator = iter(tasks)
+        task_lock = threading.Lock()
+        results_lock = threading.Lock()
+        results = []
+        done = object()
+        
+        pbar = tqdm.tqdm(total=len(tasks), desc="Обработка изображений")
+        
+        def record(result: Dict):
+            with results_lock:
+                self.stats.update(result['status'], result.get('processing_time', 0.0))
+                results.append(result)
+                pbar.update(1)
+                
+        def error_result(task: Dict, error: Exception, processing_time: float) -> Dict:
+            return {
+                "status": "error",
+                "error_message": str(error),
+                "source_path": task['image_path'],
+                "processing_time": processing_time
+            }
+            
+        def decode_worker():
+            try:
+                while not self.stop_requested:
+                    with task_lock:
+                        task = next(task_iterator, None)
+                    if task is None:
+                        break
+                        
+                    # Проверяем паузу
+                    while self.paused and not self.stop_requested:
+                        time.sleep(0.1)
+                        
+                    start_time = time.time()
+                    try:
+                        image = np.asarray(Image.open(task['image_path']).convert('RGB'))
+                    except Exception as e:
+                        self.logger.warning(f"Не удалось загрузить изображение {task['image_path']}: {e}")
+                        record(error_result(task, e, time.time() - start_time))
+                        continue
+                        
+                    decode_time = time.time() - start_time
+                    self.stats.add_stage_time('decode', decode_time)
+                    decode_queue.put((task, image, decode_time))
+            finally:
+                decode_queue.put(done)
+                
+        def encode_worker():
+            while True:
+                item = encode_queue.get()
+                if item is done:
+                    break
+                    
+                task, prediction, elapsed = item
+                start_time = time.time()
+                try:
+                    colorized_image = Image.fromarray(prediction['colorized'])
+                    colorized_image.save(task['output_path'])
+                    
+                    result = {
+                        "status": "success",
+                        "output_path": task['output_path'],
+                        "source_path": task['image_path'],
+                        "metadata": task['metadata']
+                    }
+                    
+                    # Применяем постобработку, если она включена
+                    if self.postprocess_enabled:
+                        try:
+                            postprocess_result = self.postprocessor.process_image(
+                                image=colorized_image,
+                                grayscale_image=None,
+                                output_path=task['output_path'],
+                                save_comparison=False,
+                                metadata=task['metadata']
+                            )
+                            result['postprocessed'] = True
+                            result['postprocess_info'] = postprocess_result.get('applied_operations', {})
+                        except Exception as e:
+                            self.logger.warning(f"Ошибка при постобработке: {str(e)}")
+                            result['postprocessed'] = False
+                            result['postprocess_error'] = str(e)
+                except Exception as e:
+                    self.logger.error(f"Ошибка при сохранении {task['output_path']}: {str(e)}")
+                    result = error_result(task, e, 0.0)
+                    
+                encode_time = time.time() - start_time
+                self.stats.add_stage_time('encode', encode_time)
+                result['processing_time'] = elapsed + encode_time
+                record(result)
+                
+        decoders = [threading.Thread(target=decode_worker, name=f"PipelineDecode-{i}") for i in range(decode_workers)]
+        encoders = [threading.Thread(target=encode_worker, name=f"PipelineEncode-{i}") for i in range(encode_workers)]
+        for thread in decoders + encoders:
+            thread.daemon = True
+            thread.start()
+            
+        try:
+            # Стадия модели: собираем батчи из очереди декодирования
+            finished_decoders = 0
+            while finished_decoders < decode_workers:
+                batch = []
+                while len(batch) < self.batch_size and finished_decoders < decode_workers:
+                    item = decode_queue.get()
+                    if item is done:
+                        finished_decoders += 1
+                    else:
+                        batch.append(item)
+                        
+                if not batch:
+                    continue
+                    
+                start_time = time.time()
+                try:
+                    predictions = self.predictor.predict_arrays([image for _, image, _ in batch])
+                except Exception as e:
+                    self.logger.error(f"Ошибка при обработке батча: {str(e)}")
+                    for task, _, decode_time in batch:
+                        record(error_result(task, e, decode_time))
+                    continue
+                    
+                infer_time = time.time() - start_time
+                self.stats.add_stage_time('infer', infer_time)
+                
+                for (task, _, decode_time), prediction in zip(batch, predictions):
+                    encode_queue.put((task, prediction, decode_time + infer_time / len(batch)))
+        finally:
+            # Освобождаем декодеры, ожидающие места в очереди, если стадия модели прервана
+            while any(thread.is_alive() for thread in decoders):
+                try:
+                    decode_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            for _ in encoders:
+                encode_queue.put(done)
+            for thread in encoders:
+                thread.join()
+            pbar.close()
+            
+        if self.stop_requested:
+            self.logger.info("Обработка остановлена пользователем")
+            
+        return results
+        
     def _process_single_image(
         self,
         image: Union[np.ndarray, torch.Tensor, Image.Image],
@@ -1548,10 +1894,39 @@ class QueueProcessor:
         }
 
 
+# Состояние рабочего процесса: модели загружаются один раз в init_process_worker
+_worker_state = {}
+
+
+def init_process_worker(config: Dict):
+    """
+    Инициализатор рабочего процесса: загружает предиктор и постпроцессор.
+    
+    Args:
+        config (Dict): Параметры загрузки модели и сохранения результатов
+    """
+    _worker_state['config'] = config
+    _worker_state['predictor'] = load_predictor(
+        model_path=config['model_path'],
+        config_path=config['config_path'],
+        modules_path=config['modules_path'],
+        device=config['device']
+    )
+    
+    _worker_state['postprocessor'] = None
+    if config['postprocess']:
+        _worker_state['postprocessor'] = create_postprocessor(config_path=config['config_path'], device=config['device'])
+        
+    logging.info(f"Рабочий процесс {os.getpid()} загрузил модель")
+
+
 def process_image_in_process(task: Dict) -> Dict:
     """
     Функция для обработки изображения в отдельном процессе.
     
+    Использует модели, загруженные init_process_worker. Изображение берется из общей
+    памяти, если задача содержит ссылку 'image', иначе читается по пути.
+    
     Args:
         task (Dict): Задача для обработки
         
@@ -1565,28 +1940,23 @@ def process_image_in_process(task: Dict) -> Dict:
     style_alpha = task['style_alpha']
     output_path = task['output_path']
     metadata = task['metadata']
-    config = task['config']
     
     # Определяем время начала обработки
     start_time = time.time()
     
     try:
-        # Загружаем предиктор
-        predictor = load_predictor(
-            model_path=config['model_path'],
-            config_path=config['config_path'],
-            modules_path=config['modules_path'],
-            device=config['device']
-        )
-        
-        # Загружаем постпроцессор, если нужно
-        postprocessor = None
-        if config['postprocess']:
-            from .postprocessor import create_postprocessor
-            postprocessor = create_postprocessor(config_path=config['config_path'], device=config['device'])
+        if not _worker_state:
+            raise RuntimeError("Рабочий процесс не инициализирован (init_process_worker)")
+            
+        config = _worker_state['config']
+        predictor = _worker_state['predictor']
+        postprocessor = _worker_state['postprocessor']
         
-        # Загружаем изображение
-        image = Image.open(image_path).convert('RGB')
+        # Получаем изображение из общей памяти без копирования
+        if 'image' in task:
+            image = shared_images.attach(task['image'])
+        else:
+            image = np.asarray(Image.open(image_path).convert('RGB'))
         
         # Загружаем референсное изображение, если есть
         reference_image = None
@@ -1618,7 +1988,7 @@ def process_image_in_process(task: Dict) -> Dict:
                 # Применяем постобработку
                 postprocess_result = postprocessor.process_image(
                     image=colorized_image,
-                    grayscale_image=image,
+                    grayscale_image=Image.fromarray(np.ascontiguousarray(image)),
                     output_path=colorized_path,  # Перезаписываем колоризованное изображение
                     save_comparison=config['save_comparison'],
                     metadata=metadata
@@ -1654,6 +2024,9 @@ def process_image_in_process(task: Dict) -> Dict:
             "source_path": image_path,
             "processing_time": time.time() - start_time
         }
+        
+    finally:
+        image = None
 
 
 def create_batch_processor(
@@ -1787,15 +2160,18 @@ def process_batch_from_config(config_path: str) -> Dict:
     )
     
     # Выполняем обработку директории
-    return batch_processor.process_directory(
-        input_dir=input_dir,
-        recursive=recursive,
-        extensions=extensions,
-        reference_dir=reference_dir,
-        style_name=style_name,
-        style_alpha=style_alpha,
-        metadata={'config_path': config_path}
-    )
+    try:
+        return batch_processor.process_directory(
+            input_dir=input_dir,
+            recursive=recursive,
+            extensions=extensions,
+            reference_dir=reference_dir,
+            style_name=style_name,
+            style_alpha=style_alpha,
+            metadata={'config_path': config_path}
+        )
+    finally:
+        batch_processor.close()
 
 
 if __name__ == "__main__":
@@ -1865,6 +2241,7 @@ if __name__ == "__main__":
             except KeyboardInterrupt:
                 print("\nОстановка обработки очереди...")
                 queue_processor.stop()
+                batch_processor.close()
                 print("Обработка очереди остановлена")
                 
         else:
@@ -1877,6 +2254,8 @@ if __name__ == "__main__":
                 style_alpha=args.alpha
             )
             
+            batch_processor.close()
+            
             print(f"\nОбработка завершена: {result['successful_images']} успешно, {result['failed_images']} с ошибками, {result['skipped_images']} пропущено")
             print(f"Общее время: {result['total_time']:.2f} сек, скорость: {result['images_per_second']:.2f} изобр./сек")
             
@@ -0,0 +1,353 @@
+"""
+Compilation: Компиляция модели по формам входа с прогревом и сохранением на диск.
+
+Данный модуль хранит скомпилированные варианты модели колоризации для каждого
+ключа (корзина размера пакета, размер входа, тип данных, вариант точности).
+Размер пакета округляется вверх до ближайшей корзины, поэтому набор компилируемых
+форм ограничен конфигурацией и может быть скомпилирован заранее при запуске.
+Результаты компиляции сохраняются на диск и загружаются при перезапуске.
+
+Ключевые особенности:
+- Бэкенды: TorchScript trace, torch.compile и eager без компиляции
+- Дополнение пакета до корзины и разбиение пакетов больше наибольшей корзины
+- Сохранение трассированных моделей и артефактов torch.compile на диск
+- Возврат к eager-модели для ключа, если компиляция или выполнение не удались
+
+Преимущества:
+- Первый запрос после запуска не оплачивает компиляцию и выбор ядер
+- Перезапуск сервиса не требует повторной компиляции
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import warnings
+from enum import Enum
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+
+
+class CompileBackend(Enum):
+    """Способы компиляции модели при инференсе."""
+    EAGER = "eager"      # Без компиляции
+    TRACE = "trace"      # TorchScript trace для каждой формы входа
+    COMPILE = "compile"  # torch.compile без динамических форм
+
+
+# Синонимы названий бэкендов, принятые в конфигурациях проекта
+BACKEND_ALIASES = {
+    "none": CompileBackend.EAGER,
+    "eager": CompileBackend.EAGER,
+    "trace": CompileBackend.TRACE,
+    "torchscript": CompileBackend.TRACE,
+    "compile": CompileBackend.COMPILE,
+    "torch_compile": CompileBackend.COMPILE,
+}
+
+
+def model_fingerprint(model: nn.Module) -> str:
+    """
+    Вычисляет отпечаток модели для имен файлов кэша компиляции.
+
+    Отпечаток зависит от класса модели, версии PyTorch и значений всех весов,
+    поэтому после обновления весов кэш не используется.
+
+    Args:
+        model (nn.Module): Модель
+
+    Returns:
+        str: Шестнадцатеричный отпечаток
+    """
+    hasher = hashlib.sha1()
+    hasher.update(type(model).__name__.encode())
+    hasher.update(torch.__version__.encode())
+
+    for name, tensor in model.state_dict().items():
+        hasher.update(f"{name}:{tuple(tensor.shape)}:{tensor.dtype}".encode())
+        hasher.update(tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy().tobytes())
+
+    return hasher.hexdigest()[:16]
+
+
+def _slice_outputs(output: Any, count: int) -> Any:
+    """Оставляет первые count элементов пакета во всех тензорах выхода модели."""
+    if isinstance(output, torch.Tensor):
+        return output[:count]
+    if isinstance(output, dict):
+        return {key: _slice_outputs(value, count) for key, value in output.items()}
+    if isinstance(output, (list, tuple)):
+        return type(output)(_slice_outputs(value, count) for value in output)
+    return output
+
+
+def _concat_outputs(outputs: List[Any]) -> Any:
+    """Объединяет выходы модели для частей пакета."""
+    first = outputs[0]
+    if isinstance(first, torch.Tensor):
+        return torch.cat(outputs, dim=0)
+    if isinstance(first, dict):
+        return {key: _concat_outputs([output[key] for output in outputs]) for key in first}
+    if isinstance(first, (list, tuple)):
+        return type(first)(_concat_outputs(list(values)) for values in zip(*outputs))
+    return first
+
+
+class CompiledModelCache:
+    """
+    Кэш скомпилированных вариантов модели по формам входа.
+
+    Args:
+        model (nn.Module): Модель колоризации в режиме оценки
+        backend (CompileBackend): Способ компиляции
+        batch_buckets (Sequence[int]): Допустимые размеры пакета
+        cache_dir (str, optional): Директория для сохранения результатов компиляции
+    """
+    def __init__(
+        self,
+        model: nn.Module,
+        backend: CompileBackend = CompileBackend.TRACE,
+        batch_buckets: Sequence[int] = (1, 2, 4, 8),
+        cache_dir: Optional[str] = None
+    ):
+        self.model = model
+        self.backend = backend
+        self.batch_buckets = sorted(set(int(bucket) for bucket in batch_buckets if int(bucket) > 0)) or [1]
+        self.cache_dir = cache_dir
+
+        self._runners: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+        self.stats = {'compiled': 0, 'loaded': 0, 'fallbacks': 0}
+        self.logger = logging.getLogger("CompiledModelCache")
+
+        if cache_dir is not None and backend != CompileBackend.EAGER:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.fingerprint = model_fingerprint(model)
+        else:
+            self.fingerprint = None
+
+        self._compiled_module = None
+        if backend == CompileBackend.COMPILE:
+            self._init_torch_compile()
+
+    def _init_torch_compile(self):
+        """Создает модель torch.compile и загружает сохраненные артефакты компиляции."""
+        # Каждая форма входа компилируется отдельно; лимит перекомпиляций должен их вмещать
+        dynamo_config = torch._dynamo.config
+        limit_name = 'recompile_limit' if hasattr(dynamo_config, 'recompile_limit') else 'cache_size_limit'
+        setattr(dynamo_config, limit_name, max(getattr(dynamo_config, limit_name), 64))
+
+        self._compiled_module = torch.compile(self.model, dynamic=False)
+
+        path = self._artifacts_path()
+        if path is not None and os.path.isfile(path) and hasattr(torch.compiler, 'load_cache_artifacts'):
+            try:
+                with open(path, 'rb') as f:
+                    torch.compiler.load_cache_artifacts(f.read())
+                self.stats['loaded'] += 1
+            except Exception as e:
+                self.logger.warning(f"Не удалось загрузить артефакты torch.compile: {str(e)}")
+
+    def _artifacts_path(self) -> Optional[str]:
+        """Путь к файлу артефактов torch.compile."""
+        if self.fingerprint is None:
+            return None
+        return os.path.join(self.cache_dir, f"compile_{self.fingerprint}.bin")
+
+    def _trace_path(self, key: Tuple) -> Optional[str]:
+        """Путь к файлу трассированной модели для ключа."""
+        if self.fingerprint is None:
+            return None
+        bucket, shape, dtype, variant = key
+        name = f"trace_{self.fingerprint}_{bucket}x{'x'.join(str(size) for size in shape)}_{dtype}"
+        if variant:
+            name += f"_{variant}"
+        return os.path.join(self.cache_dir, f"{name}.pt")
+
+    def bucket_for(self, batch_size: int) -> int:
+        """
+        Возвращает наименьшую корзину, вмещающую пакет.
+
+        Args:
+            batch_size (int): Размер пакета
+
+        Returns:
+            int: Размер пакета после дополнения
+        """
+        for bucket in self.batch_buckets:
+            if bucket >= batch_size:
+                return bucket
+        return self.batch_buckets[-1]
+
+    def __call__(self, x: torch.Tensor, variant: str = '') -> Any:
+        """
+        Выполняет модель через скомпилированный вариант для формы входа.
+
+        Args:
+            x (torch.Tensor): Вход модели [B, C, H, W]
+            variant (str): Дополнительная часть ключа (например, режим точности)
+
+        Returns:
+            Any: Выход модели для исходного размера пакета
+        """
+        batch_size = x.shape[0]
+        largest = self.batch_buckets[-1]
+
+        # Пакеты больше наибольшей корзины обрабатываются частями
+        if batch_size > largest:
+            return _concat_outputs([self(x[start:start + largest], variant) for start in range(0, batch_size, largest)])
+
+        bucket = self.bucket_for(batch_size)
+        if bucket > batch_size:
+            x = torch.cat([x, x[-1:].expand(bucket - batch_size, *x.shape[1:])])
+
+        key = (bucket, tuple(x.shape[1:]), str(x.dtype).replace('torch.', ''), variant)
+        runner = self._get_runner(key, x)
+
+        try:
+            output = runner(x)
+        except Exception as e:
+            if runner is self.model:
+                raise
+            self.logger.warning(f"Скомпилированная модель для {key} не выполнилась, используется eager: {str(e)}")
+            self._runners[key] = self.model
+            self.stats['fallbacks'] += 1
+            output = self.model(x)
+
+        return _slice_outputs(output, batch_size) if bucket > batch_size else output
+
+    def _get_runner(self, key: Tuple, example: torch.Tensor) -> Any:
+        """
+        Возвращает вариант модели для ключа, компилируя или загружая его при первом обращении.
+
+        Args:
+            key (Tuple): Ключ формы входа
+            example (torch.Tensor): Пример входа для трассировки
+
+        Returns:
+            Any: Вызываемый вариант модели
+        """
+        runner = self._runners.get(key)
+        if runner is not None:
+            return runner
+
+        with self._lock:
+            runner = self._runners.get(key)
+            if runner is not None:
+                return runner
+
+            if self.backend == CompileBackend.EAGER:
+                runner = self.model
+            elif self.backend == CompileBackend.COMPILE:
+                # torch.compile компилирует форму при первом вызове
+                runner = self._compiled_module
+                self.stats['compiled'] += 1
+            else:
+                runner = self._trace(key, example)
+
+            self._runners[key] = runner
+            return runner
+
+    def _trace(self, key: Tuple, example: torch.Tensor) -> Any:
+        """
+        Трассирует модель для ключа или загружает сохраненную трассировку.
+
+        Args:
+            key (Tuple): Ключ формы входа
+            example (torch.Tensor): Пример входа
+
+        Returns:
+            Any: Трассированная модель или eager-модель, если трассировка не удалась
+        """
+        path = self._trace_path(key)
+
+        with warnings.catch_warnings():
+            # TorchScript объявлен устаревшим, но остается самым быстрым способом сохранить граф
+            warnings.simplefilter('ignore', FutureWarning)
+            warnings.simplefilter('ignore', torch.jit.TracerWarning)
+
+            if path is not None and os.path.isfile(path):
+                try:
+                    traced = torch.jit.load(path, map_location=example.device)
+                    self.stats['loaded'] += 1
+                    return traced
+                except Exception as e:
+                    self.logger.warning(f"Не удалось загрузить трассировку {path}: {str(e)}")
+
+            try:
+                traced = torch.jit.trace(self.model, example, strict=False, check_trace=False)
+            except Exception as e:
+                self.logger.warning(f"Не удалось трассировать модель для {key}, используется eager: {str(e)}")
+                self.stats['fallbacks'] += 1
+                return self.model
+
+            self.stats['compiled'] += 1
+            if path is not None:
+                try:
+                    torch.jit.save(traced, path)
+                except Exception as e:
+                    self.logger.warning(f"Не удалось сохранить трассировку {path}: {str(e)}")
+
+        return traced
+
+    def persist(self):
+        """Сохраняет артефакты torch.compile для следующих запусков (трассировки сохраняются сразу)."""
+        path = self._artifacts_path()
+        if self.backend != CompileBackend.COMPILE or path is None or not hasattr(torch.compiler, 'save_cache_artifacts'):
+            return
+
+        try:
+            artifacts = torch.compiler.save_cache_artifacts()
+        except Exception as e:
+            self.logger.warning(f"Не удалось получить артефакты torch.compile: {str(e)}")
+            return
+
+        if artifacts is not None:
+            with open(path, 'wb') as f:
+                f.write(artifacts[0])
+
+    def get_stats(self) -> Dict:
+        """
+        Возвращает статистику кэша.
+
+        Returns:
+            Dict: Бэкенд, количество ключей, скомпилированных, загруженных и возвращенных к eager вариантов
+        """
+        return {
+            'backend': self.backend.value,
+            'keys': len(self._runners),
+            **self.stats
+        }
+
+
+def create_compiled_model(model: nn.Module, config: Dict) -> Optional[CompiledModelCache]:
+    """
+    Создает кэш скомпилированных вариантов модели на основе конфигурации.
+
+    Args:
+        model (nn.Module): Модель колоризации
+        config (Dict): Конфигурация (backend, batch_buckets, cache_dir)
+
+    Returns:
+        Optional[CompiledModelCache]: Кэш или None, если компиляция отключена
+    """
+    name = str(config.get('backend', 'none')).lower()
+    if name not in BACKEND_ALIASES:
+        raise ValueError(f"Неизвестный бэкенд компиляции: {name}. Доступные: {list(BACKEND_ALIASES.keys())}")
+
+    backend = BACKEND_ALIASES[name]
+    if backend == CompileBackend.EAGER:
+        return None
+
+    if backend == CompileBackend.COMPILE and not hasattr(torch, 'compile'):
+        logging.warning("torch.compile недоступен, используется TorchScript trace")
+        backend = CompileBackend.TRACE
+
+    return CompiledModelCache(
+        model,
+        backend=backend,
+        batch_buckets=config.get('batch_buckets', [1, 2, 4, 8]),
+        cache_dir=config.get('cache_dir')
+    )
@@ -0,0 +1,385 @@
+"""
+Job Store: Ограниченное персистентное хранилище пакетных заданий колоризации.
+
+Данный модуль хранит состояние пакетных заданий API в SQLite, а входные изображения
+и результаты - в файлах на диске. В памяти процесса остаются только идентификаторы
+заданий, поэтому потребление памяти не растет с количеством обработанных пакетов.
+Завершенные задания удаляются по истечении TTL или при превышении лимита хранимых
+заданий вместе со всеми своими файлами.
+
+Ключевые особенности:
+- Таблицы заданий и результатов в SQLite (переживают перезапуск процесса)
+- Вынос входных изображений и результатов в файлы
+- Удаление завершенных заданий по TTL и по лимиту количества
+- Восстановление незавершенных заданий после перезапуска
+
+Преимущества:
+- Ограниченное потребление памяти процессом API
+- Результаты доступны после перезапуска сервера
+"""
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# Статусы, после которых задание больше не обрабатывается
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+class BatchJobStore:
+    """
+    Хранилище пакетных заданий на основе SQLite и файловой системы.
+
+    Args:
+        root_dir (str): Директория хранилища (база данных и файлы заданий)
+        ttl_seconds (float): Время хранения завершенных заданий в секундах
+        max_completed_jobs (int): Максимальное количество хранимых завершенных заданий
+    """
+    def __init__(
+        self,
+        root_dir: str = "output/api/jobs",
+        ttl_seconds: float = 24 * 3600,
+        max_completed_jobs: int = 1000
+    ):
+        self.root_dir = root_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_completed_jobs = max_completed_jobs
+
+        os.makedirs(self.root_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(
+            os.path.join(self.root_dir, "jobs.sqlite3"),
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        """Создает таблицы заданий и результатов."""
+        with self._lock:
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    params TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 1,
+                    status TEXT NOT NULL,
+                    total_images INTEGER NOT NULL,
+                    processed_images INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    start_time REAL,
+                    end_time REAL
+                );
+                CREATE TABLE IF NOT EXISTS results (
+                    job_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    path TEXT,
+                    error TEXT,
+                    PRIMARY KEY (job_id, idx)
+                );
+                CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, end_time);
+            """)
+
+    def _job_dir(self, job_id: str) -> str:
+        """Возвращает директорию файлов задания."""
+        return os.path.join(self.root_dir, job_id)
+
+    def create_job(self, job_id: str, images: List[Any], params: Dict[str, Any], priority: int = 1) -> None:
+        """
+        Создает задание и сохраняет его входные изображения на диск.
+
+        Args:
+            job_id (str): ID задания
+            images (List[Any]): Изображения (base64-строки, байты, пути к файлам или массивы)
+            params (Dict[str, Any]): Параметры обработки (JSON-сериализуемые)
+            priority (int): Приоритет задания
+        """
+        job_dir = self._job_dir(job_id)
+        os.makedirs(os.path.join(job_dir, "inputs"), exist_ok=True)
+
+        # Входные данные выносим в файлы, в базе хранится только ссылка
+        input_refs = []
+        for i, image in enumerate(images):
+            input_refs.append(self._spill_input(job_dir, i, image))
+
+        params = dict(params, inputs=input_refs)
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO jobs (id, params, priority, status, total_images, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, json.dumps(params), priority, 'pending', len(images), time.time())
+            )
+
+    @staticmethod
+    def _spill_input(job_dir: str, index: int, image: Any) -> Dict[str, str]:
+        """
+        Сохраняет одно входное изображение задания на диск.
+
+        Args:
+            job_dir (str): Директория задания
+            index (int): Индекс изображения
+            image (Any): Изображение
+
+        Returns:
+            Dict[str, str]: Ссылка на сохраненные данные {'kind': ..., 'value': ...}
+        """
+        base_path = os.path.join(job_dir, "inputs", f"{index:05d}")
+
+        if isinstance(image, np.ndarray):
+            np.save(base_path + ".npy", image)
+            return {'kind': 'array', 'value': base_path + ".npy"}
+
+        if isinstance(image, bytes):
+            with open(base_path + ".bin", 'wb') as f:
+                f.write(image)
+            return {'kind': 'bytes', 'value': base_path + ".bin"}
+
+        if isinstance(image, str) and (image.startswith('data:') or not os.path.isfile(image)):
+            with open(base_path + ".txt", 'w') as f:
+                f.write(image)
+            return {'kind': 'text', 'value': base_path + ".txt"}
+
+        # Пути к файлам и URL хранятся как есть
+        return {'kind': 'reference', 'value': str(image)}
+
+    def load_input(self, job_id: str, index: int) -> Any:
+        """
+        Загружает входное изображение задания.
+
+        Args:
+            job_id (str): ID задания
+            index (int): Индекс изображения
+
+        Returns:
+            Any: Изображение в исходном представлении (строка, байты, путь или массив)
+        """
+        ref = self.get_params(job_id)['inputs'][index]
+
+        if ref['kind'] == 'array':
+            return np.load(ref['value'])
+        if ref['kind'] == 'bytes':
+            with open(ref['value'], 'rb') as f:
+                return f.read()
+        if ref['kind'] == 'text':
+            with open(ref['value'], 'r') as f:
+                return f.read()
+
+        return ref['value']
+
+    def get_params(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает параметры задания.
+
+        Args:
+            job_id (str): ID задания
+
+        Returns:
+            Optional[Dict[str, Any]]: Параметры или None, если задание не найдено
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT params FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+        return json.loads(row['params']) if row else None
+
+    def set_status(self, job_id: str, status: str) -> None:
+        """
+        Обновляет статус задания и соответствующие отметки времени.
+
+        Args:
+            job_id (str): ID задания
+            status (str): Новый статус
+        """
+        now = time.time()
+        with self._lock:
+            if status == 'processing':
+                self._connection.execute(
+                    "UPDATE jobs SET status = ?, start_time = COALESCE(start_time, ?) WHERE id = ?",
+                    (status, now, job_id)
+                )
+            elif status in FINAL_STATUSES:
+                self._connection.execute(
+                    "UPDATE jobs SET status = ?, start_time = COALESCE(start_time, ?), end_time = ? WHERE id = ?",
+                    (status, now, now, job_id)
+                )
+            else:
+                self._connection.execute("UPDATE jobs SET status = ? WHERE id = ?", (status, job_id))
+
+    def add_result(self, job_id: str, index: int, data: Optional[bytes] = None,
+                   extension: str = "png", error: Optional[str] = None) -> None:
+        """
+        Сохраняет результат обработки одного изображения.
+
+        Args:
+            job_id (str): ID задания
+            index (int): Индекс изображения
+            data (bytes, optional): Закодированное изображение
+            extension (str): Расширение файла результата
+            error (str, optional): Текст ошибки, если обработка не удалась
+        """
+        path = None
+        if data is not None:
+            results_dir = os.path.join(self._job_dir(job_id), "results")
+            os.makedirs(results_dir, exist_ok=True)
+            path = os.path.join(results_dir, f"{index:05d}.{extension}")
+            with open(path, 'wb') as f:
+                f.write(data)
+
+        with self._lock:
+            # Повторное сохранение результата изображения не увеличивает счетчик повторно
+            previous = self._connection.execute(
+                "SELECT error FROM results WHERE job_id = ? AND idx = ?", (job_id, index)
+            ).fetchone()
+            was_processed = previous is not None and previous[0] is None
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results (job_id, idx, path, error) VALUES (?, ?, ?, ?)",
+                (job_id, index, path, error)
+            )
+            delta = int(error is None) - int(was_processed)
+            if delta:
+                self._connection.execute(
+                    "UPDATE jobs SET processed_images = processed_images + ? WHERE id = ?", (delta, job_id)
+                )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает состояние задания.
+
+        Args:
+            job_id (str): ID задания
+
+        Returns:
+            Optional[Dict[str, Any]]: Состояние задания или None, если оно не найдено
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id, priority, status, total_images, processed_images, created_at, start_time, end_time "
+                "FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            errors = self._connection.execute(
+                "SELECT idx, error FROM results WHERE job_id = ? AND error IS NOT NULL ORDER BY idx", (job_id,)
+            ).fetchall()
+
+        job = dict(row)
+        job['errors'] = [{'index': error['idx'], 'error': error['error']} for error in errors]
+        return job
+
+    def get_results(self, job_id: str) -> List[Dict[str, Any]]:
+        """
+        Возвращает пути к файлам результатов задания.
+
+        Args:
+            job_id (str): ID задания
+
+        Returns:
+            List[Dict[str, Any]]: Результаты {'index', 'path'} в порядке индексов
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT idx, path FROM results WHERE job_id = ? AND path IS NOT NULL ORDER BY idx", (job_id,)
+            ).fetchall()
+
+        return [{'index': row['idx'], 'path': row['path']} for row in rows]
+
+    def get_unfinished_jobs(self) -> List[Tuple[str, int]]:
+        """
+        Возвращает незавершенные задания для повторной постановки в очередь.
+
+        Returns:
+            List[Tuple[str, int]]: Пары (ID задания, приоритет) в порядке создания
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, priority FROM jobs WHERE status NOT IN (?, ?, ?) ORDER BY created_at",
+                FINAL_STATUSES
+            ).fetchall()
+
+        return [(row['id'], row['priority']) for row in rows]
+
+    def count_jobs(self, status: Optional[str] = None) -> int:
+        """
+        Возвращает количество заданий.
+
+        Args:
+            status (str, optional): Учитывать только задания с этим статусом
+
+        Returns:
+            int: Количество заданий
+        """
+        with self._lock:
+            if status is None:
+                row = self._connection.execute("SELECT COUNT(*) FROM jobs").fetchone()
+            else:
+                row = self._connection.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()
+
+        return row[0]
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """
+        Удаляет завершенные задания с истекшим TTL и задания сверх лимита хранения.
+
+        Args:
+            now (float, optional): Текущее время (для тестирования)
+
+        Returns:
+            int: Количество удаленных заданий
+        """
+        now = time.time() if now is None else now
+
+        with self._lock:
+            expired = self._connection.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?, ?) AND end_time < ?",
+                FINAL_STATUSES + (now - self.ttl_seconds,)
+            ).fetchall()
+            job_ids = [row['id'] for row in expired]
+
+            # Сверх лимита удаляем самые старые завершенные задания
+            overflow = self._connection.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?, ?) AND end_time >= ? "
+                "ORDER BY end_time DESC LIMIT -1 OFFSET ?",
+                FINAL_STATUSES + (now - self.ttl_seconds, self.max_completed_jobs)
+            ).fetchall()
+            job_ids.extend(row['id'] for row in overflow)
+
+            for job_id in job_ids:
+                self._connection.execute("DELETE FROM results WHERE job_id = ?", (job_id,))
+                self._connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+        for job_id in job_ids:
+            shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+        return len(job_ids)
+
+    def close(self):
+        """Закрывает соединение с базой данных."""
+        with self._lock:
+            self._connection.close()
+
+
+def create_job_store(config: Dict) -> BatchJobStore:
+    """
+    Создает хранилище заданий на основе конфигурации.
+
+    Args:
+        config (Dict): Конфигурация (path, ttl_hours, max_completed_jobs)
+
+    Returns:
+        BatchJobStore: Хранилище заданий
+    """
+    return BatchJobStore(
+        root_dir=config.get('path', "output/api/jobs"),
+        ttl_seconds=config.get('ttl_hours', 24) * 3600,
+        max_completed_jobs=config.get('max_completed_jobs', 1000)
+    )
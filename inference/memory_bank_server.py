@@ -0,0 +1,597 @@
+"""
+Memory Bank Server: Общий банк памяти для нескольких процессов инференса.
+
+Данный модуль выносит банк памяти в отдельный процесс: сервер владеет единственным
+индексом и хранилищем цветов, а процессы инференса обращаются к нему через Unix-сокет.
+Одновременные запросы разных процессов объединяются планировщиком микропакетов в один
+поиск по индексу. Для работы в одном процессе (и в тестах) предусмотрен локальный
+клиент с тем же интерфейсом, вызывающий сервис напрямую.
+
+Ключевые особенности:
+- Один индекс и одно хранилище цветов на все процессы инференса
+- Объединение одновременных запросов в один вызов поиска
+- Пакетное добавление элементов, обновление качества и удаление
+- Сообщения - архивы .npz с префиксом длины, без pickle
+- Клиенты совместимы с MemoryBank (query, add_item, add_items, save, load, get_stats)
+
+Преимущества:
+- Память банка не растет с количеством процессов инференса
+- Элементы, добавленные одним процессом, сразу доступны остальным
+"""
+
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import torch
+
+from modules.memory_bank import MemoryBank
+from .micro_batching import MicroBatchScheduler
+
+
+# Путь к сокету сервера по умолчанию
+DEFAULT_SOCKET_PATH = '/tmp/tintora_memory_bank.sock'
+
+
+def encode_message(arrays: Dict[str, np.ndarray]) -> bytes:
+    """
+    Упаковывает массивы в сообщение: длина в 8 байт и архив .npz.
+
+    Args:
+        arrays (Dict[str, np.ndarray]): Именованные массивы
+
+    Returns:
+        bytes: Сообщение для передачи
+    """
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    payload = buffer.getvalue()
+    return struct.pack('<Q', len(payload)) + payload
+
+
+def read_message(stream) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Читает сообщение из потока.
+
+    Args:
+        stream: Буферизованный поток для чтения
+
+    Returns:
+        Optional[Dict[str, np.ndarray]]: Массивы сообщения или None, если поток закрыт
+    """
+    prefix = stream.read(8)
+    if len(prefix) < 8:
+        return None
+
+    length = struct.unpack('<Q', prefix)[0]
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+
+    with np.load(io.BytesIO(payload), allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def _encode_metadata(metadata: Union[None, Dict, List[Optional[Dict]]], count: int) -> np.ndarray:
+    """Сериализует метаданные элементов в массив строк JSON."""
+    if metadata is None:
+        return np.array([''] * count)
+    if isinstance(metadata, dict):
+        metadata = [metadata] * count
+    return np.array([json.dumps(value) if value is not None else '' for value in metadata])
+
+
+def _decode_metadata(encoded: np.ndarray) -> Optional[List[Optional[Dict]]]:
+    """Восстанавливает метаданные элементов из массива строк JSON."""
+    values = [json.loads(value) if value else None for value in encoded.tolist()]
+    return values if any(value is not None for value in values) else None
+
+
+def _snapshot_name(filename: str) -> str:
+    """
+    Проверяет имя снимка, полученное от клиента.
+
+    Снимки хранятся только в директории банка (save_dir): абсолютные пути, разделители
+    директорий и специальные имена отклоняются, поскольку сохранение удаляет и
+    перезаписывает директорию снимка.
+
+    Args:
+        filename (str): Имя снимка
+
+    Returns:
+        str: Проверенное имя снимка
+
+    Raises:
+        ValueError: Если имя указывает за пределы директории банка
+    """
+    separators = [sep for sep in (os.sep, os.altsep, '/') if sep]
+    if (not filename or os.path.isabs(filename) or filename in ('.', '..')
+            or any(sep in filename for sep in separators) or '\0' in filename):
+        raise ValueError(f"Недопустимое имя снимка банка памяти: {filename!r}")
+    return filename
+
+
+class MemoryBankService:
+    """
+    Сервис общего банка памяти: обработка запросов и объединение поисков.
+
+    Args:
+        bank (MemoryBank): Банк памяти, которым владеет сервис
+        max_batch_size (int): Максимальное количество запросов, объединяемых в один поиск
+        max_wait_ms (float): Время ожидания одновременных запросов в миллисекундах
+    """
+    def __init__(self, bank: MemoryBank, max_batch_size: int = 64, max_wait_ms: float = 2.0):
+        self.bank = bank
+        self.scheduler = MicroBatchScheduler(
+            self._query_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name="MemoryBankQueries"
+        )
+        self.logger = logging.getLogger("MemoryBankService")
+
+    def handle(self, request: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """
+        Выполняет запрос клиента.
+
+        Args:
+            request (Dict[str, np.ndarray]): Операция ('op') и ее массивы
+
+        Returns:
+            Dict[str, np.ndarray]: Массивы ответа
+        """
+        operation = str(request['op'])
+
+        if operation == 'query':
+            features = np.asarray(request['features'], dtype=np.float32)
+            if features.ndim != 2 or features.shape[1] != self.bank.feature_dim:
+                raise ValueError(
+                    f"Ожидались признаки [N, {self.bank.feature_dim}], получено: {list(features.shape)}"
+                )
+            # Поиск выполняется вместе с одновременными запросами других клиентов
+            return self.scheduler.submit({'features': features, 'k': int(request['k'])}).result()
+
+        if operation == 'add':
+            ids = self.bank.add_items(
+                request['features'],
+                request['colors'],
+                qualities=request['qualities'],
+                metadata=_decode_metadata(request['metadata'])
+            )
+            return {'ids': np.array(ids, dtype=np.int64)}
+
+        if operation == 'update_quality':
+            for item_id, quality in zip(request['ids'].tolist(), request['qualities'].tolist()):
+                self.bank.update_item_quality(item_id, quality)
+            return {}
+
+        if operation == 'remove':
+            return {'removed': np.array(self.bank.remove_items(request['ids'].tolist()))}
+
+        if operation == 'save':
+            filename = str(request['filename'])
+            filename = _snapshot_name(filename) if filename else None
+            self.bank.save(filename, format=str(request['format']))
+            return {}
+
+        if operation == 'load':
+            filename = _snapshot_name(str(request['filename']))
+            return {'loaded': np.array(bool(self.bank.load(filename, read_only=bool(request['read_only']))))}
+
+        if operation == 'stats':
+            stats = self.bank.get_stats()
+            stats['query_batching'] = self.scheduler.get_stats()
+            return {'stats': np.array(json.dumps(stats))}
+
+        raise ValueError(f"Неизвестная операция банка памяти: {operation}")
+
+    def _query_batch(self, requests: List[Dict]) -> List[Dict[str, np.ndarray]]:
+        """
+        Выполняет объединенные запросы одним поиском по банку памяти.
+
+        Args:
+            requests (List[Dict]): Запросы с признаками и количеством соседей
+
+        Returns:
+            List[Dict[str, np.ndarray]]: Ответы в порядке запросов
+        """
+        features = np.concatenate([request['features'] for request in requests])
+        k = max(request['k'] for request in requests)
+
+        result = self.bank.query(torch.from_numpy(features), k=k, return_distances=True)
+        if result is None:
+            return [{'empty': np.array(True)} for _ in requests]
+
+        colors = result['colors'].cpu().numpy()
+        qualities = result['qualities'].cpu().numpy()
+        distances = result['distances'].cpu().numpy()
+        ids = np.asarray(result['ids'], dtype=np.int64)
+
+        responses = []
+        start = 0
+        for request in requests:
+            rows = slice(start, start + request['features'].shape[0])
+            columns = slice(0, request['k'])
+            responses.append({
+                'colors': colors[rows, columns],
+                'qualities': qualities[rows, columns],
+                'distances': distances[rows, columns],
+                'ids': ids[rows, columns]
+            })
+            start = rows.stop
+
+        return responses
+
+    def shutdown(self):
+        """Останавливает планировщик запросов."""
+        self.scheduler.shutdown()
+
+
+class _MemoryBankRequestHandler(socketserver.StreamRequestHandler):
+    """Обработчик соединения клиента: читает запросы, пока клиент не закроет сокет."""
+
+    def handle(self):
+        while True:
+            request = read_message(self.rfile)
+            if request is None:
+                break
+
+            try:
+                response = self.server.service.handle(request)
+            except Exception as e:
+                self.server.service.logger.warning(f"Ошибка при обработке запроса к банку памяти: {str(e)}")
+                response = {'error': np.array(str(e))}
+
+            self.wfile.write(encode_message(response))
+
+
+class MemoryBankServer:
+    """
+    Сервер общего банка памяти на Unix-сокете.
+
+    Каждое соединение обслуживается отдельным потоком, поэтому запросы разных
+    процессов поступают в сервис одновременно и объединяются в один поиск.
+
+    Args:
+        service (MemoryBankService): Сервис банка памяти
+        socket_path (str): Путь к Unix-сокету
+    """
+    def __init__(self, service: MemoryBankService, socket_path: str = DEFAULT_SOCKET_PATH):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError("Unix-сокеты не поддерживаются на этой платформе")
+
+        self.service = service
+        self.socket_path = socket_path
+        self._server = None
+        self._thread = None
+        self.logger = logging.getLogger("MemoryBankServer")
+
+    def start(self):
+        """Открывает сокет и запускает обслуживание соединений в фоновом потоке."""
+        self._bind()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MemoryBankServer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def serve_forever(self):
+        """Открывает сокет и обслуживает соединения в текущем потоке."""
+        self._bind()
+        self._server.serve_forever()
+
+    def _bind(self):
+        """Создает сокет сервера, удаляя файл сокета, оставшийся от прежнего запуска."""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        server = socketserver.ThreadingUnixStreamServer(self.socket_path, _MemoryBankRequestHandler)
+        server.daemon_threads = True
+        server.service = self.service
+        self._server = server
+
+        self.logger.info(f"Сервер банка памяти слушает {self.socket_path}")
+
+    def shutdown(self):
+        """Останавливает сервер и сервис и удаляет файл сокета."""
+        if self._server is not None:
+            if self._thread is not None:
+                self._server.shutdown()
+                self._thread.join(timeout=5.0)
+            self._server.server_close()
+            self._server = None
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        self.service.shutdown()
+
+
+class _MemoryBankClientBase:
+    """
+    Общая часть клиентов банка памяти с интерфейсом MemoryBank.
+
+    Args:
+        device (torch.device, optional): Устройство для тензоров результата
+    """
+    def __init__(self, device: Optional[torch.device] = None):
+        self.device = device if device is not None else torch.device('cpu')
+
+    def _call(self, request: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        raise NotImplementedError
+
+    def query(self, features: torch.Tensor, k: int = 5, return_distances: bool = False) -> Optional[Dict]:
+        """
+        Ищет ближайшие элементы в общем банке памяти (формат результата как у MemoryBank.query).
+
+        Args:
+            features (torch.Tensor): Признаки для поиска [B, feature_dim]
+            k (int): Количество ближайших соседей
+            return_distances (bool): Возвращать ли расстояния
+
+        Returns:
+            Optional[Dict]: Цвета, качества, ID (и расстояния) или None, если банк пуст
+        """
+        response = self._call({
+            'op': np.array('query'),
+            'features': features.detach().cpu().numpy().astype(np.float32, copy=False),
+            'k': np.array(k)
+        })
+        if 'empty' in response:
+            return None
+
+        result = {
+            'colors': torch.from_numpy(np.ascontiguousarray(response['colors'])).to(self.device),
+            'qualities': torch.from_numpy(np.ascontiguousarray(response['qualities'])).to(self.device),
+            'ids': response['ids'].tolist()
+        }
+        if return_distances:
+            result['distances'] = torch.from_numpy(np.ascontiguousarray(response['distances'])).to(self.device)
+
+        return result
+
+    def add_item(self, features: torch.Tensor, color: torch.Tensor, metadata: Optional[Dict] = None,
+                 quality: float = 0.5) -> List[int]:
+        """
+        Добавляет элементы пакета в общий банк памяти.
+
+        Args:
+            features (torch.Tensor): Признаки [B, feature_dim]
+            color (torch.Tensor): Цвет [B, color_channels, H, W]
+            metadata (dict, optional): Метаданные
+            quality (float): Оценка качества (0.0 - 1.0)
+
+        Returns:
+            List[int]: ID добавленных элементов
+        """
+        return self.add_items(features, color, qualities=quality, metadata=metadata)
+
+    def add_items(self, features, colors, qualities=0.5, metadata=None) -> List[int]:
+        """
+        Добавляет в общий банк памяти пакет элементов (аргументы как у MemoryBank.add_items).
+
+        Returns:
+            List[int]: ID добавленных элементов
+        """
+        if isinstance(features, torch.Tensor):
+            features = features.detach().cpu().numpy()
+        if isinstance(colors, torch.Tensor):
+            colors = colors.detach().cpu().numpy()
+        if isinstance(qualities, torch.Tensor):
+            qualities = qualities.detach().cpu().numpy()
+
+        count = len(features)
+        response = self._call({
+            'op': np.array('add'),
+            'features': np.asarray(features, dtype=np.float32),
+            'colors': np.asarray(colors),
+            'qualities': np.broadcast_to(np.asarray(qualities, dtype=np.float32), (count,)),
+            'metadata': _encode_metadata(metadata, count)
+        })
+        return response['ids'].tolist()
+
+    def update_item_quality(self, item_id: int, quality: float):
+        """
+        Обновляет оценку качества элемента.
+
+        Args:
+            item_id (int): ID элемента
+            quality (float): Новая оценка качества
+        """
+        self._call({
+            'op': np.array('update_quality'),
+            'ids': np.array([item_id], dtype=np.int64),
+            'qualities': np.array([quality], dtype=np.float32)
+        })
+
+    def remove_items(self, item_ids) -> int:
+        """
+        Удаляет элементы из общего банка памяти.
+
+        Args:
+            item_ids (Iterable[int]): ID удаляемых элементов
+
+        Returns:
+            int: Количество удаленных элементов
+        """
+        response = self._call({'op': np.array('remove'), 'ids': np.array(list(item_ids), dtype=np.int64)})
+        return int(response['removed'])
+
+    def save(self, filename: Optional[str] = None, format: str = 'binary'):
+        """
+        Сохраняет общий банк памяти на стороне сервера.
+
+        Args:
+            filename (str, optional): Имя снимка в директории банка сервера (без разделителей пути)
+            format (str): Формат сохранения ('binary' или 'json')
+        """
+        self._call({'op': np.array('save'), 'filename': np.array(filename or ''), 'format': np.array(format)})
+
+    def load(self, filename: str, read_only: bool = False) -> bool:
+        """
+        Загружает снимок в общий банк памяти на стороне сервера.
+
+        Args:
+            filename (str): Имя снимка в директории банка сервера
+            read_only (bool): Не записывать изменения в журнал снимка
+
+        Returns:
+            bool: True, если загрузка успешна, иначе False
+        """
+        response = self._call({
+            'op': np.array('load'),
+            'filename': np.array(filename),
+            'read_only': np.array(read_only)
+        })
+        return bool(response['loaded'])
+
+    def get_stats(self) -> Dict:
+        """
+        Возвращает статистики общего банка памяти и объединения запросов.
+
+        Returns:
+            Dict: Статистики
+        """
+        return json.loads(str(self._call({'op': np.array('stats')})['stats']))
+
+
+class LocalMemoryBankClient(_MemoryBankClientBase):
+    """
+    Клиент, вызывающий сервис банка памяти в том же процессе.
+
+    Args:
+        service (MemoryBankService): Сервис банка памяти
+        device (torch.device, optional): Устройство для тензоров результата
+    """
+    def __init__(self, service: MemoryBankService, device: Optional[torch.device] = None):
+        super().__init__(device)
+        self.service = service
+
+    def _call(self, request: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        return self.service.handle(request)
+
+
+class MemoryBankClient(_MemoryBankClientBase):
+    """
+    Клиент сервера банка памяти через Unix-сокет.
+
+    Одно соединение на клиента; запросы из нескольких потоков выполняются по очереди.
+
+    Args:
+        socket_path (str): Путь к Unix-сокету сервера
+        device (torch.device, optional): Устройство для тензоров результата
+        timeout (float, optional): Таймаут операций с сокетом в секундах
+    """
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, device: Optional[torch.device] = None,
+                 timeout: Optional[float] = 30.0):
+        super().__init__(device)
+        self.socket_path = socket_path
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(socket_path)
+        self._reader = self._socket.makefile('rb')
+        self._lock = threading.Lock()
+
+    def _call(self, request: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            self._socket.sendall(encode_message(request))
+            response = read_message(self._reader)
+
+        if response is None:
+            raise ConnectionError(f"Сервер банка памяти закрыл соединение: {self.socket_path}")
+        if 'error' in response:
+            raise RuntimeError(f"Ошибка сервера банка памяти: {str(response['error'])}")
+
+        return response
+
+    def close(self):
+        """Закрывает соединение с сервером."""
+        self._reader.close()
+        self._socket.close()
+
+
+def create_memory_bank_server(config: Dict) -> MemoryBankServer:
+    """
+    Создает сервер общего банка памяти на основе конфигурации.
+
+    Args:
+        config (Dict): Конфигурация банка памяти (feature_dim, max_items, index_type, save_dir,
+            snapshot, compaction_threshold, use_faiss, color_dtype, storage_dtype) и сервера
+            (socket_path, max_batch_size, max_wait_ms)
+
+    Returns:
+        MemoryBankServer: Сервер (не запущен)
+    """
+    bank = MemoryBank(
+        feature_dim=config.get('feature_dim', 512),
+        color_channels=config.get('color_channels', 2),
+        max_items=config.get('max_items', 100000),
+        index_type=config.get('index_type', 'flat'),
+        gpu_id=config.get('gpu_id', -1),
+        save_dir=config.get('save_dir', './data/memory_bank'),
+        compaction_threshold=config.get('compaction_threshold', 0.3),
+        use_faiss=config.get('use_faiss', True),
+        color_dtype=config.get('color_dtype', 'float32'),
+        storage_dtype=config.get('storage_dtype', 'float32')
+    )
+
+    if config.get('snapshot'):
+        bank.load(config['snapshot'])
+
+    service = MemoryBankService(
+        bank,
+        max_batch_size=config.get('max_batch_size', 64),
+        max_wait_ms=config.get('max_wait_ms', 2.0)
+    )
+
+    return MemoryBankServer(service, config.get('socket_path', DEFAULT_SOCKET_PATH))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="TintoraAI Memory Bank Server")
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET_PATH, help="Путь к Unix-сокету")
+    parser.add_argument("--save-dir", type=str, default="./data/memory_bank", help="Директория банка памяти")
+    parser.add_argument("--snapshot", type=str, default=None, help="Снимок банка памяти для загрузки")
+    parser.add_argument("--feature-dim", type=int, default=512, help="Размерность признаков")
+    parser.add_argument("--max-items", type=int, default=100000, help="Максимальное количество элементов")
+    parser.add_argument("--index-type", type=str, default="flat", choices=["flat", "ivf", "hnsw"], help="Тип индекса")
+    parser.add_argument("--color-dtype", type=str, default="float32", choices=["float32", "float16"], help="Тип хранения цветов")
+    parser.add_argument("--storage-dtype", type=str, default="float32", choices=["float32", "float16"],
+                        help="Тип хранения векторов индекса без FAISS")
+    parser.add_argument("--max-batch-size", type=int, default=64, help="Максимум объединяемых запросов")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="Время ожидания одновременных запросов")
+    parser.add_argument("--save-on-exit", action="store_true", help="Сохранить снимок при остановке")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    server = create_memory_bank_server({
+        'socket_path': args.socket,
+        'save_dir': args.save_dir,
+        'snapshot': args.snapshot,
+        'feature_dim': args.feature_dim,
+        'max_items': args.max_items,
+        'index_type': args.index_type,
+        'color_dtype': args.color_dtype,
+        'storage_dtype': args.storage_dtype,
+        'max_batch_size': args.max_batch_size,
+        'max_wait_ms': args.max_wait_ms
+    })
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.save_on_exit:
+            server.service.bank.save(args.snapshot)
+        server.shutdown()
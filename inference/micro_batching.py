@@ -0,0 +1,226 @@
+"""
+Micro Batching: Динамическое объединение одиночных запросов в пакеты.
+
+Данный модуль предоставляет планировщик, который собирает одновременно поступающие
+запросы на колоризацию в течение короткого окна ожидания (или до заполнения пакета),
+выполняет их одним пакетным вызовом модели в рабочем потоке и возвращает каждому
+запросу собственный результат через future.
+
+Ключевые особенности:
+- Ограничение пакета по количеству элементов и по времени ожидания первого элемента
+- Выполнение пакетов в отдельном рабочем потоке, не блокирующем цикл событий
+- Результаты и ошибки доставляются каждому запросу индивидуально; при ошибке всего
+  пакета он делится пополам, пока ошибка не останется только у сбойных элементов
+- Совместимость с asyncio через asyncio.wrap_future
+
+Преимущества:
+- Кратное увеличение загрузки GPU/CPU при большом числе мелких запросов
+- Ограниченная дополнительная задержка, задаваемая конфигурацией
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class MicroBatchScheduler:
+    """
+    Планировщик динамических микропакетов.
+
+    Args:
+        process_batch_fn (Callable): Функция, принимающая список элементов и возвращающая
+            список результатов той же длины (элемент результата может быть исключением)
+        max_batch_size (int): Максимальное количество элементов в пакете
+        max_wait_ms (float): Максимальное время ожидания пополнения пакета в миллисекундах
+        name (str): Имя рабочего потока
+    """
+    def __init__(
+        self,
+        process_batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        name: str = "MicroBatchScheduler"
+    ):
+        if max_batch_size < 1:
+            raise ValueError(f"Размер пакета должен быть положительным, получено: {max_batch_size}")
+
+        self.process_batch_fn = process_batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue = queue.Queue()
+        self._running = True
+
+        # Статистика работы планировщика
+        self.stats = {
+            'batches': 0,
+            'items': 0,
+            'max_batch_size': 0
+        }
+        self._stats_lock = threading.Lock()
+
+        self.logger = logging.getLogger(name)
+
+        self._worker = threading.Thread(target=self._run, name=name)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        """
+        Добавляет элемент в очередь планировщика.
+
+        Args:
+            item (Any): Элемент для обработки
+
+        Returns:
+            Future: Future с результатом обработки элемента
+        """
+        if not self._running:
+            raise RuntimeError("Планировщик микропакетов остановлен")
+
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect_batch(self) -> List[Tuple[Any, Future]]:
+        """
+        Собирает пакет: ждет первый элемент, затем пополняет пакет до лимита или таймаута.
+
+        Returns:
+            List[Tuple[Any, Future]]: Элементы пакета с их future
+        """
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        if first is None:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if entry is None:
+                break
+            batch.append(entry)
+
+        return batch
+
+    def _run(self):
+        """Основной цикл рабочего потока."""
+        while self._running or not self._queue.empty():
+            batch = self._collect_batch()
+            if batch:
+                self._process(batch)
+
+    def _process(self, batch: List[Tuple[Any, Future]]):
+        """
+        Обрабатывает собранный пакет и разрешает future.
+
+        Args:
+            batch (List[Tuple[Any, Future]]): Элементы пакета с их future
+        """
+        # Пропускаем элементы, ожидание которых уже отменено
+        batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        items = [item for item, _ in batch]
+        results = self._process_items(items)
+
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+        with self._stats_lock:
+            self.stats['batches'] += 1
+            self.stats['items'] += len(items)
+            self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(items))
+
+    def _process_items(self, items: List[Any]) -> List[Any]:
+        """
+        Выполняет функцию пакетной обработки, деля пакет пополам при ошибке всего пакета.
+
+        Ошибка одного элемента (например, нехватка памяти на очень большом изображении)
+        таким образом достается только ему, а остальные элементы пакета обрабатываются.
+
+        Args:
+            items (List[Any]): Элементы пакета
+
+        Returns:
+            List[Any]: Результат или исключение для каждого элемента
+        """
+        try:
+            results = self.process_batch_fn(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"Ожидалось {len(items)} результатов, получено: {len(results)}")
+            return results
+        except Exception as e:
+            if len(items) == 1:
+                self.logger.error(f"Ошибка при обработке элемента микропакета: {str(e)}")
+                return [e]
+            self.logger.warning(f"Ошибка при обработке микропакета из {len(items)} элементов, пакет делится: {str(e)}")
+            middle = len(items) // 2
+            return self._process_items(items[:middle]) + self._process_items(items[middle:])
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Возвращает статистику работы планировщика.
+
+        Returns:
+            Dict[str, float]: Количество пакетов, элементов и средний размер пакета
+        """
+        with self._stats_lock:
+            stats = dict(self.stats)
+
+        stats['avg_batch_size'] = stats['items'] / stats['batches'] if stats['batches'] > 0 else 0.0
+        stats['queue_length'] = self._queue.qsize()
+        return stats
+
+    def shutdown(self, timeout: Optional[float] = 5.0):
+        """
+        Останавливает планировщик после обработки уже поставленных элементов.
+
+        Args:
+            timeout (float, optional): Время ожидания завершения рабочего потока
+        """
+        self._running = False
+        self._queue.put(None)
+        if self._worker.is_alive():
+            self._worker.join(timeout=timeout)
+
+
+def create_micro_batch_scheduler(
+    process_batch_fn: Callable[[List[Any]], List[Any]],
+    config: Dict
+) -> Optional[MicroBatchScheduler]:
+    """
+    Создает планировщик микропакетов на основе конфигурации.
+
+    Args:
+        process_batch_fn (Callable): Функция пакетной обработки
+        config (Dict): Конфигурация (enabled, max_batch_size, max_wait_ms)
+
+    Returns:
+        Optional[MicroBatchScheduler]: Планировщик или None, если объединение отключено
+    """
+    if not config.get('enabled', True):
+        return None
+
+    return MicroBatchScheduler(
+        process_batch_fn,
+        max_batch_size=config.get('max_batch_size', 8),
+        max_wait_ms=config.get('max_wait_ms', 10.0)
+    )
@@ -0,0 +1,272 @@
+"""
+ONNX Export: Экспорт модели колоризации в ONNX и выполнение через ONNX Runtime.
+
+Данный модуль экспортирует модель в граф ONNX только для инференса: вместо словаря
+с промежуточными признаками граф возвращает один тензор ab-каналов. Экспортированный
+граф выполняется через ONNX Runtime на CPU, что позволяет обслуживать запросы без
+накладных расходов eager-режима PyTorch.
+
+Ключевые особенности:
+- Граф с одним выходом ab [B, 2, H, W] и динамическим размером пакета
+- Проверка численного соответствия графа исходной модели PyTorch
+- Обертка сессии ONNX Runtime с интерфейсом модели для ColorizationPredictor
+
+Преимущества:
+- Оптимизации графа ONNX Runtime (слияние операций, постоянные веса) на CPU
+- Развертывание без зависимости от версии PyTorch в сервисе инференса
+"""
+
+import os
+import time
+import inspect
+import warnings
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from .precision import compare_outputs
+
+
+# Имена входа и выхода графа ONNX
+ONNX_INPUT_NAME = "grayscale"
+ONNX_OUTPUT_NAME = "ab"
+
+# Версия набора операций ONNX по умолчанию
+DEFAULT_OPSET_VERSION = 17
+
+
+class AbOutputWrapper(nn.Module):
+    """
+    Обертка модели колоризации, возвращающая только ab-каналы.
+
+    Промежуточные признаки (swin_features, vit_features и т.д.) не нужны при
+    инференсе и не попадают в экспортированный граф.
+
+    Args:
+        model (nn.Module): Модель колоризации
+    """
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        output = self.model(x)
+
+        if isinstance(output, dict):
+            output = output.get('colorized', output.get('output'))
+        elif isinstance(output, (tuple, list)):
+            output = output[0]
+
+        if output is None:
+            raise ValueError("Модель не вернула колоризованное изображение")
+
+        # Модели с выходом Lab возвращают ab-каналы без L
+        if output.shape[1] == 3:
+            output = output[:, 1:]
+
+        return output
+
+
+def export_onnx(
+    model: nn.Module,
+    output_path: str,
+    input_size: int = 256,
+    opset_version: int = DEFAULT_OPSET_VERSION,
+    dynamic_batch: bool = True
+) -> str:
+    """
+    Экспортирует модель колоризации в ONNX с одним выходом ab.
+
+    Размер входа фиксируется при экспорте, размер пакета остается динамическим.
+
+    Args:
+        model (nn.Module): Модель колоризации
+        output_path (str): Путь к файлу .onnx
+        input_size (int): Размер входа модели
+        opset_version (int): Версия набора операций ONNX
+        dynamic_batch (bool): Разрешить произвольный размер пакета
+
+    Returns:
+        str: Путь к экспортированному файлу
+    """
+    wrapper = AbOutputWrapper(model)
+    was_training = model.training
+    model.eval()
+
+    device = next(model.parameters()).device
+    example = torch.zeros(1, 1, input_size, input_size, device=device)
+
+    export_kwargs = {
+        'input_names': [ONNX_INPUT_NAME],
+        'output_names': [ONNX_OUTPUT_NAME],
+        'opset_version': opset_version,
+        'do_constant_folding': True
+    }
+    if dynamic_batch:
+        export_kwargs['dynamic_axes'] = {ONNX_INPUT_NAME: {0: 'batch'}, ONNX_OUTPUT_NAME: {0: 'batch'}}
+
+    # Экспорт через трассировку: граф модели не зависит от данных, как и в CompiledModelCache
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs['dynamo'] = False
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        with torch.no_grad(), warnings.catch_warnings():
+            warnings.simplefilter('ignore', FutureWarning)
+            warnings.simplefilter('ignore', DeprecationWarning)
+            warnings.simplefilter('ignore', torch.jit.TracerWarning)
+            torch.onnx.export(wrapper, (example,), output_path, **export_kwargs)
+    finally:
+        model.train(was_training)
+
+    return output_path
+
+
+class OnnxRuntimeModel:
+    """
+    Модель колоризации, выполняемая через сессию ONNX Runtime на CPU.
+
+    Возвращает словарь {'output': ab}, как ColorizerBackbone, поэтому может
+    использоваться ColorizationPredictor вместо модели PyTorch.
+
+    Args:
+        model_path (str): Путь к файлу .onnx, созданному export_onnx
+        intra_op_threads (int): Количество потоков внутри операции (0 - по числу ядер)
+        inter_op_threads (int): Количество потоков между операциями (0 - по умолчанию)
+    """
+    def __init__(self, model_path: str, intra_op_threads: int = 0, inter_op_threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("Для бэкенда onnxruntime требуется библиотека onnxruntime")
+
+        if not os.path.isfile(model_path):
+            raise FileNotFoundError(f"Файл модели ONNX не найден: {model_path}")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+
+        self.model_path = model_path
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Динамические измерения заданы строкой или None
+        self.input_shape = tuple(dim if isinstance(dim, int) else None for dim in model_input.shape)
+        self.output_name = self.session.get_outputs()[0].name
+
+    def accepts(self, x: torch.Tensor) -> bool:
+        """
+        Проверяет, совпадает ли форма входа с формой, зафиксированной при экспорте.
+
+        Args:
+            x (torch.Tensor): Вход модели [B, 1, H, W]
+
+        Returns:
+            bool: True, если граф может обработать вход
+        """
+        if x.dim() != len(self.input_shape):
+            return False
+        return all(expected is None or expected == size for expected, size in zip(self.input_shape, x.shape))
+
+    def __call__(self, x: torch.Tensor) -> Dict[str, torch.Tensor]:
+        """
+        Выполняет граф ONNX.
+
+        Args:
+            x (torch.Tensor): Вход модели [B, 1, H, W]
+
+        Returns:
+            Dict[str, torch.Tensor]: Словарь с ab-каналами 'output' на устройстве входа
+        """
+        inputs = np.ascontiguousarray(x.detach().float().cpu().numpy())
+        ab = self.session.run([self.output_name], {self.input_name: inputs})[0]
+        return {'output': torch.from_numpy(ab).to(x.device)}
+
+
+def check_onnx_parity(
+    model: nn.Module,
+    onnx_path: str,
+    inputs: Optional[torch.Tensor] = None,
+    input_size: int = 256,
+    batch_sizes: Sequence[int] = (1, 2),
+    tolerance: float = 1e-3
+) -> Dict[str, Any]:
+    """
+    Сравнивает выход графа ONNX с выходом модели PyTorch в fp32.
+
+    Args:
+        model (nn.Module): Исходная модель колоризации
+        onnx_path (str): Путь к экспортированному графу
+        inputs (torch.Tensor, optional): Входы для проверки [B, 1, H, W]
+            (по умолчанию случайные входы для каждого размера пакета из batch_sizes)
+        input_size (int): Размер случайных входов
+        batch_sizes (Sequence[int]): Размеры пакета случайных входов
+        tolerance (float): Допустимое среднее абсолютное отклонение ab
+
+    Returns:
+        Dict[str, Any]: Максимальное и среднее отклонение, признак соответствия и время выполнения
+    """
+    runtime_model = OnnxRuntimeModel(onnx_path)
+    wrapper = AbOutputWrapper(model).eval()
+    device = next(model.parameters()).device
+
+    if inputs is not None:
+        batches = [inputs]
+    else:
+        generator = torch.Generator().manual_seed(0)
+        batches = [torch.rand(batch_size, 1, input_size, input_size, generator=generator) for batch_size in batch_sizes]
+
+    reports = []
+    torch_time = 0.0
+    onnx_time = 0.0
+
+    for batch in batches:
+        with torch.inference_mode():
+            start_time = time.time()
+            reference = wrapper(batch.to(device)).float().cpu()
+            torch_time += time.time() - start_time
+
+        start_time = time.time()
+        candidate = runtime_model(batch.cpu())['output']
+        onnx_time += time.time() - start_time
+
+        reports.append(compare_outputs(reference, candidate, tolerance))
+
+    return {
+        'max_abs_error': max(report['max_abs_error'] for report in reports),
+        'mean_abs_error': max(report['mean_abs_error'] for report in reports),
+        'passed': all(report['passed'] for report in reports),
+        'pytorch_time': torch_time,
+        'onnxruntime_time': onnx_time
+    }
+
+
+def create_onnx_runtime_model(backend: str, config: Dict) -> Optional[OnnxRuntimeModel]:
+    """
+    Создает модель ONNX Runtime на основе конфигурации инференса.
+
+    Args:
+        backend (str): Бэкенд инференса (pytorch, onnxruntime)
+        config (Dict): Раздел onnxruntime (model_path, intra_op_threads, inter_op_threads)
+
+    Returns:
+        Optional[OnnxRuntimeModel]: Модель или None, если используется бэкенд PyTorch
+    """
+    backend = str(backend or 'pytorch').lower()
+    if backend == 'pytorch':
+        return None
+    if backend != 'onnxruntime':
+        raise ValueError(f"Неизвестный бэкенд инференса: {backend}. Доступные: ['pytorch', 'onnxruntime']")
+
+    return OnnxRuntimeModel(
+        config.get('model_path', './models/colorizer.onnx'),
+        intra_op_threads=config.get('intra_op_threads', 0),
+        inter_op_threads=config.get('inter_op_threads', 0)
+    )
@@ -0,0 +1,153 @@
+"""
+Precision: Управление точностью вычислений и форматом памяти при инференсе.
+
+Данный модуль определяет режимы точности инференса (fp32, bf16, fp16), создает
+соответствующий контекст автоматического приведения типов (autocast) для устройства,
+переводит сверточные части модели в формат памяти channels_last и проверяет
+соответствие результатов пониженной точности эталонному fp32.
+
+Ключевые особенности:
+- Режимы fp32 / bf16 / fp16 и автоматический выбор по устройству
+- Autocast для CPU (bf16) и CUDA (fp16, bf16)
+- Формат channels_last для FPN и выходной свертки
+- Проверка расхождения с fp32 на эталонном наборе изображений
+
+Преимущества:
+- Повышение пропускной способности без изменения весов модели
+- Контролируемая потеря точности с возможностью возврата к fp32
+"""
+
+import contextlib
+import logging
+from enum import Enum
+from typing import Dict, List, Optional
+
+import torch
+import torch.nn as nn
+
+
+class PrecisionMode(Enum):
+    """Режимы точности вычислений при инференсе."""
+    FP32 = "fp32"  # Полная точность
+    BF16 = "bf16"  # bfloat16 autocast (CPU и современные GPU)
+    FP16 = "fp16"  # float16 autocast (только CUDA)
+
+
+# Синонимы названий режимов, принятые в конфигурациях проекта
+PRECISION_ALIASES = {
+    "fp32": PrecisionMode.FP32,
+    "float32": PrecisionMode.FP32,
+    "bf16": PrecisionMode.BF16,
+    "bfloat16": PrecisionMode.BF16,
+    "fp16": PrecisionMode.FP16,
+    "float16": PrecisionMode.FP16,
+}
+
+# Модули ColorizerBackbone, состоящие в основном из сверток
+CHANNELS_LAST_MODULES = ['fpn_pyramid', 'output_conv']
+
+
+def resolve_precision(name: Optional[str], device: torch.device, mixed_precision: bool = False) -> PrecisionMode:
+    """
+    Определяет режим точности для устройства.
+
+    Args:
+        name (str, optional): Название режима ('fp32', 'bf16', 'fp16', 'auto' или синонимы)
+        device (torch.device): Устройство вычислений
+        mixed_precision (bool): Флаг смешанной точности, используемый при отсутствии явного режима
+
+    Returns:
+        PrecisionMode: Режим точности, поддерживаемый устройством
+    """
+    if name is None:
+        name = "auto" if mixed_precision else "fp32"
+
+    name = str(name).lower()
+    is_cuda = device.type == 'cuda'
+
+    if name == "auto":
+        if not is_cuda:
+            return PrecisionMode.BF16
+        return PrecisionMode.BF16 if torch.cuda.is_bf16_supported() else PrecisionMode.FP16
+
+    if name not in PRECISION_ALIASES:
+        raise ValueError(f"Неизвестный режим точности: {name}. Доступные: {list(PRECISION_ALIASES.keys()) + ['auto']}")
+
+    mode = PRECISION_ALIASES[name]
+
+    # fp16 autocast на CPU не дает выигрыша, используем bf16
+    if mode == PrecisionMode.FP16 and not is_cuda:
+        logging.warning("Режим fp16 недоступен на CPU, используется bf16")
+        return PrecisionMode.BF16
+
+    if mode == PrecisionMode.BF16 and is_cuda and not torch.cuda.is_bf16_supported():
+        logging.warning("Режим bf16 не поддерживается GPU, используется fp16")
+        return PrecisionMode.FP16
+
+    return mode
+
+
+def autocast_context(mode: PrecisionMode, device: torch.device):
+    """
+    Создает контекст автоматического приведения типов.
+
+    Args:
+        mode (PrecisionMode): Режим точности
+        device (torch.device): Устройство вычислений
+
+    Returns:
+        Контекстный менеджер autocast или пустой контекст для fp32
+    """
+    if mode == PrecisionMode.FP32:
+        return contextlib.nullcontext()
+
+    dtype = torch.bfloat16 if mode == PrecisionMode.BF16 else torch.float16
+    device_type = 'cuda' if device.type == 'cuda' else 'cpu'
+
+    return torch.autocast(device_type=device_type, dtype=dtype)
+
+
+def apply_channels_last(model: nn.Module, module_names: Optional[List[str]] = None) -> List[str]:
+    """
+    Переводит сверточные подмодули модели в формат памяти channels_last.
+
+    Args:
+        model (nn.Module): Модель колоризации
+        module_names (List[str], optional): Имена подмодулей (по умолчанию FPN и выходная свертка)
+
+    Returns:
+        List[str]: Имена подмодулей, переведенных в channels_last
+    """
+    converted = []
+
+    for name in module_names or CHANNELS_LAST_MODULES:
+        module = getattr(model, name, None)
+        if isinstance(module, nn.Module):
+            module.to(memory_format=torch.channels_last)
+            converted.append(name)
+
+    return converted
+
+
+def compare_outputs(reference: torch.Tensor, candidate: torch.Tensor, tolerance: float) -> Dict[str, float]:
+    """
+    Сравнивает результат пониженной точности с эталоном fp32.
+
+    Args:
+        reference (torch.Tensor): Эталонный результат fp32
+        candidate (torch.Tensor): Результат пониженной точности
+        tolerance (float): Допустимое среднее абсолютное отклонение
+
+    Returns:
+        Dict[str, float]: Максимальное и среднее абсолютное отклонение и признак соответствия
+    """
+    difference = (reference.float() - candidate.float()).abs()
+
+    max_error = difference.max().item()
+    mean_error = difference.mean().item()
+
+    return {
+        'max_abs_error': max_error,
+        'mean_abs_error': mean_error,
+        'passed': mean_error <= tolerance
+    }
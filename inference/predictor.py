@@ -21,6 +21,7 @@ Predictor: Основной класс для предсказания цвет
 """
 
 import os
+import copy
 import time
 import json
 import logging
@@ -44,6 +45,12 @@ from modules.memory_bank import MemoryBankModule
 from modules.style_transfer import StyleTransferModule
 from modules.uncertainty_estimation import UncertaintyEstimationModule
 from modules.few_shot_adapter import AdaptableColorizer
+from .tiling import create_tiling_engine
+from .upsampling import resize_tensor, upsample_chroma, compose_lab_to_uint8
+from .precision import PrecisionMode, resolve_precision, autocast_context, apply_channels_last, compare_outputs
+from .compilation import create_compiled_model
+from .onnx_export import create_onnx_runtime_model
+from .quantization import quantize_dynamic_int8, quantizable_modules, load_quantized_model
 
 
 class FallbackStrategy(Enum):
@@ -90,7 +97,24 @@ class ColorizationPredictor:
         self.save_comparisons = config.get('save_comparisons', True)
         self.save_uncertainty_maps = config.get('save_uncertainty_maps', False)
         self.fallback_strategy_name = config.get('fallback_strategy', 'default')
-        
+
+        # Параметры инференса могут задаваться на верхнем уровне или в секции 'inference'
+        inference_section = config.get('inference', {})
+        self.inference_options = dict(inference_section) if isinstance(inference_section, dict) else {}
+        self.inference_options.update({key: value for key, value in config.items() if not isinstance(value, dict)})
+
+        # Движок тайлового инференса для больших изображений
+        self.tiling_engine = create_tiling_engine(self.inference_options, model_input_size=self.input_size)
+
+        # Режим формирования результата: масштабирование RGB (по умолчанию) или увеличение
+        # только каналов ab с исходным L ('chroma_upsample', включается в конфигурации)
+        self.output_mode = self.inference_options.get('output_mode', 'resize')
+        self.chroma_upsample_method = self.inference_options.get('chroma_upsample_method', 'bilinear')
+
+        # Вход модели с исходным соотношением сторон (большая сторона равна input_size)
+        self.preserve_aspect_ratio = self.inference_options.get('preserve_aspect_ratio', False)
+        self.size_multiple = self.inference_options.get('size_multiple', 32)
+
         # Устанавливаем стратегию восстановления
         try:
             self.fallback_strategy = FallbackStrategy(self.fallback_strategy_name)
@@ -135,7 +159,113 @@ class ColorizationPredictor:
             self.logger.addHandler(file_handler)
             
         self.logger.setLevel(logging.INFO)
-        self.logger.info(f"Инициализирован ColorizationPredictor с устройством {self.device}")
+
+        # Точность вычислений и формат памяти для сверточных частей модели
+        self.precision = resolve_precision(
+            self.inference_options.get('precision'),
+            self.device,
+            mixed_precision=self.inference_options.get('mixed_precision', False)
+        )
+        if self.inference_options.get('channels_last', False):
+            converted = apply_channels_last(self.model)
+            if converted:
+                self.logger.info(f"Формат channels_last применен к модулям: {converted}")
+
+        # Динамическое INT8-квантование линейных слоев (поддерживается только на CPU).
+        # Квантуется копия модели: переданный объект модели не изменяется
+        self.quantization_config = self.inference_options.get('quantization', config.get('quantization', {})) or {}
+        if self.quantization_config.get('enabled', False):
+            if self.device.type != 'cpu':
+                self.logger.warning(f"Динамическое квантование не поддерживается на {self.device.type}, модель остается в fp32")
+            else:
+                quantized_path = self.quantization_config.get('checkpoint_path')
+                if quantized_path:
+                    # Готовые квантованные веса, созданные scripts/quantize.py
+                    self.model = load_quantized_model(quantized_path, copy.deepcopy(self.model))
+                    self.logger.info(f"Загружена квантованная модель: {quantized_path}")
+                else:
+                    exclude = self.quantization_config.get('exclude', [])
+                    quantized_count = len(quantizable_modules(self.model, exclude))
+                    self.model = quantize_dynamic_int8(self.model, exclude=exclude)
+                    self.logger.info(f"Динамическое INT8-квантование применено к {quantized_count} линейным слоям")
+                # Квантованные слои принимают только активации fp32
+                if self.precision != PrecisionMode.FP32:
+                    self.logger.info(f"Точность {self.precision.value} заменена на fp32 для квантованной модели")
+                    self.precision = PrecisionMode.FP32
+                
+        # Скомпилированные варианты модели по формам входа (None - eager-модель)
+        self.compilation_config = self.inference_options.get('compilation', config.get('compilation', {})) or {}
+        self.compiled_model = create_compiled_model(self.model, self.compilation_config)
+        if self.compiled_model is not None:
+            self.logger.info(f"Компиляция модели: {self.compiled_model.backend.value}, корзины пакетов {self.compiled_model.batch_buckets}")
+
+        # Граф ONNX, выполняемый через ONNX Runtime вместо модели PyTorch (None - бэкенд pytorch)
+        self.backend = self.inference_options.get('backend', 'pytorch')
+        self.onnx_model = create_onnx_runtime_model(
+            self.backend,
+            self.inference_options.get('onnxruntime', config.get('onnxruntime', {})) or {}
+        )
+        if self.onnx_model is not None:
+            self.logger.info(f"Бэкенд инференса onnxruntime: {self.onnx_model.model_path}")
+
+        self.logger.info(f"Инициализирован ColorizationPredictor с устройством {self.device}, точность {self.precision.value}")
+        
+    def warmup(self, sizes: Optional[List[int]] = None, batch_sizes: Optional[List[int]] = None) -> Dict[str, float]:
+        """
+        Прогревает модель на пустых входах настроенных форм.
+        
+        Компилирует (или загружает с диска) варианты модели для всех корзин размера пакета
+        и выделяет память под них, чтобы первый запрос выполнялся с установившейся скоростью.
+        
+        Args:
+            sizes (List[int], optional): Размеры входа (по умолчанию warmup_sizes или input_size)
+            batch_sizes (List[int], optional): Размеры пакета (по умолчанию корзины компиляции)
+            
+        Returns:
+            Dict[str, float]: Время прогрева каждой формы "BxS" в секундах
+        """
+        if sizes is None:
+            sizes = self.compilation_config.get('warmup_sizes', [self.input_size])
+        if batch_sizes is None:
+            batch_sizes = self.compiled_model.batch_buckets if self.compiled_model is not None else \
+                self.compilation_config.get('batch_buckets', [1])
+                
+        timings = {}
+        for size in sizes:
+            for batch_size in batch_sizes:
+                dummy = torch.zeros(batch_size, 1, size, size, device=self.device)
+                start_time = time.time()
+                self._predict_lab(dummy)
+                if self.device.type == 'cuda':
+                    torch.cuda.synchronize(self.device)
+                timings[f"{batch_size}x{size}"] = time.time() - start_time
+                
+        if self.compiled_model is not None:
+            self.compiled_model.persist()
+            
+        self.logger.info(f"Прогрев модели завершен за {sum(timings.values()):.2f} с: {timings}")
+        return timings
+        
+    def _run_model(self, grayscale_tensor: torch.Tensor, precision: Optional[PrecisionMode] = None) -> Any:
+        """
+        Выполняет модель через ONNX Runtime или скомпилированный вариант, если они включены.
+        
+        Входы, форма которых не совпадает с формой экспортированного графа,
+        обрабатываются моделью PyTorch.
+        
+        Args:
+            grayscale_tensor (torch.Tensor): Вход модели [B, 1, H, W]
+            precision (PrecisionMode, optional): Режим точности (по умолчанию self.precision)
+            
+        Returns:
+            Any: Выход модели
+        """
+        precision = precision or self.precision
+        if self.onnx_model is not None and self.onnx_model.accepts(grayscale_tensor):
+            return self.onnx_model(grayscale_tensor)
+        if self.compiled_model is not None:
+            return self.compiled_model(grayscale_tensor, variant=precision.value)
+        return self.model(grayscale_tensor)
         
     def colorize(
         self,
@@ -167,63 +297,34 @@ class ColorizationPredictor:
         start_time = time.time()
         
         try:
-            # Подготавливаем изображение
-            grayscale_tensor, original_size, original_image = self._prepare_image(image)
-            
             # Подготавливаем референсное изображение, если есть
             reference_tensor = None
             if reference_image is not None:
                 reference_tensor, _, _ = self._prepare_image(reference_image, is_reference=True)
-                
-            # Добавляем размерность батча, если нужно
-            if len(grayscale_tensor.shape) == 3:
-                grayscale_tensor = grayscale_tensor.unsqueeze(0)
-            if reference_tensor is not None and len(reference_tensor.shape) == 3:
-                reference_tensor = reference_tensor.unsqueeze(0)
-                
-            # Переносим данные на устройство
-            grayscale_tensor = grayscale_tensor.to(self.device)
-            if reference_tensor is not None:
+                if len(reference_tensor.shape) == 3:
+                    reference_tensor = reference_tensor.unsqueeze(0)
                 reference_tensor = reference_tensor.to(self.device)
-                
+
+            # Загружаем изображение и определяем способ колоризации (тайлы, ab в полном разрешении, RGB)
+            image_np = self._load_image_array(image)
+            original_size = (image_np.shape[0], image_np.shape[1])
+            colorization_path = self._colorization_path(image_np)
+            use_tiling = colorization_path == 'tiled'
+
             # Выполняем колоризацию
-            colorized_tensor, uncertainty_map = self._perform_colorization(
-                grayscale_tensor, reference_tensor, style_name, style_alpha
-            )
-            
-            # Преобразуем результаты в numpy
-            grayscale_np = tensor_to_numpy(grayscale_tensor[0].cpu())
-            colorized_np = tensor_to_numpy(colorized_tensor[0].cpu())
-            
-            # Изменяем размер результата обратно к исходному
-            if original_size != colorized_np.shape[:2]:
-                from skimage.transform import resize
-                colorized_np = resize(
-                    colorized_np,
-                    (original_size[0], original_size[1], colorized_np.shape[2]),
-                    anti_aliasing=True
+            if use_tiling:
+                grayscale_np, colorized_np, uncertainty_np = self._colorize_tiled(
+                    image_np, reference_tensor, style_name, style_alpha
                 )
-                
-                # Нормализуем результат, если нужно
-                if colorized_np.max() > 1.0:
-                    colorized_np = colorized_np / 255.0
-                    
-            # Преобразуем карту неопределенности, если есть
-            uncertainty_np = None
-            if uncertainty_map is not None:
-                uncertainty_np = tensor_to_numpy(uncertainty_map[0].cpu())
-                if uncertainty_np.ndim == 3 and uncertainty_np.shape[2] == 1:
-                    uncertainty_np = uncertainty_np[:, :, 0]
-                    
-                # Изменяем размер карты неопределенности
-                if original_size != uncertainty_np.shape[:2]:
-                    from skimage.transform import resize
-                    uncertainty_np = resize(
-                        uncertainty_np,
-                        (original_size[0], original_size[1]),
-                        anti_aliasing=True
-                    )
-                    
+            elif colorization_path == 'full_resolution':
+                grayscale_np, colorized_np, uncertainty_np = self._colorize_full_resolution(
+                    image_np, reference_tensor, style_name, style_alpha
+                )
+            else:
+                grayscale_np, colorized_np, uncertainty_np = self._colorize_resized(
+                    image_np, reference_tensor, style_name, style_alpha
+                )
+
             # Генерируем имя файла, если не указано
             if output_path is None:
                 timestamp = time.strftime("%Y%m%d-%H%M%S")
@@ -283,7 +384,9 @@ class ColorizationPredictor:
                 "processing_time": time.time() - start_time,
                 "input_size": original_size,
                 "model_used": type(self.model).__name__,
-                "color_space": self.color_space
+                "color_space": self.color_space,
+                "tiled": use_tiling,
+                "output_mode": self.output_mode
             }
             
             # Добавляем метаданные, если предоставлены
@@ -396,6 +499,58 @@ class ColorizationPredictor:
             
         return results
         
+    def predict_arrays(
+        self,
+        images: List[Union[np.ndarray, torch.Tensor, Image.Image]]
+    ) -> List[Dict]:
+        """
+        Колоризует несколько изображений без записи на диск.
+        
+        Каждое изображение обрабатывается тем же способом, что и в colorize() (тайлы,
+        preserve_aspect_ratio, output_mode, стратегии восстановления). Изображения,
+        колоризуемые с увеличением каналов ab, группируются по размеру входа модели,
+        и каждая группа выполняется одним пакетным проходом.
+        
+        Args:
+            images (List[Union[np.ndarray, torch.Tensor, Image.Image]]): Изображения для колоризации
+            
+        Returns:
+            List[Dict]: Для каждого изображения: 'colorized' (uint8 [H, W, 3]), 'grayscale'
+                (канал яркости [H, W] в диапазоне [0, 1]) и 'uncertainty' ([H, W] или None)
+        """
+        image_arrays = [self._load_image_array(image) for image in images]
+        outputs = [None] * len(image_arrays)
+        
+        # Группы изображений с одинаковым размером входа модели
+        groups = {}
+        for i, image_np in enumerate(image_arrays):
+            colorization_path = self._colorization_path(image_np)
+            if colorization_path == 'full_resolution':
+                groups.setdefault(self._model_input_shape(*image_np.shape[:2]), []).append(i)
+            elif colorization_path == 'tiled':
+                outputs[i] = self._colorize_tiled(image_np)
+            else:
+                grayscale_np, colorized_np, uncertainty_np = self._colorize_resized(image_np)
+                outputs[i] = (self._to_grayscale_array(image_np)[:, :, 0], colorized_np, uncertainty_np)
+                
+        for indices in groups.values():
+            group_outputs = self._colorize_full_resolution_batch([image_arrays[i] for i in indices])
+            for i, output in zip(indices, group_outputs):
+                outputs[i] = output
+                
+        results = []
+        for grayscale_np, colorized_np, uncertainty_np in outputs:
+            # Результат RGB в диапазоне [0, 1] приводится к uint8 так же, как при сохранении
+            if colorized_np.dtype != np.uint8:
+                colorized_np = (np.clip(colorized_np, 0.0, 1.0) * 255).round().astype(np.uint8)
+            results.append({
+                'colorized': colorized_np,
+                'grayscale': grayscale_np,
+                'uncertainty': uncertainty_np
+            })
+            
+        return results
+        
     def colorize_directory(
         self,
         input_dir: str,
@@ -525,72 +680,343 @@ class ColorizationPredictor:
             "output_dir": output_dir or self.output_dir
         }
             
-    def _prepare_image(
+    def _colorization_path(self, image_np: np.ndarray) -> str:
+        """
+        Выбирает способ колоризации изображения.
+
+        Args:
+            image_np (np.ndarray): Исходное изображение [H, W] или [H, W, C]
+
+        Returns:
+            str: 'tiled' (тайловый инференс), 'full_resolution' (увеличение каналов ab)
+                или 'resized' (масштабирование результата RGB)
+        """
+        if self.color_space != 'lab':
+            return 'resized'
+        if self.tiling_engine is not None and self.tiling_engine.should_split(image_np.shape[0], image_np.shape[1]):
+            return 'tiled'
+        if self.output_mode == 'chroma_upsample':
+            return 'full_resolution'
+        return 'resized'
+
+    def _colorize_resized(
         self,
-        image: Union[np.ndarray, torch.Tensor, Image.Image],
-        is_reference: bool = False
-    ) -> Tuple[torch.Tensor, Tuple[int, int], np.ndarray]:
+        image_np: np.ndarray,
+        reference_tensor: Optional[torch.Tensor] = None,
+        style_name: Optional[str] = None,
+        style_alpha: Optional[float] = None
+    ) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
         """
-        Подготавливает изображение для колоризации.
-        
+        Колоризует изображение целиком, приводя его к размеру входа модели.
+
+        Args:
+            image_np (np.ndarray): Исходное изображение [H, W] или [H, W, C]
+            reference_tensor (torch.Tensor, optional): Референсное изображение [1, 3, S, S]
+            style_name (str, optional): Имя стиля для применения
+            style_alpha (float, optional): Интенсивность применения стиля
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]: ЧБ изображение, колоризованное
+                изображение в исходном размере и карта неопределенности
+        """
+        original_size = (image_np.shape[0], image_np.shape[1])
+
+        # Подготавливаем изображение
+        grayscale_tensor, _, _ = self._prepare_image(image_np)
+
+        # Добавляем размерность батча, если нужно
+        if len(grayscale_tensor.shape) == 3:
+            grayscale_tensor = grayscale_tensor.unsqueeze(0)
+
+        # Переносим данные на устройство
+        grayscale_tensor = grayscale_tensor.to(self.device)
+
+        # Выполняем колоризацию
+        colorized_tensor, uncertainty_map = self._perform_colorization(
+            grayscale_tensor, reference_tensor, style_name, style_alpha
+        )
+
+        # Преобразуем результаты в numpy
+        grayscale_np = tensor_to_numpy(grayscale_tensor[0].cpu())
+        colorized_np = tensor_to_numpy(colorized_tensor[0].cpu())
+
+        # Изменяем размер результата обратно к исходному
+        if original_size != colorized_np.shape[:2]:
+            from skimage.transform import resize
+            colorized_np = resize(
+                colorized_np,
+                (original_size[0], original_size[1], colorized_np.shape[2]),
+                anti_aliasing=True
+            )
+
+            # Нормализуем результат, если нужно
+            if colorized_np.max() > 1.0:
+                colorized_np = colorized_np / 255.0
+
+        # Преобразуем карту неопределенности, если есть
+        uncertainty_np = None
+        if uncertainty_map is not None:
+            uncertainty_np = tensor_to_numpy(uncertainty_map[0].cpu())
+            if uncertainty_np.ndim == 3 and uncertainty_np.shape[2] == 1:
+                uncertainty_np = uncertainty_np[:, :, 0]
+
+            # Изменяем размер карты неопределенности
+            if original_size != uncertainty_np.shape[:2]:
+                from skimage.transform import resize
+                uncertainty_np = resize(
+                    uncertainty_np,
+                    (original_size[0], original_size[1]),
+                    anti_aliasing=True
+                )
+
+        return grayscale_np, colorized_np, uncertainty_np
+
+    def _colorize_tiled(
+        self,
+        image_np: np.ndarray,
+        reference_tensor: Optional[torch.Tensor] = None,
+        style_name: Optional[str] = None,
+        style_alpha: Optional[float] = None
+    ) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """
+        Колоризует большое изображение по перекрывающимся тайлам.
+
+        Цветовые каналы ab предсказываются для каждого тайла, смешиваются весовым окном
+        в полном разрешении и объединяются с исходным каналом L.
+
+        Args:
+            image_np (np.ndarray): Исходное изображение [H, W] или [H, W, C]
+            reference_tensor (torch.Tensor, optional): Референсное изображение [1, 3, S, S]
+            style_name (str, optional): Имя стиля для применения
+            style_alpha (float, optional): Интенсивность применения стиля
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]: Канал L, колоризованное
+                изображение и карта неопределенности в исходном размере
+        """
+        # Канал L в полном разрешении
+        luminance_np = self._to_grayscale_array(image_np)[:, :, 0].astype(np.float32)
+        luminance = torch.from_numpy(luminance_np).view(1, 1, *luminance_np.shape)
+
+        def predict_tiles(tiles: torch.Tensor) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
+            tiles = tiles.to(self.device)
+            tile_reference = None
+            if reference_tensor is not None:
+                tile_reference = reference_tensor.expand(tiles.shape[0], -1, -1, -1)
+
+            try:
+                lab_tensor, uncertainty_map = self._predict_lab(tiles, tile_reference, style_name, style_alpha)
+                return lab_tensor[:, 1:3], uncertainty_map
+            except Exception as e:
+                # Для проблемных тайлов оставляем изображение без цвета
+                self.logger.error(f"Ошибка при колоризации тайлов: {str(e)}")
+                return torch.zeros((tiles.shape[0], 2) + tiles.shape[2:], device=tiles.device), None
+
+        tiled_result = self.tiling_engine.run(luminance, predict_tiles)
+        self.logger.info(f"Тайловый инференс: {tiled_result['num_tiles']} тайлов для изображения {luminance_np.shape}")
+
+        # Объединяем исходный канал L со смешанными каналами ab
+        colorized_np = compose_lab_to_uint8(luminance, tiled_result['chroma'])[0].cpu().numpy()
+
+        uncertainty_np = None
+        if tiled_result['uncertainty'] is not None:
+            uncertainty_np = tensor_to_numpy(tiled_result['uncertainty'][0])
+
+        return luminance_np, colorized_np, uncertainty_np
+
+    def _colorize_full_resolution(
+        self,
+        image_np: np.ndarray,
+        reference_tensor: Optional[torch.Tensor] = None,
+        style_name: Optional[str] = None,
+        style_alpha: Optional[float] = None
+    ) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """
+        Колоризует изображение, увеличивая до исходного размера только каналы ab.
+
+        Args:
+            image_np (np.ndarray): Исходное изображение [H, W] или [H, W, C]
+            reference_tensor (torch.Tensor, optional): Референсное изображение [1, 3, S, S]
+            style_name (str, optional): Имя стиля для применения
+            style_alpha (float, optional): Интенсивность применения стиля
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]: Канал L, колоризованное
+                изображение uint8 и карта неопределенности в исходном размере
+        """
+        return self._colorize_full_resolution_batch([image_np], reference_tensor, style_name, style_alpha)[0]
+
+    def _colorize_full_resolution_batch(
+        self,
+        image_arrays: List[np.ndarray],
+        reference_tensor: Optional[torch.Tensor] = None,
+        style_name: Optional[str] = None,
+        style_alpha: Optional[float] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]]:
+        """
+        Колоризует изображения одним пакетным проходом, увеличивая до исходного размера только каналы ab.
+
+        Канал L в полном разрешении уменьшается до размера входа модели на устройстве,
+        предсказанные каналы ab увеличиваются обратно (билинейно или управляемым фильтром)
+        и объединяются с исходным каналом L. Результат собирается сразу в uint8.
+        Размер входа модели (_model_input_shape) должен совпадать для всех изображений.
+
+        Args:
+            image_arrays (List[np.ndarray]): Исходные изображения [H, W] или [H, W, C]
+            reference_tensor (torch.Tensor, optional): Референсное изображение [1, 3, S, S]
+            style_name (str, optional): Имя стиля для применения
+            style_alpha (float, optional): Интенсивность применения стиля
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]]: Для каждого изображения
+                канал L, колоризованное изображение uint8 и карта неопределенности в исходном размере
+        """
+        # Каналы L в полном разрешении
+        luminances_np = [self._to_grayscale_array(image_np)[:, :, 0].astype(np.float32) for image_np in image_arrays]
+        luminances = [
+            torch.from_numpy(luminance_np).view(1, 1, *luminance_np.shape).to(self.device)
+            for luminance_np in luminances_np
+        ]
+
+        # Вход модели получаем уменьшением каналов L на устройстве
+        input_shape = self._model_input_shape(*luminances_np[0].shape)
+        grayscale_tensor = torch.cat([resize_tensor(luminance, input_shape) for luminance in luminances], dim=0)
+        if reference_tensor is not None:
+            reference_tensor = reference_tensor.expand(len(luminances), -1, -1, -1)
+
+        try:
+            lab_tensor, uncertainty_map = self._predict_lab(grayscale_tensor, reference_tensor, style_name, style_alpha)
+            chroma = lab_tensor[:, 1:3]
+        except Exception as e:
+            # В случае ошибки возвращаем изображения без цвета
+            self.logger.error(f"Ошибка при колоризации: {str(e)}")
+            chroma = torch.zeros((grayscale_tensor.shape[0], 2) + grayscale_tensor.shape[2:], device=self.device)
+            uncertainty_map = None
+
+        results = []
+        for i, (luminance_np, luminance) in enumerate(zip(luminances_np, luminances)):
+            # Увеличиваем только каналы ab и объединяем их с исходным каналом L
+            upsampled = upsample_chroma(chroma[i:i + 1], luminance, method=self.chroma_upsample_method)
+            colorized_np = compose_lab_to_uint8(luminance, upsampled)[0].cpu().numpy()
+
+            uncertainty_np = None
+            if uncertainty_map is not None:
+                uncertainty_np = resize_tensor(uncertainty_map[i:i + 1, :1].float(), tuple(luminance.shape[-2:]))[0, 0].cpu().numpy()
+
+            results.append((luminance_np, colorized_np, uncertainty_np))
+
+        return results
+
+    def _load_image_array(self, image: Union[np.ndarray, torch.Tensor, Image.Image]) -> np.ndarray:
+        """
+        Преобразует изображение в numpy массив без изменения размера.
+
         Args:
             image (Union[np.ndarray, torch.Tensor, Image.Image]): Исходное изображение
-            is_reference (bool): Является ли изображение референсным
-            
+
         Returns:
-            Tuple[torch.Tensor, Tuple[int, int], np.ndarray]: Подготовленное изображение, исходный размер, исходное изображение
+            np.ndarray: Изображение [H, W] или [H, W, C]
         """
         # Преобразуем в numpy, если нужно
         if isinstance(image, torch.Tensor):
             if image.dim() == 4:  # Пакет изображений [B, C, H, W]
                 image = image.squeeze(0)  # Берем первое изображение [C, H, W]
-                
+
             # Преобразуем в numpy [H, W, C]
             image_np = image.permute(1, 2, 0).cpu().numpy()
-            
+
             # Если значения в диапазоне [0, 1], преобразуем в [0, 255]
             if image_np.max() <= 1.0:
                 image_np = (image_np * 255).astype(np.uint8)
-                
+
         elif isinstance(image, Image.Image):
             # Преобразуем PIL.Image в numpy
             image_np = np.array(image)
         else:
             # Предполагаем, что это уже numpy
             image_np = image.copy()
-            
-        # Сохраняем исходный размер
-        original_size = (image_np.shape[0], image_np.shape[1])
-        
-        # Если это ЧБ изображение и это не референс, преобразуем в RGB
-        if not is_reference and (len(image_np.shape) == 2 or (len(image_np.shape) == 3 and image_np.shape[2] == 1)):
+
+        return image_np
+
+    def _model_input_shape(self, height: int, width: int) -> Tuple[int, int]:
+        """
+        Вычисляет размер входа модели для изображения.
+
+        При preserve_aspect_ratio большая сторона приводится к input_size, меньшая -
+        пропорционально; обе стороны округляются до кратного size_multiple.
+
+        Args:
+            height (int): Высота изображения
+            width (int): Ширина изображения
+
+        Returns:
+            Tuple[int, int]: Высота и ширина входа модели
+        """
+        if not self.preserve_aspect_ratio:
+            return self.input_size, self.input_size
+
+        scale = self.input_size / max(height, width)
+        multiple = self.size_multiple
+        return (
+            max(multiple, int(round(height * scale / multiple)) * multiple),
+            max(multiple, int(round(width * scale / multiple)) * multiple)
+        )
+
+    def _to_grayscale_array(self, image_np: np.ndarray) -> np.ndarray:
+        """
+        Извлекает из изображения канал яркости в исходном разрешении.
+
+        Args:
+            image_np (np.ndarray): Изображение [H, W] или [H, W, C] в диапазоне [0, 255]
+
+        Returns:
+            np.ndarray: Канал яркости [H, W, 1] в диапазоне [0, 1]
+        """
+        # Если это ЧБ изображение, преобразуем в RGB
+        if len(image_np.shape) == 2 or (len(image_np.shape) == 3 and image_np.shape[2] == 1):
             if len(image_np.shape) == 2:
                 image_np = np.stack([image_np] * 3, axis=2)
             else:
                 image_np = np.concatenate([image_np] * 3, axis=2)
-                
-        # Если изображение уже RGB и это не референс, преобразуем в оттенки серого
-        if not is_reference and len(image_np.shape) == 3 and image_np.shape[2] == 3:
-            # Используем только канал L (яркость) в пространстве Lab
-            if self.color_space == 'lab':
-                # Конвертируем в Lab
-                from skimage.color import rgb2lab
-                lab_image = rgb2lab(image_np / 255.0)
-                
-                # Берем только канал L
-                l_channel = lab_image[:, :, 0:1]
-                
-                # Нормализуем в диапазон [0, 1]
-                l_channel = l_channel / 100.0
-                
-                # Заменяем исходное изображение
-                image_np_gray = l_channel
-            else:
-                # Используем взвешенное преобразование в оттенки серого
-                image_np_gray = np.dot(image_np[..., :3], [0.299, 0.587, 0.114]).astype(np.float32) / 255.0
-                image_np_gray = np.expand_dims(image_np_gray, axis=2)
+
+        # Используем только канал L (яркость) в пространстве Lab
+        if self.color_space == 'lab':
+            # Конвертируем в нормализованный Lab (L уже в диапазоне [0, 1])
+            lab_image = ColorSpaceConverter.rgb_to_lab(image_np[..., :3].astype(np.float32) / 255.0)
+
+            # Берем только канал L
+            return lab_image[:, :, 0:1]
+
+        # Используем взвешенное преобразование в оттенки серого
+        image_np_gray = np.dot(image_np[..., :3], [0.299, 0.587, 0.114]).astype(np.float32) / 255.0
+        return np.expand_dims(image_np_gray, axis=2)
+
+    def _prepare_image(
+        self,
+        image: Union[np.ndarray, torch.Tensor, Image.Image],
+        is_reference: bool = False
+    ) -> Tuple[torch.Tensor, Tuple[int, int], np.ndarray]:
+        """
+        Подготавливает изображение для колоризации.
+        
+        Args:
+            image (Union[np.ndarray, torch.Tensor, Image.Image]): Исходное изображение
+            is_reference (bool): Является ли изображение референсным
+            
+        Returns:
+            Tuple[torch.Tensor, Tuple[int, int], np.ndarray]: Подготовленное изображение, исходный размер, исходное изображение
+        """
+        # Преобразуем в numpy, если нужно
+        image_np = self._load_image_array(image)
+            
+        # Сохраняем исходный размер
+        original_size = (image_np.shape[0], image_np.shape[1])
+        
+        if not is_reference:
+            # Для входного изображения оставляем только канал яркости
+            image_np_gray = self._to_grayscale_array(image_np)
         else:
-            # Если изображение уже в оттенках серого или это референс, просто нормализуем
+            # Для референса просто нормализуем
             image_np_gray = image_np.astype(np.float32) / 255.0
             
         # Приводим к нужному размеру для модели
@@ -643,140 +1069,205 @@ class ColorizationPredictor:
         Returns:
             Tuple[torch.Tensor, Optional[torch.Tensor]]: Колоризованное изображение и карта неопределенности
         """
-        with torch.no_grad():
-            try:
-                # Базовое предсказание
-                if isinstance(self.model, nn.Sequential):
-                    # Для последовательной модели
-                    output = grayscale_tensor
-                    for module in self.model:
-                        output = module(output)
-                    
-                    colorized_tensor = output
-                    uncertainty_map = None
-                else:
-                    # Для сложных моделей с разными выходами
-                    output = self.model(grayscale_tensor)
-                    
-                    # Извлекаем колоризованное изображение и карту неопределенности
-                    if isinstance(output, dict):
-                        colorized_tensor = output.get('colorized', output.get('output', None))
-                        uncertainty_map = output.get('uncertainty', None)
-                    elif isinstance(output, tuple) and len(output) >= 2:
-                        colorized_tensor = output[0]
-                        uncertainty_map = output[1] if len(output) > 1 else None
-                    else:
-                        colorized_tensor = output
-                        uncertainty_map = None
-                
-                # Проверка наличия колоризованного изображения
-                if colorized_tensor is None:
-                    raise ValueError("Модель не вернула колоризованное изображение")
-                    
-                # Если выход - словарь с каналами a и b, объединяем их с входным L
-                if isinstance(output, dict) and 'a' in output and 'b' in output:
-                    a_channel = output['a']
-                    b_channel = output['b']
-                    colorized_tensor = torch.cat([grayscale_tensor, a_channel, b_channel], dim=1)
+        try:
+            colorized_tensor, uncertainty_map = self._predict_lab(
+                grayscale_tensor, reference_tensor, style_name, style_alpha
+            )
+            
+            # Преобразуем в RGB, если нужно
+            if self.color_space == 'lab':
+                # Преобразуем Lab в RGB
+                colorized_rgb = self._lab_to_rgb(colorized_tensor)
+                return colorized_rgb, uncertainty_map
+            else:
+                # Для других цветовых пространств просто возвращаем результат
+                return colorized_tensor, uncertainty_map
                 
-                # Применяем стиль, если нужно
-                if self.style_transfer_enabled and self.style_transfer is not None and (reference_tensor is not None or style_name is not None):
-                    # Определяем интенсивность стиля
-                    alpha = style_alpha if style_alpha is not None else self.style_transfer_config.get('alpha', 0.5)
-                    
-                    # Применяем перенос стиля
-                    styled_output = self.style_transfer.apply_style_transfer(
-                        grayscale_tensor,
-                        colorized_tensor,
-                        reference_image=reference_tensor,
-                        style_name=style_name,
-                        alpha=alpha
-                    )
-                    
-                    # Обновляем результат
-                    if isinstance(styled_output, dict) and 'stylized' in styled_output:
-                        colorized_tensor = styled_output['stylized']
-                        
-                # Применяем стратегию восстановления, если нужно
-                if uncertainty_map is not None and torch.any(uncertainty_map > 0.5) and self.fallback_strategy != FallbackStrategy.NONE:
-                    colorized_tensor, uncertainty_map = self._apply_fallback_strategy(
-                        grayscale_tensor, colorized_tensor, uncertainty_map
-                    )
-                    
-                # Если модель выводит только ab каналы, добавляем L-канал
-                if colorized_tensor.shape[1] == 2:
-                    colorized_tensor = torch.cat([grayscale_tensor, colorized_tensor], dim=1)
-                    
-                # Преобразуем в RGB, если нужно
-                if self.color_space == 'lab':
-                    # Проверяем, что выход имеет 3 канала (Lab)
-                    if colorized_tensor.shape[1] != 3:
-                        raise ValueError(f"Ожидается 3 канала для Lab, получено: {colorized_tensor.shape[1]}")
-                        
-                    # Преобразуем Lab в RGB
-                    colorized_rgb = self._lab_to_rgb(colorized_tensor)
-                    return colorized_rgb, uncertainty_map
-                else:
-                    # Для других цветовых пространств просто возвращаем результат
-                    return colorized_tensor, uncertainty_map
-                    
-            except Exception as e:
-                self.logger.error(f"Ошибка в процессе колоризации: {str(e)}")
-                self.logger.error(traceback.format_exc())
+        except Exception as e:
+            self.logger.error(f"Ошибка в процессе колоризации: {str(e)}")
+            self.logger.error(traceback.format_exc())
+            
+            # В случае ошибки возвращаем исходное ЧБ изображение, преобразованное в RGB
+            if grayscale_tensor.shape[1] == 1:
+                rgb_tensor = torch.cat([grayscale_tensor] * 3, dim=1)
+                return rgb_tensor, None
+            else:
+                return grayscale_tensor, None
                 
-                # В случае ошибки возвращаем исходное ЧБ изображение, преобразованное в RGB
-                if grayscale_tensor.shape[1] == 1:
-                    rgb_tensor = torch.cat([grayscale_tensor] * 3, dim=1)
-                    return rgb_tensor, None
-                else:
-                    return grayscale_tensor, None
-                    
-    def _lab_to_rgb(self, lab_tensor: torch.Tensor) -> torch.Tensor:
+    def _predict_lab(
+        self,
+        grayscale_tensor: torch.Tensor,
+        reference_tensor: Optional[torch.Tensor] = None,
+        style_name: Optional[str] = None,
+        style_alpha: Optional[float] = None,
+        precision: Optional[PrecisionMode] = None
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor]]:
         """
-        Преобразует тензор из пространства Lab в RGB.
+        Выполняет предсказание модели с переносом стиля и стратегией восстановления.
         
         Args:
-            lab_tensor (torch.Tensor): Тензор в пространстве Lab [B, 3, H, W]
+            grayscale_tensor (torch.Tensor): Тензор ЧБ изображения [B, 1, H, W]
+            reference_tensor (torch.Tensor, optional): Тензор референсного изображения [B, 3, H, W]
+            style_name (str, optional): Имя стиля для применения
+            style_alpha (float, optional): Интенсивность применения стиля
+            precision (PrecisionMode, optional): Режим точности (по умолчанию self.precision;
+                передается явно, чтобы не изменять состояние, общее с рабочими потоками)
             
         Returns:
-            torch.Tensor: Тензор в пространстве RGB [B, 3, H, W]
+            Tuple[torch.Tensor, Optional[torch.Tensor]]: Результат в цветовом пространстве модели
+                (для Lab - [B, 3, H, W] с входным каналом L) и карта неопределенности
         """
-        # Разделяем каналы
-        l_channel = lab_tensor[:, 0:1, :, :]  # [B, 1, H, W]
-        a_channel = lab_tensor[:, 1:2, :, :]  # [B, 1, H, W]
-        b_channel = lab_tensor[:, 2:3, :, :]  # [B, 1, H, W]
-        
-        # Денормализуем значения
-        # L: [0, 1] -> [0, 100]
-        # a, b: [-1, 1] -> [-128, 127]
-        l_channel = l_channel * 100.0
-        a_channel = a_channel * 127.0
-        b_channel = b_channel * 127.0
+        precision = precision or self.precision
+        with torch.inference_mode(), autocast_context(precision, self.device):
+            # Базовое предсказание
+            if isinstance(self.model, nn.Sequential) and self.compiled_model is None and self.onnx_model is None:
+                # Для последовательной модели
+                output = grayscale_tensor
+                for module in self.model:
+                    output = module(output)
+            
+                colorized_tensor = output
+                uncertainty_map = None
+            else:
+                # Для сложных моделей с разными выходами
+                output = self._run_model(grayscale_tensor, precision)
+            
+                # Извлекаем колоризованное изображение и карту неопределенности
+                if isinstance(output, dict):
+                    colorized_tensor = output.get('colorized', output.get('output', None))
+                    uncertainty_map = output.get('uncertainty', None)
+                elif isinstance(output, tuple) and len(output) >= 2:
+                    colorized_tensor = output[0]
+                    uncertainty_map = output[1] if len(output) > 1 else None
+                else:
+                    colorized_tensor = output
+                    uncertainty_map = None
         
-        # Объединяем каналы
-        lab = torch.cat([l_channel, a_channel, b_channel], dim=1)  # [B, 3, H, W]
+            # Проверка наличия колоризованного изображения
+            if colorized_tensor is None:
+                raise ValueError("Модель не вернула колоризованное изображение")
+            
+            # Если выход - словарь с каналами a и b, объединяем их с входным L
+            if isinstance(output, dict) and 'a' in output and 'b' in output:
+                a_channel = output['a']
+                b_channel = output['b']
+                colorized_tensor = torch.cat([grayscale_tensor, a_channel, b_channel], dim=1)
         
-        # Преобразуем в RGB
-        rgb_list = []
+            # Применяем стиль, если нужно
+            if self.style_transfer_enabled and self.style_transfer is not None and (reference_tensor is not None or style_name is not None):
+                # Определяем интенсивность стиля
+                alpha = style_alpha if style_alpha is not None else self.style_transfer_config.get('alpha', 0.5)
+            
+                # Применяем перенос стиля
+                styled_output = self.style_transfer.apply_style_transfer(
+                    grayscale_tensor,
+                    colorized_tensor,
+                    reference_image=reference_tensor,
+                    style_name=style_name,
+                    alpha=alpha
+                )
+            
+                # Обновляем результат
+                if isinstance(styled_output, dict) and 'stylized' in styled_output:
+                    colorized_tensor = styled_output['stylized']
+                
+            # Применяем стратегию восстановления, если нужно
+            if uncertainty_map is not None and torch.any(uncertainty_map > 0.5) and self.fallback_strategy != FallbackStrategy.NONE:
+                colorized_tensor, uncertainty_map = self._apply_fallback_strategy(
+                    grayscale_tensor, colorized_tensor, uncertainty_map
+                )
+            
+            # Если модель выводит только ab каналы, добавляем L-канал
+            if colorized_tensor.shape[1] == 2:
+                colorized_tensor = torch.cat([grayscale_tensor, colorized_tensor], dim=1)
+            
+            # Проверяем, что выход имеет 3 канала (Lab)
+            if self.color_space == 'lab' and colorized_tensor.shape[1] != 3:
+                raise ValueError(f"Ожидается 3 канала для Lab, получено: {colorized_tensor.shape[1]}")
+                
+            # Пост-обработка выполняется в fp32 независимо от точности модели
+            if uncertainty_map is not None:
+                uncertainty_map = uncertainty_map.float()
+                
+            return colorized_tensor.float(), uncertainty_map
+            
+    def check_precision_parity(
+        self,
+        images: Union[str, List[Union[np.ndarray, torch.Tensor, Image.Image]]],
+        tolerance: Optional[float] = None,
+        fallback_to_fp32: bool = True
+    ) -> Dict:
+        """
+        Сравнивает предсказания в текущем режиме точности с эталоном fp32.
         
-        for i in range(lab.shape[0]):
-            # Извлекаем изображение Lab
-            lab_img = lab[i].permute(1, 2, 0).cpu().numpy()
+        Args:
+            images (Union[str, List]): Эталонный набор изображений или путь к директории с ними
+            tolerance (float, optional): Допустимое среднее абсолютное отклонение в нормализованном Lab
+            fallback_to_fp32 (bool): Переключаться ли на fp32, если проверка не пройдена
+            
+        Returns:
+            Dict: Отчет с отклонениями по каждому изображению и итоговым признаком соответствия
+        """
+        if tolerance is None:
+            tolerance = self.inference_options.get('precision_parity_tolerance', 0.02)
             
-            # Преобразуем Lab в RGB
-            rgb_img = ColorSpaceConverter.lab_to_rgb(lab_img)
+        if isinstance(images, str):
+            extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp']
+            images = [
+                Image.open(path).convert('RGB') for path in sorted(Path(images).iterdir())
+                if path.suffix.lower() in extensions
+            ]
             
-            # Нормализуем в диапазон [0, 1]
-            rgb_img = rgb_img.astype(np.float32) / 255.0
+        precision = self.precision
+        reports = []
+        
+        for image in images:
+            image_np = self._load_image_array(image)
+            luminance_np = self._to_grayscale_array(image_np)[:, :, 0].astype(np.float32)
+            luminance = torch.from_numpy(luminance_np).view(1, 1, *luminance_np.shape).to(self.device)
+            grayscale_tensor = resize_tensor(luminance, (self.input_size, self.input_size))
             
-            # Преобразуем в тензор
-            rgb_tensor = torch.tensor(rgb_img, dtype=torch.float32).permute(2, 0, 1)
-            rgb_list.append(rgb_tensor)
+            candidate, _ = self._predict_lab(grayscale_tensor, precision=precision)
             
-        # Объединяем в пакет
-        rgb_tensor = torch.stack(rgb_list, dim=0).to(lab_tensor.device)
+            # Эталонное предсказание в fp32
+            reference, _ = self._predict_lab(grayscale_tensor, precision=PrecisionMode.FP32)
+                
+            reports.append(compare_outputs(reference, candidate, tolerance))
+            
+        passed = all(report['passed'] for report in reports)
+        summary = {
+            'precision': precision.value,
+            'tolerance': tolerance,
+            'num_images': len(reports),
+            'max_abs_error': max((report['max_abs_error'] for report in reports), default=0.0),
+            'mean_abs_error': float(np.mean([report['mean_abs_error'] for report in reports])) if reports else 0.0,
+            'passed': passed,
+            'per_image': reports
+        }
         
-        return rgb_tensor
+        if not passed and fallback_to_fp32:
+            self.logger.warning(
+                f"Режим точности {precision.value} не прошел проверку соответствия fp32 "
+                f"(среднее отклонение {summary['mean_abs_error']:.4f}), используется fp32"
+            )
+            self.precision = PrecisionMode.FP32
+        else:
+            self.logger.info(f"Проверка точности {precision.value}: среднее отклонение {summary['mean_abs_error']:.4f}")
+            
+        return summary
+                    
+    def _lab_to_rgb(self, lab_tensor: torch.Tensor) -> torch.Tensor:
+        """
+        Преобразует тензор из пространства Lab в RGB.
+        
+        Args:
+            lab_tensor (torch.Tensor): Тензор в пространстве Lab [B, 3, H, W]
+            
+        Returns:
+            torch.Tensor: Тензор в пространстве RGB [B, 3, H, W]
+        """
+        # Преобразование выполняется целиком на устройстве тензора, без цикла по батчу
+        return ColorSpaceConverter.lab_to_rgb_tensor(lab_tensor)
             
     def _apply_fallback_strategy(
         self,
@@ -1051,10 +1542,43 @@ def load_predictor(
             
         except Exception as e:
             logging.warning(f"Не удалось загрузить интеллектуальные модули: {str(e)}")
+            
+    # Подключаем общий банк памяти, если он запущен отдельным процессом
+    server_config = config.get('modules', {}).get('memory_bank', {}).get('server', {})
+    if modules_manager is not None and server_config.get('enabled', False):
+        memory_bank_module = modules_manager.get_module('memory_bank')
+        if memory_bank_module is not None:
+            try:
+                from .memory_bank_server import MemoryBankClient, DEFAULT_SOCKET_PATH
+                client = MemoryBankClient(server_config.get('socket_path', DEFAULT_SOCKET_PATH), device=device)
+                memory_bank_module.use_shared_bank(client)
+            except OSError as e:
+                logging.warning(f"Не удалось подключиться к серверу банка памяти: {str(e)}")
     
     # Создаем предиктор
     predictor = ColorizationPredictor(model, config, modules_manager, device)
     
+    # Пониженная точность используется только после проверки соответствия fp32
+    # на эталонных изображениях; без них предиктор остается в fp32
+    if predictor.precision != PrecisionMode.FP32:
+        parity_images = predictor.inference_options.get('precision_parity_images')
+        if parity_images:
+            predictor.check_precision_parity(parity_images)
+        else:
+            logging.warning(
+                f"Режим точности {predictor.precision.value} требует precision_parity_images "
+                f"для проверки соответствия fp32, используется fp32"
+            )
+            predictor.precision = PrecisionMode.FP32
+    
+    # Прогреваем модель, чтобы первый запрос не оплачивал компиляцию
+    # (по умолчанию только если выбран бэкенд компиляции: прогрев eager-модели не нужен)
+    warmup = predictor.compilation_config.get('warmup')
+    if warmup is None:
+        warmup = predictor.compiled_model is not None
+    if warmup:
+        predictor.warmup()
+    
     return predictor
 
 
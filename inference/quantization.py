@@ -0,0 +1,228 @@
+"""
+Quantization: Динамическое INT8-квантование линейных слоев модели колоризации.
+
+Данный модуль заменяет слои nn.Linear трансформерных частей модели (WindowAttention
+и MLP в Swin, Attention в ViT, CrossAttentionLayer) на динамически квантованные
+аналоги: веса хранятся в int8, активации квантуются на лету при каждом вызове.
+Сверточные части модели остаются в fp32.
+
+Ключевые особенности:
+- Исключение отдельных модулей по именам и шаблонам (fnmatch) из квантования
+- Оценка чувствительности групп модулей к квантованию на реальных входах
+- Сохранение и загрузка квантованных весов вместе со списком исключений
+
+Преимущества:
+- Ускорение матричных умножений на CPU без калибровки и переобучения
+- Уменьшение размера весов линейных слоев в 4 раза
+"""
+
+import io
+import copy
+import fnmatch
+import warnings
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import torch
+import torch.nn as nn
+
+from .precision import compare_outputs
+
+
+# Типы модулей, квантуемые динамически
+QUANTIZABLE_TYPES = (nn.Linear,)
+
+
+def _dynamic_quantization_api():
+    """Возвращает функцию quantize_dynamic и конфигурацию qint8 (модуль объявлен устаревшим в PyTorch)."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        from torch.ao.quantization import quantize_dynamic, default_dynamic_qconfig
+    return quantize_dynamic, default_dynamic_qconfig
+
+
+def _is_excluded(name: str, exclude: Iterable[str]) -> bool:
+    """Проверяет, исключен ли модуль: совпадение с шаблоном или вложенность в исключенный модуль."""
+    for pattern in exclude:
+        if fnmatch.fnmatchcase(name, pattern) or name.startswith(pattern + '.'):
+            return True
+    return False
+
+
+def quantizable_modules(model: nn.Module, exclude: Sequence[str] = ()) -> List[str]:
+    """
+    Возвращает имена модулей, которые будут квантованы.
+
+    Args:
+        model (nn.Module): Модель колоризации
+        exclude (Sequence[str]): Имена или шаблоны исключаемых модулей
+
+    Returns:
+        List[str]: Имена линейных слоев, не попавших в исключения
+    """
+    return [
+        name for name, module in model.named_modules()
+        if isinstance(module, QUANTIZABLE_TYPES) and not _is_excluded(name, exclude)
+    ]
+
+
+def quantization_groups(model: nn.Module, depth: int = 3) -> List[str]:
+    """
+    Группирует квантуемые модули по префиксу имени заданной глубины.
+
+    Например, при depth=3 слои 'swin_unet.layers_down.0.blocks.1.attn.qkv' и
+    'swin_unet.layers_down.0.blocks.0.mlp.fc1' попадают в группу 'swin_unet.layers_down.0'.
+
+    Args:
+        model (nn.Module): Модель колоризации
+        depth (int): Количество компонент имени в префиксе группы
+
+    Returns:
+        List[str]: Префиксы групп в порядке следования модулей
+    """
+    groups = []
+    for name in quantizable_modules(model):
+        prefix = '.'.join(name.split('.')[:depth])
+        if prefix not in groups:
+            groups.append(prefix)
+    return groups
+
+
+def quantize_dynamic_int8(model: nn.Module, exclude: Sequence[str] = (), inplace: bool = False) -> nn.Module:
+    """
+    Квантует линейные слои модели динамически в int8.
+
+    Args:
+        model (nn.Module): Модель колоризации в fp32
+        exclude (Sequence[str]): Имена или шаблоны модулей, остающихся в fp32
+        inplace (bool): Изменить модель на месте вместо копирования
+
+    Returns:
+        nn.Module: Квантованная модель (выполняется только на CPU)
+    """
+    quantize_dynamic, default_dynamic_qconfig = _dynamic_quantization_api()
+
+    if not inplace:
+        model = copy.deepcopy(model)
+    model.cpu().eval()
+
+    names = quantizable_modules(model, exclude)
+    if not names:
+        return model
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        warnings.simplefilter('ignore', UserWarning)
+        return quantize_dynamic(
+            model,
+            qconfig_spec={name: default_dynamic_qconfig for name in names},
+            dtype=torch.qint8,
+            inplace=True
+        )
+
+
+def model_size_bytes(model: nn.Module) -> int:
+    """
+    Вычисляет размер сериализованных весов модели.
+
+    Args:
+        model (nn.Module): Модель
+
+    Returns:
+        int: Размер state_dict в байтах
+    """
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def _ab_output(output):
+    """Извлекает ab-каналы из выхода модели."""
+    if isinstance(output, dict):
+        return output.get('colorized', output.get('output'))
+    if isinstance(output, (tuple, list)):
+        return output[0]
+    return output
+
+
+def quantization_sensitivity(
+    model: nn.Module,
+    inputs: torch.Tensor,
+    groups: Optional[Sequence[str]] = None,
+    tolerance: float = 0.01
+) -> Dict[str, Dict[str, float]]:
+    """
+    Оценивает влияние квантования каждой группы модулей на выход модели.
+
+    Каждая группа квантуется отдельно (остальные модули остаются в fp32), выход
+    сравнивается с выходом модели fp32 на тех же входах.
+
+    Args:
+        model (nn.Module): Модель колоризации в fp32
+        inputs (torch.Tensor): Входы модели [B, 1, H, W]
+        groups (Sequence[str], optional): Префиксы групп (по умолчанию quantization_groups)
+        tolerance (float): Допустимое среднее абсолютное отклонение ab
+
+    Returns:
+        Dict[str, Dict[str, float]]: Отклонения и признак соответствия для каждой группы
+    """
+    model = model.cpu().eval()
+    inputs = inputs.cpu()
+    if groups is None:
+        groups = quantization_groups(model)
+
+    with torch.inference_mode():
+        reference = _ab_output(model(inputs))
+
+    all_modules = quantizable_modules(model)
+    report = {}
+
+    for group in groups:
+        # Исключаем все модули, кроме модулей группы
+        exclude = [name for name in all_modules if not _is_excluded(name, [group])]
+        quantized = quantize_dynamic_int8(model, exclude=exclude)
+
+        with torch.inference_mode():
+            candidate = _ab_output(quantized(inputs))
+
+        report[group] = compare_outputs(reference, candidate, tolerance)
+
+    return report
+
+
+def save_quantized_model(model: nn.Module, path: str, exclude: Sequence[str] = (), extra: Optional[Dict] = None):
+    """
+    Сохраняет квантованные веса и параметры квантования.
+
+    Args:
+        model (nn.Module): Квантованная модель
+        path (str): Путь к файлу
+        exclude (Sequence[str]): Исключения, использованные при квантовании
+        extra (Dict, optional): Дополнительные сведения (исходный чекпоинт, отчет о качестве)
+    """
+    checkpoint = {
+        'quantized_state_dict': model.state_dict(),
+        'quantization': {'mode': 'dynamic_int8', 'exclude': list(exclude)}
+    }
+    if extra:
+        checkpoint.update(extra)
+    torch.save(checkpoint, path)
+
+
+def load_quantized_model(path: str, model: nn.Module) -> nn.Module:
+    """
+    Загружает квантованные веса в модель той же архитектуры.
+
+    Args:
+        path (str): Путь к файлу, созданному save_quantized_model
+        model (nn.Module): Модель fp32 той же архитектуры (веса будут заменены)
+
+    Returns:
+        nn.Module: Квантованная модель с загруженными весами
+    """
+    checkpoint = torch.load(path, map_location='cpu')
+    if 'quantization' not in checkpoint:
+        raise ValueError(f"Файл {path} не содержит квантованной модели")
+
+    quantized = quantize_dynamic_int8(model, exclude=checkpoint['quantization'].get('exclude', []), inplace=True)
+    quantized.load_state_dict(checkpoint['quantized_state_dict'])
+    return quantized
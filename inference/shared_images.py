@@ -0,0 +1,118 @@
+"""
+Shared Images: Передача изображений между процессами через общую память.
+
+Данный модуль упаковывает порцию декодированных изображений в один сегмент
+общей памяти и описывает каждое изображение компактной ссылкой (имя сегмента,
+смещение, форма). Рабочий процесс подключается к сегменту и получает массив
+numpy, отображенный на общую память, без сериализации пикселей и без повторного
+чтения файла с диска.
+
+Ключевые особенности:
+- Один сегмент на порцию изображений вместо отдельного буфера на каждое
+- Выравнивание изображений в сегменте по 64 байтам
+- Кэширование подключений к сегментам в рабочем процессе
+
+Преимущества:
+- Задачи пула процессов не содержат пикселей и сериализуются мгновенно
+- Изображение декодируется один раз, независимо от количества процессов
+"""
+
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# Выравнивание начала каждого изображения в сегменте
+_ALIGNMENT = 64
+
+# Подключенные сегменты в текущем процессе: имя -> SharedMemory
+_attached_segments: Dict[str, SharedMemory] = {}
+
+
+def pack(images: List[np.ndarray]) -> Tuple[SharedMemory, List[Dict]]:
+    """
+    Копирует изображения в новый сегмент общей памяти.
+
+    Args:
+        images (List[np.ndarray]): Изображения для передачи
+
+    Returns:
+        Tuple[SharedMemory, List[Dict]]: Сегмент и ссылки на изображения в нем
+    """
+    refs = []
+    offset = 0
+    for image in images:
+        refs.append({'offset': offset, 'shape': tuple(image.shape), 'dtype': image.dtype.str})
+        offset += (image.nbytes + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+    segment = SharedMemory(create=True, size=max(1, offset))
+
+    for image, ref in zip(images, refs):
+        ref['segment'] = segment.name
+        view = np.ndarray(ref['shape'], dtype=image.dtype, buffer=segment.buf, offset=ref['offset'])
+        view[...] = image
+        del view
+
+    return segment, refs
+
+
+def attach(ref: Dict) -> np.ndarray:
+    """
+    Возвращает изображение, отображенное на сегмент общей памяти.
+
+    При первом обращении к новому сегменту подключения к прежним сегментам закрываются,
+    так как порции изображений обрабатываются по порядку.
+
+    Args:
+        ref (Dict): Ссылка на изображение, созданная pack
+
+    Returns:
+        np.ndarray: Массив, использующий память сегмента (только для чтения)
+    """
+    name = ref['segment']
+    segment = _attached_segments.get(name)
+
+    if segment is None:
+        _close_attached(keep=None)
+        segment = SharedMemory(name=name)
+        _attached_segments[name] = segment
+
+    image = np.ndarray(ref['shape'], dtype=np.dtype(ref['dtype']), buffer=segment.buf, offset=ref['offset'])
+    image.flags.writeable = False
+    return image
+
+
+def _close_attached(keep: Optional[str]) -> None:
+    """
+    Закрывает подключения к сегментам, на которые больше нет ссылок.
+
+    Args:
+        keep (str, optional): Имя сегмента, подключение к которому сохраняется
+    """
+    for name in list(_attached_segments):
+        if name == keep:
+            continue
+        try:
+            _attached_segments[name].close()
+        except BufferError:
+            # На память сегмента еще ссылаются массивы, закроем позже
+            continue
+        del _attached_segments[name]
+
+
+def release(segment: Optional[SharedMemory]) -> None:
+    """
+    Освобождает сегмент общей памяти в создавшем его процессе.
+
+    Args:
+        segment (SharedMemory, optional): Сегмент, созданный pack
+    """
+    if segment is None:
+        return
+
+    segment.close()
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
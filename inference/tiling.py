@@ -0,0 +1,270 @@
+"""
+Tiling: Тайловый инференс для колоризации больших изображений.
+
+Данный модуль предоставляет движок, который разрезает большие изображения (архивные
+сканы, фотографии высокого разрешения) на перекрывающиеся тайлы, прогоняет их через
+модель мини-батчами и собирает результат обратно, сглаживая швы весовым окном.
+
+Ключевые особенности:
+- Разбиение изображения на тайлы с настраиваемым размером и перекрытием
+- Обработка тайлов мини-батчами для ограничения пикового потребления памяти
+- Смешивание швов линейным или гауссовым окном
+- Накопление результатов в полном разрешении исходного изображения
+
+Преимущества:
+- Сохранение детализации цвета на изображениях, значительно превышающих вход модели
+- Предсказуемое потребление памяти независимо от размера изображения
+- Отсутствие видимых границ между тайлами благодаря весовому смешиванию
+"""
+
+import math
+from typing import Dict, List, Tuple, Optional, Callable
+from enum import Enum
+
+import torch
+
+from .upsampling import resize_tensor
+
+
+class BlendingMode(Enum):
+    """Режимы смешивания перекрывающихся тайлов."""
+    LINEAR = "linear"  # Линейное затухание весов в зоне перекрытия
+    GAUSSIAN = "gaussian"  # Гауссово окно с максимумом в центре тайла
+
+
+class TiledInferenceEngine:
+    """
+    Движок тайлового инференса для больших изображений.
+
+    Args:
+        tile_size (int): Максимальный размер тайла в пикселях исходного изображения
+        overlap (int): Перекрытие между соседними тайлами в пикселях
+        model_input_size (int): Размер входа модели, к которому приводится каждый тайл
+        batch_size (int): Количество тайлов в одном мини-батче
+        blending_mode (str): Режим смешивания швов ('linear' или 'gaussian')
+    """
+    def __init__(
+        self,
+        tile_size: int = 1024,
+        overlap: int = 32,
+        model_input_size: int = 256,
+        batch_size: int = 4,
+        blending_mode: str = "linear"
+    ):
+        if tile_size <= 0:
+            raise ValueError(f"Размер тайла должен быть положительным, получено: {tile_size}")
+        if overlap < 0 or overlap >= tile_size:
+            raise ValueError(f"Перекрытие должно быть в диапазоне [0, {tile_size}), получено: {overlap}")
+
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.model_input_size = model_input_size
+        self.batch_size = max(1, batch_size)
+        self.blending_mode = BlendingMode(blending_mode)
+
+        # Кеш весовых окон по размеру тайла и устройству
+        self._window_cache = {}
+
+    def should_split(self, height: int, width: int) -> bool:
+        """
+        Проверяет, нужно ли разбивать изображение на тайлы.
+
+        Args:
+            height (int): Высота изображения
+            width (int): Ширина изображения
+
+        Returns:
+            bool: True, если изображение больше максимального размера тайла
+        """
+        return max(height, width) > self.tile_size
+
+    def compute_tiles(self, height: int, width: int) -> List[Tuple[int, int, int, int]]:
+        """
+        Вычисляет координаты тайлов, покрывающих изображение.
+
+        Args:
+            height (int): Высота изображения
+            width (int): Ширина изображения
+
+        Returns:
+            List[Tuple[int, int, int, int]]: Список координат тайлов (y0, x0, y1, x1)
+        """
+        ys = self._axis_positions(height)
+        xs = self._axis_positions(width)
+
+        tiles = []
+        for y0 in ys:
+            for x0 in xs:
+                tiles.append((y0, x0, min(y0 + self.tile_size, height), min(x0 + self.tile_size, width)))
+
+        return tiles
+
+    def _axis_positions(self, length: int) -> List[int]:
+        """
+        Вычисляет начальные позиции тайлов вдоль одной оси.
+
+        Args:
+            length (int): Длина оси в пикселях
+
+        Returns:
+            List[int]: Начальные позиции тайлов
+        """
+        if length <= self.tile_size:
+            return [0]
+
+        stride = self.tile_size - self.overlap
+        num_tiles = math.ceil((length - self.tile_size) / stride) + 1
+
+        # Последний тайл выравниваем по краю изображения, чтобы все тайлы были полного размера
+        positions = [min(i * stride, length - self.tile_size) for i in range(num_tiles)]
+
+        return sorted(set(positions))
+
+    def get_window(self, height: int, width: int, device: torch.device) -> torch.Tensor:
+        """
+        Возвращает весовое окно для тайла указанного размера.
+
+        Args:
+            height (int): Высота тайла
+            width (int): Ширина тайла
+            device (torch.device): Устройство для окна
+
+        Returns:
+            torch.Tensor: Весовое окно [1, 1, H, W] со строго положительными значениями
+        """
+        key = (height, width, str(device))
+
+        if key not in self._window_cache:
+            window_h = self._window_1d(height)
+            window_w = self._window_1d(width)
+            window = torch.outer(window_h, window_w).view(1, 1, height, width)
+            self._window_cache[key] = window.to(device)
+
+        return self._window_cache[key]
+
+    def _window_1d(self, length: int) -> torch.Tensor:
+        """
+        Создает одномерное весовое окно.
+
+        Args:
+            length (int): Длина окна
+
+        Returns:
+            torch.Tensor: Весовое окно [length]
+        """
+        positions = torch.arange(length, dtype=torch.float32)
+
+        if self.blending_mode == BlendingMode.GAUSSIAN:
+            center = (length - 1) / 2.0
+            sigma = max(length / 4.0, 1.0)
+            window = torch.exp(-((positions - center) ** 2) / (2 * sigma ** 2))
+        else:
+            # Трапеция: линейный рост на ширине перекрытия, затем плато
+            ramp = torch.minimum(positions + 1, length - positions) / (self.overlap + 1)
+            window = torch.clamp(ramp, max=1.0)
+
+        # Окно должно быть строго положительным, чтобы нормализация не делила на ноль
+        return torch.clamp(window, min=1e-3)
+
+    def run(
+        self,
+        luminance: torch.Tensor,
+        predict_fn: Callable[[torch.Tensor], Tuple[torch.Tensor, Optional[torch.Tensor]]]
+    ) -> Dict[str, Optional[torch.Tensor]]:
+        """
+        Выполняет тайловый инференс.
+
+        Args:
+            luminance (torch.Tensor): Канал яркости в полном разрешении [1, 1, H, W]
+            predict_fn (Callable): Функция, принимающая батч тайлов [N, 1, S, S] и
+                возвращающая цветовые каналы [N, C, S, S] и карту неопределенности или None
+
+        Returns:
+            Dict[str, Optional[torch.Tensor]]: {
+                'chroma': Смешанные цветовые каналы [1, C, H, W],
+                'uncertainty': Смешанная карта неопределенности [1, 1, H, W] или None,
+                'num_tiles': Количество обработанных тайлов
+            }
+        """
+        _, _, height, width = luminance.shape
+        device = luminance.device
+        tiles = self.compute_tiles(height, width)
+
+        chroma_sum = None
+        uncertainty_sum = None
+        weight_sum = torch.zeros((1, 1, height, width), dtype=torch.float32, device=device)
+
+        for start in range(0, len(tiles), self.batch_size):
+            batch_coords = tiles[start:start + self.batch_size]
+
+            # Приводим каждый тайл к размеру входа модели
+            batch = torch.cat([
+                self._resize(luminance[:, :, y0:y1, x0:x1], (self.model_input_size, self.model_input_size))
+                for y0, x0, y1, x1 in batch_coords
+            ], dim=0)
+
+            chroma, uncertainty = predict_fn(batch)
+
+            for i, (y0, x0, y1, x1) in enumerate(batch_coords):
+                tile_h, tile_w = y1 - y0, x1 - x0
+                window = self.get_window(tile_h, tile_w, device)
+
+                tile_chroma = self._resize(chroma[i:i + 1].float().to(device), (tile_h, tile_w))
+                if chroma_sum is None:
+                    chroma_sum = torch.zeros((1, tile_chroma.shape[1], height, width), dtype=torch.float32, device=device)
+                chroma_sum[:, :, y0:y1, x0:x1] += tile_chroma * window
+
+                if uncertainty is not None:
+                    tile_uncertainty = self._resize(uncertainty[i:i + 1, :1].float().to(device), (tile_h, tile_w))
+                    if uncertainty_sum is None:
+                        uncertainty_sum = torch.zeros((1, 1, height, width), dtype=torch.float32, device=device)
+                    uncertainty_sum[:, :, y0:y1, x0:x1] += tile_uncertainty * window
+
+                weight_sum[:, :, y0:y1, x0:x1] += window
+
+        chroma = chroma_sum / weight_sum
+        uncertainty = uncertainty_sum / weight_sum if uncertainty_sum is not None else None
+
+        return {
+            'chroma': chroma,
+            'uncertainty': uncertainty,
+            'num_tiles': len(tiles)
+        }
+
+    @staticmethod
+    def _resize(tensor: torch.Tensor, size: Tuple[int, int]) -> torch.Tensor:
+        """
+        Изменяет размер тензора с учетом направления масштабирования.
+
+        Args:
+            tensor (torch.Tensor): Тензор [B, C, H, W]
+            size (Tuple[int, int]): Целевой размер (H, W)
+
+        Returns:
+            torch.Tensor: Тензор нового размера
+        """
+        return resize_tensor(tensor, size)
+
+
+def create_tiling_engine(config: Dict, model_input_size: int = 256) -> Optional[TiledInferenceEngine]:
+    """
+    Создает движок тайлового инференса на основе конфигурации.
+
+    Args:
+        config (Dict): Конфигурация инференса (split_large_images, max_size_per_split, overlap,
+            blending_mode, batch_size)
+        model_input_size (int): Размер входа модели
+
+    Returns:
+        Optional[TiledInferenceEngine]: Движок или None, если разбиение отключено
+    """
+    if not config.get('split_large_images', False):
+        return None
+
+    return TiledInferenceEngine(
+        tile_size=config.get('max_size_per_split', 1024),
+        overlap=config.get('overlap', 32),
+        model_input_size=model_input_size,
+        batch_size=config.get('batch_size', 4),
+        blending_mode=config.get('blending_mode', 'linear')
+    )
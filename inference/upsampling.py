@@ -0,0 +1,158 @@
+"""
+Upsampling: Восстановление цветовых каналов в полном разрешении изображения.
+
+Модель предсказывает каналы ab в разрешении своего входа, тогда как канал L
+доступен в исходном разрешении. Вместо масштабирования готового RGB-результата
+данный модуль увеличивает только каналы ab непосредственно на устройстве и
+объединяет их с исходным каналом L, сохраняя всю детализацию яркости.
+
+Ключевые особенности:
+- Билинейное увеличение каналов ab на устройстве вычислений
+- Быстрый управляемый фильтр (guided filter), выравнивающий границы цвета по каналу L
+- Сборка итогового изображения сразу в uint8 без промежуточных float64-массивов
+
+Преимущества:
+- Кратное сокращение времени на пост-обработку больших изображений
+- Более резкий результат за счет исходного канала яркости
+"""
+
+from typing import Tuple
+
+import torch
+import torch.nn.functional as F
+
+from utils.color_conversion import lab_to_rgb_tensor
+
+
+# Поддерживаемые методы увеличения каналов ab
+CHROMA_UPSAMPLE_METHODS = ['bilinear', 'guided']
+
+
+def resize_tensor(tensor: torch.Tensor, size: Tuple[int, int]) -> torch.Tensor:
+    """
+    Изменяет размер тензора с учетом направления масштабирования.
+
+    Args:
+        tensor (torch.Tensor): Тензор [B, C, H, W]
+        size (Tuple[int, int]): Целевой размер (H, W)
+
+    Returns:
+        torch.Tensor: Тензор нового размера
+    """
+    if tuple(tensor.shape[-2:]) == tuple(size):
+        return tensor
+
+    # При уменьшении используем усреднение по площади, чтобы избежать алиасинга
+    if tensor.shape[-2] >= size[0] and tensor.shape[-1] >= size[1]:
+        return F.interpolate(tensor, size=size, mode='area')
+
+    return F.interpolate(tensor, size=size, mode='bilinear', align_corners=False)
+
+
+def box_filter(tensor: torch.Tensor, radius: int) -> torch.Tensor:
+    """
+    Усредняет тензор в квадратном окне со стороной 2 * radius + 1.
+
+    Args:
+        tensor (torch.Tensor): Тензор [B, C, H, W]
+        radius (int): Радиус окна
+
+    Returns:
+        torch.Tensor: Сглаженный тензор того же размера
+    """
+    kernel_size = 2 * radius + 1
+    return F.avg_pool2d(tensor, kernel_size, stride=1, padding=radius, count_include_pad=False)
+
+
+def guided_upsample(
+    source: torch.Tensor,
+    guide_low: torch.Tensor,
+    guide_high: torch.Tensor,
+    radius: int = 2,
+    eps: float = 1e-4
+) -> torch.Tensor:
+    """
+    Увеличивает тензор быстрым управляемым фильтром.
+
+    Коэффициенты линейной модели source ~ A * guide + b оцениваются в низком разрешении,
+    затем билинейно увеличиваются и применяются к направляющему каналу полного разрешения.
+
+    Args:
+        source (torch.Tensor): Увеличиваемый тензор [B, C, h, w]
+        guide_low (torch.Tensor): Направляющий канал в низком разрешении [B, 1, h, w]
+        guide_high (torch.Tensor): Направляющий канал в полном разрешении [B, 1, H, W]
+        radius (int): Радиус окна фильтра в пикселях низкого разрешения
+        eps (float): Регуляризация, ограничивающая перенос текстуры из направляющего канала
+
+    Returns:
+        torch.Tensor: Увеличенный тензор [B, C, H, W]
+    """
+    radius = max(0, min(radius, (min(source.shape[-2:]) - 1) // 2))
+
+    mean_guide = box_filter(guide_low, radius)
+    mean_source = box_filter(source, radius)
+    covariance = box_filter(guide_low * source, radius) - mean_guide * mean_source
+    variance = box_filter(guide_low * guide_low, radius) - mean_guide * mean_guide
+
+    coefficient_a = covariance / (variance + eps)
+    coefficient_b = mean_source - coefficient_a * mean_guide
+
+    # Сглаживаем коэффициенты и переносим их в полное разрешение
+    size = tuple(guide_high.shape[-2:])
+    coefficient_a = F.interpolate(box_filter(coefficient_a, radius), size=size, mode='bilinear', align_corners=False)
+    coefficient_b = F.interpolate(box_filter(coefficient_b, radius), size=size, mode='bilinear', align_corners=False)
+
+    return coefficient_a * guide_high + coefficient_b
+
+
+def upsample_chroma(
+    chroma: torch.Tensor,
+    luminance: torch.Tensor,
+    method: str = 'bilinear',
+    radius: int = 2,
+    eps: float = 1e-4
+) -> torch.Tensor:
+    """
+    Увеличивает каналы ab до разрешения канала L.
+
+    Args:
+        chroma (torch.Tensor): Предсказанные каналы ab [B, 2, h, w]
+        luminance (torch.Tensor): Канал L в полном разрешении [B, 1, H, W]
+        method (str): Метод увеличения ('bilinear' или 'guided')
+        radius (int): Радиус окна управляемого фильтра
+        eps (float): Регуляризация управляемого фильтра
+
+    Returns:
+        torch.Tensor: Каналы ab [B, 2, H, W]
+    """
+    if method not in CHROMA_UPSAMPLE_METHODS:
+        raise ValueError(f"Неизвестный метод увеличения цвета: {method}. Доступные: {CHROMA_UPSAMPLE_METHODS}")
+
+    size = tuple(luminance.shape[-2:])
+    chroma = chroma.float()
+
+    if tuple(chroma.shape[-2:]) == size:
+        return chroma
+
+    if method == 'guided':
+        guide_low = resize_tensor(luminance.float(), tuple(chroma.shape[-2:]))
+        return guided_upsample(chroma, guide_low, luminance.float(), radius=radius, eps=eps)
+
+    return F.interpolate(chroma, size=size, mode='bilinear', align_corners=False)
+
+
+def compose_lab_to_uint8(luminance: torch.Tensor, chroma: torch.Tensor) -> torch.Tensor:
+    """
+    Объединяет канал L и каналы ab и преобразует результат в RGB uint8.
+
+    Args:
+        luminance (torch.Tensor): Канал L [B, 1, H, W] в диапазоне [0, 1]
+        chroma (torch.Tensor): Каналы ab [B, 2, H, W] в диапазоне [-1, 1]
+
+    Returns:
+        torch.Tensor: RGB-изображения uint8 [B, H, W, 3] на устройстве входа
+    """
+    lab = torch.cat([luminance.float(), chroma.float()], dim=1)
+    rgb = lab_to_rgb_tensor(lab, normalized=True)
+
+    return (rgb * 255.0).round_().to(torch.uint8).permute(0, 2, 3, 1)
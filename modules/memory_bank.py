@@ -24,25 +24,53 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
-from collections import defaultdict, OrderedDict, deque
+from collections import defaultdict, deque
+import io
 import os
 import time
 import json
+import shutil
+import struct
+import threading
 from typing import Dict, List, Tuple, Union, Optional
 from datetime import datetime
 
 
+# Формат снимка банка памяти: заголовок, журнал изменений и метка начала журнала
+SNAPSHOT_HEADER = 'header.json'
+SNAPSHOT_METADATA = 'metadata.json'
+SNAPSHOT_INDEX = 'index'
+SNAPSHOT_NORMS = 'norms.npy'
+SNAPSHOT_INDEX_VECTORS = 'index_vectors.npy'
+SNAPSHOT_DELTA = 'delta.log'
+SNAPSHOT_VERSION = 1
+DELTA_MAGIC = b'TNTDELT1'
+DELTA_HEADER_SIZE = len(DELTA_MAGIC) + 8
+
+
 class FaissIndexWrapper:
     """
     Обертка для индекса FAISS для векторного поиска ближайших соседей.
     
+    При отсутствии FAISS используется собственная реализация: векторы хранятся в одной
+    непрерывной предвыделенной матрице с параллельным массивом ID, поиск выполняется
+    для всех запросов сразу блочным матричным умножением, удаление помечает строки
+    как удаленные. Как и IndexFlatL2, поиск возвращает квадраты L2-расстояний.
+    
     Args:
         dim (int): Размерность векторов
         index_type (str): Тип индекса FAISS ('flat', 'ivf', 'hnsw')
         gpu_id (int): ID GPU для использования или -1 для CPU
         max_items (int): Максимальное количество элементов в индексе
+        storage_dtype (str): Тип хранения векторов без FAISS ('float32' или 'float16')
+        use_faiss (bool): Использовать ли FAISS, если он установлен
     """
-    def __init__(self, dim=512, index_type='flat', gpu_id=-1, max_items=1000000):
+    # Начальная емкость матрицы и количество строк, обрабатываемых за одно умножение
+    initial_capacity = 1024
+    search_chunk_size = 65536
+    
+    def __init__(self, dim=512, index_type='flat', gpu_id=-1, max_items=1000000, storage_dtype='float32',
+                 use_faiss=True):
         self.dim = dim
         self.index_type = index_type
         self.gpu_id = gpu_id
@@ -50,14 +78,21 @@ class FaissIndexWrapper:
         self.is_gpu = False
         self.needs_training = False
         
+        if storage_dtype not in ('float32', 'float16'):
+            raise ValueError(f"Неподдерживаемый тип хранения векторов: {storage_dtype}")
+        self.storage_dtype = np.dtype(storage_dtype)
+        
         # Попытка импортировать FAISS
         try:
+            if not use_faiss:
+                raise ImportError
             import faiss
             self.faiss = faiss
             self.has_faiss = True
             self.create_index()
         except ImportError:
-            print("FAISS не установлен. Используем альтернативную реализацию на основе PyTorch.")
+            if use_faiss:
+                print("FAISS не установлен. Используем альтернативную реализацию на основе PyTorch.")
             self.has_faiss = False
             self.create_pytorch_index()
         
@@ -68,9 +103,18 @@ class FaissIndexWrapper:
         if not self.has_faiss:
             return self.create_pytorch_index()
             
+        # ID задаются банком памяти; для HNSW удаление заменяется пометками
+        self.supports_remove = self.index_type != 'hnsw'
+        self.deleted_ids = set()
+        
+        # Векторы, ожидающие обучения индекса IVF, и их количество, достаточное для обучения
+        self.pending_vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self.pending_ids = np.zeros(0, dtype=np.int64)
+        self.train_size = 0
+        
         if self.index_type == 'flat':
-            # Простой плоский индекс, точный поиск
-            self.index = self.faiss.IndexFlatL2(self.dim)
+            # Простой плоский индекс, точный поиск (IndexIDMap для собственных ID и удаления)
+            self.index = self.faiss.IndexIDMap(self.faiss.IndexFlatL2(self.dim))
         elif self.index_type == 'ivf':
             # IVF индекс для более быстрого поиска
             quantizer = self.faiss.IndexFlatL2(self.dim)
@@ -78,11 +122,14 @@ class FaissIndexWrapper:
             self.index = self.faiss.IndexIVFFlat(quantizer, self.dim, nlist, self.faiss.METRIC_L2)
             self.index.nprobe = 256  # Количество ячеек для проверки при поиске
             self.needs_training = True
+            # Кластеризация требует не меньше векторов, чем центроидов
+            self.train_size = max(1000, nlist)
         elif self.index_type == 'hnsw':
             # HNSW индекс для еще более быстрого поиска
-            self.index = self.faiss.IndexHNSWFlat(self.dim, 32)  # 32 соседа на уровень
-            self.index.hnsw.efConstruction = 40  # Больше - точнее, но медленнее
-            self.index.hnsw.efSearch = 64
+            hnsw_index = self.faiss.IndexHNSWFlat(self.dim, 32)  # 32 соседа на уровень
+            hnsw_index.hnsw.efConstruction = 40  # Больше - точнее, но медленнее
+            hnsw_index.hnsw.efSearch = 64
+            self.index = self.faiss.IndexIDMap(hnsw_index)
         else:
             raise ValueError(f"Неподдерживаемый тип индекса: {self.index_type}")
         
@@ -99,9 +146,211 @@ class FaissIndexWrapper:
     def create_pytorch_index(self):
         """
         Создает простую альтернативу FAISS на основе PyTorch.
+        
+        Векторы хранятся в непрерывной матрице [capacity, dim], рядом хранятся ID,
+        квадраты норм строк и маска живых строк.
+        """
+        self._allocate(self.initial_capacity)
+        self.ntotal = 0  # Количество занятых строк, включая удаленные
+        self.num_deleted = 0
+        self.id_to_row = {}
+        
+    def _allocate(self, capacity):
+        """
+        Выделяет матрицу векторов заданной емкости, сохраняя занятые строки.
+        
+        Args:
+            capacity (int): Новая емкость в строках
         """
-        self.vectors = []
-        self.ids = []
+        used = getattr(self, 'ntotal', 0)
+        
+        vectors = np.zeros((capacity, self.dim), dtype=self.storage_dtype)
+        ids = np.full(capacity, -1, dtype=np.int64)
+        norms = np.zeros(capacity, dtype=np.float32)
+        alive = np.zeros(capacity, dtype=bool)
+        
+        if used > 0:
+            vectors[:used] = self.vectors[:used]
+            ids[:used] = self.ids[:used]
+            norms[:used] = self.norms[:used]
+            alive[:used] = self.alive[:used]
+            
+        self.vectors = vectors
+        self.ids = ids
+        self.norms = norms
+        self.alive = alive
+        
+    def _add_pytorch(self, vectors, ids):
+        """
+        Добавляет векторы в матрицу без FAISS.
+        
+        Args:
+            vectors (np.ndarray): Массив векторов [N, dim]
+            ids (np.ndarray, optional): ID для векторов
+        """
+        count = vectors.shape[0]
+        
+        if ids is None:
+            ids = np.arange(self.ntotal, self.ntotal + count)
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        
+        # Повторно добавленный ID заменяет прежний вектор
+        self.remove_ids(ids)
+        
+        # Увеличиваем емкость вдвое, пока новые строки не поместятся
+        required = self.ntotal + count
+        if required > self.vectors.shape[0]:
+            capacity = self.vectors.shape[0]
+            while capacity < required:
+                capacity *= 2
+            self._allocate(capacity)
+            
+        rows = slice(self.ntotal, required)
+        self.vectors[rows] = vectors
+        self.ids[rows] = ids
+        stored = self.vectors[rows].astype(np.float32)
+        self.norms[rows] = np.einsum('ij,ij->i', stored, stored)
+        self.alive[rows] = True
+        
+        self.id_to_row.update(zip(ids.tolist(), range(self.ntotal, required)))
+        self.ntotal = required
+        
+    def _search_pytorch(self, query_vectors, k):
+        """
+        Ищет ближайших соседей без FAISS блочным матричным умножением.
+        
+        Расстояния ||q||^2 - 2 q.x + ||x||^2 вычисляются для всех запросов сразу по блокам
+        матрицы; лучшие k кандидатов каждого блока объединяются с текущими лучшими.
+        
+        Args:
+            query_vectors (np.ndarray): Запрос [N, dim]
+            k (int): Количество ближайших соседей
+            
+        Returns:
+            tuple: (квадраты расстояний [N, k'], ID [N, k']), где k' = min(k, число живых векторов)
+        """
+        queries = torch.as_tensor(np.asarray(query_vectors, dtype=np.float32))
+        n_queries = queries.shape[0]
+        k_actual = min(k, self.get_size())
+        
+        if k_actual == 0:
+            return np.zeros((n_queries, 0), dtype=np.float32), np.zeros((n_queries, 0), dtype=np.int64)
+            
+        query_norms = (queries * queries).sum(dim=1, keepdim=True)
+        best_distances = torch.full((n_queries, k_actual), float('inf'))
+        best_rows = torch.full((n_queries, k_actual), -1, dtype=torch.int64)
+        
+        for start in range(0, self.ntotal, self.search_chunk_size):
+            end = min(start + self.search_chunk_size, self.ntotal)
+            alive = torch.from_numpy(self.alive[start:end])
+            if not alive.any():
+                continue
+                
+            chunk = torch.from_numpy(self.vectors[start:end]).float()
+            norms = torch.from_numpy(self.norms[start:end])
+            
+            distances = torch.addmm(query_norms + norms, queries, chunk.t(), alpha=-2.0).clamp_(min=0.0)
+            distances.masked_fill_(~alive, float('inf'))
+            
+            chunk_k = min(k_actual, end - start)
+            values, rows = torch.topk(distances, chunk_k, dim=1, largest=False)
+            
+            # Объединяем кандидатов блока с лучшими найденными ранее
+            merged_distances = torch.cat([best_distances, values], dim=1)
+            merged_rows = torch.cat([best_rows, rows + start], dim=1)
+            best_distances, order = torch.topk(merged_distances, k_actual, dim=1, largest=False)
+            best_rows = torch.gather(merged_rows, 1, order)
+            
+        ids = self.ids[best_rows.numpy()]
+        return best_distances.numpy(), ids
+        
+    def remove_ids(self, ids):
+        """
+        Удаляет векторы с указанными ID.
+        
+        Без FAISS строки матрицы только помечаются удаленными и исключаются из поиска.
+        Для индекса HNSW, не поддерживающего удаление, ID запоминаются как удаленные,
+        а их векторы остаются в индексе до перестроения.
+        
+        Args:
+            ids (Iterable[int]): ID удаляемых векторов
+            
+        Returns:
+            int: Количество удаленных векторов
+        """
+        ids = np.asarray(list(ids) if not isinstance(ids, np.ndarray) else ids, dtype=np.int64).reshape(-1)
+        if ids.size == 0:
+            return 0
+            
+        if self.has_faiss:
+            if self.needs_training:
+                keep = ~np.isin(self.pending_ids, ids)
+                removed = len(self.pending_ids) - int(keep.sum())
+                self.pending_vectors = self.pending_vectors[keep]
+                self.pending_ids = self.pending_ids[keep]
+                return removed
+            if self.supports_remove:
+                self._own_index()
+                return int(self.index.remove_ids(ids))
+            new_ids = set(ids.tolist()) - self.deleted_ids
+            self.deleted_ids.update(new_ids)
+            return len(new_ids)
+            
+        rows = [self.id_to_row.pop(item_id) for item_id in ids.tolist() if item_id in self.id_to_row]
+        if rows:
+            self.alive[rows] = False
+            self.num_deleted += len(rows)
+            
+        return len(rows)
+        
+    def adopt(self, vectors, ids, norms=None):
+        """
+        Заполняет индекс без FAISS готовыми массивами без копирования.
+        
+        Используется при загрузке снимка банка памяти: матрица векторов может быть
+        отображена на файл (np.memmap), тогда процессы разделяют ее страницы.
+        
+        Args:
+            vectors (np.ndarray): Векторы [N, dim]
+            ids (np.ndarray): ID векторов [N]
+            norms (np.ndarray, optional): Квадраты норм векторов [N]
+        """
+        count = len(ids)
+        self.create_pytorch_index()
+        if count == 0:
+            return
+            
+        if vectors.dtype != self.storage_dtype:
+            vectors = vectors.astype(self.storage_dtype)
+        if norms is None:
+            stored = np.asarray(vectors, dtype=np.float32)
+            norms = np.einsum('ij,ij->i', stored, stored)
+            
+        self.vectors = vectors
+        self.ids = np.array(ids, dtype=np.int64)
+        self.norms = norms
+        self.alive = np.ones(count, dtype=bool)
+        self.id_to_row = dict(zip(self.ids.tolist(), range(count)))
+        self.ntotal = count
+        
+    def _own_index(self):
+        """
+        Копирует отображенный на файл плоский индекс FAISS в память.
+        
+        Отображенный индекс только читает данные файла, поэтому перед первым
+        изменением векторы и ID копируются в новый индекс.
+        """
+        if not getattr(self, 'mapped', False):
+            return
+            
+        flat = self.faiss.downcast_index(self.index.index)
+        vectors = self.faiss.rev_swig_ptr(flat.get_xb(), flat.ntotal * self.dim).reshape(-1, self.dim).copy()
+        ids = self.faiss.vector_to_array(self.index.id_map)
+        
+        self.index = self.faiss.IndexIDMap(self.faiss.IndexFlatL2(self.dim))
+        if len(ids) > 0:
+            self.index.add_with_ids(vectors, ids)
+        self.mapped = False
         
     def train(self, vectors):
         """
@@ -130,26 +379,32 @@ class FaissIndexWrapper:
             
         if not self.has_faiss:
             # Реализация на PyTorch
-            vectors_tensor = torch.from_numpy(vectors) if isinstance(vectors, np.ndarray) else vectors
-            
-            if ids is None:
-                ids = np.arange(len(self.vectors), len(self.vectors) + vectors.shape[0])
-                
-            for i in range(vectors.shape[0]):
-                self.vectors.append(vectors_tensor[i].view(1, -1))
-                self.ids.append(ids[i])
+            if isinstance(vectors, torch.Tensor):
+                vectors = vectors.detach().cpu().numpy()
+            self._add_pytorch(vectors, ids)
             return
             
         # FAISS реализация
-        # Обучаем индекс, если нужно
-        if self.needs_training and vectors.shape[0] >= 1000:
-            self.train(vectors)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if ids is None:
+            ids = np.arange(self.get_total(), self.get_total() + vectors.shape[0])
+        ids = np.asarray(ids, dtype=np.int64)
+        
+        # Необученный индекс IVF накапливает векторы и обучается, когда их достаточно
+        if self.needs_training:
+            self.pending_vectors = np.concatenate([self.pending_vectors, vectors])
+            self.pending_ids = np.concatenate([self.pending_ids, ids])
+            if len(self.pending_ids) < self.train_size:
+                return
+            self.train(self.pending_vectors)
+            vectors, ids = self.pending_vectors, self.pending_ids
+            self.pending_vectors = np.zeros((0, self.dim), dtype=np.float32)
+            self.pending_ids = np.zeros(0, dtype=np.int64)
             
         # Добавляем векторы
-        if ids is not None:
-            self.index.add_with_ids(vectors, ids)
-        else:
-            self.index.add(vectors)
+        self._own_index()
+        self.deleted_ids.difference_update(ids.tolist())
+        self.index.add_with_ids(vectors, ids)
             
     def search(self, query_vectors, k=5):
         """
@@ -164,40 +419,45 @@ class FaissIndexWrapper:
         """
         if not self.has_faiss:
             # Реализация на PyTorch
-            query_tensor = torch.from_numpy(query_vectors) if isinstance(query_vectors, np.ndarray) else query_vectors
-            n_queries = query_tensor.shape[0]
-            
-            # Подготавливаем массивы для результатов
-            distances = torch.zeros((n_queries, min(k, len(self.vectors))))
-            indices = torch.zeros((n_queries, min(k, len(self.vectors))), dtype=torch.int64)
-            
-            if len(self.vectors) == 0:
-                return distances.numpy(), indices.numpy()
-                
-            for i in range(n_queries):
-                if len(self.vectors) == 0:
-                    continue
-                    
-                # Объединяем все векторы в один тензор
-                vectors_tensor = torch.cat(self.vectors, dim=0)
-                
-                # Вычисляем L2 расстояния
-                dists = torch.cdist(query_tensor[i].view(1, -1), vectors_tensor)[0]
-                
-                # Находим ближайшие
-                k_actual = min(k, len(self.vectors))
-                values, indices_local = torch.topk(dists, k_actual, largest=False)
-                
-                # Сохраняем результаты
-                distances[i, :k_actual] = values
-                for j, idx in enumerate(indices_local):
-                    indices[i, j] = self.ids[idx]
-                    
-            return distances.numpy(), indices.numpy()
+            if isinstance(query_vectors, torch.Tensor):
+                query_vectors = query_vectors.detach().cpu().numpy()
+            return self._search_pytorch(query_vectors, k)
             
         # FAISS реализация
+        if self.needs_training:
+            return self._search_pending(np.asarray(query_vectors, dtype=np.float32), k)
         return self.index.search(query_vectors, k)
     
+    def _search_pending(self, query_vectors, k):
+        """
+        Точный поиск среди векторов, ожидающих обучения индекса IVF.
+        
+        Args:
+            query_vectors (np.ndarray): Запрос [N, dim]
+            k (int): Количество ближайших соседей
+            
+        Returns:
+            tuple: (квадраты расстояний [N, k], ID [N, k]); недостающие позиции имеют ID -1
+        """
+        n_queries = query_vectors.shape[0]
+        distances = np.full((n_queries, k), np.finfo(np.float32).max, dtype=np.float32)
+        ids = np.full((n_queries, k), -1, dtype=np.int64)
+        
+        count = min(k, len(self.pending_ids))
+        if count == 0:
+            return distances, ids
+            
+        all_distances = (
+            (query_vectors * query_vectors).sum(axis=1, keepdims=True)
+            - 2.0 * query_vectors @ self.pending_vectors.T
+            + (self.pending_vectors * self.pending_vectors).sum(axis=1)
+        ).clip(min=0.0)
+        
+        nearest = np.argsort(all_distances, axis=1)[:, :count]
+        distances[:, :count] = np.take_along_axis(all_distances, nearest, axis=1)
+        ids[:, :count] = self.pending_ids[nearest]
+        return distances, ids
+    
     def get_size(self):
         """
         Возвращает количество элементов в индексе.
@@ -206,9 +466,34 @@ class FaissIndexWrapper:
             int: Количество элементов
         """
         if not self.has_faiss:
-            return len(self.vectors)
+            return self.ntotal - self.num_deleted
+            
+        return self.index.ntotal + len(self.pending_ids) - len(self.deleted_ids)
+    
+    def get_total(self):
+        """
+        Возвращает количество векторов в индексе, включая помеченные удаленными.
+        
+        Returns:
+            int: Количество векторов
+        """
+        if not self.has_faiss:
+            return self.ntotal
             
-        return self.index.ntotal
+        return self.index.ntotal + len(self.pending_ids)
+    
+    def get_dead_ratio(self):
+        """
+        Возвращает долю удаленных векторов, все еще занимающих место в индексе.
+        
+        Returns:
+            float: Доля удаленных векторов (0.0 - 1.0)
+        """
+        total = self.get_total()
+        if total == 0:
+            return 0.0
+            
+        return (total - self.get_size()) / total
     
     def save(self, path):
         """
@@ -218,11 +503,11 @@ class FaissIndexWrapper:
             path (str): Путь для сохранения
         """
         if not self.has_faiss:
-            # Реализация на PyTorch
-            vectors_data = [v.numpy() if isinstance(v, torch.Tensor) else v for v in self.vectors]
+            # Реализация на PyTorch: сохраняем только живые строки
+            alive = self.alive[:self.ntotal]
             data = {
-                'vectors': vectors_data,
-                'ids': self.ids
+                'vectors': self.vectors[:self.ntotal][alive],
+                'ids': self.ids[:self.ntotal][alive]
             }
             torch.save(data, path)
             return
@@ -235,23 +520,44 @@ class FaissIndexWrapper:
         else:
             self.faiss.write_index(self.index, path)
             
-    def load(self, path):
+    def load(self, path, mmap=False):
         """
         Загружает индекс с диска.
         
         Args:
             path (str): Путь для загрузки
+            mmap (bool): Отобразить плоский индекс FAISS на файл вместо чтения в память
         """
         if not self.has_faiss:
             # Реализация на PyTorch
-            data = torch.load(path)
-            self.vectors = [torch.tensor(v) if isinstance(v, np.ndarray) else v for v in data['vectors']]
-            self.ids = data['ids']
+            data = torch.load(path, weights_only=False)
+            vectors = data['vectors']
+            
+            # Поддерживаем прежний формат: список тензоров [1, dim]
+            if isinstance(vectors, list):
+                vectors = np.concatenate([np.asarray(v, dtype=np.float32).reshape(-1, self.dim) for v in vectors]) \
+                    if vectors else np.zeros((0, self.dim), dtype=np.float32)
+                    
+            self.create_pytorch_index()
+            if len(vectors) > 0:
+                self._add_pytorch(np.asarray(vectors), np.asarray(data['ids'], dtype=np.int64))
             return
             
         # FAISS реализация
-        # Загружаем индекс с диска
-        self.index = self.faiss.read_index(path)
+        # Загружаем индекс с диска; плоский индекс можно отобразить на файл без копирования
+        self.index = None
+        self.mapped = False
+        if mmap and self.index_type == 'flat' and self.gpu_id < 0 and hasattr(self.faiss, 'IO_FLAG_MMAP_IFC'):
+            try:
+                self.index = self.faiss.read_index(path, self.faiss.IO_FLAG_MMAP_IFC)
+                self.mapped = True
+            except RuntimeError:
+                self.index = None
+        if self.index is None:
+            self.index = self.faiss.read_index(path)
+        self.deleted_ids = set()
+        self.pending_vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self.pending_ids = np.zeros(0, dtype=np.int64)
         
         # Перемещаем на GPU, если нужно
         if self.gpu_id >= 0 and self.faiss.get_num_gpus() > 0:
@@ -461,6 +767,298 @@ class MemoryItem:
         return item
 
 
+class MemoryItemStore:
+    """
+    Колоночное хранилище элементов банка памяти.
+    
+    Вместо отдельного объекта на каждый элемент признаки, цвета и статистики
+    хранятся в предвыделенных массивах numpy (строка массива - элемент), что
+    позволяет вычислять полезность и выбирать элементы для вытеснения векторно.
+    Строки удаленных элементов переиспользуются новыми элементами.
+    
+    Args:
+        feature_dim (int): Размерность признаков
+        max_items (int): Максимальное количество элементов
+        color_dtype (str): Тип хранения цветов ('float32' или 'float16')
+        initial_capacity (int): Начальная емкость в строках
+    """
+    # Колонки, сохраняемые в снимке банка памяти
+    column_names = ('ids', 'features', 'colors', 'quality', 'usage_count', 'last_used', 'creation_time')
+    
+    def __init__(self, feature_dim, max_items, color_dtype='float32', initial_capacity=1024):
+        if color_dtype not in ('float32', 'float16'):
+            raise ValueError(f"Неподдерживаемый тип хранения цветов: {color_dtype}")
+            
+        self.feature_dim = feature_dim
+        self.max_items = max_items
+        self.color_dtype = np.dtype(color_dtype)
+        self.initial_capacity = max(1, min(initial_capacity, max_items))
+        
+        self.capacity = 0
+        self.color_shape = None
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.features = np.zeros((0, feature_dim), dtype=np.float32)
+        self.colors = None
+        self.quality = np.zeros(0, dtype=np.float32)
+        self.usage_count = np.zeros(0, dtype=np.int64)
+        self.last_used = np.zeros(0, dtype=np.float64)
+        self.creation_time = np.zeros(0, dtype=np.float64)
+        self.alive = np.zeros(0, dtype=bool)
+        self.metadata = []
+        
+        self.size = 0  # Количество когда-либо занятых строк
+        self.free_rows = []
+        self.id_to_row = {}
+        
+    @classmethod
+    def from_columns(cls, feature_dim, max_items, columns, metadata=None, color_dtype='float32'):
+        """
+        Создает хранилище из готовых колонок без копирования.
+        
+        Колонки могут быть отображены на файлы (np.memmap в режиме 'c'): данные читаются
+        по мере обращения, а изменения строк остаются в памяти процесса. При росте
+        хранилища колонки копируются в обычные массивы.
+        
+        Args:
+            feature_dim (int): Размерность признаков
+            max_items (int): Максимальное количество элементов
+            columns (dict): Колонки column_names одинаковой длины, все строки живые
+            metadata (dict, optional): Метаданные по номеру строки
+            color_dtype (str): Тип хранения цветов
+            
+        Returns:
+            MemoryItemStore: Хранилище
+        """
+        store = cls(feature_dim, max_items, color_dtype=color_dtype)
+        count = len(columns['ids'])
+        if count == 0:
+            return store
+            
+        for name in cls.column_names:
+            setattr(store, name, columns[name])
+            
+        store.color_shape = tuple(store.colors.shape[1:])
+        store.alive = np.ones(count, dtype=bool)
+        store.metadata = [None] * count
+        for row, item_metadata in (metadata or {}).items():
+            store.metadata[int(row)] = item_metadata
+            
+        store.capacity = count
+        store.size = count
+        store.id_to_row = dict(zip(store.ids.tolist(), range(count)))
+        return store
+    
+    def columns(self):
+        """
+        Возвращает копии колонок живых элементов без пропусков.
+        
+        Returns:
+            tuple: (колонки column_names, метаданные по номеру строки в колонках)
+        """
+        rows = self.live_rows()
+        columns = {name: getattr(self, name)[rows] for name in self.column_names}
+        metadata = {
+            position: self.metadata[row]
+            for position, row in enumerate(rows.tolist())
+            if self.metadata[row] is not None
+        }
+        return columns, metadata
+    
+    def __len__(self):
+        return len(self.id_to_row)
+    
+    def __contains__(self, item_id):
+        return item_id in self.id_to_row
+    
+    def _grow(self, required):
+        """
+        Увеличивает емкость массивов вдвое, пока в них не поместится required строк.
+        
+        Args:
+            required (int): Требуемое количество строк
+        """
+        capacity = max(self.capacity, self.initial_capacity)
+        while capacity < required:
+            capacity *= 2
+        capacity = min(capacity, max(self.max_items, required))
+        
+        def resized(array, fill=0):
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            return grown
+            
+        self.ids = resized(self.ids, -1)
+        self.features = resized(self.features)
+        self.colors = resized(self.colors)
+        self.quality = resized(self.quality)
+        self.usage_count = resized(self.usage_count)
+        self.last_used = resized(self.last_used)
+        self.creation_time = resized(self.creation_time)
+        self.alive = resized(self.alive, False)
+        self.metadata.extend([None] * (capacity - len(self.metadata)))
+        self.capacity = capacity
+        
+    def add(self, ids, features, colors, quality, metadata=None, timestamp=None):
+        """
+        Добавляет элементы в хранилище.
+        
+        Args:
+            ids (np.ndarray): ID элементов [N]
+            features (np.ndarray): Признаки [N, feature_dim]
+            colors (np.ndarray): Цвета [N, color_channels, H, W]
+            quality (Union[float, np.ndarray]): Оценки качества
+            metadata (List[dict], optional): Метаданные элементов
+            timestamp (float, optional): Время добавления
+            
+        Returns:
+            np.ndarray: Строки, в которые записаны элементы
+        """
+        count = len(ids)
+        if count == 0:
+            return np.zeros(0, dtype=np.int64)
+            
+        if self.color_shape is None:
+            self.color_shape = tuple(colors.shape[1:])
+            self.colors = np.zeros((0,) + self.color_shape, dtype=self.color_dtype)
+        elif tuple(colors.shape[1:]) != self.color_shape:
+            raise ValueError(f"Размер цвета {tuple(colors.shape[1:])} не совпадает с размером в банке {self.color_shape}")
+            
+        # Сначала заполняем освободившиеся строки, затем новые
+        reused = [self.free_rows.pop() for _ in range(min(count, len(self.free_rows)))]
+        new_count = count - len(reused)
+        if self.size + new_count > self.capacity:
+            self._grow(self.size + new_count)
+        rows = np.array(reused + list(range(self.size, self.size + new_count)), dtype=np.int64)
+        self.size += new_count
+        
+        timestamp = time.time() if timestamp is None else timestamp
+        
+        self.ids[rows] = ids
+        self.features[rows] = features
+        self.colors[rows] = colors
+        self.quality[rows] = quality
+        self.usage_count[rows] = 0
+        self.last_used[rows] = timestamp
+        self.creation_time[rows] = timestamp
+        self.alive[rows] = True
+        
+        for position, row in enumerate(rows.tolist()):
+            self.metadata[row] = metadata[position] if metadata is not None else None
+            
+        self.id_to_row.update(zip(np.asarray(ids).tolist(), rows.tolist()))
+        return rows
+    
+    def remove(self, ids):
+        """
+        Удаляет элементы из хранилища.
+        
+        Args:
+            ids (Iterable[int]): ID удаляемых элементов
+            
+        Returns:
+            list: ID действительно удаленных элементов
+        """
+        removed = []
+        for item_id in ids:
+            row = self.id_to_row.pop(int(item_id), None)
+            if row is None:
+                continue
+            self.alive[row] = False
+            self.metadata[row] = None
+            self.free_rows.append(row)
+            removed.append(int(item_id))
+            
+        return removed
+    
+    def rows_for(self, ids):
+        """
+        Возвращает строки элементов по их ID.
+        
+        Args:
+            ids (np.ndarray): ID элементов произвольной формы
+            
+        Returns:
+            np.ndarray: Строки той же формы (-1 для отсутствующих элементов)
+        """
+        ids = np.asarray(ids)
+        rows = np.fromiter((self.id_to_row.get(item_id, -1) for item_id in ids.ravel().tolist()),
+                           dtype=np.int64, count=ids.size)
+        return rows.reshape(ids.shape)
+    
+    def live_rows(self):
+        """
+        Возвращает строки живых элементов.
+        
+        Returns:
+            np.ndarray: Номера строк
+        """
+        return np.flatnonzero(self.alive[:self.size])
+    
+    def least_useful(self, count, now=None):
+        """
+        Выбирает наименее полезные элементы.
+        
+        Полезность = quality * (usage_count + 1) / (time_since_last_used + 1) вычисляется
+        для всех строк сразу, а count наименьших значений выбираются через argpartition.
+        
+        Args:
+            count (int): Количество элементов
+            now (float, optional): Текущее время
+            
+        Returns:
+            np.ndarray: ID выбранных элементов
+        """
+        rows = self.live_rows()
+        if count <= 0 or rows.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        if count >= rows.size:
+            return self.ids[rows]
+            
+        now = time.time() if now is None else now
+        utility = self.quality[rows] * (self.usage_count[rows] + 1) / (now - self.last_used[rows] + 1)
+        
+        selected = np.argpartition(utility, count - 1)[:count]
+        return self.ids[rows[selected]]
+    
+    def touch(self, rows, now=None):
+        """
+        Обновляет статистику использования строк.
+        
+        Args:
+            rows (np.ndarray): Строки использованных элементов (повторы учитываются)
+            now (float, optional): Текущее время
+        """
+        rows = np.asarray(rows).ravel()
+        rows = rows[rows >= 0]
+        np.add.at(self.usage_count, rows, 1)
+        self.last_used[rows] = time.time() if now is None else now
+        
+    def get(self, item_id):
+        """
+        Собирает объект MemoryItem для элемента.
+        
+        Args:
+            item_id (int): ID элемента
+            
+        Returns:
+            MemoryItem: Копия данных элемента или None, если элемент не найден
+        """
+        row = self.id_to_row.get(item_id)
+        if row is None:
+            return None
+            
+        item = MemoryItem(
+            features=self.features[row].copy(),
+            color=self.colors[row].astype(np.float32),
+            metadata=dict(self.metadata[row] or {}),
+            quality=float(self.quality[row])
+        )
+        item.usage_count = int(self.usage_count[row])
+        item.last_used = float(self.last_used[row])
+        item.creation_time = float(self.creation_time[row])
+        return item
+
+
 class MemoryBank(nn.Module):
     """
     Банк памяти для хранения и использования цветовых решений.
@@ -472,9 +1070,16 @@ class MemoryBank(nn.Module):
         index_type (str): Тип индекса для поиска ('flat', 'ivf', 'hnsw')
         gpu_id (int): ID GPU для использования или -1 для CPU
         save_dir (str): Директория для сохранения банка памяти
+        compaction_threshold (float): Доля удаленных векторов в индексе, при которой он перестраивается
+        background_compaction (bool): Перестраивать ли индекс в фоновом потоке
+        use_faiss (bool): Использовать ли FAISS, если он установлен
+        color_dtype (str): Тип хранения цветов ('float32' или 'float16')
+        storage_dtype (str): Тип хранения векторов индекса без FAISS ('float32' или 'float16')
     """
     def __init__(self, feature_dim=512, color_channels=2, max_items=100000, 
-                 index_type='flat', gpu_id=-1, save_dir='./data/memory_bank'):
+                 index_type='flat', gpu_id=-1, save_dir='./data/memory_bank',
+                 compaction_threshold=0.3, background_compaction=True, use_faiss=True,
+                 color_dtype='float32', storage_dtype='float32'):
         super(MemoryBank, self).__init__()
         
         self.feature_dim = feature_dim
@@ -483,17 +1088,30 @@ class MemoryBank(nn.Module):
         self.index_type = index_type
         self.gpu_id = gpu_id
         self.save_dir = save_dir
+        self.compaction_threshold = compaction_threshold
+        self.background_compaction = background_compaction
+        self.use_faiss = use_faiss
+        self.storage_dtype = storage_dtype
         
         # Создаем индекс для быстрого поиска
-        self.index = FaissIndexWrapper(
-            dim=feature_dim,
-            index_type=index_type,
-            gpu_id=gpu_id,
-            max_items=max_items
-        )
+        self.index = self._create_index()
         
-        # Словарь для хранения элементов
-        self.items = OrderedDict()
+        # Блокировка для фонового перестроения индекса и журнал операций,
+        # выполненных во время перестроения (None, если перестроение не идет)
+        self._lock = threading.RLock()
+        self._pending_index_ops = None
+        self._compaction_thread = None
+        
+        # Колоночное хранилище элементов
+        self.color_dtype = color_dtype
+        self.items = MemoryItemStore(feature_dim, max_items, color_dtype=color_dtype)
+        
+        # Журнал изменений после последнего снимка: путь, прочитанная позиция, метка снимка
+        # и признак записи (процессы, открывшие снимок только для чтения, журнал не пишут)
+        self._snapshot_path = None
+        self._snapshot_token = None
+        self._delta_offset = 0
+        self._delta_writable = False
         
         # Счетчик для генерации ID
         self.next_id = 0
@@ -511,7 +1129,121 @@ class MemoryBank(nn.Module):
     @property
     def device(self):
         """Возвращает устройство, на котором находится модуль."""
-        return next(self.parameters()).device
+        # У банка памяти нет параметров, только буферы статистики
+        return self.total_queries.device
+        
+    def _create_index(self, storage_dtype=None):
+        """
+        Создает пустой индекс с параметрами банка памяти.
+        
+        Args:
+            storage_dtype (str, optional): Тип хранения векторов (по умолчанию тип банка памяти)
+        
+        Returns:
+            FaissIndexWrapper: Индекс для поиска ближайших соседей
+        """
+        return FaissIndexWrapper(
+            dim=self.feature_dim,
+            index_type=self.index_type,
+            gpu_id=self.gpu_id,
+            max_items=self.max_items,
+            storage_dtype=storage_dtype or self.storage_dtype,
+            use_faiss=self.use_faiss
+        )
+        
+    def _index_add(self, vectors, ids):
+        """
+        Добавляет векторы в индекс и в журнал перестроения, если оно идет.
+        
+        Args:
+            vectors (np.ndarray): Признаки [N, feature_dim]
+            ids (np.ndarray): ID элементов
+        """
+        self.index.add(vectors, ids)
+        if self._pending_index_ops is not None:
+            self._pending_index_ops.append(('add', vectors, ids))
+            
+    def _index_remove(self, ids):
+        """
+        Удаляет векторы из индекса и при необходимости запускает его перестроение.
+        
+        Args:
+            ids (np.ndarray): ID удаляемых элементов
+        """
+        self.index.remove_ids(ids)
+        if self._pending_index_ops is not None:
+            self._pending_index_ops.append(('remove', ids))
+            
+        if self.index.get_dead_ratio() >= self.compaction_threshold:
+            if self.background_compaction:
+                if self._compaction_thread is None or not self._compaction_thread.is_alive():
+                    self._compaction_thread = threading.Thread(target=self.compact, name="MemoryBankCompaction")
+                    self._compaction_thread.daemon = True
+                    self._compaction_thread.start()
+            else:
+                self.compact()
+                
+    def compact(self):
+        """
+        Перестраивает индекс только из живых элементов.
+        
+        Индекс строится без блокировки банка памяти; добавления и удаления, выполненные
+        за это время, записываются в журнал и применяются к новому индексу перед заменой.
+        
+        Returns:
+            bool: True, если индекс перестроен, False, если перестроение уже идет
+        """
+        with self._lock:
+            if self._pending_index_ops is not None:
+                return False
+                
+            rows = self.items.live_rows()
+            ids = self.items.ids[rows]
+            features = self.items.features[rows]
+            self._pending_index_ops = []
+            
+        try:
+            new_index = self._create_index()
+            new_index.add(features, ids)
+        except Exception:
+            with self._lock:
+                self._pending_index_ops = None
+            raise
+            
+        with self._lock:
+            # Применяем операции, выполненные во время перестроения
+            for operation in self._pending_index_ops:
+                if operation[0] == 'add':
+                    new_index.add(operation[1], operation[2])
+                else:
+                    new_index.remove_ids(operation[1])
+                    
+            self.index = new_index
+            self._pending_index_ops = None
+            
+        return True
+    
+    def remove_items(self, item_ids):
+        """
+        Удаляет элементы из банка памяти и из индекса.
+        
+        Args:
+            item_ids (Iterable[int]): ID удаляемых элементов
+            
+        Returns:
+            int: Количество удаленных элементов
+        """
+        with self._lock:
+            removed = self.items.remove(item_ids)
+            if not removed:
+                return 0
+                
+            removed_ids = np.array(removed, dtype=np.int64)
+            self._index_remove(removed_ids)
+            self.total_items_removed += len(removed)
+            self._append_delta('remove', ids=removed_ids)
+            
+        return len(removed)
             
     def add_item(self, features, color, metadata=None, quality=0.5):
         """
@@ -526,51 +1258,105 @@ class MemoryBank(nn.Module):
         Returns:
             list: Список ID добавленных элементов
         """
-        batch_size = features.shape[0]
-        added_ids = []
+        return self.add_items(features, color, qualities=quality, metadata=metadata)
+    
+    def add_items(self, features, colors, qualities=0.5, metadata=None):
+        """
+        Добавляет в банк памяти пакет элементов произвольного размера.
         
+        Элементы добавляются одной операцией: наименее полезные элементы вытесняются
+        один раз для всего пакета, строки записываются в хранилище и в индекс одним
+        вызовом, а индекс IVF обучается на первом достаточно большом пакете.
+        
+        Args:
+            features (Union[torch.Tensor, np.ndarray]): Признаки [N, feature_dim]
+            colors (Union[torch.Tensor, np.ndarray]): Цвета [N, color_channels, H, W]
+            qualities (Union[float, np.ndarray, torch.Tensor]): Оценки качества (одна или [N])
+            metadata (Union[dict, List[dict]], optional): Общие метаданные или метаданные каждого элемента
+            
+        Returns:
+            list: Список ID добавленных элементов
+        """
         # Преобразуем в numpy для работы с FAISS
-        features_np = features.detach().cpu().numpy()
-        color_np = color.detach().cpu().numpy()
-        
-        # Добавляем каждый элемент пакета
-        for i in range(batch_size):
-            # Проверяем, не слишком ли много элементов
-            if len(self.items) >= self.max_items:
-                # Удаляем наименее полезные элементы
-                self._remove_least_useful_items(batch_size)
+        if isinstance(features, torch.Tensor):
+            features = features.detach().cpu().numpy()
+        if isinstance(colors, torch.Tensor):
+            colors = colors.detach().cpu().numpy()
+        if isinstance(qualities, torch.Tensor):
+            qualities = qualities.detach().cpu().numpy()
+            
+        features_np = np.ascontiguousarray(features, dtype=np.float32)
+        count = features_np.shape[0]
+        if colors.shape[0] != count:
+            raise ValueError(f"Количество цветов ({colors.shape[0]}) не совпадает с количеством признаков ({count})")
+            
+        quality_np = np.broadcast_to(np.asarray(qualities, dtype=np.float32), (count,)).copy()
+        
+        if metadata is None:
+            metadata_list = None
+        elif isinstance(metadata, dict):
+            metadata_list = [metadata.copy() for _ in range(count)]
+        else:
+            metadata_list = list(metadata)
+            if len(metadata_list) != count:
+                raise ValueError(f"Количество метаданных ({len(metadata_list)}) не совпадает с количеством элементов ({count})")
                 
-            # Генерируем ID
-            item_id = self.next_id
-            self.next_id += 1
+        with self._lock:
+            return self._add_items_locked(features_np, colors, metadata_list, quality_np)
             
-            # Создаем метаданные, если не предоставлены
-            if metadata is None:
-                item_metadata = {'timestamp': datetime.now().isoformat()}
-            else:
-                item_metadata = metadata.copy()
-                item_metadata['timestamp'] = datetime.now().isoformat()
-            
-            # Создаем элемент
-            item = MemoryItem(
-                features=features_np[i],
-                color=color_np[i],
-                metadata=item_metadata,
-                quality=quality
-            )
-            
-            # Добавляем в словарь
-            self.items[item_id] = item
-            
-            # Добавляем в индекс
-            self.index.add(features_np[i].reshape(1, -1), np.array([item_id]))
-            
-            added_ids.append(item_id)
+    def _add_items_locked(self, features_np, color_np, metadata, quality):
+        """
+        Добавляет элементы пакета (вызывается под блокировкой).
+        
+        Args:
+            features_np (np.ndarray): Признаки [N, feature_dim]
+            color_np (np.ndarray): Цвета [N, color_channels, H, W]
+            metadata (List[dict], optional): Метаданные элементов
+            quality (np.ndarray): Оценки качества [N]
             
+        Returns:
+            list: Список ID добавленных элементов
+        """
+        # Если пакет больше банка, в нем остаются только последние max_items элементов
+        if features_np.shape[0] > self.max_items:
+            skip = features_np.shape[0] - self.max_items
+            features_np, color_np, quality = features_np[skip:], color_np[skip:], quality[skip:]
+            metadata = metadata[skip:] if metadata is not None else None
+            
+        count = features_np.shape[0]
+        if count == 0:
+            return []
+            
+        # Вытесняем наименее полезные элементы один раз для всего пакета
+        overflow = len(self.items) + count - self.max_items
+        if overflow > 0:
+            self._remove_least_useful_items(overflow)
+            
+        # Генерируем ID
+        ids = np.arange(self.next_id, self.next_id + count, dtype=np.int64)
+        self.next_id += count
+        
+        # Время добавления хранится в колонке creation_time, метаданные - только если заданы
+        timestamp = time.time()
+        self.items.add(ids, features_np, color_np, quality, metadata=metadata, timestamp=timestamp)
+        
+        # Добавляем в индекс одним вызовом
+        self._index_add(features_np, ids)
+        
+        self._append_delta(
+            'add',
+            ids=ids,
+            features=features_np,
+            colors=color_np,
+            quality=quality,
+            timestamp=np.array(timestamp),
+            metadata=np.array([json.dumps(value) if value is not None else '' for value in metadata or [None] * count])
+        )
+        
         # Обновляем статистику
-        self.total_items_added += batch_size
+        self.total_items_added += count
         
-        return added_ids
+        return ids.tolist()
     
     def _remove_least_useful_items(self, count=1):
         """
@@ -579,34 +1365,12 @@ class MemoryBank(nn.Module):
         Args:
             count (int): Количество элементов для удаления
         """
-        # Если элементов меньше, чем нужно удалить, просто выходим
-        if len(self.items) <= count:
+        count = min(count, len(self.items))
+        if count <= 0:
             return
             
-        # Вычисляем "полезность" каждого элемента
-        # Полезность = quality * (usage_count + 1) / (time_since_last_used + 1)
-        current_time = time.time()
-        item_utilities = {}
-        
-        for item_id, item in self.items.items():
-            time_since_last_used = current_time - item.last_used
-            utility = item.quality * (item.usage_count + 1) / (time_since_last_used + 1)
-            item_utilities[item_id] = utility
-            
-        # Сортируем элементы по полезности
-        sorted_items = sorted(item_utilities.items(), key=lambda x: x[1])
-        
-        # Удаляем наименее полезные элементы
-        items_to_remove = sorted_items[:count]
-        for item_id, _ in items_to_remove:
-            del self.items[item_id]
-            
-        # Обновляем статистику
-        self.total_items_removed += count
-        
-        # Примечание: мы не удаляем элементы из индекса FAISS, так как это
-        # сложная операция. Вместо этого мы просто игнорируем результаты поиска
-        # для ID, которых нет в словаре self.items
+        # Полезность всех элементов вычисляется векторно, без полной сортировки
+        self.remove_items(self.items.least_useful(count).tolist())
         
     def query(self, features, k=5, return_distances=False):
         """
@@ -635,50 +1399,29 @@ class MemoryBank(nn.Module):
         # Преобразуем в numpy для работы с FAISS
         features_np = features.detach().cpu().numpy()
         
-        # Ищем ближайших соседей
-        distances, indices = self.index.search(features_np, min(k, len(self.items)))
-        
-        # Подготавливаем списки для результатов
-        all_colors = []
-        all_qualities = []
-        all_ids = []
-        
-        # Обрабатываем результаты
-        for i in range(batch_size):
-            batch_colors = []
-            batch_qualities = []
-            batch_ids = []
+        with self._lock:
+            k_live = min(k, len(self.items))
+            distances, indices = self._search_live(features_np, k_live)
             
-            for j in range(min(k, len(self.items))):
-                if j < indices.shape[1]:
-                    item_id = int(indices[i, j])
-                    
-                    # Проверяем, что элемент все еще существует
-                    if item_id in self.items:
-                        item = self.items[item_id]
-                        batch_colors.append(item.color)
-                        batch_qualities.append(item.quality)
-                        batch_ids.append(item_id)
-                        
-                        # Обновляем статистику использования
-                        item.update_usage()
-                    else:
-                        # Элемент был удален, добавляем заглушки
-                        batch_colors.append(np.zeros((self.color_channels, 1, 1), dtype=np.float32))
-                        batch_qualities.append(0.0)
-                        batch_ids.append(-1)
+            rows = self.items.rows_for(indices)
+            found = rows >= 0
+            
+            # Собираем цвета и качества найденных строк; для пропусков - нули
+            safe_rows = np.where(found, rows, 0)
+            colors = self.items.colors[safe_rows].astype(np.float32)
+            colors[~found] = 0.0
+            qualities = np.where(found, self.items.quality[safe_rows], 0.0).astype(np.float32)
+            all_ids = np.where(found, indices, -1).tolist()
+            
+            # Обновляем статистику использования
+            self.items.touch(rows[found])
             
             # Если нашли элементы, увеличиваем счетчик успешных запросов
-            if len(batch_ids) > 0:
-                self.successful_queries += 1
-                
-            all_colors.append(batch_colors)
-            all_qualities.append(batch_qualities)
-            all_ids.append(batch_ids)
+            self.successful_queries += int(found.any(axis=1).sum())
             
         # Преобразуем в тензоры
-        colors_tensor = torch.tensor(np.array(all_colors), device=self.device)
-        qualities_tensor = torch.tensor(np.array(all_qualities), device=self.device)
+        colors_tensor = torch.from_numpy(colors).to(self.device)
+        qualities_tensor = torch.from_numpy(qualities).to(self.device)
         
         # Подготавливаем результат
         result = {
@@ -692,6 +1435,46 @@ class MemoryBank(nn.Module):
             
         return result
     
+    def _search_live(self, features_np, k):
+        """
+        Ищет k ближайших живых элементов с запасом и фильтрацией.
+        
+        Из индекса запрашивается больше соседей, чем нужно, с учетом доли удаленных
+        векторов; результаты с ID, отсутствующими в банке, отбрасываются. Если живых
+        результатов недостаточно, запрос повторяется с удвоенным запасом.
+        
+        Args:
+            features_np (np.ndarray): Признаки для поиска [B, feature_dim]
+            k (int): Количество соседей
+            
+        Returns:
+            tuple: (расстояния [B, k], ID [B, k]); недостающие позиции имеют ID -1
+        """
+        total = self.index.get_total()
+        fetch = min(total, int(np.ceil(k / max(1e-3, 1.0 - self.index.get_dead_ratio()))) + 1)
+        
+        while True:
+            distances, indices = self.index.search(features_np, fetch)
+            
+            live = self.items.rows_for(indices) >= 0
+                
+            if fetch >= total or live.sum(axis=1).min() >= k:
+                break
+            fetch = min(total, fetch * 2)
+            
+        result_distances = np.full((indices.shape[0], k), np.inf, dtype=np.float32)
+        result_ids = np.full((indices.shape[0], k), -1, dtype=np.int64)
+        
+        for i in range(indices.shape[0]):
+            columns = np.flatnonzero(live[i])[:k]
+            result_distances[i, :len(columns)] = distances[i, columns]
+            result_ids[i, :len(columns)] = indices[i, columns]
+            
+            # Недостающим позициям присваиваем наибольшее найденное расстояние
+            result_distances[i, len(columns):] = distances[i, columns].max() if len(columns) > 0 else 0.0
+            
+        return result_distances, result_ids
+        
     def update_item_quality(self, item_id, quality):
         """
         Обновляет оценку качества элемента.
@@ -700,8 +1483,11 @@ class MemoryBank(nn.Module):
             item_id (int): ID элемента
             quality (float): Новая оценка качества
         """
-        if item_id in self.items:
-            self.items[item_id].update_quality(quality)
+        with self._lock:
+            row = self.items.id_to_row.get(item_id)
+            if row is not None:
+                # Скользящее среднее, как в MemoryItem.update_quality
+                self.items.quality[row] = 0.8 * self.items.quality[row] + 0.2 * quality
             
     def get_item(self, item_id):
         """
@@ -713,16 +1499,21 @@ class MemoryBank(nn.Module):
         Returns:
             MemoryItem: Элемент или None, если не найден
         """
-        return self.items.get(item_id, None)
+        return self.items.get(item_id)
     
-    def save(self, filename=None):
+    def save(self, filename=None, format='binary'):
         """
         Сохраняет банк памяти на диск.
         
         Args:
             filename (str, optional): Имя файла для сохранения.
                 Если None, используется текущая дата и время.
+            format (str): Формат сохранения: 'binary' (директория с колонками .npy,
+                открываемая через mmap) или 'json' (прежний формат)
         """
+        if format not in ('binary', 'json'):
+            raise ValueError(f"Неподдерживаемый формат сохранения банка памяти: {format}")
+            
         if filename is None:
             # Генерируем имя файла на основе текущей даты и времени
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -730,75 +1521,389 @@ class MemoryBank(nn.Module):
             
         # Полный путь для сохранения
         save_path = os.path.join(self.save_dir, filename)
+        
+        if format == 'binary':
+            self._save_binary(save_path)
+        else:
+            self._save_json(save_path)
+            
+        print(f"Банк памяти сохранен: {save_path}")
+        
+    def _stats_dict(self):
+        """Возвращает счетчики статистики для сохранения."""
+        return {
+            'total_queries': self.total_queries.item(),
+            'successful_queries': self.successful_queries.item(),
+            'total_items_added': self.total_items_added.item(),
+            'total_items_removed': self.total_items_removed.item()
+        }
+        
+    def _restore_stats(self, stats):
+        """Восстанавливает счетчики статистики."""
+        self.total_queries.fill_(stats['total_queries'])
+        self.successful_queries.fill_(stats['successful_queries'])
+        self.total_items_added.fill_(stats['total_items_added'])
+        self.total_items_removed.fill_(stats['total_items_removed'])
+        
+    def _save_json(self, save_path):
+        """
+        Сохраняет банк памяти в прежнем формате: файл индекса и JSON с элементами.
+        
+        Args:
+            save_path (str): Путь без расширения
+        """
         index_path = f"{save_path}_index"
         items_path = f"{save_path}_items.json"
         
-        # Сохраняем индекс
-        self.index.save(index_path)
+        with self._lock:
+            # Сохраняем индекс
+            self.index.save(index_path)
+            
+            # Сохраняем элементы
+            with open(items_path, 'w') as f:
+                # Преобразуем элементы в словарь для сериализации
+                items_dict = {
+                    str(item_id): self.items.get(item_id).to_dict() for item_id in self.items.id_to_row
+                }
+                json.dump({
+                    'items': items_dict,
+                    'next_id': self.next_id,
+                    'stats': self._stats_dict()
+                }, f)
+                
+    def _save_binary(self, save_path):
+        """
+        Сохраняет снимок банка памяти в бинарном формате.
+        
+        Директория снимка содержит колонки хранилища в файлах .npy, квадраты норм
+        признаков, метаданные и заголовок в JSON, индекс FAISS (если используется)
+        и пустой журнал изменений. Снимок записывается во временную директорию и
+        заменяет прежний целиком; процессы, отобразившие прежние файлы, продолжают
+        работать с ними.
         
-        # Сохраняем элементы
-        with open(items_path, 'w') as f:
-            # Преобразуем элементы в словарь для сериализации
-            items_dict = {str(item_id): item.to_dict() for item_id, item in self.items.items()}
-            json.dump({
-                'items': items_dict,
+        Args:
+            save_path (str): Путь к директории снимка
+        """
+        temp_path = f"{save_path}.tmp"
+        if os.path.exists(temp_path):
+            shutil.rmtree(temp_path)
+        os.makedirs(temp_path)
+        
+        with self._lock:
+            token = time.time_ns()
+            header = {
+                'version': SNAPSHOT_VERSION,
+                'token': token,
+                'feature_dim': self.feature_dim,
+                'color_dtype': self.items.color_dtype.name,
+                'storage_dtype': self.index.storage_dtype.name,
+                'count': len(self.items),
                 'next_id': self.next_id,
-                'stats': {
-                    'total_queries': self.total_queries.item(),
-                    'successful_queries': self.successful_queries.item(),
-                    'total_items_added': self.total_items_added.item(),
-                    'total_items_removed': self.total_items_removed.item()
-                }
-            }, f)
+                'index_type': self.index_type,
+                'index_file': None,
+                'deleted_ids': [],
+                'stats': self._stats_dict()
+            }
             
-        print(f"Банк памяти сохранен: {save_path}")
-        
-    def load(self, filename):
+            if len(self.items) > 0:
+                columns, metadata = self.items.columns()
+                for name, array in columns.items():
+                    np.save(os.path.join(temp_path, f"{name}.npy"), array)
+                    
+                # Индекс без FAISS с хранением float16 отображает собственную матрицу векторов;
+                # нормы считаются по векторам в типе хранения индекса
+                features = columns['features']
+                if self.index.storage_dtype != features.dtype:
+                    features = features.astype(self.index.storage_dtype)
+                    np.save(os.path.join(temp_path, SNAPSHOT_INDEX_VECTORS), features)
+                features = features.astype(np.float32, copy=False)
+                np.save(os.path.join(temp_path, SNAPSHOT_NORMS), np.einsum('ij,ij->i', features, features))
+                
+                with open(os.path.join(temp_path, SNAPSHOT_METADATA), 'w') as f:
+                    json.dump({str(row): value for row, value in metadata.items()}, f)
+                    
+                # Индекс FAISS сохраняется, чтобы не строить его заново (HNSW строится долго);
+                # необученный индекс IVF строится из признаков при загрузке
+                if self.index.has_faiss and not self.index.needs_training:
+                    self.index.save(os.path.join(temp_path, SNAPSHOT_INDEX))
+                    header['index_file'] = SNAPSHOT_INDEX
+                    header['deleted_ids'] = sorted(self.index.deleted_ids)
+                    
+            with open(os.path.join(temp_path, SNAPSHOT_HEADER), 'w') as f:
+                json.dump(header, f)
+                
+            with open(os.path.join(temp_path, SNAPSHOT_DELTA), 'wb') as f:
+                f.write(DELTA_MAGIC + struct.pack('<Q', token))
+                
+            if os.path.exists(save_path):
+                shutil.rmtree(save_path)
+            os.replace(temp_path, save_path)
+            
+            # Последующие изменения записываются в журнал нового снимка
+            self._snapshot_path = save_path
+            self._snapshot_token = token
+            self._delta_offset = DELTA_HEADER_SIZE
+            self._delta_writable = True
+            
+    def load(self, filename, read_only=False):
         """
         Загружает банк памяти с диска.
         
+        Бинарный снимок открывается через mmap: колонки не читаются целиком, а
+        отображаются на файлы в режиме копирования при записи, поэтому несколько
+        процессов разделяют одни страницы памяти. После загрузки применяется
+        журнал изменений снимка.
+        
         Args:
-            filename (str): Имя файла для загрузки (без расширения)
+            filename (str): Имя файла для загрузки (без расширения) или директории снимка
+            read_only (bool): Не записывать изменения в журнал снимка (для процессов,
+                которые только читают банк памяти, обновляя его через refresh_delta)
             
         Returns:
             bool: True, если загрузка успешна, иначе False
         """
         # Полный путь для загрузки
         load_path = os.path.join(self.save_dir, filename)
+        
+        try:
+            if os.path.isfile(os.path.join(load_path, SNAPSHOT_HEADER)):
+                self._load_binary(load_path, read_only)
+            else:
+                self._load_json(load_path)
+                
+            print(f"Банк памяти загружен: {load_path}")
+            return True
+            
+        except Exception as e:
+            print(f"Ошибка при загрузке банка памяти: {e}")
+            return False
+            
+    def _load_json(self, load_path):
+        """
+        Загружает банк памяти в прежнем формате.
+        
+        Args:
+            load_path (str): Путь без расширения
+        """
         index_path = f"{load_path}_index"
         items_path = f"{load_path}_items.json"
         
-        try:
+        with open(items_path, 'r') as f:
+            data = json.load(f)
+            
+        # Восстанавливаем элементы
+        items = MemoryItemStore(self.feature_dim, self.max_items, color_dtype=self.color_dtype)
+        for item_id_str, item_data in data['items'].items():
+            item = MemoryItem.from_dict(item_data)
+            row = items.add(
+                np.array([int(item_id_str)]),
+                item.features.reshape(1, -1),
+                item.color[None],
+                item.quality,
+                metadata=[item.metadata],
+                timestamp=item.creation_time
+            )[0]
+            items.usage_count[row] = item.usage_count
+            items.last_used[row] = item.last_used
+            
+        with self._lock:
             # Загружаем индекс
             self.index.load(index_path)
+            self.items = items
+            
+            # Восстанавливаем счетчик ID и статистику
+            self.next_id = data['next_id']
+            self._restore_stats(data['stats'])
+            
+            # Прежний формат не ведет журнал изменений
+            self._snapshot_path = None
+            self._snapshot_token = None
+            self._delta_writable = False
+            
+    def _load_binary(self, load_path, read_only):
+        """
+        Открывает бинарный снимок банка памяти и применяет его журнал изменений.
+        
+        Args:
+            load_path (str): Путь к директории снимка
+            read_only (bool): Не записывать изменения в журнал снимка
+        """
+        with open(os.path.join(load_path, SNAPSHOT_HEADER), 'r') as f:
+            header = json.load(f)
             
-            # Загружаем элементы
-            with open(items_path, 'r') as f:
-                data = json.load(f)
+        if header['version'] != SNAPSHOT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия снимка банка памяти: {header['version']}")
+        if header['feature_dim'] != self.feature_dim:
+            raise ValueError(
+                f"Размерность признаков снимка ({header['feature_dim']}) не совпадает с банком ({self.feature_dim})"
+            )
+            
+        index = self._create_index(header.get('storage_dtype'))
+        
+        if header['count'] > 0:
+            # Режим 'c': страницы общие для процессов, изменения остаются в памяти процесса
+            columns = {
+                name: np.load(os.path.join(load_path, f"{name}.npy"), mmap_mode='c')
+                for name in MemoryItemStore.column_names
+            }
+            with open(os.path.join(load_path, SNAPSHOT_METADATA), 'r') as f:
+                metadata = json.load(f)
                 
-                # Восстанавливаем элементы
-                self.items = OrderedDict()
-                for item_id_str, item_data in data['items'].items():
-                    item_id = int(item_id_str)
-                    self.items[item_id] = MemoryItem.from_dict(item_data)
-                    
-                # Восстанавливаем счетчик ID
-                self.next_id = data['next_id']
+            items = MemoryItemStore.from_columns(
+                self.feature_dim, self.max_items, columns, metadata, color_dtype=header['color_dtype']
+            )
+            
+            index_file = header.get('index_file')
+            if index.has_faiss and index_file is not None:
+                index.load(os.path.join(load_path, index_file), mmap=True)
+                index.deleted_ids = set(header['deleted_ids'])
+            elif not index.has_faiss:
+                # Отдельное отображение признаков: строки хранилища переиспользуются
+                # новыми элементами, а строки индекса - нет
+                vectors_file = SNAPSHOT_INDEX_VECTORS if os.path.isfile(
+                    os.path.join(load_path, SNAPSHOT_INDEX_VECTORS)
+                ) else 'features.npy'
+                index.adopt(
+                    np.load(os.path.join(load_path, vectors_file), mmap_mode='c'),
+                    items.ids,
+                    np.load(os.path.join(load_path, SNAPSHOT_NORMS), mmap_mode='c')
+                )
+            else:
+                index.add(np.asarray(items.features), items.ids)
+        else:
+            items = MemoryItemStore(self.feature_dim, self.max_items, color_dtype=header['color_dtype'])
+            
+        with self._lock:
+            self.items = items
+            self.index = index
+            self.storage_dtype = index.storage_dtype.name
+            self.next_id = header['next_id']
+            self._restore_stats(header['stats'])
+            
+            self._snapshot_path = load_path
+            self._snapshot_token = header['token']
+            self._delta_offset = DELTA_HEADER_SIZE
+            self._delta_writable = not read_only
+            
+            # Применяем изменения, записанные после снимка
+            delta_path = os.path.join(load_path, SNAPSHOT_DELTA)
+            if os.path.isfile(delta_path):
+                with open(delta_path, 'rb') as f:
+                    if f.read(DELTA_HEADER_SIZE) == DELTA_MAGIC + struct.pack('<Q', header['token']):
+                        self._read_delta(f)
+                    else:
+                        print(f"Журнал изменений не относится к снимку и пропущен: {delta_path}")
+            
+    def _append_delta(self, operation, **arrays):
+        """
+        Дописывает запись в журнал изменений снимка (вызывается под блокировкой).
+        
+        Запись - длина в 8 байт и архив .npz с массивами операции.
+        
+        Args:
+            operation (str): Операция ('add' или 'remove')
+            **arrays: Массивы операции
+        """
+        if self._snapshot_path is None or not self._delta_writable:
+            return
+            
+        buffer = io.BytesIO()
+        np.savez(buffer, op=np.array(operation), **arrays)
+        payload = buffer.getvalue()
+        
+        with open(os.path.join(self._snapshot_path, SNAPSHOT_DELTA), 'ab') as f:
+            f.write(struct.pack('<Q', len(payload)) + payload)
+            self._delta_offset = f.tell()
+            
+    def refresh_delta(self):
+        """
+        Применяет записи журнала изменений, появившиеся после последнего чтения.
+        
+        Процесс, открывший снимок только для чтения, вызывает этот метод, чтобы
+        увидеть элементы, добавленные и удаленные процессом-владельцем. Если снимок
+        был заменен новым, банк памяти открывает новый снимок.
+        
+        Returns:
+            int: Количество примененных записей
+        """
+        with self._lock:
+            if self._snapshot_path is None:
+                return 0
                 
-                # Восстанавливаем статистику
-                stats = data['stats']
-                self.total_queries.fill_(stats['total_queries'])
-                self.successful_queries.fill_(stats['successful_queries'])
-                self.total_items_added.fill_(stats['total_items_added'])
-                self.total_items_removed.fill_(stats['total_items_removed'])
+            delta_path = os.path.join(self._snapshot_path, SNAPSHOT_DELTA)
+            try:
+                f = open(delta_path, 'rb')
+            except FileNotFoundError:
+                f = None
                 
-            print(f"Банк памяти загружен: {load_path}")
-            return True
+            if f is not None:
+                with f:
+                    start = f.read(DELTA_HEADER_SIZE)
+                    if start == DELTA_MAGIC + struct.pack('<Q', self._snapshot_token):
+                        return self._read_delta(f)
+                        
+            # Снимок заменен: открываем его заново с тем же режимом записи журнала
+            self._load_binary(self._snapshot_path, read_only=not self._delta_writable)
+            return 0
             
-        except Exception as e:
-            print(f"Ошибка при загрузке банка памяти: {e}")
-            return False
+    def _read_delta(self, f):
+        """
+        Читает и применяет записи журнала начиная с прочитанной позиции.
+        
+        Args:
+            f: Открытый файл журнала
+            
+        Returns:
+            int: Количество примененных записей
+        """
+        f.seek(self._delta_offset)
+        applied = 0
+        
+        while True:
+            prefix = f.read(8)
+            if len(prefix) < 8:
+                break
+            length = struct.unpack('<Q', prefix)[0]
+            payload = f.read(length)
+            if len(payload) < length:
+                # Запись еще дописывается другим процессом
+                break
+                
+            with np.load(io.BytesIO(payload), allow_pickle=False) as record:
+                self._apply_delta_record(record)
+            self._delta_offset = f.tell()
+            applied += 1
             
+        return applied
+    
+    def _apply_delta_record(self, record):
+        """
+        Применяет запись журнала изменений к хранилищу и индексу.
+        
+        Args:
+            record: Архив .npz с операцией и ее массивами
+        """
+        ids = record['ids']
+        
+        if str(record['op']) == 'add':
+            metadata = [json.loads(value) if value else None for value in record['metadata'].tolist()]
+            self.items.add(
+                ids,
+                record['features'],
+                record['colors'],
+                record['quality'],
+                metadata=metadata,
+                timestamp=float(record['timestamp'])
+            )
+            self._index_add(record['features'], ids)
+            self.next_id = max(self.next_id, int(ids.max()) + 1)
+            self.total_items_added += len(ids)
+        else:
+            removed = self.items.remove(ids.tolist())
+            if removed:
+                self._index_remove(np.array(removed, dtype=np.int64))
+                self.total_items_removed += len(removed)
+                
     def get_stats(self):
         """
         Возвращает статистики банка памяти.
@@ -831,7 +1936,7 @@ class MemoryBank(nn.Module):
             return {'bins': [], 'counts': []}
             
         # Собираем оценки качества
-        qualities = [item.quality for item in self.items.values()]
+        qualities = self.items.quality[self.items.live_rows()]
         
         # Создаем гистограмму
         bins = np.linspace(0.0, 1.0, 11)  # 10 бинов от 0.0 до 1.0
@@ -989,10 +2094,15 @@ class MemoryBankModule(nn.Module):
         save_dir (str): Директория для сохранения банка памяти
         use_fusion (bool): Использовать ли слияние цветов
         k_neighbors (int): Количество ближайших соседей для запроса
+        compaction_threshold (float): Доля удаленных векторов в индексе, при которой он перестраивается
+        use_faiss (bool): Использовать ли FAISS, если он установлен
+        color_dtype (str): Тип хранения цветов ('float32' или 'float16')
+        storage_dtype (str): Тип хранения векторов индекса без FAISS ('float32' или 'float16')
     """
     def __init__(self, feature_dim=512, color_channels=2, max_items=100000,
                  index_type='flat', gpu_id=-1, save_dir='./data/memory_bank',
-                 use_fusion=True, k_neighbors=5):
+                 use_fusion=True, k_neighbors=5, compaction_threshold=0.3, use_faiss=True,
+                 color_dtype='float32', storage_dtype='float32'):
         super(MemoryBankModule, self).__init__()
         
         # Банк памяти
@@ -1002,7 +2112,11 @@ class MemoryBankModule(nn.Module):
             max_items=max_items,
             index_type=index_type,
             gpu_id=gpu_id,
-            save_dir=save_dir
+            save_dir=save_dir,
+            compaction_threshold=compaction_threshold,
+            use_faiss=use_faiss,
+            color_dtype=color_dtype,
+            storage_dtype=storage_dtype
         )
         
         # Энкодер для извлечения признаков из цветных изображений
@@ -1041,6 +2155,19 @@ class MemoryBankModule(nn.Module):
         self.register_buffer('fusion_quality_sum', torch.zeros(1))
         self.register_buffer('fusion_count', torch.zeros(1, dtype=torch.long))
         
+    def use_shared_bank(self, bank):
+        """
+        Заменяет собственный банк памяти общим банком другого процесса.
+        
+        Args:
+            bank: Клиент общего банка памяти с интерфейсом MemoryBank
+                (например, inference.memory_bank_server.MemoryBankClient)
+        """
+        # Клиент не является nn.Module, поэтому сначала удаляем подмодуль
+        if 'memory_bank' in self._modules:
+            del self._modules['memory_bank']
+        self.memory_bank = bank
+        
     def encode_image(self, gray_image, color_image=None):
         """
         Извлекает признаки из изображений.
@@ -1212,26 +2339,28 @@ class MemoryBankModule(nn.Module):
         for item_id, quality in zip(item_ids, quality_scores):
             self.memory_bank.update_item_quality(item_id, quality)
             
-    def save_memory_bank(self, filename=None):
+    def save_memory_bank(self, filename=None, format='binary'):
         """
         Сохраняет банк памяти на диск.
         
         Args:
             filename (str, optional): Имя файла для сохранения
+            format (str): Формат сохранения ('binary' или 'json')
         """
-        self.memory_bank.save(filename)
+        self.memory_bank.save(filename, format=format)
         
-    def load_memory_bank(self, filename):
+    def load_memory_bank(self, filename, read_only=False):
         """
         Загружает банк памяти с диска.
         
         Args:
             filename (str): Имя файла для загрузки
+            read_only (bool): Не записывать изменения в журнал снимка
             
         Returns:
             bool: True, если загрузка успешна, иначе False
         """
-        return self.memory_bank.load(filename)
+        return self.memory_bank.load(filename, read_only=read_only)
     
     def get_stats(self):
         """
@@ -1282,7 +2411,11 @@ def create_memory_bank_module(config=None):
         'gpu_id': -1,
         'save_dir': './data/memory_bank',
         'use_fusion': True,
-        'k_neighbors': 5
+        'k_neighbors': 5,
+        'compaction_threshold': 0.3,
+        'use_faiss': True,
+        'color_dtype': 'float32',
+        'storage_dtype': 'float32'
     }
     
     # Объединяем с пользовательской конфигурацией
@@ -1300,7 +2433,11 @@ def create_memory_bank_module(config=None):
         gpu_id=default_config['gpu_id'],
         save_dir=default_config['save_dir'],
         use_fusion=default_config['use_fusion'],
-        k_neighbors=default_config['k_neighbors']
+        k_neighbors=default_config['k_neighbors'],
+        compaction_threshold=default_config['compaction_threshold'],
+        use_faiss=default_config['use_faiss'],
+        color_dtype=default_config['color_dtype'],
+        storage_dtype=default_config['storage_dtype']
     )
     
     return model
@@ -14,6 +14,7 @@ TintoraAI - Скрипт оценки производительности мо
 - Тестирование на различных наборах данных для объективной оценки
 - Визуализация результатов и создание сравнительных таблиц
 - Анализ производительности по времени и потреблению ресурсов
+- Профилирование модулей модели (время, FLOP, память) с экспортом в Chrome Trace
 - Детальный анализ по категориям изображений
 - Экспорт результатов в различные форматы (CSV, JSON, HTML)
 """
@@ -49,6 +50,7 @@ from inference.batch_processor import BatchProcessor
 from utils.config_parser import load_config
 from utils.visualization import ColorizationVisualizer
 from utils.metrics import MetricsCalculator
+from utils.profiler import ModuleProfiler
 
 from modules.uncertainty_estimation import UncertaintyEstimation
 
@@ -122,6 +124,10 @@ def parse_args():
                         help="Измерять использование памяти")
     parser.add_argument("--measure-latency", action="store_true", default=False,
                         help="Измерять задержку обработки")
+    parser.add_argument("--profile-batches", type=int, default=10,
+                        help="Количество батчей для профилирования модулей модели")
+    parser.add_argument("--profile-intelligent", action="store_true", default=False,
+                        help="Профилировать интеллектуальные модули вместе с моделью")
     
     # Дополнительные параметры
     parser.add_argument("--gpu", action="store_true", default=None,
@@ -1053,15 +1059,20 @@ def generate_html_report(results_df, metrics_summary, category_stats, output_dir
     print(f"HTML-отчет сохранен в {html_path}")
 
 
-def measure_performance(args, model, dataloader, device):
+def measure_performance(args, model, dataloader, device, output_dirs=None, intelligent_modules=None):
     """
     Измерение производительности модели.
     
+    При --profile дополнительно профилируются модули верхнего уровня модели
+    (см. profile_modules).
+    
     Args:
         args (argparse.Namespace): Аргументы командной строки
         model (nn.Module): Модель для оценки
         dataloader (DataLoader): Загрузчик данных
         device (torch.device): Устройство для расчетов
+        output_dirs (dict, optional): Директории для сохранения результатов профилирования
+        intelligent_modules (dict, optional): Интеллектуальные модули для профилирования
         
     Returns:
         dict: Результаты измерения производительности
@@ -1127,9 +1138,67 @@ def measure_performance(args, model, dataloader, device):
         print(f"Среднее использование памяти: {avg_memory_usage:.2f} МБ")
         print(f"Максимальное использование памяти: {max_memory_usage:.2f} МБ")
     
+    # Профилирование по модулям
+    if args.profile:
+        performance_data['module_profile'] = profile_modules(
+            args, model, dataloader, device, output_dirs, intelligent_modules
+        )
+    
     return performance_data
 
 
+def profile_modules(args, model, dataloader, device, output_dirs=None, intelligent_modules=None):
+    """
+    Профилирование времени, FLOP и памяти по модулям верхнего уровня модели.
+    
+    Интеллектуальные модули вызываются на тех же входах, что и модель, как при
+    использовании их предиктором. Трасса сохраняется в reports/module_trace.json
+    (открывается в chrome://tracing или Perfetto), таблица - в reports/module_profile.txt.
+    
+    Args:
+        args (argparse.Namespace): Аргументы командной строки
+        model (nn.Module): Модель для оценки
+        dataloader (DataLoader): Загрузчик данных
+        device (torch.device): Устройство для расчетов
+        output_dirs (dict, optional): Директории для сохранения результатов
+        intelligent_modules (dict, optional): Интеллектуальные модули для профилирования
+        
+    Returns:
+        list: Сводная статистика по модулям (см. ModuleProfiler.summary)
+    """
+    print("\nПрофилирование модулей модели...")
+    
+    profiler = ModuleProfiler(model, extra_modules=intelligent_modules)
+    
+    with torch.no_grad(), profiler:
+        for batch_idx, batch in enumerate(dataloader):
+            if batch_idx >= args.profile_batches:
+                break
+            
+            grayscale = batch['grayscale'].to(device)
+            _ = model(grayscale)
+            
+            for name, module in (intelligent_modules or {}).items():
+                try:
+                    _ = module(grayscale)
+                except Exception as e:
+                    print(f"Ошибка при профилировании модуля {name}: {str(e)}")
+    
+    summary_table = profiler.format_summary_table()
+    print(summary_table)
+    
+    if output_dirs is not None:
+        trace_path = os.path.join(output_dirs['reports'], 'module_trace.json')
+        profiler.export_chrome_trace(trace_path)
+        
+        with open(os.path.join(output_dirs['reports'], 'module_profile.txt'), 'w', encoding='utf-8') as f:
+            f.write(summary_table + '\n')
+        
+        print(f"Трасса профилирования сохранена в {trace_path}")
+    
+    return profiler.summary()
+
+
 def save_results(results_df, metrics_summary, category_stats, performance_data, output_dirs):
     """
     Сохранение результатов оценки в различных форматах.
@@ -1188,6 +1257,9 @@ def save_results(results_df, metrics_summary, category_stats, performance_data,
                 'max': float(np.max(performance_data['memory_usage']))
             }
             
+        if performance_data.get('module_profile'):
+            performance_json['module_profile'] = performance_data['module_profile']
+            
         with open(os.path.join(output_dirs['reports'], 'performance_data.json'), 'w') as f:
             json.dump(performance_json, f, indent=2)
     
@@ -1273,7 +1345,15 @@ def main():
         # Измерение производительности
         performance_data = {}
         if args.profile or args.measure_latency or args.measure_memory:
-            performance_data = measure_performance(args, model, dataloader, device)
+            intelligent_modules = None
+            if args.profile_intelligent:
+                intelligent_modules = {
+                    name: getattr(predictor, name, None) for name in ('guide_net', 'memory_bank')
+                    if isinstance(getattr(predictor, name, None), torch.nn.Module)
+                }
+            performance_data = measure_performance(
+                args, model, dataloader, device, output_dirs, intelligent_modules
+            )
         
         # Оценка модели
         print("\nНачало оценки модели...")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TintoraAI - Скрипт экспорта модели колоризации в ONNX
+
+Данный скрипт экспортирует обученную модель колоризации в граф ONNX только для
+инференса (один выход ab-каналов, динамический размер пакета) и проверяет численное
+соответствие графа исходной модели через ONNX Runtime. Экспортированный граф
+используется бэкендом onnxruntime в ColorizationPredictor.
+
+Возможности:
+- Экспорт модели из чекпоинта с фиксированным размером входа
+- Проверка соответствия выходов ONNX Runtime и PyTorch на нескольких размерах пакета
+- Сравнение времени выполнения PyTorch и ONNX Runtime на CPU
+"""
+
+import os
+import sys
+import argparse
+
+import torch
+
+# Добавляем корневую директорию проекта в путь поиска
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Импорты из модулей проекта
+from inference.onnx_export import export_onnx, check_onnx_parity, DEFAULT_OPSET_VERSION
+
+from utils.config_parser import load_config
+
+from training.checkpoints import load_model_from_checkpoint
+
+
+def parse_args():
+    """
+    Парсинг аргументов командной строки.
+
+    Returns:
+        argparse.Namespace: Объект с аргументами командной строки
+    """
+    parser = argparse.ArgumentParser(
+        description="TintoraAI - Экспорт модели колоризации в ONNX",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument("--checkpoint", type=str, required=True,
+                        help="Путь к файлу чекпоинта модели")
+    parser.add_argument("--model-config", type=str, default="configs/model_config.yaml",
+                        help="Путь к файлу конфигурации модели")
+    parser.add_argument("--output", type=str, default="models/colorizer.onnx",
+                        help="Путь к экспортированному графу ONNX")
+    parser.add_argument("--input-size", type=int, default=256,
+                        help="Размер входа модели")
+    parser.add_argument("--opset", type=int, default=DEFAULT_OPSET_VERSION,
+                        help="Версия набора операций ONNX")
+    parser.add_argument("--static-batch", action="store_true",
+                        help="Зафиксировать размер пакета 1 в графе")
+    parser.add_argument("--parity-batch-sizes", type=int, nargs="+", default=[1, 4],
+                        help="Размеры пакета для проверки соответствия")
+    parser.add_argument("--tolerance", type=float, default=1e-3,
+                        help="Допустимое среднее абсолютное отклонение ab")
+    parser.add_argument("--skip-parity", action="store_true",
+                        help="Не проверять соответствие графа модели PyTorch")
+
+    return parser.parse_args()
+
+
+def main():
+    """
+    Основная функция экспорта.
+    """
+    args = parse_args()
+    device = torch.device('cpu')
+
+    # Загрузка конфигурации модели
+    model_config = load_config(args.model_config) if os.path.exists(args.model_config) else None
+    if model_config is None:
+        print(f"Не удалось загрузить конфигурацию модели из {args.model_config}, используем значения из чекпоинта")
+        model_config = {}
+
+    print(f"Загрузка модели из чекпоинта: {args.checkpoint}")
+    model = load_model_from_checkpoint(args.checkpoint, model_config.get('model', model_config), device)
+    model.eval()
+
+    print(f"Экспорт в ONNX (opset {args.opset}, вход {args.input_size}x{args.input_size}): {args.output}")
+    export_onnx(
+        model,
+        args.output,
+        input_size=args.input_size,
+        opset_version=args.opset,
+        dynamic_batch=not args.static_batch
+    )
+
+    if args.skip_parity:
+        return 0
+
+    batch_sizes = [1] if args.static_batch else args.parity_batch_sizes
+    report = check_onnx_parity(
+        model,
+        args.output,
+        input_size=args.input_size,
+        batch_sizes=batch_sizes,
+        tolerance=args.tolerance
+    )
+
+    print(f"Максимальное отклонение ab: {report['max_abs_error']:.6f}")
+    print(f"Среднее отклонение ab: {report['mean_abs_error']:.6f} (допустимо {args.tolerance})")
+    print(f"Время PyTorch: {report['pytorch_time']:.3f} с, ONNX Runtime: {report['onnxruntime_time']:.3f} с")
+
+    if not report['passed']:
+        print("Граф ONNX не соответствует модели PyTorch")
+        return 1
+
+    print("Граф ONNX соответствует модели PyTorch")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TintoraAI - Скрипт динамического INT8-квантования модели колоризации
+
+Данный скрипт создает квантованный вариант обученной модели для инференса на CPU:
+линейные слои трансформерных частей (Swin, ViT, Cross-Attention) квантуются
+динамически в int8, сверточные части остаются в fp32. Качество квантованной модели
+сравнивается с исходной на отложенном наборе изображений.
+
+Возможности:
+- Квантование модели из чекпоинта с исключением отдельных модулей
+- Автоматическое исключение групп модулей, квантование которых ухудшает результат
+- Отчет о качестве (PSNR, SSIM, LabColorAccuracy), размере весов и скорости на CPU
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+# Добавляем корневую директорию проекта в путь поиска
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Импорты из модулей проекта
+from inference.predictor import ColorizationPredictor
+from inference.quantization import (
+    quantize_dynamic_int8, quantizable_modules, quantization_groups, quantization_sensitivity,
+    model_size_bytes, save_quantized_model
+)
+
+from utils.config_parser import load_config
+from utils.color_conversion import rgb_to_lab_tensor
+from utils.metrics import PSNR, SSIM, LabColorAccuracy
+
+from training.checkpoints import load_model_from_checkpoint
+
+
+IMAGE_EXTENSIONS = ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+
+
+def parse_args():
+    """
+    Парсинг аргументов командной строки.
+
+    Returns:
+        argparse.Namespace: Объект с аргументами командной строки
+    """
+    parser = argparse.ArgumentParser(
+        description="TintoraAI - Динамическое INT8-квантование модели колоризации",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument("--checkpoint", type=str, required=True,
+                        help="Путь к файлу чекпоинта модели")
+    parser.add_argument("--model-config", type=str, default="configs/model_config.yaml",
+                        help="Путь к файлу конфигурации модели")
+    parser.add_argument("--eval-dir", type=str, required=True,
+                        help="Директория с цветными изображениями для оценки качества")
+    parser.add_argument("--output", type=str, default="models/colorizer_int8.pt",
+                        help="Путь к файлу квантованной модели")
+    parser.add_argument("--report", type=str, default=None,
+                        help="Путь к JSON-отчету (по умолчанию рядом с квантованной моделью)")
+    parser.add_argument("--input-size", type=int, default=256,
+                        help="Размер входа модели")
+    parser.add_argument("--max-images", type=int, default=64,
+                        help="Максимальное количество изображений для оценки")
+    parser.add_argument("--batch-size", type=int, default=4,
+                        help="Размер пакета при оценке и замере скорости")
+    parser.add_argument("--exclude", type=str, nargs="*", default=[],
+                        help="Имена или шаблоны модулей, остающихся в fp32")
+    parser.add_argument("--auto-exclude", action="store_true",
+                        help="Исключать группы модулей с отклонением больше --max-ab-error")
+    parser.add_argument("--group-depth", type=int, default=3,
+                        help="Глубина префикса имени при группировке модулей")
+    parser.add_argument("--max-ab-error", type=float, default=0.01,
+                        help="Допустимое среднее отклонение ab для группы модулей")
+    parser.add_argument("--benchmark-iters", type=int, default=10,
+                        help="Количество итераций замера скорости")
+
+    return parser.parse_args()
+
+
+def load_images(eval_dir, max_images):
+    """
+    Загружает цветные изображения для оценки.
+
+    Args:
+        eval_dir (str): Директория с изображениями
+        max_images (int): Максимальное количество изображений
+
+    Returns:
+        List[np.ndarray]: Изображения RGB uint8 [H, W, 3]
+    """
+    paths = sorted(path for pattern in IMAGE_EXTENSIONS for path in glob.glob(os.path.join(eval_dir, pattern)))
+    return [np.array(Image.open(path).convert('RGB')) for path in paths[:max_images]]
+
+
+def prepare_inputs(images, input_size):
+    """
+    Формирует входы модели (нормализованный канал L) для оценки чувствительности.
+
+    Args:
+        images (List[np.ndarray]): Изображения RGB uint8
+        input_size (int): Размер входа модели
+
+    Returns:
+        torch.Tensor: Входы модели [N, 1, S, S]
+    """
+    inputs = []
+    for image in images:
+        rgb = torch.from_numpy(image).permute(2, 0, 1).unsqueeze(0)
+        luminance = rgb_to_lab_tensor(rgb)[:, :1]
+        inputs.append(F.interpolate(luminance, size=(input_size, input_size), mode='area'))
+    return torch.cat(inputs)
+
+
+def evaluate_quality(predictor, images, batch_size):
+    """
+    Вычисляет PSNR, SSIM и LabColorAccuracy колоризации относительно исходных изображений.
+
+    Args:
+        predictor (ColorizationPredictor): Предиктор
+        images (List[np.ndarray]): Исходные цветные изображения
+        batch_size (int): Размер пакета
+
+    Returns:
+        Dict[str, float]: Средние значения метрик
+    """
+    psnr, ssim, lab_accuracy = PSNR(), SSIM(), LabColorAccuracy()
+    values = {'psnr': [], 'ssim': [], 'lab_accuracy': []}
+
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        results = predictor.predict_arrays(batch)
+
+        for image, result in zip(batch, results):
+            target = torch.from_numpy(image).permute(2, 0, 1).unsqueeze(0).float() / 255.0
+            pred = torch.from_numpy(result['colorized']).permute(2, 0, 1).unsqueeze(0).float() / 255.0
+
+            values['psnr'].append(psnr(pred, target).mean().item())
+            # Константы SSIM рассчитаны на диапазон [0, 255]
+            values['ssim'].append(ssim(pred * 255.0, target * 255.0).mean().item())
+            values['lab_accuracy'].append(lab_accuracy(rgb_to_lab_tensor(pred), rgb_to_lab_tensor(target)).mean().item())
+
+    return {name: float(np.mean(metric_values)) for name, metric_values in values.items()}
+
+
+def benchmark(model, inputs, iterations):
+    """
+    Измеряет пропускную способность модели на CPU.
+
+    Args:
+        model (nn.Module): Модель
+        inputs (torch.Tensor): Пакет входов
+        iterations (int): Количество итераций
+
+    Returns:
+        float: Изображений в секунду
+    """
+    with torch.inference_mode():
+        model(inputs)
+        start_time = time.time()
+        for _ in range(iterations):
+            model(inputs)
+        elapsed = time.time() - start_time
+
+    return inputs.shape[0] * iterations / elapsed
+
+
+def main():
+    """
+    Основная функция квантования.
+    """
+    args = parse_args()
+    device = torch.device('cpu')
+
+    # Загрузка конфигурации и модели
+    model_config = load_config(args.model_config) if os.path.exists(args.model_config) else None
+    if model_config is None:
+        print(f"Не удалось загрузить конфигурацию модели из {args.model_config}, используем значения из чекпоинта")
+        model_config = {}
+
+    print(f"Загрузка модели из чекпоинта: {args.checkpoint}")
+    model = load_model_from_checkpoint(args.checkpoint, model_config.get('model', model_config), device)
+    model.eval()
+
+    images = load_images(args.eval_dir, args.max_images)
+    if not images:
+        print(f"В директории {args.eval_dir} не найдено изображений")
+        return 1
+    print(f"Изображений для оценки: {len(images)}")
+
+    inputs = prepare_inputs(images, args.input_size)
+    exclude = list(args.exclude)
+
+    # Оценка чувствительности групп модулей к квантованию
+    sensitivity = {}
+    if args.auto_exclude:
+        groups = [group for group in quantization_groups(model, depth=args.group_depth) if group not in exclude]
+        print(f"Оценка чувствительности {len(groups)} групп модулей")
+        sensitivity = quantization_sensitivity(model, inputs[:args.batch_size], groups, tolerance=args.max_ab_error)
+
+        for group, result in sensitivity.items():
+            status = "ok" if result['passed'] else "исключена"
+            print(f"  {group}: среднее отклонение ab {result['mean_abs_error']:.5f} ({status})")
+            if not result['passed']:
+                exclude.append(group)
+
+    quantized = quantize_dynamic_int8(model, exclude=exclude)
+    quantized_count = len(quantizable_modules(model, exclude))
+    print(f"Квантовано линейных слоев: {quantized_count}, исключения: {exclude}")
+
+    # Качество, размер весов и скорость
+    output_dir = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(output_dir, exist_ok=True)
+    predictor_config = {
+        'color_space': 'lab',
+        'input_size': args.input_size,
+        'output_dir': output_dir,
+        'fallback_strategy': 'none',
+        'precision': 'fp32',
+        'channels_last': False
+    }
+
+    fp32_quality = evaluate_quality(ColorizationPredictor(model, predictor_config, device=device), images, args.batch_size)
+    int8_quality = evaluate_quality(ColorizationPredictor(quantized, predictor_config, device=device), images, args.batch_size)
+
+    fp32_size = model_size_bytes(model)
+    int8_size = model_size_bytes(quantized)
+
+    benchmark_inputs = inputs[:args.batch_size]
+    fp32_throughput = benchmark(model, benchmark_inputs, args.benchmark_iters)
+    int8_throughput = benchmark(quantized, benchmark_inputs, args.benchmark_iters)
+
+    report = {
+        'checkpoint': args.checkpoint,
+        'images': len(images),
+        'quantized_modules': quantized_count,
+        'exclude': exclude,
+        'quality': {
+            'fp32': fp32_quality,
+            'int8': int8_quality,
+            'delta': {name: int8_quality[name] - fp32_quality[name] for name in fp32_quality}
+        },
+        'size_mb': {'fp32': fp32_size / 2 ** 20, 'int8': int8_size / 2 ** 20, 'ratio': fp32_size / int8_size},
+        'throughput': {'fp32': fp32_throughput, 'int8': int8_throughput, 'speedup': int8_throughput / fp32_throughput},
+        'sensitivity': sensitivity
+    }
+
+    save_quantized_model(quantized, args.output, exclude, extra={'source_checkpoint': args.checkpoint, 'report': report})
+
+    report_path = args.report or os.path.splitext(args.output)[0] + '_report.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for name in fp32_quality:
+        print(f"{name}: fp32 {fp32_quality[name]:.4f}, int8 {int8_quality[name]:.4f} ({report['quality']['delta'][name]:+.4f})")
+    print(f"Размер весов: {report['size_mb']['fp32']:.1f} МБ -> {report['size_mb']['int8']:.1f} МБ ({report['size_mb']['ratio']:.2f}x)")
+    print(f"Скорость на CPU: {fp32_throughput:.2f} -> {int8_throughput:.2f} изобр/с ({report['throughput']['speedup']:.2f}x)")
+    print(f"Квантованная модель сохранена в {args.output}, отчет: {report_path}")
+    print(f"Для инференса укажите quantization.checkpoint_path: {args.output}")
+    print(f"(или quantization.exclude: {exclude} для квантования при каждой загрузке)")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,8 @@ ViT, FPN, Cross-Attention Bridge и Feature Fusion Module.
 import unittest
 import os
 import sys
+import json
+import tempfile
 import torch
 import torch.nn as nn
 import numpy as np
@@ -29,6 +31,13 @@ from core.vit_semantic import ViTSemantic
 from core.fpn_pyramid import FPNPyramid
 from core.cross_attention_bridge import CrossAttentionBridge
 from core.feature_fusion import MultiHeadFeatureFusion
+from core.swin_unet import SwinTransformerBlock, MASK_CACHE_SIZE
+from core.vit_semantic import Attention
+from core.cross_attention_bridge import CrossAttentionLayer
+from core import set_fused_attention
+from core import ColorizerBackbone, create_colorizer
+from core import apply_activation_checkpointing, estimate_activation_memory, select_checkpoint_stages
+from utils.profiler import ModuleProfiler
 
 
 class TestSwinUNet(unittest.TestCase):
@@ -625,5 +634,260 @@ class TestFullArchitecture(unittest.TestCase):
             self.fail(f"Тест потока градиентов не прошел с ошибкой: {e}")
 
 
+
+class TestFusedAttention(unittest.TestCase):
+    """Тесты для блоков внимания на основе scaled_dot_product_attention."""
+    
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        torch.manual_seed(0)
+        
+    def _compare(self, module, *inputs):
+        """Сравнивает выходы и градиенты по входу для fused и эталонного путей."""
+        results = []
+        for enabled in (True, False):
+            set_fused_attention(module, enabled)
+            leaf_inputs = [x.clone().requires_grad_(True) for x in inputs]
+            output = module(*leaf_inputs)
+            output.sum().backward()
+            results.append((output.detach(), leaf_inputs[0].grad))
+            
+        (fused_output, fused_grad), (reference_output, reference_grad) = results
+        self.assertTrue(torch.allclose(fused_output, reference_output, atol=1e-5))
+        self.assertTrue(torch.allclose(fused_grad, reference_grad, atol=1e-4))
+        
+    def test_window_attention_matches_reference(self):
+        """Тестирование окон со сдвигом: позиционное смещение и маска сдвига в одной маске."""
+        block = SwinTransformerBlock(dim=32, input_resolution=(16, 16), num_heads=2, window_size=4, shift_size=2).eval()
+        self.assertIsNotNone(block.attn_mask)
+        self._compare(block, torch.randn(2, 256, 32))
+        
+        # Маска кэшируется при инференсе и пересчитывается после изменения таблицы смещений
+        x = torch.randn(2, 256, 32)
+        with torch.no_grad():
+            set_fused_attention(block, True)
+            block(x)
+            cached_keys = len(block.attn._bias_cache)
+            block(x)
+            self.assertEqual(len(block.attn._bias_cache), cached_keys)
+            
+            block.attn.relative_position_bias_table.normal_()
+            fused_output = block(x)
+            set_fused_attention(block, False)
+            reference_output = block(x)
+        self.assertTrue(torch.allclose(fused_output, reference_output, atol=1e-5))
+        
+    def test_vit_and_cross_attention_match_reference(self):
+        """Тестирование внимания ViT и Cross-Attention."""
+        self._compare(Attention(dim=64, num_heads=4).eval(), torch.randn(2, 17, 64))
+        self._compare(CrossAttentionLayer(dim=64, num_heads=4).eval(), torch.randn(2, 10, 64), torch.randn(2, 17, 64))
+
+
+class TestArbitraryResolution(unittest.TestCase):
+    """Тесты для входов произвольного размера в Swin-UNet и ColorizerBackbone."""
+    
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        torch.manual_seed(0)
+        
+    def test_window_padding_and_mask_cache(self):
+        """Тестирование дополнения до окна и кэширования масок по разрешению."""
+        block = SwinTransformerBlock(dim=16, input_resolution=(8, 8), num_heads=2, window_size=4, shift_size=0).eval()
+        x = torch.randn(1, 6 * 8, 16)
+        
+        # Окна без дополнения не зависят от строк, добавленных дополнением
+        with torch.no_grad():
+            padded_output = block(x, (6, 8)).view(1, 6, 8, 16)[:, :4]
+            cropped_output = block(x.view(1, 6, 8, 16)[:, :4].reshape(1, 32, 16), (4, 8)).view(1, 4, 8, 16)
+        self.assertTrue(torch.allclose(padded_output, cropped_output, atol=1e-5))
+        
+        # Маска блока со сдвигом строится один раз для каждого разрешения
+        shifted = SwinTransformerBlock(dim=16, input_resolution=(8, 8), num_heads=2, window_size=4, shift_size=2).eval()
+        device = torch.device('cpu')
+        self.assertIs(shifted.get_attention_mask(8, 8, device), shifted.attn_mask)
+        mask = shifted.get_attention_mask(12, 6, device)
+        self.assertEqual(mask.shape, (3 * 2, 16, 16))
+        self.assertIs(shifted.get_attention_mask(12, 6, device), mask)
+        
+        # Маски и смещения хранятся для ограниченного числа разрешений и не зависят от размера пакета
+        with torch.no_grad():
+            for size in range(9, 9 + MASK_CACHE_SIZE + 4):
+                for batch_size in (1, 3):
+                    shifted(torch.randn(batch_size, size * 8, 16), (size, 8))
+        self.assertEqual(len(shifted._mask_cache), MASK_CACHE_SIZE)
+        self.assertEqual(len(shifted.attn._bias_cache), MASK_CACHE_SIZE)
+        last_mask = shifted.get_attention_mask(size, 8, device)
+        self.assertEqual(shifted.attn._bias_cache[next(reversed(shifted.attn._bias_cache))].shape[0], last_mask.shape[0])
+        
+    def test_vit_position_embedding_cache(self):
+        """Тестирование кэша интерполированных позиционных кодирований ViT."""
+        model = ViTSemantic(img_size=32, patch_size=16, embed_dim=32, depth=1, num_heads=2, semantic_dim=16).eval()
+        x = torch.randn(1, 1, 64, 48)
+        
+        with torch.no_grad():
+            first = model(x)['patch_tokens']
+            cached = model.interpolate_pos_encoding(None, 4, 3)
+            model(x)
+        self.assertEqual(first.shape, (1, 12, 32))
+        self.assertEqual(len(model._pos_embed_cache), 1)
+        with torch.no_grad():
+            self.assertIs(model.interpolate_pos_encoding(None, 4, 3), cached)
+            
+            # Кодирования хранятся для ограниченного числа сеток патчей
+            for h in range(5, 5 + MASK_CACHE_SIZE + 2):
+                model.interpolate_pos_encoding(None, h, 3)
+        self.assertEqual(len(model._pos_embed_cache), MASK_CACHE_SIZE)
+
+        # С вычислением градиентов кодирование не кэшируется и совпадает с кэшированным
+        self.assertTrue(torch.allclose(model.interpolate_pos_encoding(None, 4, 3), cached))
+        
+        # После загрузки новых весов кодирование пересчитывается
+        state_dict = model.state_dict()
+        state_dict['pos_embed'] = torch.randn_like(state_dict['pos_embed'])
+        model.load_state_dict(state_dict)
+        with torch.no_grad():
+            reloaded = model.interpolate_pos_encoding(None, 4, 3)
+        self.assertFalse(torch.allclose(reloaded, cached))
+        self.assertTrue(torch.allclose(reloaded, model._interpolate_pos_embed(4, 3)))
+        
+    def test_non_square_inputs(self):
+        """Тестирование прямого прохода с неквадратными входами и размерами, не кратными окну."""
+        model = ColorizerBackbone(
+            img_size=64, swin_embed_dim=24, swin_depths=[2, 2, 2, 2], swin_num_heads=[1, 2, 2, 4],
+            vit_embed_dim=64, vit_depth=2, vit_num_heads=2, fpn_channels=32, bridge_fusion_dim=32, fusion_dim=32
+        ).eval()
+        
+        for height, width in [(64, 64), (96, 64), (70, 50)]:
+            with torch.no_grad():
+                output = model(torch.randn(2, 1, height, width))
+            self.assertEqual(output['output'].shape, (2, 2, height, width))
+            self.assertFalse(torch.isnan(output['output']).any().item())
+
+
+class TestActivationCheckpointing(unittest.TestCase):
+    """Тесты для политики checkpointing активаций ColorizerBackbone."""
+    
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        torch.manual_seed(0)
+        self.config = {
+            'img_size': 64, 'swin_embed_dim': 24, 'swin_depths': [2, 2, 2, 2], 'swin_num_heads': [1, 2, 2, 4],
+            'vit_embed_dim': 64, 'vit_depth': 2, 'vit_num_heads': 2,
+            'fpn_channels': 32, 'bridge_fusion_dim': 32, 'fusion_dim': 32
+        }
+        
+    def _forward_backward(self, model, x):
+        """Выполняет прямой и обратный проход, возвращает выход и градиенты весов."""
+        model.zero_grad()
+        torch.manual_seed(1)
+        output = model(x)['output']
+        output.sum().backward()
+        grads = [param.grad.clone() for param in model.parameters() if param.grad is not None]
+        return output.detach(), grads
+        
+    def test_policies_preserve_gradients(self):
+        """Тестирование совпадения выхода и градиентов с checkpointing и без него."""
+        model = create_colorizer(dict(self.config, activation_checkpointing={'policy': 'transformer'})).train()
+        self.assertTrue(all(layer.use_checkpoint for layer in model.swin_unet.layers_down))
+        self.assertTrue(model.vit_semantic.use_checkpoint)
+        self.assertEqual(model.checkpoint_stages, set())
+        
+        x = torch.randn(2, 1, 64, 64)
+        stages = apply_activation_checkpointing(model, 'all')
+        self.assertIn('feature_fusion', stages)
+        checkpointed_output, checkpointed_grads = self._forward_backward(model, x)
+        
+        apply_activation_checkpointing(model, 'none')
+        reference_output, reference_grads = self._forward_backward(model, x)
+        
+        self.assertTrue(torch.allclose(checkpointed_output, reference_output, atol=1e-5))
+        self.assertEqual(len(checkpointed_grads), len(reference_grads))
+        for checkpointed, reference in zip(checkpointed_grads, reference_grads):
+            self.assertTrue(torch.allclose(checkpointed, reference, atol=1e-5))
+            
+        with self.assertRaises(ValueError):
+            apply_activation_checkpointing(model, stages=['unknown_stage'])
+            
+    def test_budget_policy(self):
+        """Тестирование выбора этапов по бюджету памяти активаций."""
+        model = create_colorizer(self.config)
+        estimate = estimate_activation_memory(model, img_size=64, batch_size=2)
+        total_mb = estimate['total'] / 2 ** 20
+        self.assertGreater(total_mb, 0)
+        self.assertTrue(all(stats['saved'] > 0 for stats in estimate['stages'].values()))
+        
+        # Бюджет больше оценки - checkpointing не нужен
+        self.assertEqual(select_checkpoint_stages(estimate, total_mb * 2), [])
+        
+        stages = apply_activation_checkpointing(
+            model, 'budget', memory_budget_mb=total_mb * 0.8, img_size=64, batch_size=2
+        )
+        self.assertGreater(len(stages), 0)
+        
+        # Оценка на устройстве 'meta' не меняет модель
+        self.assertEqual(next(model.parameters()).device.type, 'cpu')
+        self.assertTrue(model.training)
+        with torch.no_grad():
+            output = model.eval()(torch.randn(1, 1, 64, 64))
+        self.assertEqual(output['output'].shape, (1, 2, 64, 64))
+
+
+class TestModuleProfiler(unittest.TestCase):
+    """Тесты для профилировщика модулей ColorizerBackbone."""
+    
+    def test_profile_and_export(self):
+        """Тестирование записи вызовов, сводной таблицы и экспорта Chrome Trace."""
+        torch.manual_seed(0)
+        model = create_colorizer({
+            'img_size': 64, 'swin_embed_dim': 24, 'swin_depths': [2, 2, 2, 2], 'swin_num_heads': [1, 2, 2, 4],
+            'vit_embed_dim': 64, 'vit_depth': 2, 'vit_num_heads': 2,
+            'fpn_channels': 32, 'bridge_fusion_dim': 32, 'fusion_dim': 32
+        }).eval()
+        guide = nn.Conv2d(1, 2, kernel_size=3, padding=1).eval()
+        x = torch.randn(2, 1, 64, 64)
+        
+        with torch.no_grad():
+            reference = model(x)['output']
+            with ModuleProfiler(model, extra_modules={'guide_net': guide}) as profiler:
+                for _ in range(2):
+                    output = model(x)['output']
+                    guide(x)
+                    
+        # Хуки не меняют выход и удаляются после выхода из блока
+        self.assertTrue(torch.allclose(output, reference))
+        self.assertEqual(len(model._forward_hooks), 0)
+        self.assertEqual(len(model.swin_unet._forward_pre_hooks), 0)
+        
+        summary = {row['module']: row for row in profiler.summary()}
+        expected = ['ColorizerBackbone', 'swin_unet', 'vit_semantic', 'fpn_pyramid',
+                    'cross_bridge', 'feature_fusion', 'output_conv', 'guide_net']
+        self.assertEqual(list(summary.keys()), expected)
+        for name in expected:
+            self.assertEqual(summary[name]['calls'], 2)
+            self.assertGreater(summary[name]['mean_flops'], 0)
+            
+        # FLOP корневой модели не меньше суммы FLOP модулей верхнего уровня
+        children_flops = sum(summary[name]['mean_flops'] for name in expected[1:-1])
+        self.assertGreaterEqual(summary['ColorizerBackbone']['mean_flops'], children_flops)
+        self.assertEqual(summary['output_conv']['output_shapes'], [2, 2, 64, 64])
+        self.assertIn('feature_fusion', profiler.format_summary_table())
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            trace_path = os.path.join(temp_dir, 'trace.json')
+            profiler.export_chrome_trace(trace_path)
+            with open(trace_path, 'r', encoding='utf-8') as f:
+                trace = json.load(f)
+                
+        events = trace['traceEvents']
+        self.assertEqual(len(events), len(profiler.records))
+        self.assertTrue(all(event['ph'] == 'X' and event['dur'] >= 0 for event in events))
+        
+        # Модули верхнего уровня выполняются внутри вызова корневой модели
+        root = next(event for event in events if event['name'] == 'ColorizerBackbone')
+        child = next(event for event in events if event['name'] == 'swin_unet')
+        self.assertGreaterEqual(child['ts'], root['ts'])
+        self.assertLessEqual(child['ts'] + child['dur'], root['ts'] + root['dur'])
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,1199 @@
+"""
+Test Inference: Модуль для тестирования компонентов инференса.
+
+Данный модуль содержит набор тестов для проверки корректности работы
+компонентов инференса колоризатора: предиктора и тайлового инференса
+для изображений большого размера.
+
+Тесты проверяют:
+- Полное покрытие изображения тайлами с заданным перекрытием
+- Корректность смешивания тайлов весовыми окнами
+- Работу предиктора на изображениях, превышающих размер тайла
+- Пакетное преобразование Lab <-> RGB на тензорах
+- Увеличение каналов ab до исходного разрешения
+- Режимы точности инференса и их соответствие fp32
+- Объединение одновременных запросов в микропакеты
+- Хранилище пакетных заданий с ограниченным сроком хранения
+- Общий банк памяти для нескольких процессов инференса
+- Кэш скомпилированных вариантов модели и прогрев
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import base64
+from io import BytesIO
+from unittest.mock import patch
+import torch
+import torch.nn as nn
+import numpy as np
+from PIL import Image
+
+# Добавляем корневую директорию проекта в путь импорта
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from inference.tiling import TiledInferenceEngine, create_tiling_engine
+from inference.predictor import ColorizationPredictor
+from inference.micro_batching import MicroBatchScheduler
+from inference.job_store import BatchJobStore
+from inference import shared_images
+from inference.memory_bank_server import (
+    MemoryBankService, MemoryBankServer, MemoryBankClient, LocalMemoryBankClient
+)
+from modules.memory_bank import MemoryBank, MemoryBankModule
+import inference.batch_processor as batch_processor_module
+from inference.compilation import CompiledModelCache, CompileBackend
+from core import create_colorizer
+from inference.onnx_export import export_onnx, check_onnx_parity, OnnxRuntimeModel
+from inference.quantization import (
+    quantize_dynamic_int8, quantizable_modules, quantization_sensitivity,
+    model_size_bytes, save_quantized_model, load_quantized_model
+)
+from inference.precision import PrecisionMode, resolve_precision, apply_channels_last
+from inference.upsampling import upsample_chroma, compose_lab_to_uint8
+from utils.color_conversion import rgb_to_lab_tensor, lab_to_rgb_tensor
+from utils.visualization import save_image
+import API
+
+
+class ConstantChromaModel(nn.Module):
+    """Простая модель, предсказывающая постоянные каналы ab."""
+
+    def __init__(self, a_value: float = 0.0, b_value: float = 0.0):
+        super().__init__()
+        self.a_value = a_value
+        self.b_value = b_value
+        self.dummy = nn.Parameter(torch.zeros(1))
+
+    def forward(self, x):
+        batch_size, _, height, width = x.shape
+        ab = torch.empty(batch_size, 2, height, width, device=x.device)
+        ab[:, 0] = self.a_value
+        ab[:, 1] = self.b_value
+        return {'output': ab + self.dummy * 0}
+
+
+class SmallConvModel(nn.Module):
+    """Небольшая сверточная модель с подмодулями, как у ColorizerBackbone."""
+
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.fpn_pyramid = nn.Conv2d(1, 8, kernel_size=3, padding=1)
+        self.output_conv = nn.Conv2d(8, 2, kernel_size=1)
+
+    def forward(self, x):
+        return {'output': torch.tanh(self.output_conv(torch.relu(self.fpn_pyramid(x))))}
+
+
+class SmallTransformerModel(nn.Module):
+    """Небольшая модель с линейными слоями по каналам, как в трансформерных блоках."""
+
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.embed = nn.Conv2d(1, 32, kernel_size=3, padding=1)
+        self.blocks = nn.ModuleList([
+            nn.ModuleDict({'fc1': nn.Linear(32, 64), 'fc2': nn.Linear(64, 32)}) for _ in range(2)
+        ])
+        self.output_conv = nn.Conv2d(32, 2, kernel_size=1)
+
+    def forward(self, x):
+        x = self.embed(x).permute(0, 2, 3, 1)
+        for block in self.blocks:
+            x = x + block['fc2'](torch.relu(block['fc1'](x)))
+        return {'output': torch.tanh(self.output_conv(x.permute(0, 3, 1, 2)))}
+
+
+class TestTiledInferenceEngine(unittest.TestCase):
+    """Тесты для движка тайлового инференса."""
+
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.engine = TiledInferenceEngine(
+            tile_size=64,
+            overlap=16,
+            model_input_size=32,
+            batch_size=3,
+            blending_mode='linear'
+        )
+
+    def test_tiles_cover_image(self):
+        """Тестирование полного покрытия изображения тайлами."""
+        height, width = 150, 97
+        tiles = self.engine.compute_tiles(height, width)
+
+        coverage = np.zeros((height, width), dtype=np.int32)
+        for y0, x0, y1, x1 in tiles:
+            self.assertLessEqual(y1 - y0, self.engine.tile_size)
+            self.assertLessEqual(x1 - x0, self.engine.tile_size)
+            coverage[y0:y1, x0:x1] += 1
+
+        self.assertTrue((coverage > 0).all())
+
+    def test_small_image_single_tile(self):
+        """Тестирование изображения, помещающегося в один тайл."""
+        self.assertFalse(self.engine.should_split(64, 40))
+        self.assertEqual(self.engine.compute_tiles(64, 40), [(0, 0, 64, 40)])
+
+    def test_blending_preserves_constant_prediction(self):
+        """Тестирование того, что смешивание не искажает постоянное предсказание."""
+        luminance = torch.rand(1, 1, 150, 97)
+
+        def predict_fn(tiles):
+            self.assertEqual(tuple(tiles.shape[1:]), (1, 32, 32))
+            return torch.full((tiles.shape[0], 2, 32, 32), 0.25), None
+
+        for mode in ['linear', 'gaussian']:
+            self.engine = TiledInferenceEngine(tile_size=64, overlap=16, model_input_size=32, blending_mode=mode)
+            result = self.engine.run(luminance, predict_fn)
+
+            self.assertEqual(result['chroma'].shape, (1, 2, 150, 97))
+            self.assertIsNone(result['uncertainty'])
+            self.assertTrue(torch.allclose(result['chroma'], torch.full_like(result['chroma'], 0.25), atol=1e-5))
+
+    def test_create_from_config(self):
+        """Тестирование создания движка из конфигурации."""
+        self.assertIsNone(create_tiling_engine({'split_large_images': False}))
+
+        engine = create_tiling_engine({
+            'split_large_images': True,
+            'max_size_per_split': 512,
+            'overlap': 32,
+            'blending_mode': 'gaussian'
+        }, model_input_size=128)
+
+        self.assertEqual(engine.tile_size, 512)
+        self.assertEqual(engine.model_input_size, 128)
+
+
+class TestColorConversion(unittest.TestCase):
+    """Тесты для пакетного преобразования цветовых пространств."""
+
+    def test_matches_skimage(self):
+        """Тестирование совпадения с эталонной реализацией skimage."""
+        from skimage.color import rgb2lab
+
+        rgb = torch.rand(2, 3, 16, 24)
+        lab = rgb_to_lab_tensor(rgb, normalize=False)
+
+        for i in range(rgb.shape[0]):
+            reference = rgb2lab(rgb[i].permute(1, 2, 0).numpy()).transpose(2, 0, 1)
+            self.assertTrue(np.allclose(lab[i].numpy(), reference, atol=1e-3))
+
+    def test_round_trip_batch(self):
+        """Тестирование обратимости преобразования для батча."""
+        rgb = torch.rand(4, 3, 16, 16)
+        lab = rgb_to_lab_tensor(rgb)
+
+        self.assertEqual(lab.shape, rgb.shape)
+        self.assertEqual(lab.dtype, torch.float32)
+        self.assertTrue(lab[:, 0].min() >= 0.0 and lab[:, 0].max() <= 1.0)
+        self.assertTrue(torch.allclose(lab_to_rgb_tensor(lab), rgb, atol=1e-4))
+
+    def test_single_image(self):
+        """Тестирование тензора одного изображения [3, H, W]."""
+        rgb = torch.rand(3, 8, 8)
+        self.assertEqual(lab_to_rgb_tensor(rgb_to_lab_tensor(rgb)).shape, (3, 8, 8))
+
+        with self.assertRaises(ValueError):
+            rgb_to_lab_tensor(torch.rand(1, 8, 8))
+
+
+class TestPredictorTiling(unittest.TestCase):
+    """Тесты для тайлового инференса в предикторе."""
+
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.config = {
+            'color_space': 'lab',
+            'input_size': 32,
+            'output_dir': self.temp_dir,
+            'save_comparisons': False,
+            'fallback_strategy': 'none',
+            'split_large_images': True,
+            'max_size_per_split': 64,
+            'overlap': 8,
+            'blending_mode': 'linear',
+            'batch_size': 4
+        }
+
+    def tearDown(self):
+        """Очистка после каждого теста."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_large_image_is_tiled(self):
+        """Тестирование колоризации изображения больше размера тайла."""
+        predictor = ColorizationPredictor(ConstantChromaModel(), self.config, device=torch.device('cpu'))
+        image = np.random.randint(0, 255, (100, 150), dtype=np.uint8)
+
+        result = predictor.colorize(image, output_path=os.path.join(self.temp_dir, 'large.png'))
+
+        self.assertEqual(result['status'], 'success')
+        self.assertTrue(result['tiled'])
+        self.assertEqual(tuple(result['input_size']), (100, 150))
+        self.assertTrue(os.path.exists(result['output_path']))
+
+    def test_small_image_is_not_tiled(self):
+        """Тестирование того, что небольшие изображения обрабатываются целиком."""
+        predictor = ColorizationPredictor(ConstantChromaModel(), self.config, device=torch.device('cpu'))
+        image = np.random.randint(0, 255, (48, 48, 3), dtype=np.uint8)
+
+        result = predictor.colorize(image, output_path=os.path.join(self.temp_dir, 'small.png'))
+
+        self.assertEqual(result['status'], 'success')
+        self.assertFalse(result['tiled'])
+
+    def test_preserve_aspect_ratio(self):
+        """Тестирование входа модели с исходным соотношением сторон."""
+        config = dict(self.config, split_large_images=False, input_size=64, preserve_aspect_ratio=True, size_multiple=16)
+        predictor = ColorizationPredictor(ConstantChromaModel(0.2, -0.1), config, device=torch.device('cpu'))
+
+        self.assertEqual(predictor._model_input_shape(90, 180), (32, 64))
+        self.assertEqual(predictor._model_input_shape(200, 20), (64, 16))
+
+        image = np.random.randint(0, 255, (90, 180, 3), dtype=np.uint8)
+        result = predictor.colorize(image, output_path=os.path.join(self.temp_dir, 'wide.png'))
+
+        self.assertEqual(result['status'], 'success')
+        with Image.open(result['output_path']) as saved:
+            self.assertEqual(saved.size, (180, 90))
+
+
+class TestChromaUpsampling(unittest.TestCase):
+    """Тесты для увеличения каналов ab до полного разрешения."""
+
+    def test_upsample_methods(self):
+        """Тестирование размера и сохранения постоянного цвета."""
+        chroma = torch.full((1, 2, 16, 16), 0.3)
+        luminance = torch.rand(1, 1, 50, 70)
+
+        for method in ['bilinear', 'guided']:
+            upsampled = upsample_chroma(chroma, luminance, method=method)
+            self.assertEqual(upsampled.shape, (1, 2, 50, 70))
+            self.assertTrue(torch.allclose(upsampled, torch.full_like(upsampled, 0.3), atol=1e-3))
+
+        with self.assertRaises(ValueError):
+            upsample_chroma(chroma, luminance, method='nearest')
+
+    def test_compose_keeps_luminance(self):
+        """Тестирование того, что без цвета результат повторяет исходную яркость."""
+        gray = torch.rand(1, 1, 20, 30)
+        luminance = rgb_to_lab_tensor(gray.expand(-1, 3, -1, -1))[:, :1]
+
+        rgb = compose_lab_to_uint8(luminance, torch.zeros(1, 2, 20, 30))
+
+        self.assertEqual(rgb.dtype, torch.uint8)
+        self.assertEqual(rgb.shape, (1, 20, 30, 3))
+        expected = (gray[0, 0] * 255).round()
+        self.assertLessEqual((rgb[0, :, :, 0].float() - expected).abs().max().item(), 1.0)
+
+    def test_predictor_output_modes(self):
+        """Тестирование режимов формирования результата в предикторе."""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for mode in ['chroma_upsample', 'resize']:
+                config = {
+                    'color_space': 'lab',
+                    'input_size': 32,
+                    'output_dir': temp_dir,
+                    'save_comparisons': False,
+                    'split_large_images': False,
+                    'output_mode': mode,
+                    'chroma_upsample_method': 'guided'
+                }
+                predictor = ColorizationPredictor(ConstantChromaModel(0.2, -0.1), config, device=torch.device('cpu'))
+                image = np.random.randint(0, 255, (90, 70, 3), dtype=np.uint8)
+                output_path = os.path.join(temp_dir, f'{mode}.png')
+
+                result = predictor.colorize(image, output_path=output_path)
+
+                self.assertEqual(result['status'], 'success')
+                self.assertEqual(result['output_mode'], mode)
+                with Image.open(output_path) as saved:
+                    self.assertEqual(saved.size, (70, 90))
+
+            # Без ключа output_mode сохраняется прежнее поведение (масштабирование RGB)
+            predictor = ColorizationPredictor(ConstantChromaModel(0.2, -0.1), {'input_size': 32, 'output_dir': temp_dir}, device=torch.device('cpu'))
+            self.assertEqual(predictor.output_mode, 'resize')
+
+            # Почти черное изображение uint8 сохраняется без повторного масштабирования
+            dark = np.ones((8, 8, 3), dtype=np.uint8)
+            save_image(dark, 'dark.png', output_dir=temp_dir)
+            with Image.open(os.path.join(temp_dir, 'dark.png')) as saved:
+                self.assertEqual(np.asarray(saved).max(), 1)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class TestInferencePrecision(unittest.TestCase):
+    """Тесты для режимов точности инференса."""
+
+    def test_resolve_precision_on_cpu(self):
+        """Тестирование выбора режима точности на CPU."""
+        device = torch.device('cpu')
+
+        self.assertEqual(resolve_precision(None, device), PrecisionMode.FP32)
+        self.assertEqual(resolve_precision(None, device, mixed_precision=True), PrecisionMode.BF16)
+        self.assertEqual(resolve_precision('float32', device), PrecisionMode.FP32)
+        self.assertEqual(resolve_precision('fp16', device), PrecisionMode.BF16)
+
+        with self.assertRaises(ValueError):
+            resolve_precision('int4', device)
+
+    def test_channels_last(self):
+        """Тестирование перевода сверточных модулей в channels_last."""
+        model = SmallConvModel()
+        converted = apply_channels_last(model)
+
+        self.assertEqual(converted, ['fpn_pyramid', 'output_conv'])
+        self.assertTrue(model.fpn_pyramid.weight.is_contiguous(memory_format=torch.channels_last))
+
+    def test_bf16_parity(self):
+        """Тестирование соответствия bf16 эталону fp32."""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            config = {
+                'color_space': 'lab',
+                'input_size': 32,
+                'output_dir': temp_dir,
+                'precision': 'bf16',
+                'channels_last': True
+            }
+            predictor = ColorizationPredictor(SmallConvModel(), config, device=torch.device('cpu'))
+            self.assertEqual(predictor.precision, PrecisionMode.BF16)
+
+            images = [np.random.randint(0, 255, (40, 40, 3), dtype=np.uint8) for _ in range(2)]
+            report = predictor.check_precision_parity(images, tolerance=0.05)
+
+            self.assertEqual(report['num_images'], 2)
+            self.assertTrue(report['passed'])
+            self.assertEqual(predictor.precision, PrecisionMode.BF16)
+
+            # Эталонный набор задается директорией изображений
+            parity_dir = os.path.join(temp_dir, 'parity')
+            os.makedirs(parity_dir)
+            for i, image in enumerate(images):
+                Image.fromarray(image).save(os.path.join(parity_dir, f'{i}.png'))
+            self.assertEqual(predictor.check_precision_parity(parity_dir, tolerance=0.05)['num_images'], 2)
+
+            # При недостижимом допуске предиктор возвращается к fp32
+            report = predictor.check_precision_parity(images, tolerance=0.0)
+            self.assertFalse(report['passed'])
+            self.assertGreater(report['mean_abs_error'], 0.0)
+            self.assertEqual(predictor.precision, PrecisionMode.FP32)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class TestMicroBatching(unittest.TestCase):
+    """Тесты для планировщика микропакетов."""
+
+    def test_concurrent_requests_are_coalesced(self):
+        """Тестирование объединения одновременных запросов в пакеты."""
+        batch_sizes = []
+        release = threading.Event()
+
+        def process_batch(items):
+            release.wait(timeout=5)
+            batch_sizes.append(len(items))
+            return [item * 2 for item in items]
+
+        scheduler = MicroBatchScheduler(process_batch, max_batch_size=4, max_wait_ms=200)
+        try:
+            futures = [scheduler.submit(i) for i in range(8)]
+            release.set()
+
+            self.assertEqual([future.result(timeout=5) for future in futures], [i * 2 for i in range(8)])
+            self.assertEqual(sum(batch_sizes), 8)
+            self.assertLessEqual(max(batch_sizes), 4)
+            self.assertLess(len(batch_sizes), 8)
+        finally:
+            scheduler.shutdown()
+
+    def test_errors_are_delivered_per_item(self):
+        """Тестирование доставки ошибок отдельным запросам."""
+        def process_batch(items):
+            return [ValueError("bad") if item < 0 else item for item in items]
+
+        scheduler = MicroBatchScheduler(process_batch, max_batch_size=8, max_wait_ms=50)
+        try:
+            good, bad = scheduler.submit(1), scheduler.submit(-1)
+
+            self.assertEqual(good.result(timeout=5), 1)
+            with self.assertRaises(ValueError):
+                bad.result(timeout=5)
+        finally:
+            scheduler.shutdown()
+
+        with self.assertRaises(RuntimeError):
+            scheduler.submit(2)
+
+    def test_batch_failure_is_isolated(self):
+        """Тестирование деления пакета, чтобы ошибка досталась только сбойному запросу."""
+        release = threading.Event()
+
+        def process_batch(items):
+            release.wait(timeout=5)
+            if any(item < 0 for item in items):
+                raise MemoryError("out of memory")
+            return [item * 2 for item in items]
+
+        scheduler = MicroBatchScheduler(process_batch, max_batch_size=8, max_wait_ms=200)
+        try:
+            futures = [scheduler.submit(item) for item in [1, 2, -1, 3, 4]]
+            release.set()
+
+            with self.assertRaises(MemoryError):
+                futures[2].result(timeout=5)
+            self.assertEqual([futures[i].result(timeout=5) for i in [0, 1, 3, 4]], [2, 4, 6, 8])
+        finally:
+            scheduler.shutdown()
+
+    def test_predictor_batched_forward(self):
+        """Тестирование пакетного прохода предиктора без записи на диск."""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            config = {'color_space': 'lab', 'input_size': 32, 'output_dir': temp_dir}
+            predictor = ColorizationPredictor(SmallConvModel(), config, device=torch.device('cpu'))
+            images = [
+                np.random.randint(0, 255, (40, 60, 3), dtype=np.uint8),
+                np.random.randint(0, 255, (25, 30), dtype=np.uint8)
+            ]
+
+            results = predictor.predict_arrays(images)
+
+            self.assertEqual(len(results), 2)
+            self.assertEqual(results[0]['colorized'].shape, (40, 60, 3))
+            self.assertEqual(results[1]['colorized'].shape, (25, 30, 3))
+            self.assertEqual(results[0]['colorized'].dtype, np.uint8)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_predict_arrays_matches_colorize(self):
+        """Тестирование совпадения пакетного прохода с colorize() для всех способов колоризации."""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            configs = [
+                {'output_mode': 'resize'},
+                {'output_mode': 'chroma_upsample', 'preserve_aspect_ratio': True, 'size_multiple': 8},
+                {'output_mode': 'chroma_upsample', 'split_large_images': True, 'max_size_per_split': 64, 'overlap': 16}
+            ]
+            images = [
+                np.random.randint(0, 255, (90, 70, 3), dtype=np.uint8),
+                np.random.randint(0, 255, (40, 120, 3), dtype=np.uint8),
+                np.random.randint(0, 255, (70, 90, 3), dtype=np.uint8)
+            ]
+            for options in configs:
+                config = dict(options, color_space='lab', input_size=32, output_dir=temp_dir, save_comparisons=False)
+                predictor = ColorizationPredictor(SmallConvModel(), config, device=torch.device('cpu'))
+
+                results = predictor.predict_arrays(images)
+
+                for i, (image, result) in enumerate(zip(images, results)):
+                    output_path = os.path.join(temp_dir, f'single_{i}.png')
+                    self.assertEqual(predictor.colorize(image, output_path=output_path)['status'], 'success')
+                    with Image.open(output_path) as saved:
+                        expected = np.asarray(saved).astype(np.int16)
+                    self.assertEqual(result['colorized'].shape, image.shape)
+                    self.assertLessEqual(np.abs(result['colorized'].astype(np.int16) - expected).max(), 1, options)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class TestApiInMemoryColorization(unittest.TestCase):
+    """Тесты для колоризации в памяти через TintoraAIModel."""
+
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.temp_dir = tempfile.mkdtemp()
+        with patch.object(API.TintoraAIModel, 'load_model_async'):
+            config_path = os.path.join(os.path.dirname(__file__), '..', 'configs', 'inference_config.yaml')
+            self.api_model = API.TintoraAIModel('unused.pth', config_path)
+
+        config = {'color_space': 'lab', 'input_size': 32, 'output_dir': os.path.join(self.temp_dir, 'output')}
+        self.api_model.predictor = ColorizationPredictor(
+            ConstantChromaModel(a_value=0.3, b_value=-0.2), config, device=torch.device('cpu')
+        )
+        self.api_model.is_loaded = True
+
+    def tearDown(self):
+        """Очистка после каждого теста."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_colorize_image_from_base64(self):
+        """Тестирование колоризации изображения из base64 без записи на диск."""
+        buffer = BytesIO()
+        Image.fromarray(np.random.randint(0, 255, (40, 56), dtype=np.uint8)).save(buffer, format='PNG')
+        image = API.decode_image(base64.b64encode(buffer.getvalue()).decode('ascii'))
+
+        result = self.api_model.colorize_image(image_data=image)
+
+        self.assertEqual(result['colorized'].shape, (40, 56, 3))
+        self.assertEqual(result['colorized'].dtype, np.uint8)
+        # Постоянные каналы ab дают цветной, а не серый результат
+        self.assertGreater(np.abs(result['colorized'][..., 0].astype(int) - result['colorized'][..., 2]).mean(), 0)
+        written = [
+            name for _, _, files in os.walk(os.path.join(self.temp_dir, 'output')) for name in files
+            if not name.endswith('.log')
+        ]
+        self.assertEqual(written, [])
+
+    def test_request_data_is_not_read_as_path(self):
+        """Тестирование того, что строка запроса не читается как путь к файлу сервера."""
+        path = os.path.join(self.temp_dir, 'image.png')
+        image = np.random.randint(0, 255, (16, 16, 3), dtype=np.uint8)
+        Image.fromarray(image).save(path)
+
+        with self.assertRaises(Exception):
+            API.decode_image(path)
+
+        # Файлы загружаются только через вспомогательную функцию SDK
+        np.testing.assert_array_equal(API.load_image_file(path), image)
+
+
+class RecordingTintoraModel:
+    """Заглушка TintoraAIModel для BatchProcessor, записывающая пакетные вызовы."""
+
+    def __init__(self, root_dir, mini_batch_size=2, fail=False, fail_value=None):
+        self.config = {'api': {
+            'job_store': {'path': root_dir},
+            'batch_workers': {'num_workers': 1, 'mini_batch_size': mini_batch_size, 'scheduling': 'round_robin'}
+        }}
+        self.fail = fail
+        self.fail_value = fail_value
+        self.calls = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def colorize_batch(self, requests):
+        self.entered.set()
+        self.release.wait(timeout=5)
+        # Пакет определяется по значению пикселей входа
+        self.calls.append('A' if requests[0]['image_data'][0, 0] < 128 else 'B')
+        if self.fail or any(request['image_data'][0, 0] == self.fail_value for request in requests):
+            raise RuntimeError("model failure")
+        return [{'colorized': np.zeros((4, 4, 3), dtype=np.uint8)} for _ in requests]
+
+
+class TestBatchWorkerPool(unittest.TestCase):
+    """Тесты для пула рабочих потоков пакетной обработки API."""
+
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.processor = None
+
+    def tearDown(self):
+        """Очистка после каждого теста."""
+        if self.processor is not None:
+            self.processor.model.release.set()
+            self.processor.shutdown()
+            self.processor.job_store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _create_processor(self, **kwargs):
+        self.processor = API.BatchProcessor(RecordingTintoraModel(self.temp_dir, **kwargs))
+        return self.processor
+
+    def _wait_finished(self, batch_id):
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            progress = self.processor.get_batch_progress(batch_id)
+            if progress['status'] in ('completed', 'cancelled') and batch_id not in self.processor.batch_queue:
+                return progress
+            time.sleep(0.02)
+        self.fail(f"Пакет {batch_id} не завершен")
+
+    @staticmethod
+    def _images(value, count):
+        return [np.full((4, 4), value, dtype=np.uint8) for _ in range(count)]
+
+    def test_new_batch_interleaves_with_started_batch(self):
+        """Тестирование чередования нового пакета с ранее начатым (без монопольного обслуживания)."""
+        processor = self._create_processor()
+        model = processor.model
+
+        batch_a = processor.add_batch(self._images(10, 6))
+        self.assertTrue(model.entered.wait(timeout=5))
+        batch_b = processor.add_batch(self._images(200, 6))
+        model.release.set()
+
+        self._wait_finished(batch_a)
+        self._wait_finished(batch_b)
+
+        # Пакет B начинает с виртуального времени A и далее чередуется с ним
+        self.assertEqual(model.calls, ['A', 'A', 'B', 'A', 'B', 'B'])
+        self.assertEqual(processor.get_batch_progress(batch_b)['processed_images'], 6)
+
+    def test_cancel_batch(self):
+        """Тестирование отмены пакета между мини-пакетами."""
+        processor = self._create_processor()
+        model = processor.model
+
+        batch_id = processor.add_batch(self._images(10, 6))
+        self.assertTrue(model.entered.wait(timeout=5))
+        self.assertTrue(processor.cancel_batch(batch_id))
+        model.release.set()
+
+        progress = self._wait_finished(batch_id)
+
+        # Переданный модели мини-пакет обрабатывается, остальные изображения - нет
+        self.assertEqual(progress['status'], 'cancelled')
+        self.assertEqual(model.calls, ['A'])
+        self.assertEqual(progress['processed_images'], 2)
+        self.assertFalse(processor.cancel_batch(batch_id))
+        self.assertFalse(processor.cancel_batch('unknown'))
+
+    def test_model_failure_completes_each_image_once(self):
+        """Тестирование однократного завершения изображений при ошибке декодирования и модели."""
+        processor = self._create_processor(mini_batch_size=3, fail=True)
+        finalized_errors = []
+        finalize_batch = processor._finalize_batch
+
+        def recording_finalize(batch_id):
+            finalized_errors.append(len(processor.job_store.get_job(batch_id)['errors']))
+            finalize_batch(batch_id)
+
+        processor._finalize_batch = recording_finalize
+        processor.model.release.set()
+
+        batch_id = processor.add_batch(['not-an-image'] + self._images(10, 2))
+        progress = self._wait_finished(batch_id)
+
+        # Пакет завершается один раз, когда записаны ошибки всех изображений
+        self.assertEqual(finalized_errors, [3])
+        self.assertEqual(progress['processed_images'], 0)
+        self.assertEqual(sorted(error['index'] for error in progress['errors']), [0, 1, 2])
+
+    def test_model_failure_is_isolated_to_failing_image(self):
+        """Тестирование повторной обработки по одному, если проход модели по мини-пакету не удался."""
+        processor = self._create_processor(mini_batch_size=3, fail_value=50)
+        processor.model.release.set()
+
+        images = self._images(10, 3)
+        images[1] = np.full((4, 4), 50, dtype=np.uint8)
+        batch_id = processor.add_batch(images)
+        progress = self._wait_finished(batch_id)
+
+        # Ошибка достается только изображению, на котором падает модель
+        self.assertEqual(progress['processed_images'], 2)
+        self.assertEqual([error['index'] for error in progress['errors']], [1])
+
+
+class TestBatchJobStore(unittest.TestCase):
+    """Тесты для хранилища пакетных заданий."""
+
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = BatchJobStore(self.temp_dir, ttl_seconds=60, max_completed_jobs=2)
+
+    def tearDown(self):
+        """Очистка после каждого теста."""
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_job_lifecycle(self):
+        """Тестирование создания, обработки и чтения результатов задания."""
+        array = np.zeros((4, 4), dtype=np.uint8)
+        self.store.create_job('job', ['data:image/png;base64,AAAA', b'raw', array], {'style': 'vivid'}, priority=3)
+
+        self.assertEqual(self.store.get_params('job')['style'], 'vivid')
+        self.assertEqual(self.store.load_input('job', 0), 'data:image/png;base64,AAAA')
+        self.assertEqual(self.store.load_input('job', 1), b'raw')
+        self.assertTrue(np.array_equal(self.store.load_input('job', 2), array))
+        self.assertEqual(self.store.get_unfinished_jobs(), [('job', 3)])
+
+        self.store.set_status('job', 'processing')
+        self.store.add_result('job', 0, data=b'png', extension='png')
+        self.store.add_result('job', 1, error='broken')
+        # Повторное завершение изображения не увеличивает счетчик
+        self.store.add_result('job', 0, data=b'png', extension='png')
+        self.store.set_status('job', 'completed')
+
+        job = self.store.get_job('job')
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(job['processed_images'], 1)
+        self.assertEqual(job['errors'], [{'index': 1, 'error': 'broken'}])
+
+        results = self.store.get_results('job')
+        self.assertEqual(len(results), 1)
+        with open(results[0]['path'], 'rb') as f:
+            self.assertEqual(f.read(), b'png')
+        self.assertEqual(self.store.get_unfinished_jobs(), [])
+
+    def test_eviction(self):
+        """Тестирование удаления заданий по TTL и лимиту количества."""
+        for i in range(4):
+            self.store.create_job(f'job{i}', [b'x'], {})
+            self.store.set_status(f'job{i}', 'completed')
+            time.sleep(0.01)
+        self.store.create_job('pending', [b'x'], {})
+
+        # Лимит: сохраняются только два последних завершенных задания
+        self.assertEqual(self.store.evict(), 2)
+        self.assertIsNone(self.store.get_job('job0'))
+        self.assertIsNotNone(self.store.get_job('job3'))
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'job0')))
+
+        # TTL: все завершенные задания устаревают, незавершенные остаются
+        self.assertEqual(self.store.evict(now=time.time() + 120), 2)
+        self.assertIsNotNone(self.store.get_job('pending'))
+
+
+class RecordingPredictor:
+    """Предиктор-заглушка для рабочих процессов: записывает PID процесса в результат."""
+
+    def __init__(self, log_path):
+        with open(log_path, 'a') as f:
+            f.write(f"{os.getpid()}\n")
+
+    def colorize(self, image, output_path=None, **kwargs):
+        Image.fromarray(np.ascontiguousarray(image)).save(output_path)
+        return {'status': 'success', 'output_path': output_path, 'pid': os.getpid(), 'mean': float(image.mean())}
+
+
+class TestProcessPoolSharedMemory(unittest.TestCase):
+    """Тесты для режима PARALLEL_PROCESS с общей памятью."""
+
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.temp_dir, 'input')
+        os.makedirs(self.input_dir)
+        for i in range(6):
+            Image.fromarray(np.full((8 + i, 10, 3), i * 10, dtype=np.uint8)).save(os.path.join(self.input_dir, f'{i}.png'))
+
+        self.load_log = os.path.join(self.temp_dir, 'loads.txt')
+        self.original_load_predictor = batch_processor_module.load_predictor
+        batch_processor_module.load_predictor = lambda **kwargs: RecordingPredictor(self.load_log)
+
+    def tearDown(self):
+        """Очистка после каждого теста."""
+        batch_processor_module.load_predictor = self.original_load_predictor
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_pack_and_attach(self):
+        """Тестирование передачи изображений через сегмент общей памяти."""
+        images = [np.random.randint(0, 255, (5, 7, 3), dtype=np.uint8), np.arange(12, dtype=np.float32).reshape(3, 4)]
+        segment, refs = shared_images.pack(images)
+        try:
+            for image, ref in zip(images, refs):
+                attached = shared_images.attach(ref)
+                self.assertTrue(np.array_equal(attached, image))
+                self.assertEqual(ref['offset'] % 64, 0)
+                self.assertFalse(attached.flags.writeable)
+            attached = None
+            shared_images._close_attached(keep=None)
+        finally:
+            shared_images.release(segment)
+
+    def test_models_loaded_once_per_worker(self):
+        """Тестирование загрузки модели один раз на рабочий процесс при повторных запусках."""
+        processor = batch_processor_module.BatchProcessor(
+            predictor=None,
+            batch_size=2,
+            mode=batch_processor_module.ProcessingMode.PARALLEL_PROCESS,
+            max_workers=2,
+            config={'output_dir': os.path.join(self.temp_dir, 'output'), 'postprocess': False,
+                    'overwrite_existing': True, 'device': 'cpu'}
+        )
+        try:
+            for _ in range(2):
+                report = processor.process_directory(self.input_dir)
+                self.assertEqual(report['successful_images'], 6)
+
+            means = sorted(result['mean'] for result in report['results'])
+            self.assertEqual(means, [i * 10.0 for i in range(6)])
+        finally:
+            processor.close()
+
+        with open(self.load_log) as f:
+            loads = f.read().split()
+        self.assertLessEqual(len(loads), 2)
+        self.assertNotIn(str(os.getpid()), loads)
+
+
+class TestPipelineProcessing(unittest.TestCase):
+    """Тесты для конвейерного режима пакетной обработки."""
+
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.temp_dir, 'input')
+        os.makedirs(self.input_dir)
+        for i in range(7):
+            Image.fromarray(np.random.randint(0, 255, (20 + i, 24, 3), dtype=np.uint8)).save(os.path.join(self.input_dir, f'{i}.png'))
+        # Поврежденный файл должен дать ошибку, не останавливая конвейер
+        with open(os.path.join(self.input_dir, 'broken.png'), 'wb') as f:
+            f.write(b'not an image')
+
+        predictor_config = {
+            'color_space': 'lab',
+            'input_size': 16,
+            'output_dir': self.temp_dir,
+            'save_comparisons': False,
+            'fallback_strategy': 'none',
+            'split_large_images': False
+        }
+        self.predictor = ColorizationPredictor(ConstantChromaModel(), predictor_config, device=torch.device('cpu'))
+
+    def tearDown(self):
+        """Очистка после каждого теста."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_pipeline_processes_directory(self):
+        """Тестирование обработки директории конвейером с малыми очередями."""
+        output_dir = os.path.join(self.temp_dir, 'output')
+        processor = batch_processor_module.BatchProcessor(
+            predictor=self.predictor,
+            batch_size=3,
+            mode=batch_processor_module.ProcessingMode.PIPELINE,
+            config={
+                'output_dir': output_dir,
+                'postprocess': False,
+                'batch_processing': {'pipeline': {'decode_workers': 2, 'encode_workers': 2, 'queue_size': 1}}
+            }
+        )
+
+        report = processor.process_directory(self.input_dir)
+
+        self.assertEqual(report['successful_images'], 7)
+        self.assertEqual(report['failed_images'], 1)
+        self.assertEqual(set(report['stage_times']), {'decode', 'infer', 'encode'})
+        for result in report['results']:
+            if result['status'] == 'success':
+                with Image.open(result['output_path']) as image:
+                    self.assertEqual(image.mode, 'RGB')
+                    self.assertEqual(image.size, Image.open(result['source_path']).size)
+
+
+
+class TestMemoryBankServer(unittest.TestCase):
+    """Тесты для общего банка памяти и объединения запросов."""
+
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.bank = MemoryBank(feature_dim=8, max_items=100, save_dir=self.temp_dir, use_faiss=False)
+        self.features = torch.randn(20, 8)
+        self.colors = torch.randn(20, 2, 2, 2)
+
+    def tearDown(self):
+        """Очистка после каждого теста."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_local_client_coalesces_queries(self):
+        """Тестирование объединения одновременных запросов в один поиск."""
+        service = MemoryBankService(self.bank, max_batch_size=16, max_wait_ms=50.0)
+        client = LocalMemoryBankClient(service)
+        try:
+            self.assertIsNone(client.query(self.features[:1], k=3))
+
+            ids = client.add_items(self.features, self.colors, qualities=0.7, metadata={'source': 'test'})
+            self.assertEqual(ids, list(range(20)))
+            self.assertEqual(self.bank.get_item(4).metadata, {'source': 'test'})
+
+            results = [None] * 8
+
+            def run_query(index):
+                results[index] = client.query(self.features[index:index + 1], k=index % 3 + 1,
+                                              return_distances=True)
+
+            threads = [threading.Thread(target=run_query, args=(i,)) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            for index, result in enumerate(results):
+                self.assertEqual(len(result['ids'][0]), index % 3 + 1)
+                self.assertEqual(result['ids'][0][0], index)
+                self.assertEqual(tuple(result['colors'].shape), (1, index % 3 + 1, 2, 2, 2))
+
+            stats = client.get_stats()
+            self.assertEqual(stats['total_items'], 20)
+            self.assertLess(stats['query_batching']['batches'], 8)
+        finally:
+            service.shutdown()
+
+    def test_unix_socket_server(self):
+        """Тестирование обмена запросами с сервером через Unix-сокет."""
+        socket_path = os.path.join(self.temp_dir, 'memory_bank.sock')
+        server = MemoryBankServer(MemoryBankService(self.bank), socket_path)
+        server.start()
+
+        writer = MemoryBankClient(socket_path)
+        reader = MemoryBankClient(socket_path)
+        try:
+            writer.add_item(self.features[:10], self.colors[:10], quality=0.9)
+            result = reader.query(self.features[3:5], k=2)
+            self.assertEqual([ids[0] for ids in result['ids']], [3, 4])
+            np.testing.assert_allclose(result['colors'][0, 0].numpy(), self.colors[3].numpy(), rtol=1e-6)
+
+            self.assertEqual(reader.remove_items([3]), 1)
+            self.assertNotEqual(writer.query(self.features[3:4], k=1)['ids'][0][0], 3)
+
+            # Ошибка запроса возвращается клиенту, соединение остается рабочим
+            with self.assertRaises(RuntimeError):
+                reader.query(torch.randn(1, 5), k=1)
+            self.assertEqual(reader.get_stats()['total_items'], 9)
+        finally:
+            writer.close()
+            reader.close()
+            server.shutdown()
+
+        self.assertFalse(os.path.exists(socket_path))
+
+    def test_snapshot_names_and_load(self):
+        """Тестирование проверки имен снимков и загрузки снимка через клиента."""
+        service = MemoryBankService(self.bank)
+        client = LocalMemoryBankClient(service)
+        outside_dir = os.path.join(self.temp_dir, 'outside')
+        os.makedirs(outside_dir)
+        try:
+            client.add_items(self.features[:5], self.colors[:5])
+
+            # Имена вне директории банка отклоняются до сохранения
+            for filename in [outside_dir, '../outside', 'nested/snapshot', '..']:
+                with self.assertRaises(ValueError):
+                    client.save(filename)
+                with self.assertRaises(ValueError):
+                    client.load(filename)
+            self.assertTrue(os.path.isdir(outside_dir))
+
+            client.save('snapshot', format='json')
+            client.add_items(self.features[5:10], self.colors[5:10])
+            self.assertEqual(client.get_stats()['total_items'], 10)
+
+            # MemoryBankModule с общим банком загружает снимок через клиента
+            module = MemoryBankModule(feature_dim=8, max_items=100, save_dir=self.temp_dir)
+            module.use_shared_bank(client)
+            self.assertTrue(module.load_memory_bank('snapshot'))
+            self.assertEqual(client.get_stats()['total_items'], 5)
+        finally:
+            service.shutdown()
+
+
+
+class TestCompiledModelCache(unittest.TestCase):
+    """Тесты для кэша скомпилированных вариантов модели."""
+
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.model = SmallConvModel().eval()
+
+    def tearDown(self):
+        """Очистка после каждого теста."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_buckets_match_eager(self):
+        """Тестирование дополнения пакета до корзины и разбиения больших пакетов."""
+        cache = CompiledModelCache(self.model, CompileBackend.TRACE, batch_buckets=[1, 4])
+
+        with torch.inference_mode():
+            for batch_size in (1, 3, 4, 10):
+                x = torch.randn(batch_size, 1, 16, 16)
+                expected = self.model(x)['output']
+                actual = cache(x)['output']
+                self.assertEqual(tuple(actual.shape), (batch_size, 2, 16, 16))
+                self.assertTrue(torch.allclose(actual, expected, atol=1e-5))
+
+        # Формы: 1x16x16 и 4x16x16 (пакеты 3, 4 и части пакета 10 используют корзину 4)
+        stats = cache.get_stats()
+        self.assertEqual(stats['keys'], 2)
+        self.assertEqual(stats['compiled'], 2)
+
+    def test_persisted_traces_are_reused(self):
+        """Тестирование загрузки сохраненных трассировок при повторном создании кэша."""
+        x = torch.randn(2, 1, 16, 16)
+        with torch.inference_mode():
+            CompiledModelCache(self.model, CompileBackend.TRACE, batch_buckets=[2], cache_dir=self.temp_dir)(x)
+            restarted = CompiledModelCache(self.model, CompileBackend.TRACE, batch_buckets=[2], cache_dir=self.temp_dir)
+            output = restarted(x)['output']
+
+        self.assertEqual(restarted.get_stats()['loaded'], 1)
+        self.assertEqual(restarted.get_stats()['compiled'], 0)
+        with torch.inference_mode():
+            self.assertTrue(torch.allclose(output, self.model(x)['output'], atol=1e-5))
+
+    def test_predictor_warmup(self):
+        """Тестирование прогрева предиктора по всем корзинам размера пакета."""
+        config = {
+            'color_space': 'lab',
+            'input_size': 16,
+            'output_dir': self.temp_dir,
+            'fallback_strategy': 'none',
+            'compilation': {'backend': 'trace', 'batch_buckets': [1, 2], 'warmup_sizes': [16]}
+        }
+        predictor = ColorizationPredictor(self.model, config, device=torch.device('cpu'))
+
+        timings = predictor.warmup()
+        self.assertEqual(sorted(timings), ['1x16', '2x16'])
+        self.assertEqual(predictor.compiled_model.get_stats()['keys'], 2)
+
+        lab, _ = predictor._predict_lab(torch.rand(2, 1, 16, 16))
+        self.assertEqual(tuple(lab.shape), (2, 3, 16, 16))
+        self.assertEqual(predictor.compiled_model.get_stats()['keys'], 2)
+
+
+
+try:
+    import onnxruntime  # noqa: F401
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+
+@unittest.skipUnless(ONNXRUNTIME_AVAILABLE, "onnxruntime не установлен")
+class TestOnnxExport(unittest.TestCase):
+    """Тесты для экспорта модели в ONNX и бэкенда onnxruntime."""
+
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.model = SmallConvModel().eval()
+        self.onnx_path = os.path.join(self.temp_dir, 'colorizer.onnx')
+        export_onnx(self.model, self.onnx_path, input_size=16)
+
+    def tearDown(self):
+        """Очистка после каждого теста."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_export_parity(self):
+        """Тестирование графа с одним выходом ab и динамическим размером пакета."""
+        runtime_model = OnnxRuntimeModel(self.onnx_path)
+        self.assertEqual(len(runtime_model.session.get_outputs()), 1)
+
+        x = torch.rand(3, 1, 16, 16)
+        self.assertTrue(runtime_model.accepts(x))
+        self.assertFalse(runtime_model.accepts(torch.rand(3, 1, 32, 32)))
+        self.assertEqual(tuple(runtime_model(x)['output'].shape), (3, 2, 16, 16))
+
+        report = check_onnx_parity(self.model, self.onnx_path, input_size=16, batch_sizes=[1, 5], tolerance=1e-4)
+        self.assertTrue(report['passed'])
+        self.assertLess(report['max_abs_error'], 1e-4)
+
+    def test_predictor_onnxruntime_backend(self):
+        """Тестирование предиктора с бэкендом onnxruntime."""
+        config = {
+            'color_space': 'lab',
+            'input_size': 16,
+            'output_dir': self.temp_dir,
+            'fallback_strategy': 'none',
+            'precision': 'fp32',
+            'backend': 'onnxruntime',
+            'onnxruntime': {'model_path': self.onnx_path}
+        }
+        predictor = ColorizationPredictor(self.model, config, device=torch.device('cpu'))
+        self.assertIsNotNone(predictor.onnx_model)
+
+        x = torch.rand(2, 1, 16, 16)
+        lab, _ = predictor._predict_lab(x)
+        with torch.inference_mode():
+            expected = self.model(x)['output']
+
+        self.assertEqual(tuple(lab.shape), (2, 3, 16, 16))
+        self.assertTrue(torch.equal(lab[:, :1], x))
+        self.assertTrue(torch.allclose(lab[:, 1:], expected, atol=1e-4))
+
+        # Входы другой формы обрабатываются моделью PyTorch
+        lab, _ = predictor._predict_lab(torch.rand(1, 1, 24, 24))
+        self.assertEqual(tuple(lab.shape), (1, 3, 24, 24))
+
+    def test_colorizer_backbone_export(self):
+        """Тестирование экспорта ColorizerBackbone с малой конфигурацией и соответствия ONNX Runtime."""
+        torch.manual_seed(0)
+        model = create_colorizer({
+            'img_size': 64, 'swin_embed_dim': 24, 'swin_depths': [2, 2, 2, 2], 'swin_num_heads': [1, 2, 2, 4],
+            'vit_embed_dim': 64, 'vit_depth': 2, 'vit_num_heads': 2,
+            'fpn_channels': 32, 'bridge_fusion_dim': 32, 'fusion_dim': 32
+        }).eval()
+        onnx_path = os.path.join(self.temp_dir, 'backbone.onnx')
+        export_onnx(model, onnx_path, input_size=64)
+
+        report = check_onnx_parity(model, onnx_path, input_size=64, batch_sizes=[1, 2], tolerance=1e-4)
+        self.assertTrue(report['passed'])
+        self.assertLess(report['max_abs_error'], 1e-3)
+
+
+
+class TestDynamicQuantization(unittest.TestCase):
+    """Тесты для динамического INT8-квантования."""
+
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.model = SmallTransformerModel().eval()
+        self.inputs = torch.rand(2, 1, 16, 16)
+
+    def tearDown(self):
+        """Очистка после каждого теста."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_exclude_and_accuracy(self):
+        """Тестирование исключения модулей и близости выхода к модели fp32."""
+        self.assertEqual(len(quantizable_modules(self.model)), 4)
+        self.assertEqual(quantizable_modules(self.model, exclude=['blocks.1']), ['blocks.0.fc1', 'blocks.0.fc2'])
+
+        quantized = quantize_dynamic_int8(self.model, exclude=['blocks.1'])
+        self.assertIsInstance(self.model.blocks[0]['fc1'], nn.Linear)
+        self.assertNotIsInstance(quantized.blocks[0]['fc1'], nn.Linear)
+        self.assertIsInstance(quantized.blocks[1]['fc1'], nn.Linear)
+        self.assertLess(model_size_bytes(quantized), model_size_bytes(self.model))
+
+        with torch.inference_mode():
+            error = (quantized(self.inputs)['output'] - self.model(self.inputs)['output']).abs().mean().item()
+        self.assertLess(error, 0.02)
+
+        sensitivity = quantization_sensitivity(self.model, self.inputs, groups=['blocks.0', 'blocks.1'], tolerance=0.02)
+        self.assertEqual(sorted(sensitivity), ['blocks.0', 'blocks.1'])
+        self.assertTrue(all(result['passed'] for result in sensitivity.values()))
+
+    def test_save_load_and_predictor(self):
+        """Тестирование сохранения квантованной модели и квантования в предикторе."""
+        path = os.path.join(self.temp_dir, 'model_int8.pt')
+        quantized = quantize_dynamic_int8(self.model, exclude=['blocks.0.fc1'])
+        save_quantized_model(quantized, path, exclude=['blocks.0.fc1'])
+
+        loaded = load_quantized_model(path, SmallTransformerModel())
+        with torch.inference_mode():
+            self.assertTrue(torch.allclose(loaded(self.inputs)['output'], quantized(self.inputs)['output']))
+
+        config = {
+            'color_space': 'lab',
+            'input_size': 16,
+            'output_dir': self.temp_dir,
+            'fallback_strategy': 'none',
+            'precision': 'bf16',
+            'quantization': {'enabled': True, 'exclude': ['blocks.1']}
+        }
+        model = SmallTransformerModel()
+        predictor = ColorizationPredictor(model, config, device=torch.device('cpu'))
+        self.assertEqual(predictor.precision, PrecisionMode.FP32)
+        self.assertIsInstance(predictor.model.blocks[1]['fc1'], nn.Linear)
+        self.assertNotIsInstance(predictor.model.blocks[0]['fc1'], nn.Linear)
+        # Переданная модель не изменяется
+        self.assertIsInstance(model.blocks[0]['fc1'], nn.Linear)
+
+        lab, _ = predictor._predict_lab(self.inputs)
+        self.assertEqual(tuple(lab.shape), (2, 3, 16, 16))
+
+        # Сохраненные квантованные веса загружаются вместо повторного квантования
+        config['quantization'] = {'enabled': True, 'checkpoint_path': path}
+        predictor = ColorizationPredictor(SmallTransformerModel(), config, device=torch.device('cpu'))
+        self.assertIsInstance(predictor.model.blocks[0]['fc1'], nn.Linear)
+        self.assertNotIsInstance(predictor.model.blocks[1]['fc1'], nn.Linear)
+        with torch.inference_mode():
+            self.assertTrue(torch.allclose(predictor.model(self.inputs)['output'], quantized(self.inputs)['output']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,6 +16,8 @@ Style Transfer, Memory Bank, Uncertainty Estimation и Few-Shot Adapter.
 import unittest
 import os
 import sys
+import shutil
+import tempfile
 import torch
 import torch.nn as nn
 import torch.optim as optim
@@ -28,7 +30,8 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from modules.guide_net import GuideNet
 from modules.discriminator import MotivationalDiscriminator as Discriminator
 from modules.style_transfer import StyleTransfer
-from modules.memory_bank import MemoryBankModule
+from modules.memory_bank import MemoryBankModule, MemoryBank, MemoryItemStore, FaissIndexWrapper, create_memory_bank_module
+from inference.memory_bank_server import create_memory_bank_server
 from modules.uncertainty_estimation import UncertaintyEstimation
 from modules.few_shot_adapter import AdaptableColorizer
 
@@ -393,6 +396,338 @@ class TestMemoryBank(unittest.TestCase):
         self.assertEqual(len(results['items']), min(3, len(self.model.memory_items)))
 
 
+class TestFaissIndexFallback(unittest.TestCase):
+    """Тесты для реализации индекса банка памяти без FAISS."""
+    
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.dim = 16
+        self.index = FaissIndexWrapper(dim=self.dim, use_faiss=False)
+        
+        # Маленькие блоки и емкость, чтобы проверить рост матрицы и слияние блоков
+        self.index.search_chunk_size = 7
+        self.index.create_pytorch_index()
+        self.index._allocate(4)
+        
+        rng = np.random.RandomState(0)
+        self.vectors = rng.randn(50, self.dim).astype(np.float32)
+        self.ids = np.arange(100, 150)
+        
+    def brute_force(self, queries, vectors, ids, k):
+        """Эталонный поиск полным перебором."""
+        distances = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(-1)
+        order = np.argsort(distances, axis=1)[:, :k]
+        return np.take_along_axis(distances, order, axis=1), ids[order]
+        
+    def test_search_matches_brute_force(self):
+        """Тестирование совпадения блочного поиска с полным перебором."""
+        self.index.add(self.vectors[:20], self.ids[:20])
+        self.index.add(self.vectors[20:], self.ids[20:])
+        self.assertEqual(self.index.get_size(), 50)
+        self.assertGreaterEqual(self.index.vectors.shape[0], 50)
+        
+        queries = np.random.RandomState(1).randn(5, self.dim).astype(np.float32)
+        distances, ids = self.index.search(queries, k=4)
+        expected_distances, expected_ids = self.brute_force(queries, self.vectors, self.ids, 4)
+        
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(distances, expected_distances, rtol=1e-4, atol=1e-4)
+        
+    def test_removed_ids_are_not_returned(self):
+        """Тестирование исключения удаленных векторов из поиска."""
+        self.index.add(self.vectors, self.ids)
+        removed = self.ids[::2]
+        
+        self.assertEqual(self.index.remove_ids(removed), 25)
+        self.assertEqual(self.index.get_size(), 25)
+        
+        distances, ids = self.index.search(self.vectors[:3], k=30)
+        self.assertEqual(ids.shape, (3, 25))
+        self.assertFalse(np.isin(ids, removed).any())
+        
+        # Поиск собственного живого вектора возвращает его первым
+        self.assertEqual(ids[1, 0], self.ids[1])
+        
+    def test_float16_storage(self):
+        """Тестирование хранения векторов в половинной точности."""
+        index = FaissIndexWrapper(dim=self.dim, storage_dtype='float16', use_faiss=False)
+        index.add(self.vectors, self.ids)
+        
+        self.assertEqual(index.vectors.dtype, np.float16)
+        _, ids = index.search(self.vectors[:10], k=1)
+        np.testing.assert_array_equal(ids[:, 0], self.ids[:10])
+
+
+class TestMemoryItemStore(unittest.TestCase):
+    """Тесты для колоночного хранилища элементов банка памяти."""
+    
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.store = MemoryItemStore(feature_dim=4, max_items=8, color_dtype='float16', initial_capacity=2)
+        self.store.add(
+            np.arange(6),
+            np.random.randn(6, 4).astype(np.float32),
+            np.random.randn(6, 2, 3, 3).astype(np.float32),
+            np.array([0.9, 0.1, 0.8, 0.2, 0.7, 0.3]),
+            timestamp=100.0
+        )
+        
+    def test_least_useful_selection(self):
+        """Тестирование векторного выбора наименее полезных элементов."""
+        self.store.touch(self.store.rows_for(np.array([3, 3, 3])), now=100.0)
+        
+        selected = set(self.store.least_useful(2, now=100.0).tolist())
+        
+        # Элемент 3 часто используется, поэтому вытесняются 1 и 5
+        self.assertEqual(selected, {1, 5})
+        
+    def test_rows_are_reused(self):
+        """Тестирование переиспользования строк удаленных элементов."""
+        self.assertEqual(self.store.remove([1, 4, 42]), [1, 4])
+        rows = self.store.add(
+            np.array([10, 11, 12]),
+            np.zeros((3, 4), dtype=np.float32),
+            np.ones((3, 2, 3, 3), dtype=np.float32),
+            0.5
+        )
+        
+        self.assertEqual(len(self.store), 7)
+        self.assertEqual(self.store.size, 7)
+        self.assertEqual(self.store.colors.dtype, np.float16)
+        self.assertEqual(set(rows.tolist()) & {1, 4}, {1, 4})
+        np.testing.assert_array_equal(self.store.rows_for(np.array([[10, 1]]))[0, 1], -1)
+        self.assertEqual(self.store.get(12).color.dtype, np.float32)
+
+
+class TestMemoryBankDeletion(unittest.TestCase):
+    """Тесты для удаления элементов и перестроения индекса банка памяти."""
+    
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.features = torch.randn(40, 8)
+        self.colors = torch.randn(40, 2, 2, 2)
+        
+    def tearDown(self):
+        """Очистка после каждого теста."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        
+    def create_bank(self, **kwargs):
+        """Создает банк памяти и заполняет его тестовыми элементами."""
+        bank = MemoryBank(feature_dim=8, max_items=100, save_dir=self.temp_dir, **kwargs)
+        for i in range(self.features.shape[0]):
+            bank.add_item(self.features[i:i + 1], self.colors[i:i + 1])
+        return bank
+        
+    def test_query_returns_only_live_items(self):
+        """Тестирование того, что запрос возвращает k живых элементов после удалений."""
+        bank = self.create_bank(use_faiss=False, compaction_threshold=1.0)
+        removed = list(range(0, 40, 4)) + list(range(1, 40, 4))
+        
+        self.assertEqual(bank.remove_items(removed), 20)
+        self.assertEqual(bank.index.get_size(), 20)
+        
+        result = bank.query(self.features[:5], k=6, return_distances=True)
+        for ids in result['ids']:
+            self.assertEqual(len(ids), 6)
+            self.assertTrue(all(item_id in bank.items for item_id in ids))
+        self.assertEqual(tuple(result['colors'].shape), (5, 6, 2, 2, 2))
+        self.assertTrue(torch.isfinite(result['distances']).all())
+        
+        # Удаленные элементы не возвращаются даже при запросе собственных признаков
+        self.assertNotEqual(bank.query(self.features[:1], k=1)['ids'][0][0], 0)
+        
+    def test_background_compaction(self):
+        """Тестирование фонового перестроения индекса при превышении доли удаленных."""
+        bank = self.create_bank(use_faiss=False, compaction_threshold=0.5)
+        bank.remove_items(range(25))
+        
+        if bank._compaction_thread is not None:
+            bank._compaction_thread.join(timeout=10)
+            
+        self.assertEqual(bank.index.get_total(), 15)
+        self.assertEqual(bank.index.get_dead_ratio(), 0.0)
+        _, ids = bank.index.search(self.features[30:31].numpy(), 1)
+        self.assertEqual(ids[0, 0], 30)
+        
+    def test_eviction_removes_from_index(self):
+        """Тестирование удаления вытесненных элементов из индекса."""
+        bank = MemoryBank(feature_dim=8, max_items=10, save_dir=self.temp_dir, use_faiss=False,
+                          background_compaction=False)
+        for i in range(25):
+            bank.add_item(self.features[i:i + 1], self.colors[i:i + 1])
+            
+        self.assertEqual(len(bank.items), 10)
+        self.assertEqual(bank.index.get_size(), 10)
+        self.assertLessEqual(bank.index.get_total(), 15)
+
+
+class TestMemoryBankPersistence(unittest.TestCase):
+    """Тесты для бинарного снимка банка памяти и журнала изменений."""
+    
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.features = torch.randn(30, 8)
+        self.colors = torch.randn(30, 2, 2, 2)
+        
+    def tearDown(self):
+        """Очистка после каждого теста."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        
+    def create_bank(self, count=0, **kwargs):
+        """Создает банк памяти и добавляет в него count тестовых элементов."""
+        bank = MemoryBank(feature_dim=8, max_items=100, save_dir=self.temp_dir, **kwargs)
+        for i in range(count):
+            bank.add_item(self.features[i:i + 1], self.colors[i:i + 1], metadata={'index': i})
+        return bank
+        
+    def test_binary_roundtrip(self):
+        """Тестирование сохранения и загрузки снимка через mmap с FAISS и без него."""
+        for use_faiss in (False, True):
+            source = self.create_bank(20, use_faiss=use_faiss)
+            source.remove_items([3])
+            source.save('snapshot')
+            
+            loaded = self.create_bank(use_faiss=use_faiss)
+            self.assertTrue(loaded.load('snapshot', read_only=True))
+            self.assertIsInstance(loaded.items.features, np.memmap)
+            self.assertEqual(len(loaded.items), 19)
+            self.assertEqual(loaded.next_id, 20)
+            self.assertEqual(loaded.get_item(5).metadata, {'index': 5})
+            
+            expected = source.query(self.features[:4], k=3)['ids']
+            self.assertEqual(loaded.query(self.features[:4], k=3)['ids'], expected)
+            
+    def test_float16_storage_roundtrip(self):
+        """Тестирование хранения векторов индекса в float16 и его восстановления из снимка."""
+        source = self.create_bank(20, use_faiss=False, storage_dtype='float16')
+        self.assertEqual(source.index.vectors.dtype, np.float16)
+        source.save('snapshot')
+        
+        # Тип хранения задается снимком, матрица индекса отображается на файл
+        loaded = self.create_bank(use_faiss=False)
+        self.assertTrue(loaded.load('snapshot', read_only=True))
+        self.assertEqual(loaded.storage_dtype, 'float16')
+        self.assertIsInstance(loaded.index.vectors, np.memmap)
+        self.assertEqual(loaded.index.vectors.dtype, np.float16)
+        self.assertEqual(
+            loaded.query(self.features[:4], k=3)['ids'],
+            source.query(self.features[:4], k=3)['ids']
+        )
+        
+    def test_storage_options_are_forwarded(self):
+        """Тестирование передачи параметров хранения из конфигурации модуля и сервера в банк памяти."""
+        config = {
+            'feature_dim': 8,
+            'max_items': 100,
+            'save_dir': self.temp_dir,
+            'use_faiss': False,
+            'compaction_threshold': 0.5,
+            'color_dtype': 'float16',
+            'storage_dtype': 'float16'
+        }
+        module_bank = create_memory_bank_module(config).memory_bank
+        server = create_memory_bank_server(dict(config, socket_path=os.path.join(self.temp_dir, 'bank.sock')))
+        server_bank = server.service.bank
+        server.service.scheduler.shutdown()
+        
+        for bank in (module_bank, server_bank):
+            self.assertFalse(bank.index.has_faiss)
+            self.assertEqual(bank.compaction_threshold, 0.5)
+            self.assertEqual(bank.items.color_dtype, np.float16)
+            self.assertEqual(bank.index.storage_dtype, np.float16)
+        
+    def test_delta_log(self):
+        """Тестирование журнала изменений после снимка и его чтения другим экземпляром."""
+        writer = self.create_bank(10, use_faiss=False)
+        writer.save('snapshot')
+        for i in range(10, 15):
+            writer.add_item(self.features[i:i + 1], self.colors[i:i + 1])
+        writer.remove_items([0, 11])
+        
+        reader = self.create_bank(use_faiss=False)
+        self.assertTrue(reader.load('snapshot', read_only=True))
+        self.assertEqual(sorted(reader.items.id_to_row), sorted(writer.items.id_to_row))
+        self.assertEqual(reader.next_id, 15)
+        
+        # Новые изменения владельца становятся видны после refresh_delta
+        writer.add_item(self.features[15:16], self.colors[15:16])
+        self.assertEqual(reader.refresh_delta(), 1)
+        self.assertEqual(reader.query(self.features[15:16], k=1)['ids'][0][0], 15)
+        
+        # Читающий экземпляр не пишет в журнал
+        reader.add_item(self.features[16:17], self.colors[16:17])
+        self.assertEqual(writer.refresh_delta(), 0)
+        self.assertNotIn(16, writer.items)
+        
+        # После нового снимка читающий экземпляр открывает его заново
+        writer.save('snapshot')
+        reader.refresh_delta()
+        self.assertEqual(sorted(reader.items.id_to_row), sorted(writer.items.id_to_row))
+        
+    def test_json_format(self):
+        """Тестирование сохранения и загрузки в прежнем формате JSON."""
+        source = self.create_bank(5, use_faiss=False)
+        source.save('legacy', format='json')
+        
+        loaded = self.create_bank(use_faiss=False)
+        self.assertTrue(loaded.load('legacy'))
+        self.assertEqual(len(loaded.items), 5)
+        np.testing.assert_allclose(loaded.get_item(2).features, self.features[2].numpy(), rtol=1e-6)
+
+
+class TestMemoryBankBulkIngest(unittest.TestCase):
+    """Тесты для пакетного добавления элементов в банк памяти."""
+    
+    def setUp(self):
+        """Настройка перед каждым тестом."""
+        self.temp_dir = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        """Очистка после каждого теста."""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        
+    def test_single_eviction_and_index_call(self):
+        """Тестирование одного вытеснения и одного вызова индекса на пакет."""
+        bank = MemoryBank(feature_dim=8, max_items=500, save_dir=self.temp_dir, use_faiss=False,
+                          compaction_threshold=1.0)
+        bank.add_items(np.random.randn(400, 8), np.random.randn(400, 2, 1, 1), qualities=np.full(400, 0.9))
+        
+        index_calls = []
+        original_add = bank.index.add
+        bank.index.add = lambda vectors, ids=None: (index_calls.append(len(vectors)), original_add(vectors, ids))
+        
+        features = np.random.randn(300, 8).astype(np.float32)
+        metadata = [{'row': i} for i in range(300)]
+        ids = bank.add_items(features, np.random.randn(300, 2, 1, 1), qualities=0.5, metadata=metadata)
+        
+        self.assertEqual(index_calls, [300])
+        self.assertEqual(ids, list(range(400, 700)))
+        self.assertEqual(len(bank.items), 500)
+        self.assertEqual(bank.index.get_size(), 500)
+        self.assertEqual(bank.total_items_removed.item(), 200)
+        self.assertEqual(bank.get_item(450).metadata, {'row': 50})
+        self.assertEqual(bank.query(torch.from_numpy(features[:1]), k=1)['ids'][0][0], 400)
+        
+    def test_lazy_ivf_training(self):
+        """Тестирование отложенного обучения индекса IVF на первом большом пакете."""
+        bank = MemoryBank(feature_dim=8, max_items=5000, index_type='ivf', save_dir=self.temp_dir)
+        if not bank.index.has_faiss:
+            self.skipTest("FAISS не установлен")
+            
+        small = np.random.randn(10, 8).astype(np.float32)
+        bank.add_items(small, np.random.randn(10, 2, 1, 1))
+        self.assertTrue(bank.index.needs_training)
+        self.assertEqual(bank.query(torch.from_numpy(small[3:4]), k=1)['ids'][0][0], 3)
+        
+        large = np.random.randn(1500, 8).astype(np.float32)
+        bank.add_items(large, np.random.randn(1500, 2, 1, 1))
+        self.assertFalse(bank.index.needs_training)
+        self.assertEqual(bank.index.get_size(), 1510)
+        self.assertEqual(bank.query(torch.from_numpy(small[3:4]), k=1)['ids'][0][0], 3)
+
+
 class TestUncertaintyEstimation(unittest.TestCase):
     """Тесты для компонента UncertaintyEstimation."""
     
@@ -11,6 +11,7 @@ TintoraAI Utils: Набор вспомогательных функций и к
 - Metrics: Вычисление метрик качества колоризации (PSNR, SSIM, LPIPS и др.)
 - UserInteraction: Интерактивное взаимодействие с пользователем через консольные команды
 - ConfigParser: Парсинг и валидация конфигурационных файлов YAML
+- ModuleProfiler: Профилирование времени, FLOP и памяти по модулям модели
 """
 
 from .data_loader import (
@@ -45,6 +46,10 @@ from .config_parser import (
     validate_config, merge_configs
 )
 
+from .profiler import (
+    ModuleProfiler, create_module_profiler
+)
+
 
 # Экспортируемые модули и функции
 __all__ = [
@@ -74,6 +79,9 @@ __all__ = [
     'ConfigValidator', 'ConfigParser', 'YAMLConfigParser',
     'parse_config', 'load_config', 'save_config', 'create_default_config',
     'validate_config', 'merge_configs',
+    
+    # Profiler
+    'ModuleProfiler', 'create_module_profiler',
 ]
 
 
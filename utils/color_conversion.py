@@ -0,0 +1,196 @@
+"""
+Color Conversion: Пакетные преобразования между RGB и Lab на тензорах PyTorch.
+
+Данный модуль реализует прямое и обратное преобразование sRGB <-> CIE Lab (D65)
+целиком на тензорах: батч изображений обрабатывается одной последовательностью
+векторных операций на том устройстве, где он уже находится (CPU или GPU), без
+копирования в numpy, без цикла по изображениям и без квантования в uint8.
+
+Ключевые особенности:
+- Поддержка тензоров формата [3, H, W] и [B, 3, H, W]
+- Вычисления в float32 (или float64 для входов двойной точности)
+- Нормализация, принятая в проекте: L / 100 -> [0, 1], a, b / 127 -> [-1, 1]
+- Общая реализация для ColorSpaceConverter, get_color_transforms и предиктора
+
+Преимущества:
+- Батч любого размера не покидает устройство и не требует Python-цикла
+- Отсутствие потерь точности на промежуточном uint8
+- Идентичные результаты при обучении и инференсе
+"""
+
+import numpy as np
+import torch
+
+
+# Нормировочные коэффициенты каналов Lab
+L_SCALE = 100.0
+AB_SCALE = 127.0
+
+# Опорная точка белого D65
+_WHITE_POINT_D65 = (0.95047, 1.0, 1.08883)
+
+# Матрицы преобразования линейного sRGB <-> XYZ (D65)
+_RGB_TO_XYZ = (
+    (0.412453, 0.357580, 0.180423),
+    (0.212671, 0.715160, 0.072169),
+    (0.019334, 0.119193, 0.950227),
+)
+_XYZ_TO_RGB = (
+    (3.240481340, -1.537151516, -0.498536727),
+    (-0.969254949, 1.875990000, 0.041555926),
+    (0.055646639, -0.204041338, 1.057311070),
+)
+
+# Пороги кусочных функций CIE
+_LAB_EPSILON = 0.008856
+_LAB_KAPPA = 7.787
+_LAB_DELTA = 6.0 / 29.0
+
+
+def _float_dtype(tensor: torch.Tensor) -> torch.dtype:
+    """Возвращает вещественный тип для вычислений над тензором."""
+    return torch.float64 if tensor.dtype == torch.float64 else torch.float32
+
+
+def _apply_matrix(image: torch.Tensor, matrix) -> torch.Tensor:
+    """
+    Применяет матрицу 3x3 к каналам изображения.
+
+    Args:
+        image (torch.Tensor): Тензор [..., 3, H, W]
+        matrix: Матрица 3x3
+
+    Returns:
+        torch.Tensor: Тензор [..., 3, H, W]
+    """
+    matrix = torch.tensor(matrix, dtype=image.dtype, device=image.device)
+    return torch.einsum('ij,...jhw->...ihw', matrix, image)
+
+
+def _check_channels(image: torch.Tensor) -> None:
+    """Проверяет, что тензор имеет формат [3, H, W] или [B, 3, H, W]."""
+    if image.dim() not in (3, 4) or image.shape[-3] != 3:
+        raise ValueError(f"Ожидается тензор [3, H, W] или [B, 3, H, W], получено: {tuple(image.shape)}")
+
+
+def rgb_to_lab_tensor(rgb: torch.Tensor, normalize: bool = True) -> torch.Tensor:
+    """
+    Преобразует RGB-тензор в Lab.
+
+    Args:
+        rgb (torch.Tensor): RGB-тензор [3, H, W] или [B, 3, H, W] в диапазоне [0, 1]
+            (тензоры uint8 интерпретируются как [0, 255])
+        normalize (bool): Нормализовать ли результат (L в [0, 1], a и b в [-1, 1])
+
+    Returns:
+        torch.Tensor: Lab-тензор той же формы
+    """
+    _check_channels(rgb)
+
+    if rgb.dtype == torch.uint8:
+        rgb = rgb.float() / 255.0
+    else:
+        rgb = rgb.to(_float_dtype(rgb))
+
+    rgb = rgb.clamp(0.0, 1.0)
+
+    # Снимаем гамма-коррекцию sRGB
+    linear = torch.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+
+    xyz = _apply_matrix(linear, _RGB_TO_XYZ)
+    white = torch.tensor(_WHITE_POINT_D65, dtype=xyz.dtype, device=xyz.device).view(3, 1, 1)
+    xyz = xyz / white
+
+    f = torch.where(
+        xyz > _LAB_EPSILON,
+        xyz.clamp(min=_LAB_EPSILON) ** (1.0 / 3.0),
+        _LAB_KAPPA * xyz + 16.0 / 116.0
+    )
+    fx, fy, fz = f.unbind(dim=-3)
+
+    l_channel = 116.0 * fy - 16.0
+    a_channel = 500.0 * (fx - fy)
+    b_channel = 200.0 * (fy - fz)
+
+    if normalize:
+        l_channel = l_channel / L_SCALE
+        a_channel = a_channel / AB_SCALE
+        b_channel = b_channel / AB_SCALE
+
+    return torch.stack([l_channel, a_channel, b_channel], dim=-3)
+
+
+def lab_to_rgb_tensor(lab: torch.Tensor, normalized: bool = True, clamp: bool = True) -> torch.Tensor:
+    """
+    Преобразует Lab-тензор в RGB.
+
+    Args:
+        lab (torch.Tensor): Lab-тензор [3, H, W] или [B, 3, H, W]
+        normalized (bool): Нормализован ли вход (L в [0, 1], a и b в [-1, 1])
+        clamp (bool): Ограничивать ли результат диапазоном [0, 1]
+
+    Returns:
+        torch.Tensor: RGB-тензор той же формы в диапазоне [0, 1]
+    """
+    _check_channels(lab)
+
+    lab = lab.to(_float_dtype(lab))
+    l_channel, a_channel, b_channel = lab.unbind(dim=-3)
+
+    if normalized:
+        l_channel = l_channel * L_SCALE
+        a_channel = a_channel * AB_SCALE
+        b_channel = b_channel * AB_SCALE
+
+    fy = (l_channel + 16.0) / 116.0
+    fx = fy + a_channel / 500.0
+    fz = fy - b_channel / 200.0
+    f = torch.stack([fx, fy, fz], dim=-3)
+
+    xyz = torch.where(f > _LAB_DELTA, f ** 3, (f - 16.0 / 116.0) / _LAB_KAPPA)
+    white = torch.tensor(_WHITE_POINT_D65, dtype=xyz.dtype, device=xyz.device).view(3, 1, 1)
+    xyz = xyz * white
+
+    linear = _apply_matrix(xyz, _XYZ_TO_RGB).clamp(min=0.0)
+
+    # Применяем гамма-коррекцию sRGB
+    rgb = torch.where(
+        linear > 0.0031308,
+        1.055 * linear.clamp(min=0.0031308) ** (1.0 / 2.4) - 0.055,
+        linear * 12.92
+    )
+
+    if clamp:
+        rgb = rgb.clamp(0.0, 1.0)
+
+    return rgb
+
+
+def rgb_to_lab_array(rgb_img: np.ndarray, normalize: bool = True) -> np.ndarray:
+    """
+    Преобразует RGB-изображение numpy [H, W, 3] в Lab через тензорную реализацию.
+
+    Args:
+        rgb_img (np.ndarray): RGB-изображение [H, W, 3] (uint8 или float в [0, 1])
+        normalize (bool): Нормализовать ли результат
+
+    Returns:
+        np.ndarray: Lab-изображение [H, W, 3] в float32
+    """
+    tensor = torch.from_numpy(np.ascontiguousarray(rgb_img[..., :3])).permute(2, 0, 1)
+    return rgb_to_lab_tensor(tensor, normalize=normalize).permute(1, 2, 0).float().numpy()
+
+
+def lab_to_rgb_array(lab_img: np.ndarray, normalized: bool = True) -> np.ndarray:
+    """
+    Преобразует Lab-изображение numpy [H, W, 3] в RGB через тензорную реализацию.
+
+    Args:
+        lab_img (np.ndarray): Lab-изображение [H, W, 3]
+        normalized (bool): Нормализован ли вход
+
+    Returns:
+        np.ndarray: RGB-изображение [H, W, 3] в float32 в диапазоне [0, 1]
+    """
+    tensor = torch.from_numpy(np.ascontiguousarray(lab_img)).permute(2, 0, 1)
+    return lab_to_rgb_tensor(tensor, normalized=normalized).permute(1, 2, 0).float().numpy()
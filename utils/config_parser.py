@@ -402,6 +402,50 @@ INFERENCE_CONFIG_SCHEMA = {
     "save_uncertainty_maps": {"type": "bool", "required": False},
     "fallback_strategy": {"type": "str", "required": False, 
                          "allowed_values": ["memory_bank", "guide_net", "default", "none"]},
+    "split_large_images": {"type": "bool", "required": False},
+    "max_size_per_split": {"type": "int", "required": False, "min": 32},
+    "overlap": {"type": "int", "required": False, "min": 0},
+    "blending_mode": {"type": "str", "required": False, "allowed_values": ["linear", "gaussian"]},
+    "output_mode": {"type": "str", "required": False, "allowed_values": ["chroma_upsample", "resize"]},
+    "chroma_upsample_method": {"type": "str", "required": False, "allowed_values": ["bilinear", "guided"]},
+    "preserve_aspect_ratio": {"type": "bool", "required": False},
+    "size_multiple": {"type": "int", "required": False, "min": 1},
+    "mixed_precision": {"type": "bool", "required": False},
+    "precision": {"type": "str", "required": False, "allowed_values": ["auto", "fp32", "bf16", "fp16", "float32", "bfloat16", "float16"]},
+    "channels_last": {"type": "bool", "required": False},
+    "precision_parity_tolerance": {"type": "float", "required": False, "min": 0.0},
+    "precision_parity_images": {"type": "str", "required": False},
+    "compilation": {
+        "type": "dict",
+        "required": False,
+        "schema": {
+            "backend": {"type": "str", "required": False,
+                        "allowed_values": ["none", "eager", "trace", "torchscript", "compile", "torch_compile"]},
+            "batch_buckets": {"type": "list", "required": False},
+            "warmup": {"type": "bool", "required": False},
+            "warmup_sizes": {"type": "list", "required": False},
+            "cache_dir": {"type": "str", "required": False}
+        }
+    },
+    "backend": {"type": "str", "required": False, "allowed_values": ["pytorch", "onnxruntime"]},
+    "onnxruntime": {
+        "type": "dict",
+        "required": False,
+        "schema": {
+            "model_path": {"type": "str", "required": False},
+            "intra_op_threads": {"type": "int", "required": False, "min": 0},
+            "inter_op_threads": {"type": "int", "required": False, "min": 0}
+        }
+    },
+    "quantization": {
+        "type": "dict",
+        "required": False,
+        "schema": {
+            "enabled": {"type": "bool", "required": False},
+            "exclude": {"type": "list", "required": False},
+            "checkpoint_path": {"type": "str", "required": False}
+        }
+    },
     "style_transfer": {
         "type": "dict",
         "required": False,
@@ -750,6 +794,30 @@ def create_default_config(config_type: str) -> Dict:
             "save_comparisons": True,
             "save_uncertainty_maps": True,
             "fallback_strategy": "memory_bank",
+            "split_large_images": True,
+            "max_size_per_split": 1024,
+            "overlap": 32,
+            "blending_mode": "linear",
+            "output_mode": "chroma_upsample",
+            "chroma_upsample_method": "bilinear",
+            "preserve_aspect_ratio": False,
+            "size_multiple": 32,
+            "mixed_precision": False,
+            "precision": "fp32",
+            "channels_last": True,
+            "precision_parity_tolerance": 0.02,
+            "compilation": {
+                "backend": "none",
+                "batch_buckets": [1, 2, 4, 8],
+                "warmup": False,
+                "warmup_sizes": [256]
+            },
+            "backend": "pytorch",
+            "quantization": {
+                "enabled": False,
+                "exclude": [],
+                "checkpoint_path": None
+            },
             "style_transfer": {
                 "enabled": False,
                 "alpha": 0.5
@@ -38,7 +38,8 @@ from torch.utils.data import Dataset, DataLoader, random_split, Subset
 import torchvision.transforms as transforms
 from torchvision.transforms import functional as TF
 from PIL import Image, ImageFile, ImageFilter, ImageOps
-import cv2
+
+from utils.color_conversion import rgb_to_lab_tensor, lab_to_rgb_tensor, rgb_to_lab_array, lab_to_rgb_array
 
 # Настройка PIL для загрузки поврежденных изображений
 ImageFile.LOAD_TRUNCATED_IMAGES = True
@@ -53,25 +54,22 @@ class ColorSpaceConverter:
         """
         Конвертирует изображение из RGB в Lab.
         
+        Канал L возвращается как истинное L/100 в диапазоне [0, 1]. Прежняя реализация
+        через cv2 для uint8 делила на 100 значение L, уже масштабированное в [0, 255],
+        и давала L в [0, 2.55]. Модели, обученные на данных прежнего загрузчика, получают
+        теперь вход в другом масштабе и требуют дообучения (или умножения L на 2.55).
+        
         Args:
-            rgb_img (np.ndarray): Изображение в формате RGB [H, W, 3]
+            rgb_img (np.ndarray): Изображение в формате RGB [H, W, 3] (uint8 или float в [0, 1])
             
         Returns:
             np.ndarray: Изображение в формате Lab [H, W, 3]
         """
-        # OpenCV ожидает BGR формат
-        bgr_img = cv2.cvtColor(rgb_img, cv2.COLOR_RGB2BGR)
-        lab_img = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2LAB)
-        
         # Нормализуем значения
         # L: [0, 100] -> [0, 1]
         # a: [-127, 127] -> [-1, 1]
         # b: [-127, 127] -> [-1, 1]
-        lab_img = lab_img.astype(np.float32)
-        lab_img[:, :, 0] = lab_img[:, :, 0] / 100.0
-        lab_img[:, :, 1:] = (lab_img[:, :, 1:] - 128) / 127.0
-        
-        return lab_img
+        return rgb_to_lab_array(rgb_img, normalize=True)
         
     @staticmethod
     def lab_to_rgb(lab_img: np.ndarray) -> np.ndarray:
@@ -79,7 +77,7 @@ class ColorSpaceConverter:
         Конвертирует изображение из Lab в RGB.
         
         Args:
-            lab_img (np.ndarray): Изображение в формате Lab [H, W, 3] или [3, H, W]
+            lab_img (np.ndarray): Нормализованное изображение в формате Lab [H, W, 3] или [3, H, W]
             
         Returns:
             np.ndarray: Изображение в формате RGB [H, W, 3]
@@ -88,23 +86,36 @@ class ColorSpaceConverter:
         if lab_img.shape[0] == 3 and len(lab_img.shape) == 3:
             lab_img = np.transpose(lab_img, (1, 2, 0))
             
-        # Копируем, чтобы не изменять входное изображение
-        lab_img = lab_img.copy().astype(np.float32)
+        rgb_img = lab_to_rgb_array(lab_img.astype(np.float32), normalized=True)
         
-        # Денормализуем значения
-        lab_img[:, :, 0] = lab_img[:, :, 0] * 100.0
-        lab_img[:, :, 1:] = lab_img[:, :, 1:] * 127.0 + 128
+        # Преобразуем значения к uint8 только на выходе
+        return np.round(rgb_img * 255.0).astype(np.uint8)
         
-        # Преобразуем значения к uint8
-        lab_img = np.clip(lab_img, 0, 255).astype(np.uint8)
+    @staticmethod
+    def rgb_to_lab_tensor(rgb_tensor: torch.Tensor) -> torch.Tensor:
+        """
+        Конвертирует тензор из RGB в нормализованный Lab без выхода с устройства.
         
-        # Конвертируем Lab в BGR
-        bgr_img = cv2.cvtColor(lab_img, cv2.COLOR_LAB2BGR)
+        Args:
+            rgb_tensor (torch.Tensor): RGB-тензор [3, H, W] или [B, 3, H, W] в диапазоне [0, 1]
+            
+        Returns:
+            torch.Tensor: Lab-тензор той же формы
+        """
+        return rgb_to_lab_tensor(rgb_tensor, normalize=True)
         
-        # Конвертируем BGR в RGB
-        rgb_img = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB)
+    @staticmethod
+    def lab_to_rgb_tensor(lab_tensor: torch.Tensor) -> torch.Tensor:
+        """
+        Конвертирует нормализованный Lab-тензор в RGB без выхода с устройства.
         
-        return rgb_img
+        Args:
+            lab_tensor (torch.Tensor): Lab-тензор [3, H, W] или [B, 3, H, W]
+            
+        Returns:
+            torch.Tensor: RGB-тензор той же формы в диапазоне [0, 1]
+        """
+        return lab_to_rgb_tensor(lab_tensor, normalized=True)
         
     @staticmethod
     def rgb_to_grayscale(rgb_img: np.ndarray) -> np.ndarray:
@@ -145,7 +145,8 @@ class SSIM:
         
         # Получаем устройство для вычислений
         device = img1.device
-        gaussian_kernel = self.gaussian_kernel.to(device)
+        # Отдельное ядро для каждого канала (свертка по группам)
+        gaussian_kernel = self.gaussian_kernel.to(device=device, dtype=img1.dtype).expand(img1.shape[1], 1, -1, -1)
         
         # Константы для стабильности
         C1 = (0.01 * 255) ** 2
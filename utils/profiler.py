@@ -0,0 +1,329 @@
+"""
+Profiler: Профилирование времени, вычислений и памяти по модулям модели колоризации.
+
+Данный модуль регистрирует forward-хуки на модулях верхнего уровня ColorizerBackbone
+(swin_unet, vit_semantic, fpn_pyramid, cross_bridge, feature_fusion, output_conv) и,
+при необходимости, на интеллектуальных модулях (GuideNet, MemoryBank и др.) и для
+каждого вызова записывает время выполнения, оценку FLOP, пиковую память и формы
+входных и выходных тензоров.
+
+Ключевые особенности:
+- Время измеряется с синхронизацией CUDA до и после вызова модуля
+- FLOP оцениваются torch.utils.flop_counter для каждой новой формы входа
+  (повторный проход модуля вне замера времени, результат кэшируется)
+- Пиковая память на CUDA - прирост max_memory_allocated за время вызова модуля
+- Экспорт в формат Chrome Trace (chrome://tracing, Perfetto) и сводная таблица
+
+Преимущества:
+- Показывает, какая ветвь модели определяет время и память инференса
+- Не требует изменения кода модели
+"""
+
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import torch
+import torch.nn as nn
+from torch.utils.flop_counter import FlopCounterMode
+
+from core.checkpointing import _tensor_bytes
+
+
+def _tensor_shapes(value):
+    """Формы тензоров во вложенных списках, кортежах и словарях (прочие значения опускаются)."""
+    if isinstance(value, torch.Tensor):
+        return list(value.shape)
+    if isinstance(value, dict):
+        shapes = {key: _tensor_shapes(item) for key, item in value.items()}
+        return {key: shape for key, shape in shapes.items() if shape is not None} or None
+    if isinstance(value, (list, tuple)):
+        shapes = [_tensor_shapes(item) for item in value]
+        shapes = [shape for shape in shapes if shape is not None]
+        return shapes or None
+    return None
+
+
+def _first_device(value) -> Optional[torch.device]:
+    """Устройство первого тензора во вложенной структуре."""
+    if isinstance(value, torch.Tensor):
+        return value.device
+    items = value.values() if isinstance(value, dict) else value if isinstance(value, (list, tuple)) else ()
+    for item in items:
+        device = _first_device(item)
+        if device is not None:
+            return device
+    return None
+
+
+class ModuleProfiler:
+    """
+    Профилировщик модулей модели на основе forward-хуков.
+
+    Хуки действуют между attach() и detach() (или внутри блока with). Корневая модель
+    также профилируется (под именем класса) и служит базой для доли времени модулей.
+    Пиковая память вызова учитывает пики вложенных профилируемых вызовов, но
+    статистика max_memory_allocated CUDA сбрасывается перед каждым вызовом.
+
+    Args:
+        model (nn.Module): Профилируемая модель (обычно ColorizerBackbone)
+        module_names (List[str], optional): Имена профилируемых подмодулей
+            (по умолчанию все модули верхнего уровня)
+        extra_modules (Dict[str, nn.Module], optional): Дополнительные модули вне модели
+            (например, интеллектуальные модули предиктора)
+        count_flops (bool): Оценивать FLOP вызовов (только в режиме eval)
+    """
+    def __init__(
+        self,
+        model: nn.Module,
+        module_names: Optional[List[str]] = None,
+        extra_modules: Optional[Dict[str, nn.Module]] = None,
+        count_flops: bool = True
+    ):
+        self.model = model
+        self.root_name = type(model).__name__
+        self.count_flops = count_flops
+
+        if module_names is None:
+            module_names = [name for name, _ in model.named_children()]
+
+        self.modules = OrderedDict([(self.root_name, model)])
+        for name in module_names:
+            self.modules[name] = model.get_submodule(name)
+        for name, module in (extra_modules or {}).items():
+            if module is not None:
+                self.modules[name] = module
+
+        self.records = []
+        self._flop_cache = {}
+        self._handles = []
+        self._stack = []
+        self._counting = False
+        self._origin = None
+        self._paused = 0.0
+
+    def __enter__(self):
+        return self.attach()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.detach()
+
+    def attach(self):
+        """Регистрирует хуки на профилируемых модулях."""
+        if self._handles:
+            return self
+        for name, module in self.modules.items():
+            pre_hook, post_hook = self._make_hooks(name)
+            self._handles.append(module.register_forward_pre_hook(pre_hook, with_kwargs=True))
+            self._handles.append(module.register_forward_hook(post_hook, with_kwargs=True))
+        return self
+
+    def detach(self):
+        """Удаляет хуки; записанные вызовы сохраняются."""
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        self._stack = []
+
+    def reset(self):
+        """Очищает записанные вызовы."""
+        self.records = []
+        self._origin = None
+
+    def _make_hooks(self, name):
+        def pre_hook(module, args, kwargs):
+            if self._counting:
+                return
+            device = _first_device(args) or _first_device(kwargs)
+            cuda = device is not None and device.type == 'cuda'
+            memory_start = None
+            if cuda:
+                torch.cuda.synchronize(device)
+                memory_start = torch.cuda.memory_allocated(device)
+                self._reset_peak_memory(device)
+            self._stack.append({
+                'device': device,
+                'cuda': cuda,
+                'memory_start': memory_start,
+                'memory_peak': memory_start,
+                'input_shapes': _tensor_shapes((args, kwargs)),
+                'start': self._clock()
+            })
+            if self._origin is None:
+                self._origin = self._stack[-1]['start']
+
+        def post_hook(module, args, kwargs, output):
+            if self._counting:
+                return
+            call = self._stack.pop()
+            if call['cuda']:
+                torch.cuda.synchronize(call['device'])
+            end = self._clock()
+
+            peak_memory = None
+            if call['cuda']:
+                memory_peak = max(call['memory_peak'], torch.cuda.max_memory_allocated(call['device']))
+                peak_memory = memory_peak - call['memory_start']
+                # Пик вложенного вызова входит в пик объемлющих вызовов
+                for outer in self._stack:
+                    if outer['cuda']:
+                        outer['memory_peak'] = max(outer['memory_peak'], memory_peak)
+
+            self.records.append({
+                'module': name,
+                'start_ms': (call['start'] - self._origin) * 1000,
+                'duration_ms': (end - call['start']) * 1000,
+                'flops': self._estimate_flops(name, module, args, kwargs, call),
+                'peak_memory_bytes': peak_memory,
+                'output_bytes': _tensor_bytes(output),
+                'input_shapes': call['input_shapes'],
+                'output_shapes': _tensor_shapes(output)
+            })
+
+        return pre_hook, post_hook
+
+    def _clock(self) -> float:
+        """Время без учета повторных проходов оценки FLOP, в секундах."""
+        return time.perf_counter() - self._paused
+
+    def _reset_peak_memory(self, device):
+        """Сбрасывает пиковую память CUDA, сохранив текущий пик в активных вызовах."""
+        memory_peak = torch.cuda.max_memory_allocated(device)
+        for call in self._stack:
+            if call['cuda']:
+                call['memory_peak'] = max(call['memory_peak'], memory_peak)
+        torch.cuda.reset_peak_memory_stats(device)
+
+    def _estimate_flops(self, name, module, args, kwargs, call) -> Optional[int]:
+        """Оценивает FLOP вызова модуля повторным проходом для новой формы входа."""
+        if not self.count_flops or module.training:
+            # Повторный проход в режиме обучения изменил бы статистики BatchNorm
+            return None
+
+        key = (name, json.dumps(call['input_shapes']))
+        if key not in self._flop_cache:
+            self._counting = True
+            pause_start = time.perf_counter()
+            try:
+                with torch.no_grad(), FlopCounterMode(display=False) as counter:
+                    module(*args, **kwargs)
+                self._flop_cache[key] = counter.get_total_flops()
+            finally:
+                self._counting = False
+                self._paused += time.perf_counter() - pause_start
+            # Память повторного прохода не относится к объемлющим вызовам
+            if call['cuda']:
+                torch.cuda.reset_peak_memory_stats(call['device'])
+        return self._flop_cache[key]
+
+    def summary(self) -> List[Dict]:
+        """
+        Сводная статистика вызовов по модулям.
+
+        Returns:
+            List[Dict]: Для каждого модуля (в порядке регистрации): количество вызовов,
+            суммарное, среднее и максимальное время (мс), доля времени корневой модели,
+            средние FLOP на вызов, производительность (GFLOP/с), максимальная пиковая
+            память (байт, только CUDA) и формы выхода последнего вызова
+        """
+        root_time = sum(record['duration_ms'] for record in self.records if record['module'] == self.root_name)
+        rows = []
+
+        for name in self.modules:
+            records = [record for record in self.records if record['module'] == name]
+            if not records:
+                continue
+
+            durations = [record['duration_ms'] for record in records]
+            total_ms = sum(durations)
+            flops = [record['flops'] for record in records if record['flops'] is not None]
+            peaks = [record['peak_memory_bytes'] for record in records if record['peak_memory_bytes'] is not None]
+            mean_flops = sum(flops) / len(flops) if flops else None
+
+            rows.append({
+                'module': name,
+                'calls': len(records),
+                'total_ms': total_ms,
+                'mean_ms': total_ms / len(records),
+                'max_ms': max(durations),
+                'time_share': total_ms / root_time if root_time > 0 else None,
+                'mean_flops': mean_flops,
+                'gflops_per_s': sum(flops) / total_ms / 1e6 if flops and len(flops) == len(records) and total_ms > 0 else None,
+                'peak_memory_bytes': max(peaks) if peaks else None,
+                'output_shapes': records[-1]['output_shapes']
+            })
+
+        return rows
+
+    def format_summary_table(self) -> str:
+        """
+        Форматирует сводную статистику в текстовую таблицу.
+
+        Returns:
+            str: Таблица с колонками модуль, вызовы, время, доля, GFLOP, GFLOP/с, память
+        """
+        header = f"{'Модуль':<24}{'Вызовы':>8}{'Всего, мс':>12}{'Среднее, мс':>13}{'Доля':>8}{'GFLOP':>10}{'GFLOP/с':>10}{'Пик, МБ':>10}"
+        lines = [header, '-' * len(header)]
+
+        def number(value, scale, fmt):
+            return format(value / scale, fmt) if value is not None else '-'
+
+        for row in self.summary():
+            share = f"{row['time_share'] * 100:.1f}%" if row['time_share'] is not None else '-'
+            lines.append(
+                f"{row['module']:<24}{row['calls']:>8}{row['total_ms']:>12.2f}{row['mean_ms']:>13.2f}{share:>8}"
+                f"{number(row['mean_flops'], 1e9, '.3f'):>10}{number(row['gflops_per_s'], 1, '.1f'):>10}"
+                f"{number(row['peak_memory_bytes'], 2 ** 20, '.1f'):>10}"
+            )
+
+        return '\n'.join(lines)
+
+    def export_chrome_trace(self, path: str):
+        """
+        Сохраняет записанные вызовы в формате Chrome Trace (события 'X', время в мкс).
+
+        Args:
+            path (str): Путь к JSON-файлу
+        """
+        events = []
+        for record in self.records:
+            events.append({
+                'name': record['module'],
+                'cat': 'model' if record['module'] == self.root_name else 'module',
+                'ph': 'X',
+                'ts': record['start_ms'] * 1000,
+                'dur': record['duration_ms'] * 1000,
+                'pid': 0,
+                'tid': 0,
+                'args': {
+                    'flops': record['flops'],
+                    'peak_memory_bytes': record['peak_memory_bytes'],
+                    'output_bytes': record['output_bytes'],
+                    'input_shapes': record['input_shapes'],
+                    'output_shapes': record['output_shapes']
+                }
+            })
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+
+
+def create_module_profiler(
+    model: nn.Module,
+    intelligent_modules: Optional[Dict[str, nn.Module]] = None,
+    count_flops: bool = True
+) -> ModuleProfiler:
+    """
+    Создает профилировщик модулей верхнего уровня модели колоризации.
+
+    Args:
+        model (nn.Module): Модель ColorizerBackbone
+        intelligent_modules (Dict[str, nn.Module], optional): Интеллектуальные модули
+            для профилирования вместе с моделью
+        count_flops (bool): Оценивать FLOP вызовов
+
+    Returns:
+        ModuleProfiler: Профилировщик (хуки регистрируются через attach() или with)
+    """
+    return ModuleProfiler(model, extra_modules=intelligent_modules, count_flops=count_flops)
@@ -1140,9 +1140,12 @@ def save_image(image: np.ndarray, filename: str, output_dir: str = "./output/col
     # Определяем путь для сохранения
     save_path = os.path.join(output_dir, filename)
     
-    # Нормализуем изображение, если нужно
-    if image.max() <= 1.0:
-        image = (image * 255).astype(np.uint8)
+    # Нормализуем вещественное изображение из диапазона [0, 1]; uint8 сохраняется как есть
+    # (проверка max() <= 1.0 искажала бы почти черные изображения uint8)
+    if np.issubdtype(image.dtype, np.floating):
+        if image.max() <= 1.0:
+            image = image * 255
+        image = np.clip(image, 0, 255).round().astype(np.uint8)
     
     # Сохраняем изображение
     if image.ndim == 2 or image.shape[-1] == 1: